@@ -42,6 +42,23 @@ source "$SCRIPT_DIR/scripts/tagging.sh" || { echo "Error: tagging.sh not found."
 # --- Configuration ---\
 export BUILD_DIR="$SCRIPT_DIR/build"
 
+# --- Command Line Options ---
+# --resume : skip the menu and continue the journaled run from its failed stage
+# --locked : build with the pinned values of BUILD_LOCKFILE (USE_BUILD_LOCK=y)
+# --arch-profile=DEVICES : compile CUDA code only for these devices/SMs (CUDA_ARCH_PROFILE)
+for arg in "$@"; do
+    case "$arg" in
+        --resume) export BUILD_RESUME="y" ;;
+        --locked) export USE_BUILD_LOCK="y" ;;
+        --arch-profile=*) export CUDA_ARCH_PROFILE="${arg#*=}" ;;
+        *) log_warning "Ignoring unknown option: $arg" ;;
+    esac
+done
+if [[ "${USE_BUILD_LOCK:-n}" == "y" ]] && ! python3 "$SCRIPT_DIR/scripts/build_lock.py" --lockfile "$BUILD_LOCKFILE" check; then
+    log_error "USE_BUILD_LOCK=y but $BUILD_LOCKFILE is missing or partial. Create it with: python3 scripts/build_lock.py lock"
+    exit 1
+fi
+
 # --- Initialization ---\
 log_start
 check_dependencies "docker" "dialog" # This call should be fine now
@@ -52,13 +69,21 @@ main() {
     log_debug "JETC_DEBUG is set to: ${JETC_DEBUG}"
     BUILD_FAILED=0
 
-    # 1. Handle User Interaction
-    log_debug "Step 1: Handling user interaction..."
-    if handle_user_interaction; then
-        log_debug "handle_user_interaction seemed successful."
+    # 1. Handle User Interaction (or restore the selections of the journaled run)
+    if [[ "${BUILD_RESUME:-n}" == "y" ]]; then
+        log_debug "Step 1: Restoring selections from the build journal..."
+        if ! journal_load_resume_state; then
+            log_error "Cannot resume: no interrupted build found in the journal."
+            BUILD_FAILED=1
+        fi
     else
-        log_error "Build cancelled or failed during user interaction (check previous logs)."
-        BUILD_FAILED=1
+        log_debug "Step 1: Handling user interaction..."
+        if handle_user_interaction; then
+            log_debug "handle_user_interaction seemed successful."
+        else
+            log_error "Build cancelled or failed during user interaction (check previous logs)."
+            BUILD_FAILED=1
+        fi
     fi
 
     # 2. Setup Buildx Builder
@@ -78,8 +103,12 @@ main() {
     # 3. Determine Build Order
     if [[ $BUILD_FAILED -eq 0 ]]; then
         log_debug "Step 3: Determining build order..."
+        # config.py build args (locked with --locked), read once for the fingerprints and builds
+        prepare_stage_build_args || true
         if determine_build_order "$BUILD_DIR" "${SELECTED_FOLDERS_LIST:-}"; then
             log_success "Build order determined."
+            # Start a fresh journal so a failed run can be resumed with --resume
+            [[ "${BUILD_RESUME:-n}" == "y" ]] || journal_begin_run || log_warning "Build journal unavailable; this run cannot be resumed."
         else
             log_error "Failed to determine build order."
             BUILD_FAILED=1
@@ -91,12 +120,16 @@ main() {
     # 4. Execute Build Stages
     if [[ $BUILD_FAILED -eq 0 ]]; then
         log_debug "Step 4: Executing build stages..."
+        prefetch_stage_bases
+        start_wheelhouse
         if build_selected_stages; then
             log_success "All selected build stages completed successfully."
+            journal_finish_run || true
         else
             log_error "Build process completed with errors during stages."
             BUILD_FAILED=1
         fi
+        finish_base_prefetch
         log_debug "LAST_SUCCESSFUL_TAG after build stages: ${LAST_SUCCESSFUL_TAG:-<unset>}"
     else
         log_warning "Skipping Step 4 (Build Stages) due to previous failure."
@@ -129,13 +162,25 @@ main() {
             fi
         fi
 
-        log_debug "Step 7: Verifying all built images exist locally..."
         local all_tags=("$final_image_tag")
         [[ -n "$final_timestamp_tag" ]] && all_tags+=("$final_timestamp_tag")
-        if ! verify_all_images_exist_locally "${all_tags[@]}"; then
-             log_warning "Final local verification failed."
+        if [[ "${skip_intermediate_push_pull:-y}" == "n" ]]; then
+            log_debug "Step 7: Verifying all built images in the registry..."
+            if ! verify_all_images_pushed "${all_tags[@]}"; then
+                 log_warning "Final registry verification failed."
+            else
+                 log_success "All built images verified in the registry: ${all_tags[*]}"
+            fi
+            # Pushed images are not pulled back; the container verification below needs the final one,
+            # and a local image under its tag may be an older build
+            sync_local_image "$final_image_tag" || true
         else
-             log_success "All built images verified locally: ${all_tags[*]}"
+            log_debug "Step 7: Verifying all built images exist locally..."
+            if ! verify_all_images_exist_locally "${all_tags[@]}"; then
+                 log_warning "Final local verification failed."
+            else
+                 log_success "All built images verified locally: ${all_tags[*]}"
+            fi
         fi
 
         # <<< --- ADDED VERIFICATION STEP --- >>>
@@ -152,6 +197,8 @@ main() {
 
     # 8. Post-Build Summary & Menu
     log_debug "Step 8: Post-Build Summary..."
+    report_build_telemetry
+    report_image_layers "$final_image_tag"
     log_info "Build process completed."
     if [[ $BUILD_FAILED -eq 0 ]]; then
         log_success "Build SUCCEEDED."
@@ -164,6 +211,7 @@ main() {
         else
              log_error "No successful image was built."
         fi
+        log_info "Run './build.sh --resume' to continue from the failed stage."
     fi
 
     # Run post-build menu - COMMENTED OUT as post_build_menu.sh is deprecated/broken
@@ -191,7 +239,8 @@ if ! declare -f cleanup > /dev/null; then
     cleanup() { log_debug "Basic cleanup trap triggered."; }
     log_warning "cleanup function not found in sourced scripts, using basic trap."
 fi
-trap cleanup EXIT INT TERM
+# The wheelhouse server started for this build stops with it
+trap 'stop_wheelhouse; cleanup' EXIT INT TERM
 main
 exit $?
 
@@ -202,6 +251,6 @@ exit $?
 # │   └── build.sh               <- THIS FILE
 # └── ...                        <- Other project files
 #
-# Description: Main build orchestrator script for the Jetson Container project.
+# Description: Main build orchestrator script for the Jetson Container project. Supports --resume, --locked (build lock) and --arch-profile (CUDA arch profile), starts (and stops) the wheelhouse, prefetches base images into the base image mirror, pushes zstd/eStargz layers when configured, reports per-stage telemetry and optionally the final image's layer report. Push mode verifies images by digest and retags the final image in the registry.
 # Author: Mr K / GitHub Copilot
-# COMMIT-TRACKING: UUID-20250425-080000-42595D
+# COMMIT-TRACKING: UUID-20261017-045500-FX22
@@ -22,12 +22,16 @@ apt-get install -y --no-install-recommends \
 		libtool \
 		zip \
 		unzip
-rm -rf /var/lib/apt/lists/*
-apt-get clean
 
 pip3 install tzdata
 pip3 install 'setuptools<72'  # setup.py invalid command 'test'
 
+# Compiler cache (USE_CCACHE=on); the autotools build has no launcher variable
+. /opt/jetc-scripts/ccache-env.sh
+if [ "${USE_CCACHE}" == "on" ]; then
+    export CC="ccache gcc" CXX="ccache g++"
+fi
+
 cd /tmp 
 
 wget --quiet --show-progress --progress=bar:force:noscroll --no-check-certificate ${PROTOBUF_URL}/$PROTOBUF_DIR.zip
@@ -47,6 +51,9 @@ make check -j$(nproc)
 make install
 ldconfig
 
+# Compiler cache hit rate of this build (collected by build_folder_image)
+sh /opt/jetc-scripts/ccache-report.sh
+
 cd python
 python3 setup.py build --cpp_implementation
 python3 setup.py test --cpp_implementation
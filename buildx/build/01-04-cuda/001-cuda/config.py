@@ -221,15 +221,14 @@ cuda_configs_x86_64 = [
 ]
 
 # --- Generate Package List ---
-package = []
+packages = []
 
 # Helper to add package definitions, avoiding duplicates for pip_cache
 defined_pip_caches = set()
 def add_package_pair(pkg_def, pip_def):
-    global package
-    package.append(pkg_def)
+    packages.append(pkg_def)
     if pip_def['name'] not in defined_pip_caches:
-        package.append(pip_def)
+        packages.append(pip_def)
         defined_pip_caches.add(pip_def['name'])
 
 if IS_TEGRA:
@@ -239,7 +238,7 @@ if IS_TEGRA:
         samples_branch = rest[0] if rest else None
         pkg_def, pip_def = cuda_package(version, url, deb=deb, requires=req)
         add_package_pair(pkg_def, pip_def)
-        package.append(cuda_samples(version, requires=req, branch=samples_branch))
+        packages.append(cuda_samples(version, requires=req, branch=samples_branch))
 
     # JetPack 5
     for config in cuda_configs_tegra_jp5:
@@ -247,12 +246,12 @@ if IS_TEGRA:
         samples_branch = rest[0] if rest else None
         pkg_def, pip_def = cuda_package(version, url, deb=deb, requires=req)
         add_package_pair(pkg_def, pip_def)
-        package.append(cuda_samples(version, requires=req, branch=samples_branch))
+        packages.append(cuda_samples(version, requires=req, branch=samples_branch))
 
     # JetPack 4-5 (CUDA installed in base container) - Use cuda_builtin
     pkg_def, pip_def = cuda_builtin(CUDA_VERSION, requires='<36')
     add_package_pair(pkg_def, pip_def)
-    package.append(cuda_samples(CUDA_VERSION, requires='<36'))
+    packages.append(cuda_samples(CUDA_VERSION, requires='<36'))
 
 elif IS_SBSA:
     # SBSA
@@ -261,7 +260,7 @@ elif IS_SBSA:
         samples_branch = rest[0] if rest else None
         pkg_def, pip_def = cuda_package(version, url, deb=deb, requires=req)
         add_package_pair(pkg_def, pip_def)
-        package.append(cuda_samples(version, requires=req, branch=samples_branch))
+        packages.append(cuda_samples(version, requires=req, branch=samples_branch))
 
 else:
     # x86_64
@@ -270,4 +269,7 @@ else:
         samples_branch = rest[0] if rest else None
         pkg_def, pip_def = cuda_package(version, url, deb=deb, requires=req)
         add_package_pair(pkg_def, pip_def)
-        package.append(cuda_samples(version, requires=req, branch=samples_branch))
+        packages.append(cuda_samples(version, requires=req, branch=samples_branch))
+
+# Assigned last: the helpers above copy the injected `package` dict
+package = packages
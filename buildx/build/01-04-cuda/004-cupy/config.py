@@ -12,12 +12,12 @@
 # Author: Mr K / GitHub Copilot
 # COMMIT-TRACKING: UUID-20250425-080000-42595D
 
-from jetson_containers import L4T_VERSION, CUDA_ARCHITECTURES, package
+from jetson_containers import L4T_VERSION, CUDA_ARCHITECTURES, github_branch_commit, package
 
 # latest cupy versions to support Python 3.8 (for JetPack 5)
 # and Python 3.6 (for JetPack 4), respectively
 if L4T_VERSION.major >= 36:
-    CUPY_VERSION = 'main'
+    CUPY_VERSION = github_branch_commit('cupy/cupy', 'main')
 elif L4T_VERSION.major >= 34:
     CUPY_VERSION = 'v12.1.0'
 else:
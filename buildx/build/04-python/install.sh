@@ -45,9 +45,6 @@ else
    curl -sS https://bootstrap.pypa.io/get-pip.py | python${PYTHON_VERSION}
 fi
 
-rm -rf /var/lib/apt/lists/*
-apt-get clean
-
 ln -f -s /usr/bin/python${PYTHON_VERSION} /usr/local/bin/python3
 #ln -s /usr/bin/pip${PYTHON_VERSION} /usr/local/bin/pip3
 
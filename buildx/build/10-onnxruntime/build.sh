@@ -9,6 +9,14 @@ if [ ! -d "/usr/lib/$(uname -m)-linux-gnu" ]; then
     exit 1
 fi
 
+# Compiler cache (USE_CCACHE=on): ccache over the BuildKit cache mount at /root/.ccache
+. /opt/jetc-scripts/ccache-env.sh
+
+# Job count of --parallel below, sized by scripts/build_governor.py when it passes the jetc-jobs secret
+export MAX_JOBS=$(cat /run/secrets/jetc-jobs 2>/dev/null || nproc)
+export CMAKE_BUILD_PARALLEL_LEVEL=${MAX_JOBS}
+echo "jetc-jobs: ${MAX_JOBS}"
+
 # Ensure TensorRT libraries are in LD_LIBRARY_PATH
 export LD_LIBRARY_PATH=/usr/lib/$(uname -m)-linux-gnu:$LD_LIBRARY_PATH
 
@@ -26,9 +34,11 @@ fi
 # Clean any previous installation
 pip3 uninstall -y onnxruntime || echo "onnxruntime was not previously installed"
 
-# Clone repository
-git clone --depth=1 --branch ${ONNXRUNTIME_BRANCH} https://github.com/microsoft/onnxruntime /opt/onnxruntime
+# Fetch the source by ref: ONNXRUNTIME_BRANCH may be a branch, a tag or a commit pinned by the build lock
+git init -q /opt/onnxruntime
 cd /opt/onnxruntime
+git fetch --depth=1 https://github.com/microsoft/onnxruntime ${ONNXRUNTIME_BRANCH}
+git checkout -q FETCH_HEAD
 git submodule update --init --recursive
 
 # Fix eigen download URL if needed
@@ -39,10 +49,10 @@ install_dir="/opt/onnxruntime/install"
 pip3 install "cmake<4"
 
 # Build onnxruntime
-./build.sh --config Release --update --parallel --build --build_wheel --build_shared_lib \
+./build.sh --config Release --update --parallel ${MAX_JOBS} --build --build_wheel --build_shared_lib \
         --skip_tests --skip_submodule_sync ${ONNXRUNTIME_FLAGS} \
         --cmake_extra_defines CMAKE_CXX_FLAGS="-Wno-unused-variable -I/usr/local/cuda/include" \
-        --cmake_extra_defines CMAKE_CUDA_ARCHITECTURES="${CUDA_ARCHITECTURES}" \
+        --cmake_extra_defines CMAKE_CUDA_ARCHITECTURES="${CUDA_ARCH_LIST:-${CUDA_ARCHITECTURES}}" \
         --cmake_extra_defines CMAKE_INSTALL_PREFIX=${install_dir} \
         --cmake_extra_defines onnxruntime_BUILD_UNIT_TESTS=OFF \
         --cuda_home /usr/local/cuda --cudnn_home /usr/lib/$(uname -m)-linux-gnu \
@@ -52,6 +62,9 @@ pip3 install "cmake<4"
 cd build/Linux/Release
 make install
 
+# Compiler cache hit rate of this build (collected by build_folder_image)
+sh /opt/jetc-scripts/ccache-report.sh
+
 # Copy wheel to /opt for later use
 cp dist/onnxruntime*.whl /opt
 
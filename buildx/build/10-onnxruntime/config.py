@@ -1,4 +1,4 @@
-from jetson_containers import CUDA_VERSION
+from jetson_containers import CUDA_VERSION, github_branch_commit
 from packaging.version import Version
 
 
@@ -37,8 +37,8 @@ def onnxruntime(version, branch=None, requires=None, default=False):
 
 
 package = [
-    onnxruntime('1.23', requires=['>=36', '>=cu130'], branch='main', default=(CUDA_VERSION >= Version('13.0'))),
-    onnxruntime('1.22', requires=['>=36', '>=cu126'], branch='main', default=(CUDA_VERSION <= Version('12.8'))),
+    onnxruntime('1.23', requires=['>=36', '>=cu130'], branch=github_branch_commit('microsoft/onnxruntime', 'main'), default=(CUDA_VERSION >= Version('13.0'))),
+    onnxruntime('1.22', requires=['>=36', '>=cu126'], branch=github_branch_commit('microsoft/onnxruntime', 'main'), default=(CUDA_VERSION <= Version('12.8'))),
     onnxruntime('1.21', requires=['>=36', '>=cu124'], default=False),
     onnxruntime('1.20.1', requires=['>=36', '>=cu124'], default=False),
     onnxruntime('1.20', requires=['>=36', '>=cu124'], default=False),
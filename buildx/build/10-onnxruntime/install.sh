@@ -6,7 +6,8 @@ if [ "$FORCE_BUILD" == "on" ]; then
 	exit 1
 fi
 
-tarpack install onnxruntime-gpu-${ONNXRUNTIME_VERSION}
+# The wheelhouse only holds the wheel, so the C/C++ tarball is optional with it
+tarpack install onnxruntime-gpu-${ONNXRUNTIME_VERSION} || [ -n "${WHEELHOUSE_URL}" ]
 pip3 install onnxruntime-gpu==${ONNXRUNTIME_VERSION}
 
 python3 -c 'import onnxruntime; print(onnxruntime.__version__);'
\ No newline at end of file
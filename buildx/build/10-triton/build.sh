@@ -17,6 +17,14 @@ echo "============ Building triton ${TRITON_VERSION} (branch=${TRITON_BRANCH}) =
 
 pip3 uninstall -y triton
 
+# Compiler cache (USE_CCACHE=on): ccache over the BuildKit cache mount at /root/.ccache
+. /opt/jetc-scripts/ccache-env.sh
+
+# setup.py compiles with MAX_JOBS jobs
+export MAX_JOBS=$(cat /run/secrets/jetc-jobs 2>/dev/null || nproc)
+export CMAKE_BUILD_PARALLEL_LEVEL=${MAX_JOBS}
+echo "jetc-jobs: ${MAX_JOBS}"
+
 # Fix git clone command to properly handle branch parameter
 git clone --recursive https://github.com/triton-lang/triton /opt/triton
 cd /opt/triton
@@ -36,6 +44,9 @@ ln -sf /usr/local/cuda/bin/ptxas $(pwd)/third_party/cuda/ptxas
 
 pip3 wheel --wheel-dir=/opt --no-deps ./python
 
+# Compiler cache hit rate of this build (collected by build_folder_image)
+sh /opt/jetc-scripts/ccache-report.sh
+
 cd /
 rm -rf /opt/triton 
 
@@ -1,3 +1,6 @@
+from jetson_containers import github_branch_commit
+
+
 def triton(version, branch=None, requires=None, default=False):
     pkg = package.copy()
 
@@ -25,9 +28,9 @@ def triton(version, branch=None, requires=None, default=False):
     return pkg, builder
 
 package = [
-    triton('3.3.0', branch='release/3.3.x', default=True),
-    triton('3.2.0', branch='release/3.2.x'),
-    triton('3.1.0', branch='release/3.1.x'),
-    triton('3.0.0', branch='release/3.0.x'),
+    triton('3.3.0', branch=github_branch_commit('triton-lang/triton', 'release/3.3.x'), default=True),
+    triton('3.2.0', branch=github_branch_commit('triton-lang/triton', 'release/3.2.x')),
+    triton('3.1.0', branch=github_branch_commit('triton-lang/triton', 'release/3.1.x')),
+    triton('3.0.0', branch=github_branch_commit('triton-lang/triton', 'release/3.0.x')),
 ]
 
@@ -22,4 +22,10 @@ fi
 
 # Install from source
 cd /opt/diffusers
-pip3 install -e .
\ No newline at end of file
+pip3 install -e .
+
+# Publish a wheel of this build (local wheelhouse or TWINE_REPOSITORY_URL)
+if [ -n "${TWINE_REPOSITORY_URL}" ]; then
+    pip3 wheel --no-deps --wheel-dir /opt/diffusers/wheels . && \
+    twine upload --verbose /opt/diffusers/wheels/diffusers*.whl || echo "failed to upload wheel to ${TWINE_REPOSITORY_URL}"
+fi
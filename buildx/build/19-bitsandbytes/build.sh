@@ -13,9 +13,13 @@ echo "### CUDA_INSTALLED_VERSION: $CUDA_INSTALLED_VERSION"
 echo "### CUDA_MAKE_LIB: $CUDA_MAKE_LIB" 
 pip3 uninstall -y bitsandbytes || echo "previous bitsandbytes installation not found"
 
-git clone --branch=$BITSANDBYTES_BRANCH --recursive --depth=1 "https://github.com/$BITSANDBYTES_REPO" /opt/bitsandbytes || \
-git clone --recursive --depth=1 "https://github.com/$BITSANDBYTES_REPO" /opt/bitsandbytes
+# Fetch by ref: BITSANDBYTES_BRANCH may be a branch, a tag or a commit pinned by the build lock
+git init -q /opt/bitsandbytes
 cd /opt/bitsandbytes
+git fetch --depth=1 "https://github.com/$BITSANDBYTES_REPO" "$BITSANDBYTES_BRANCH" || \
+git fetch --depth=1 "https://github.com/$BITSANDBYTES_REPO"
+git checkout -q FETCH_HEAD
+git submodule update --init --recursive --depth=1
 
 if [ $CUDA_INSTALLED_VERSION < 126 ]; then
     CUDA_VERSION=$CUDA_INSTALLED_VERSION make -C /opt/bitsandbytes -j$(nproc) "${CUDA_MAKE_LIB}"
@@ -1,4 +1,4 @@
-from jetson_containers import CUDA_VERSION
+from jetson_containers import CUDA_VERSION, github_branch_commit
 from packaging.version import Version
 
 def bitsandbytes(version, requires=None, default=False, branch=None, repo='bitsandbytes-foundation/bitsandbytes'):
@@ -32,7 +32,7 @@ def bitsandbytes(version, requires=None, default=False, branch=None, repo='bitsa
     return pkg, builder
 
 package = [
-    bitsandbytes('0.39.1', default=(CUDA_VERSION < Version('12.2')), repo="dusty-nv/bitsandbytes", branch="main"),
+    bitsandbytes('0.39.1', default=(CUDA_VERSION < Version('12.2')), repo="dusty-nv/bitsandbytes", branch=github_branch_commit("dusty-nv/bitsandbytes", "main")),
     bitsandbytes('0.45.4', default=(CUDA_VERSION < Version('12.6'))),
     bitsandbytes('0.45.5', default=(CUDA_VERSION >= Version('12.6'))),
 ]
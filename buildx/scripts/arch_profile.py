@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# filepath: /workspaces/jetc/buildx/scripts/arch_profile.py
+"""
+CUDA architecture profile of the build.
+
+CUDA_ARCH_PROFILE (buildx/.env or build.sh --arch-profile) names the devices the
+images are deployed to ('orin', 'xavier,orin') or their SMs ('87'); the
+jetson_containers stand-in narrows CUDA_ARCHITECTURES to those SMs, so config.py
+build args follow it. This script gives the shell side the same list:
+
+    'archs'       the effective list ('87'), recorded in the image labels
+    'args STAGE'  the architecture build args (CUDA_ARCH_BIN, CUDA_ARCH_LIST,
+                  CUPY_NVCC_GENERATE_CODE, ...) the stage Dockerfile declares,
+                  one KEY=VALUE per line, so a stage compiles only for those SMs
+
+Usage:
+    arch_profile.py archs
+    arch_profile.py args [--build-dir DIR] STAGE
+"""
+import argparse
+import os
+import sys
+
+from build_lock import declared_args, dockerfile_instructions
+from package_index import DEFAULT_BUILD_DIR, SCRIPT_DIR
+
+if SCRIPT_DIR not in sys.path:
+    sys.path.insert(0, SCRIPT_DIR)
+
+from jetson_containers import CUDA_ARCHITECTURES, cuda_arch_build_args  # noqa: E402
+
+
+def stage_arch_args(build_dir, stage):
+    """Architecture build args declared by the Dockerfile of a stage folder."""
+    declared = declared_args(dockerfile_instructions(os.path.join(build_dir, stage, 'Dockerfile')))
+    return {key: value for key, value in cuda_arch_build_args().items() if key in declared}
+
+
+def cmd_archs(args):
+    print(';'.join(str(x) for x in CUDA_ARCHITECTURES))
+    return 0
+
+
+def cmd_args(args):
+    for key, value in sorted(stage_arch_args(args.build_dir, args.stage).items()):
+        print(f"{key}={value}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CUDA architectures of the build, narrowed by CUDA_ARCH_PROFILE")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    cmd = sub.add_parser('archs', help="effective CUDA architecture list ('72;87')")
+    cmd.set_defaults(func=cmd_archs)
+    cmd = sub.add_parser('args', help="architecture build args declared by a stage, one KEY=VALUE per line")
+    cmd.add_argument('stage')
+    cmd.add_argument('--build-dir', default=DEFAULT_BUILD_DIR)
+    cmd.set_defaults(func=cmd_args)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+# --- Footer ---
+# File location diagram:
+# jetc/                          <- Main project folder
+# ├── buildx/                    <- Parent directory
+# │   └── scripts/               <- Current directory
+# │       └── arch_profile.py    <- THIS FILE
+# └── ...                        <- Other project files
+#
+# Description: Effective CUDA architectures of the build (narrowed by CUDA_ARCH_PROFILE) and the matching architecture build args of a stage.
+# Author: Mr K / GitHub Copilot
+# COMMIT-TRACKING: UUID-20261017-013500-SMPR
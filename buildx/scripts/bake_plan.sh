@@ -0,0 +1,279 @@
+#!/bin/bash
+# filepath: /workspaces/jetc/buildx/scripts/bake_plan.sh
+
+# =========================================================================
+# Bake Plan Script
+# Responsibility: Turn the selected ORDERED_FOLDERS into a single
+#                 'docker buildx bake' file (JSON) where every stage is a
+#                 target linked to its parent through a named build context,
+#                 so BuildKit builds the whole chain in one session without
+#                 exporting the intermediate images.
+# Relies on logging functions sourced by the main script, on stage_graph.sh
+# (STAGE_PARENT) and on get_stage_cache_args from docker_helpers.sh.
+# =========================================================================
+
+# --- Dependencies ---
+SCRIPT_DIR_BAKE="$(cd "$(dirname "${BASH_SOURCE[0]:-$0}")" && pwd)"
+
+# DO NOT source logging.sh or env_setup.sh here.
+# Assume they are sourced by the main build.sh script; fall back to basic echo otherwise.
+if ! declare -f log_info > /dev/null; then
+    log_info() { echo "INFO: $1"; }
+    log_warning() { echo "WARNING: $1" >&2; }
+    log_error() { echo "ERROR: $1" >&2; }
+    log_success() { echo "SUCCESS: $1"; }
+fi
+declare -f log_debug > /dev/null || log_debug() { :; }
+
+# --- Global Variables ---
+# BAKE_STAGE_TAG[folder] = image tag of each stage in the generated plan
+# BAKE_EXPORTED_FOLDERS  = stages whose image is exported (loaded/pushed) by the plan
+declare -gA BAKE_STAGE_TAG=()
+BAKE_EXPORTED_FOLDERS=()
+
+# =========================================================================
+# Function: Quote a value as a JSON string
+# Arguments: $1 = value
+# Returns: JSON string (with quotes) to stdout
+# =========================================================================
+_bake_json_string() {
+    local value="$1"
+    value="${value//\\/\\\\}"
+    value="${value//\"/\\\"}"
+    printf '"%s"' "$value"
+}
+
+# =========================================================================
+# Function: Quote a list of values as a JSON array
+# Arguments: $@ = values
+# Returns: JSON array to stdout
+# =========================================================================
+_bake_json_array() {
+    local out="[" sep="" value
+    for value in "$@"; do
+        out+="$sep$(_bake_json_string "$value")"
+        sep=", "
+    done
+    printf '%s]' "$out"
+}
+
+# =========================================================================
+# Function: Get the bake target name of a stage folder
+# Arguments: $1 = folder name (e.g. '01-04-cuda')
+# Returns: Target name to stdout (bake only allows [a-zA-Z0-9_-])
+# =========================================================================
+get_bake_target_name() {
+    echo "stage-$1" | tr -c 'a-zA-Z0-9_\n-' '_'
+}
+
+# =========================================================================
+# Function: Generate the bake file for the selected stages
+# Each stage's BASE_IMAGE build arg is set to a placeholder reference that a
+# named context ('target:<parent>') resolves to the parent target, so
+# FROM ${BASE_IMAGE} consumes the parent's result straight from BuildKit.
+# Only leaf stages are exported (pushed with skip_intermediate_push_pull=n,
+# loaded otherwise), unless BAKE_EXPORT_ALL=y. With USE_BUILD_LOCK=y every
+# target gets its locked build args and the root builds on the pinned base.
+# With CUDA_ARCH_PROFILE set the targets get the narrowed architecture args and
+# labels.
+# Arguments: $1 = output path of the bake file
+# Relies on: ORDERED_FOLDERS, SELECTED_BASE_IMAGE (or STAGE_CHAIN_BASE_IMAGE), DOCKER_USERNAME,
+#            DOCKER_REPO_PREFIX, DOCKER_REGISTRY, use_cache,
+#            skip_intermediate_push_pull, PLATFORM, BAKE_EXPORT_ALL,
+#            BAKE_USE_GRAPH (uses STAGE_PARENT from stage_graph.sh when 'y'),
+#            USE_BUILD_LOCK / BUILD_LOCKFILE (get_stage_build_args from docker_helpers.sh),
+#            CUDA_ARCH_PROFILE (get_stage_arch_args from docker_helpers.sh),
+#            USE_WHEELHOUSE / WHEELHOUSE_URL / WHEELHOUSE_TOKEN (start_wheelhouse from
+#            wheelhouse.sh; the token is passed as the jetc-wheelhouse secret),
+#            get_stage_scripts_context (jetc-scripts context of the RUN-step helpers),
+#            USE_COMPILER_CACHE / COMPILER_CACHE_SIZE,
+#            IMAGE_COMPRESSION (get_image_compression_attrs from docker_helpers.sh),
+#            BUILD_JOB_GOVERNOR (decide_stage_build_jobs from docker_helpers.sh; the
+#            compiling targets share the memory and get their job count as the
+#            jetc-jobs secret, written next to the bake file)
+# Exports: BAKE_STAGE_TAG, BAKE_EXPORTED_FOLDERS
+# Returns: 0 on success, 1 on failure
+# =========================================================================
+generate_bake_plan() {
+    local bake_file="$1"
+    BAKE_STAGE_TAG=()
+    BAKE_EXPORTED_FOLDERS=()
+
+    if [ ${#ORDERED_FOLDERS[@]} -eq 0 ]; then
+        log_warning "No stages selected. Bake plan not generated."
+        return 1
+    fi
+
+    local folder_path registry_prefix=""
+    [[ -n "${DOCKER_REGISTRY:-}" ]] && registry_prefix="${DOCKER_REGISTRY}/"
+    local repo="${registry_prefix}${DOCKER_USERNAME}/${DOCKER_REPO_PREFIX}"
+    local platform="${PLATFORM:-linux/arm64}"
+    local output="type=docker"
+    if [[ "${skip_intermediate_push_pull:-y}" == "n" ]]; then
+        output="type=registry"
+        declare -f get_image_compression_attrs > /dev/null && output+=$(get_image_compression_attrs)
+    fi
+    local cuda_archs=""
+    declare -f get_cuda_arch_profile_list > /dev/null && cuda_archs=$(get_cuda_arch_profile_list)
+
+    # Compiling targets may all build at once: they split the free memory
+    local governed=0
+    if [[ "${BUILD_JOB_GOVERNOR:-y}" == "y" ]] && declare -f decide_stage_build_jobs > /dev/null; then
+        for folder_path in "${ORDERED_FOLDERS[@]}"; do
+            grep -q 'id=jetc-jobs' "$folder_path/Dockerfile" 2>/dev/null && governed=$((governed + 1))
+        done
+    fi
+
+    # Parents: the dependency graph when requested, otherwise the serial chain
+    local -A parent_of=()
+    local folder previous=""
+    for folder_path in "${ORDERED_FOLDERS[@]}"; do
+        folder=$(basename "$folder_path")
+        if [[ "${BAKE_USE_GRAPH:-n}" == "y" ]]; then
+            parent_of["$folder"]="${STAGE_PARENT[$folder]:-}"
+        else
+            parent_of["$folder"]="$previous"
+        fi
+        previous="$folder"
+        BAKE_STAGE_TAG["$folder"]=$(echo "${repo}:${folder}" | tr '[:upper:]' '[:lower:]')
+    done
+
+    # Leaves are the stages no other selected stage builds on
+    local -A has_child=()
+    for folder in "${parent_of[@]}"; do
+        [[ -n "$folder" ]] && has_child["$folder"]=1
+    done
+
+    local targets="" group_targets=() sep=""
+    for folder_path in "${ORDERED_FOLDERS[@]}"; do
+        folder=$(basename "$folder_path")
+        local target parent
+        target=$(get_bake_target_name "$folder")
+        parent="${parent_of[$folder]}"
+
+        local base_ref="${STAGE_CHAIN_BASE_IMAGE:-$SELECTED_BASE_IMAGE}"
+        declare -f get_locked_base_image > /dev/null && base_ref=$(get_locked_base_image "$base_ref")
+        local contexts="" context_json="" scripts_context=""
+        if [[ -n "$parent" ]]; then
+            base_ref="jetc-bake/$(get_bake_target_name "$parent" | tr '[:upper:]' '[:lower:]')"
+            context_json="$(_bake_json_string "$base_ref"): $(_bake_json_string "target:$(get_bake_target_name "$parent")")"
+        fi
+        # Shared RUN-step helpers (scripts/stage) the stage bind-mounts
+        declare -f get_stage_scripts_context > /dev/null && scripts_context=$(get_stage_scripts_context "$folder_path")
+        [[ -n "$scripts_context" ]] && context_json+="${context_json:+, }\"jetc-scripts\": $(_bake_json_string "$scripts_context")"
+        [[ -n "$context_json" ]] && contexts=$(printf ',\n      "contexts": { %s }' "$context_json")
+
+        local outputs=""
+        if [[ -z "${has_child[$folder]:-}" || "${BAKE_EXPORT_ALL:-n}" == "y" ]]; then
+            outputs=$(printf ',\n      "output": %s' "$(_bake_json_array "$output")")
+            group_targets+=("$target")
+            BAKE_EXPORTED_FOLDERS+=("$folder")
+        fi
+
+        local cache_from=() cache_to=() cache_args=() i
+        if declare -f get_stage_cache_args > /dev/null; then
+            mapfile -t cache_args < <(get_stage_cache_args "$folder" "${use_cache:-y}" "${repo}-cache")
+            for ((i = 0; i + 1 < ${#cache_args[@]}; i += 2)); do
+                case "${cache_args[$i]}" in
+                    --cache-from) cache_from+=("${cache_args[$((i + 1))]}") ;;
+                    --cache-to) cache_to+=("${cache_args[$((i + 1))]}") ;;
+                esac
+            done
+        fi
+        local cache=""
+        [[ ${#cache_from[@]} -gt 0 ]] && cache+=$(printf ',\n      "cache-from": %s' "$(_bake_json_array "${cache_from[@]}")")
+        [[ ${#cache_to[@]} -gt 0 ]] && cache+=$(printf ',\n      "cache-to": %s' "$(_bake_json_array "${cache_to[@]}")")
+
+        # CUDA architecture args of the profile, then the config.py/locked args (which win)
+        local build_arg_json="" extra_args=() extra_arg lock_args=()
+        declare -f get_stage_arch_args > /dev/null && mapfile -t extra_args < <(get_stage_arch_args "$folder")
+        declare -f get_stage_build_args > /dev/null && mapfile -t lock_args < <(get_stage_build_args "$folder")
+        local -A stage_args=()
+        local arg_names=()
+        for extra_arg in "${extra_args[@]}" "${lock_args[@]}"; do
+            [[ -n "${stage_args[${extra_arg%%=*}]+x}" ]] || arg_names+=("${extra_arg%%=*}")
+            stage_args["${extra_arg%%=*}"]="${extra_arg#*=}"
+        done
+        for extra_arg in "${arg_names[@]}"; do
+            build_arg_json+=", $(_bake_json_string "$extra_arg"): $(_bake_json_string "${stage_args[$extra_arg]}")"
+        done
+        if [[ "${USE_WHEELHOUSE:-n}" == "y" && -n "${WHEELHOUSE_URL:-}" ]]; then
+            build_arg_json+=", \"WHEELHOUSE_URL\": $(_bake_json_string "$WHEELHOUSE_URL")"
+        fi
+        if [[ "${USE_COMPILER_CACHE:-n}" == "y" ]]; then
+            build_arg_json+=", \"USE_CCACHE\": \"on\", \"CCACHE_MAXSIZE\": $(_bake_json_string "${COMPILER_CACHE_SIZE:-5G}")"
+        fi
+
+        local secrets="" secret_specs=()
+        if [[ $governed -gt 0 ]] && decide_stage_build_jobs "$folder_path" "$governed"; then
+            local jobs_file="${bake_file%.*}.jobs-$target"
+            echo "$STAGE_BUILD_JOBS" > "$jobs_file" || { log_error "Failed to write $jobs_file"; return 1; }
+            secret_specs+=("id=jetc-jobs,src=$jobs_file")
+        fi
+        [[ "${USE_WHEELHOUSE:-n}" == "y" && -n "${WHEELHOUSE_URL:-}" && -n "${WHEELHOUSE_TOKEN:-}" ]] \
+            && secret_specs+=("id=jetc-wheelhouse,env=WHEELHOUSE_TOKEN")
+        [[ ${#secret_specs[@]} -gt 0 ]] && secrets=$(printf ',\n      "secret": %s' "$(_bake_json_array "${secret_specs[@]}")")
+
+        local labels=""
+        if [[ -n "$cuda_archs" ]]; then
+            labels=$(printf ',\n      "labels": { "jetc.cuda.arch_profile": %s, "jetc.cuda.architectures": %s }' \
+                "$(_bake_json_string "$CUDA_ARCH_PROFILE")" "$(_bake_json_string "$cuda_archs")")
+        fi
+
+        local no_cache="false"
+        [[ "${use_cache:-y}" == "n" ]] && no_cache="true"
+
+        targets+="$sep$(printf '    %s: {\n      "context": %s,\n      "dockerfile": "Dockerfile",\n      "platforms": %s,\n      "tags": %s,\n      "args": { "BASE_IMAGE": %s%s },\n      "no-cache": %s%s%s%s%s%s\n    }' \
+            "$(_bake_json_string "$target")" \
+            "$(_bake_json_string "$folder_path")" \
+            "$(_bake_json_array "$platform")" \
+            "$(_bake_json_array "${BAKE_STAGE_TAG[$folder]}")" \
+            "$(_bake_json_string "$base_ref")" "$build_arg_json" \
+            "$no_cache" "$labels" "$contexts" "$cache" "$secrets" "$outputs")"
+        sep=$',\n'
+    done
+
+    {
+        printf '{\n  "group": {\n    "default": { "targets": %s }\n  },\n' "$(_bake_json_array "${group_targets[@]}")"
+        printf '  "target": {\n%s\n  }\n}\n' "$targets"
+    } > "$bake_file" || { log_error "Failed to write bake file: $bake_file"; return 1; }
+
+    log_info "Bake plan written to $bake_file (${#ORDERED_FOLDERS[@]} targets, exporting: ${BAKE_EXPORTED_FOLDERS[*]})"
+    return 0
+}
+
+# --- Main Execution (for testing) ---
+if [[ "${BASH_SOURCE[0]}" == "${0}" ]]; then
+    set -euo pipefail
+    log_info "Running bake_plan.sh directly for testing..."
+
+    build_dir="$SCRIPT_DIR_BAKE/../build"
+    ORDERED_FOLDERS=("$build_dir/01-00-build-essential" "$build_dir/01-04-cuda" "$build_dir/09-opencv")
+    SELECTED_BASE_IMAGE="kairin/001:jetc-nvidia-pytorch-25.03-py3-igpu"
+    DOCKER_USERNAME="mockuser"
+    DOCKER_REPO_PREFIX="mockrepo"
+    use_cache="y"
+    skip_intermediate_push_pull="y"
+
+    bake_file="$(mktemp --suffix=.json)"
+    generate_bake_plan "$bake_file"
+    cat "$bake_file"
+    if command -v python3 > /dev/null; then
+        python3 -m json.tool "$bake_file" > /dev/null && log_success "Bake file is valid JSON."
+    fi
+    rm -f "$bake_file"
+    log_info "Bake plan script test finished."
+    exit 0
+fi
+
+# --- Footer ---
+# File location diagram:
+# jetc/                          <- Main project folder
+# ├── buildx/                    <- Parent directory
+# │   └── scripts/               <- Current directory
+# │       └── bake_plan.sh       <- THIS FILE
+# └── ...                        <- Other project files
+#
+# Description: Generates a single buildx bake file linking the selected stages as targets (with locked build args when USE_BUILD_LOCK=y, narrowed CUDA arch args with CUDA_ARCH_PROFILE, WHEELHOUSE_URL with USE_WHEELHOUSE=y, ccache args with USE_COMPILER_CACHE=y, zstd/eStargz registry outputs with IMAGE_COMPRESSION and memory-sized job secrets for compiling stages).
+# Author: Mr K / GitHub Copilot
+# COMMIT-TRACKING: UUID-20261017-043000-FX17
@@ -0,0 +1,280 @@
+#!/bin/bash
+# filepath: /workspaces/jetc/buildx/scripts/base_mirror.sh
+
+# =========================================================================
+# Base Image Mirror Script
+# Responsibility: Run (or join) a local pull-through mirror of Docker Hub
+#                 (a registry:2 container with REGISTRY_PROXY_REMOTEURL,
+#                 USE_BASE_MIRROR=y) that the buildx builder pulls base images
+#                 from, and prefetch the upstream base images of the selected
+#                 stages into it in the background while the stages build.
+# Relies on logging functions sourced by the main script.
+# =========================================================================
+
+# --- Dependencies ---
+SCRIPT_DIR_BASE_MIRROR="$(cd "$(dirname "${BASH_SOURCE[0]:-$0}")" && pwd)"
+
+# DO NOT source logging.sh or env_setup.sh here.
+# Assume they are sourced by the main build.sh script; fall back to basic echo otherwise.
+if ! declare -f log_info > /dev/null; then
+    log_info() { echo "INFO: $1"; }
+    log_warning() { echo "WARNING: $1" >&2; }
+    log_error() { echo "ERROR: $1" >&2; }
+    log_success() { echo "SUCCESS: $1"; }
+fi
+declare -f log_debug > /dev/null || log_debug() { :; }
+
+# PID of the background prefetch started by prefetch_stage_bases
+BASE_PREFETCH_PID=""
+
+# =========================================================================
+# Function: Get the address the builder container reaches this host on
+# BuildKit containers cannot reach the host's loopback; they reach it on the
+# docker bridge gateway, which is not exposed to the LAN. The mirror is
+# published on that address only: it pulls with the Docker Hub credentials.
+# Arguments: None
+# Relies on: BASE_MIRROR_BIND (publish on this address instead)
+# Returns: The address to stdout
+# =========================================================================
+get_base_mirror_address() {
+    local address="${BASE_MIRROR_BIND:-}"
+    if [[ -z "$address" ]] && command -v docker > /dev/null 2>&1; then
+        address=$(docker network inspect bridge --format '{{range .IPAM.Config}}{{.Gateway}}{{end}}' 2>/dev/null | awk '{print $1}')
+    fi
+    echo "${address:-127.0.0.1}"
+}
+
+# =========================================================================
+# Function: Check whether a registry answers on host:port (plain http)
+# Arguments: $1 = mirror host:port
+# Returns: 0 if its /v2/ endpoint answers, 1 otherwise
+# =========================================================================
+base_mirror_is_up() {
+    if command -v curl > /dev/null 2>&1; then
+        curl -sS -o /dev/null --max-time 3 -w '%{http_code}' "http://$1/v2/" 2>/dev/null | grep -qE '^(200|401)$'
+    else
+        python3 -c "import sys, urllib.request; urllib.request.urlopen('http://' + sys.argv[1] + '/v2/', timeout=3)" "$1" 2>/dev/null
+    fi
+}
+
+# =========================================================================
+# Function: Start (or join) the base image mirror for this build
+# With BASE_MIRROR_HOST set the mirror on that host:port is used; otherwise the
+# BASE_MIRROR_NAME container is started on BASE_MIRROR_PORT, storing the
+# blobs in BASE_MIRROR_DIR (or reused when it is still running from an
+# earlier build). It keeps running after the build.
+# Arguments: None
+# Relies on: USE_BASE_MIRROR, BASE_MIRROR_HOST, BASE_MIRROR_NAME, BASE_MIRROR_PORT,
+#            BASE_MIRROR_DIR, BASE_MIRROR_UPSTREAM, BASE_MIRROR_USERNAME / BASE_MIRROR_TOKEN
+# Exports: BASE_MIRROR_HOST (empty when the mirror is off or unavailable),
+#          INSECURE_REGISTRIES (the mirror is added: it is plain http)
+# Returns: 0 (the build goes on pulling from Docker Hub when it cannot start)
+# =========================================================================
+start_base_mirror() {
+    if [[ "${USE_BASE_MIRROR:-n}" != "y" ]]; then
+        export BASE_MIRROR_HOST=""
+        return 0
+    fi
+    local host="${BASE_MIRROR_HOST:-}"
+    if [[ -n "$host" ]]; then
+        host="${host#http://}"
+        host="${host%/}"
+        base_mirror_is_up "$host" || log_warning "Base image mirror $host is not reachable; the builder will fall back to Docker Hub."
+    else
+        local address
+        address=$(get_base_mirror_address)
+        host="${address}:${BASE_MIRROR_PORT:-5001}"
+        local name="${BASE_MIRROR_NAME:-jetc-base-mirror}"
+        # A container of an earlier version may publish the mirror on every interface
+        if docker container inspect "$name" > /dev/null 2>&1 \
+            && ! docker port "$name" 5000/tcp 2>/dev/null | grep -qxF "$host"; then
+            log_warning "Base image mirror $name is not published on $host only; recreating it."
+            docker rm -f "$name" > /dev/null || true
+        fi
+        if ! base_mirror_is_up "$host"; then
+            local mirror_dir="${BASE_MIRROR_DIR:-$SCRIPT_DIR_BASE_MIRROR/../.buildcache/base-mirror}"
+            mkdir -p "$mirror_dir/data"
+            if docker container inspect "$name" > /dev/null 2>&1; then
+                docker start "$name" > /dev/null || true
+            else
+                local proxy_args=("-e" "REGISTRY_PROXY_REMOTEURL=${BASE_MIRROR_UPSTREAM:-https://registry-1.docker.io}")
+                # Docker Hub credentials lift the anonymous pull rate limit (and give access to private bases)
+                if [[ -n "${BASE_MIRROR_USERNAME:-}" && -n "${BASE_MIRROR_TOKEN:-}" ]]; then
+                    proxy_args+=("-e" "REGISTRY_PROXY_USERNAME=$BASE_MIRROR_USERNAME" "-e" "REGISTRY_PROXY_PASSWORD=$BASE_MIRROR_TOKEN")
+                fi
+                docker run -d --name "$name" --restart unless-stopped -p "${host}:5000" \
+                    -v "$(cd "$mirror_dir" && pwd)/data:/var/lib/registry" "${proxy_args[@]}" registry:2 > /dev/null || true
+            fi
+            local i
+            for ((i = 0; i < 20; i++)); do
+                base_mirror_is_up "$host" && break
+                sleep 0.5
+            done
+            if ! base_mirror_is_up "$host"; then
+                log_warning "Base image mirror did not start (see 'docker logs $name'); pulling from Docker Hub."
+                export BASE_MIRROR_HOST=""
+                return 0
+            fi
+            log_success "Started base image mirror $name on $host (blobs in $mirror_dir/data)"
+        fi
+    fi
+    export BASE_MIRROR_HOST="$host"
+    [[ " ${INSECURE_REGISTRIES:-} " == *" $host "* ]] || export INSECURE_REGISTRIES="${INSECURE_REGISTRIES:+$INSECURE_REGISTRIES }$host"
+    log_info "Using base image mirror: $BASE_MIRROR_HOST"
+    return 0
+}
+
+# =========================================================================
+# Function: Stop the base image mirror container started by start_base_mirror
+# Its blobs stay in BASE_MIRROR_DIR for the next start.
+# Arguments: None
+# Returns: 0
+# =========================================================================
+stop_base_mirror() {
+    local name="${BASE_MIRROR_NAME:-jetc-base-mirror}"
+    if docker container inspect "$name" > /dev/null 2>&1 && docker stop "$name" > /dev/null; then
+        log_info "Stopped base image mirror ($name)."
+    fi
+    return 0
+}
+
+# =========================================================================
+# Function: Get the buildkitd configuration that points the builder at the mirror
+# Docker Hub pulls of the builder go to the mirror first (BuildKit falls back
+# to Docker Hub when it does not answer).
+# Arguments: None
+# Relies on: BASE_MIRROR_HOST (start_base_mirror)
+# Returns: TOML to stdout (nothing when no mirror is in use)
+# =========================================================================
+get_base_mirror_builder_config() {
+    [[ -n "${BASE_MIRROR_HOST:-}" ]] || return 0
+    cat <<EOF
+[registry."docker.io"]
+  mirrors = ["$BASE_MIRROR_HOST"]
+
+[registry."$BASE_MIRROR_HOST"]
+  http = true
+  insecure = true
+EOF
+}
+
+# =========================================================================
+# Function: List the upstream base images of the stages to build
+# Images that no stage of this build produces: the chain base (BASE_IMAGE of
+# the first stage) and images a Dockerfile names in FROM directly, in build
+# order and without repeats. Pinned by the build lock when USE_BUILD_LOCK=y.
+# Arguments: None
+# Relies on: ORDERED_FOLDERS, STAGE_CHAIN_BASE_IMAGE / SELECTED_BASE_IMAGE
+# Returns: One image reference per line to stdout
+# =========================================================================
+get_stage_upstream_bases() {
+    local -A seen=()
+    local image folder_path
+    local images=("${STAGE_CHAIN_BASE_IMAGE:-${SELECTED_BASE_IMAGE:-}}")
+    for folder_path in "${ORDERED_FOLDERS[@]}"; do
+        [[ -f "$folder_path/Dockerfile" ]] || continue
+        # FROM [--platform=...] image [AS name]: skip build args, 'scratch' and earlier build stages
+        while IFS= read -r image; do
+            images+=("$image")
+        done < <(awk '$1 == "FROM" {
+                          i = 2; while ($i ~ /^--/) i++
+                          image = $i; if (toupper($(i + 1)) == "AS") alias[tolower($(i + 2))] = 1
+                          if (image !~ /\$/ && image != "scratch" && !(tolower(image) in alias)) print image
+                      }' "$folder_path/Dockerfile")
+    done
+    for image in "${images[@]}"; do
+        [[ -n "$image" && "$image" != oci-layout://* && -z "${seen[$image]:-}" ]] || continue
+        seen["$image"]=1
+        declare -f get_locked_base_image > /dev/null && image=$(get_locked_base_image "$image")
+        echo "$image"
+    done
+}
+
+# =========================================================================
+# Function: Prefetch the upstream base images into the mirror in the background
+# Runs 'registry.py prefetch' over get_stage_upstream_bases while the stages
+# build, so the builder finds the bases of the upcoming stages on the LAN
+# instead of waiting on a cold pull from Docker Hub. Output goes to
+# LOG_DIR/base-prefetch.log.
+# Arguments: None
+# Relies on: BASE_MIRROR_HOST, BASE_PREFETCH, PLATFORM
+# Sets: BASE_PREFETCH_PID
+# Returns: 0
+# =========================================================================
+prefetch_stage_bases() {
+    [[ -n "${BASE_MIRROR_HOST:-}" && "${BASE_PREFETCH:-y}" == "y" ]] || return 0
+    command -v python3 > /dev/null 2>&1 || return 0
+    local bases=()
+    mapfile -t bases < <(get_stage_upstream_bases)
+    [[ ${#bases[@]} -gt 0 ]] || return 0
+
+    local log_file="${LOG_DIR:-$SCRIPT_DIR_BASE_MIRROR/../logs}/base-prefetch.log"
+    mkdir -p "$(dirname "$log_file")"
+    : > "$log_file"
+    python3 "$SCRIPT_DIR_BASE_MIRROR/registry.py" prefetch "${bases[@]}" --via "$BASE_MIRROR_HOST" \
+        --platform "${PLATFORM:-linux/arm64}" >> "$log_file" 2>&1 &
+    BASE_PREFETCH_PID=$!
+    log_info "Prefetching ${#bases[@]} base image(s) into $BASE_MIRROR_HOST in the background: ${bases[*]}"
+    return 0
+}
+
+# =========================================================================
+# Function: End the background prefetch and log what it fetched
+# Called once the stages are built; a prefetch still running is stopped.
+# Arguments: None
+# Returns: 0
+# =========================================================================
+finish_base_prefetch() {
+    [[ -n "${BASE_PREFETCH_PID:-}" ]] || return 0
+    if kill -0 "$BASE_PREFETCH_PID" 2>/dev/null; then
+        kill "$BASE_PREFETCH_PID" 2>/dev/null || true
+        log_warning "Base image prefetch was still running; stopped."
+    fi
+    wait "$BASE_PREFETCH_PID" 2>/dev/null || true
+    BASE_PREFETCH_PID=""
+    local log_file="${LOG_DIR:-$SCRIPT_DIR_BASE_MIRROR/../logs}/base-prefetch.log"
+    [[ -f "$log_file" ]] || return 0
+    local line
+    while IFS= read -r line; do
+        log_info "Prefetch: $line"
+    done < "$log_file"
+    return 0
+}
+
+# --- Main Execution (for testing) ---
+if [[ "${BASH_SOURCE[0]}" == "${0}" ]]; then
+    set -euo pipefail
+    case "${1:-test}" in
+        start) USE_BASE_MIRROR=y start_base_mirror ;;
+        stop) stop_base_mirror ;;
+        prefetch)
+            shift
+            USE_BASE_MIRROR=y start_base_mirror
+            [[ -n "$BASE_MIRROR_HOST" ]] && python3 "$SCRIPT_DIR_BASE_MIRROR/registry.py" prefetch "$@" --via "$BASE_MIRROR_HOST"
+            ;;
+        *)
+            log_info "Running base_mirror.sh directly for testing..."
+            ORDERED_FOLDERS=("$SCRIPT_DIR_BASE_MIRROR"/../build/*/)
+            SELECTED_BASE_IMAGE="kairin/001:jetc-nvidia-pytorch-25.03-py3-igpu"
+            log_info "Upstream base images of all stages:"
+            get_stage_upstream_bases
+            BASE_MIRROR_HOST="mirror.lan:5001"
+            log_info "Builder configuration for $BASE_MIRROR_HOST:"
+            get_base_mirror_builder_config
+            log_info "Base mirror script test finished."
+            ;;
+    esac
+    exit 0
+fi
+
+# --- Footer ---
+# File location diagram:
+# jetc/                          <- Main project folder
+# ├── buildx/                    <- Parent directory
+# │   └── scripts/               <- Current directory
+# │       └── base_mirror.sh     <- THIS FILE
+# └── ...                        <- Other project files
+#
+# Description: Starts or joins the local pull-through mirror of Docker Hub for the buildx builder and prefetches the upstream base images of the selected stages into it in the background.
+# Author: Mr K / GitHub Copilot
+# COMMIT-TRACKING: UUID-20261017-045000-FX21
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+# filepath: /workspaces/jetc/buildx/scripts/build_governor.py
+"""
+Memory governor of the compile parallelism of the stages.
+
+A stage that compiles (onnxruntime, triton, bitsandbytes, ...) reads its job
+count from the 'jetc-jobs' BuildKit secret and runs make/ninja/MAX_JOBS with it
+(printing 'jetc-jobs: N'); without the secret it uses every core. The job
+count is not a build arg, so a different count does not invalidate the layer
+cache of the compile step.
+
+    'decide' sizes the job count of a stage from the memory of the host right
+    now and the memory one job of the stage needs:
+
+        jobs = (MemAvailable + SwapFree x BUILD_SWAP_FRACTION - BUILD_MEM_RESERVE)
+               / stages building at once / memory per job
+
+    clamped to 1..BUILD_MAX_JOBS (default: the number of cores). The memory per
+    job is learned from the last builds of the stage kept in the telemetry
+    database (stage_memory); until there is one it comes from the
+    '# mem-per-job:' field of the Dockerfile header, or BUILD_MEM_PER_JOB.
+
+    'watch' samples /proc/meminfo during the build; 'record' stores what the
+    build used (drop of MemAvailable plus swap used, from the start of the
+    build) with the job count the stage printed. A build that ran out of memory
+    (compiler killed, exit code 137) records the memory it had instead, so the
+    next build of the stage runs fewer jobs.
+
+Memory is read on the host, which the docker-container builder shares (builds
+on a remote builder are not recorded); with stages building in parallel
+(BUILD_SCHEDULER=dag) a sample also counts the other stages, which only makes
+the profile more cautious.
+
+Usage:
+    build_governor.py decide STAGE --db DB [--share N] [--dockerfile FILE]
+    build_governor.py watch --out FILE [--interval SECONDS]
+    build_governor.py record STAGE --db DB --run-id ID --log FILE [--watch FILE]
+    build_governor.py profile --db DB
+"""
+import argparse
+import json
+import os
+import re
+import signal
+import sys
+import time
+
+from build_telemetry import connect, human_size
+from package_index import log_warning
+
+PROFILE_WINDOW = 5          # builds of a stage its memory per job is learned from
+HEADROOM = 1.15             # margin over the largest memory per job measured
+OOM_FACTOR = 1.5            # a build that ran out of memory needed at least this much more per job
+MIN_PER_JOB = 512 << 20     # floor of a learned memory per job
+MIN_MEASURED = 64 << 20     # less per job means the build did not run on this host (remote builder)
+JOBS_MARKER = re.compile(r'jetc-jobs: (\d+)')
+OOM_MARKERS = re.compile(r'Killed signal terminated program|internal compiler error: Killed|fatal error: Killed'
+                         r"|died due to signal 9|virtual memory exhausted|out of memory allocating"
+                         r'|exit code: 137|exit status 137')
+SIZE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*$', re.IGNORECASE)
+
+
+def parse_size(value):
+    """'2G', '512M', '1.5GiB' or bytes -> bytes (None when it is not a size)."""
+    match = SIZE.match(str(value or ''))
+    if not match:
+        return None
+    return int(float(match.group(1)) * 1024 ** ' KMGT'.index(match.group(2).upper() or ' '))
+
+
+def env_size(name, default):
+    value = os.environ.get(name)
+    size = parse_size(value) if value else None
+    if value and size is None:
+        log_warning(f"{name}={value!r} is not a size (e.g. 2G); using {default}")
+    return size if size is not None else parse_size(default)
+
+
+def meminfo():
+    """{field: bytes} of /proc/meminfo ({} when it cannot be read)."""
+    fields = {}
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                parts = value.split()
+                if parts and parts[0].isdigit():
+                    fields[name] = int(parts[0]) * (1024 if parts[1:] == ['kB'] else 1)
+    except OSError:
+        return {}
+    return fields
+
+
+def header_per_job(dockerfile):
+    """Memory per job declared in the '#---' header of a Dockerfile ('# mem-per-job: 3G')."""
+    if not dockerfile or not os.path.isfile(dockerfile):
+        return None
+    in_header = False
+    with open(dockerfile) as f:
+        for line in f:
+            if line.startswith('#---'):
+                if in_header:
+                    break
+                in_header = True
+            elif in_header:
+                match = re.match(r'#\s*mem-per-job:\s*(\S+)', line)
+                if match:
+                    return parse_size(match.group(1))
+    return None
+
+
+def learned_per_job(conn, stage):
+    """(bytes per job, builds it comes from) learned from the last builds of a stage; None without any."""
+    rows = conn.execute("SELECT jobs, used_bytes, budget_bytes, oom FROM stage_memory WHERE stage = ? "
+                        "AND jobs > 0 ORDER BY id DESC LIMIT ?", (stage, PROFILE_WINDOW)).fetchall()
+    per_job = []
+    for row in rows:
+        if row['oom'] and row['budget_bytes']:
+            per_job.append(max(row['used_bytes'] or 0, row['budget_bytes']) * OOM_FACTOR / row['jobs'])
+        elif row['used_bytes'] is not None:
+            per_job.append(row['used_bytes'] / row['jobs'])
+    if not per_job:
+        return None
+    return max(max(per_job) * HEADROOM, MIN_PER_JOB), len(per_job)
+
+
+def memory_budget(memory):
+    """Bytes the builds may use now: free memory plus the allowed part of the free swap, minus the reserve."""
+    try:
+        swap_fraction = min(max(float(os.environ.get('BUILD_SWAP_FRACTION') or 0.25), 0.0), 1.0)
+    except ValueError:
+        swap_fraction = 0.25
+    swap = int(memory.get('SwapFree', 0) * swap_fraction)
+    return memory.get('MemAvailable', 0) + swap - env_size('BUILD_MEM_RESERVE', '1G'), swap
+
+
+def max_jobs():
+    cores = os.cpu_count() or 1
+    try:
+        return max(int(os.environ.get('BUILD_MAX_JOBS') or cores), 1)
+    except ValueError:
+        return cores
+
+
+def decide(conn, stage, share=1, dockerfile=None):
+    """(jobs, reason) of a stage building now."""
+    limit = max_jobs()
+    memory = meminfo()
+    if 'MemAvailable' not in memory:
+        return limit, "free memory unknown, one job per core"
+
+    learned = learned_per_job(conn, stage)
+    if learned:
+        per_job, source = learned[0], f"learned from {learned[1]} build(s)"
+    elif header_per_job(dockerfile):
+        per_job, source = header_per_job(dockerfile), "Dockerfile mem-per-job"
+    else:
+        per_job, source = env_size('BUILD_MEM_PER_JOB', '2G'), "BUILD_MEM_PER_JOB"
+
+    budget, swap = memory_budget(memory)
+    share = max(share, 1)
+    jobs = min(max(int(budget / share // per_job), 1), limit)
+    shared = f" / {share} stages" if share > 1 else ''
+    return jobs, (f"{human_size(memory['MemAvailable'])} free + {human_size(swap)} swap{shared}, "
+                  f"{human_size(per_job)} per job ({source})")
+
+
+def cmd_decide(args):
+    with connect(args.db) as conn:
+        jobs, reason = decide(conn, args.stage, args.share, args.dockerfile)
+    print(f"{jobs}\t{reason}")
+    return 0
+
+
+def cmd_watch(args):
+    """Sample free memory and swap until terminated, then write what the build used."""
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    start = meminfo()
+    if 'MemAvailable' not in start:
+        log_warning("cannot read /proc/meminfo; build memory not measured")
+        return 1
+    swap_used = start.get('SwapTotal', 0) - start.get('SwapFree', 0)
+    summary = {'start_available': start['MemAvailable'], 'min_available': start['MemAvailable'],
+               'start_swap_used': swap_used, 'max_swap_used': swap_used,
+               'budget': memory_budget(start)[0], 'samples': 0}
+    try:
+        while True:
+            memory = meminfo()
+            if 'MemAvailable' in memory:
+                summary['min_available'] = min(summary['min_available'], memory['MemAvailable'])
+                summary['max_swap_used'] = max(summary['max_swap_used'],
+                                               memory.get('SwapTotal', 0) - memory.get('SwapFree', 0))
+                summary['samples'] += 1
+            time.sleep(args.interval)
+    finally:
+        with open(args.out, 'w') as f:
+            json.dump(summary, f)
+
+
+def scan_log(path):
+    """(job count the stage printed, whether a compiler ran out of memory) from a plain-progress build log."""
+    jobs, oom = 0, False
+    with open(path, errors='replace') as f:
+        for line in f:
+            match = JOBS_MARKER.search(line)
+            if match:
+                jobs = max(jobs, int(match.group(1)))
+            oom = oom or bool(OOM_MARKERS.search(line))
+    return jobs, oom
+
+
+def cmd_record(args):
+    try:
+        jobs, oom = scan_log(args.log)
+    except OSError as error:
+        log_warning(f"cannot read the build log of {args.stage}: {error}")
+        return 1
+    if not jobs:
+        # Nothing compiled: a prebuilt wheel was installed or the compile step was cached
+        return 0
+    summary = {}
+    if args.watch:
+        try:
+            with open(args.watch) as f:
+                summary = json.load(f)
+        except (OSError, ValueError):
+            log_warning(f"no memory samples for {args.stage}")
+    used = swap = None
+    if summary:
+        swap = max(summary['max_swap_used'] - summary['start_swap_used'], 0)
+        used = max(summary['start_available'] - summary['min_available'], 0) + swap
+    if used is not None and used < jobs * MIN_MEASURED and not oom:
+        log_warning(f"{args.stage}: {jobs} jobs used {human_size(used)} of this host; not recorded (remote builder?)")
+        return 0
+
+    with connect(args.db) as conn:
+        conn.execute("INSERT INTO stage_memory (run_id, stage, jobs, used_bytes, budget_bytes, swap_bytes, oom) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                     (args.run_id, args.stage, jobs, used, summary.get('budget'), swap, int(oom)))
+        learned = learned_per_job(conn, args.stage)
+    print(f"{args.stage}: {jobs} jobs used {human_size(used)}"
+          + (" and ran out of memory" if oom else '')
+          + (f"; next build: {human_size(learned[0])} per job" if learned else ''))
+    return 0
+
+
+def cmd_profile(args):
+    with connect(args.db) as conn:
+        stages = [row['stage'] for row in conn.execute(
+            "SELECT stage, MAX(id) AS last FROM stage_memory GROUP BY stage ORDER BY stage")]
+        print(f"{'STAGE':<24} {'PER JOB':>9} {'BUILDS':>6} {'LAST JOBS':>9} {'LAST USED':>10} {'OOM':>4}")
+        for stage in stages:
+            last = conn.execute("SELECT * FROM stage_memory WHERE stage = ? ORDER BY id DESC LIMIT 1",
+                                (stage,)).fetchone()
+            ooms = conn.execute("SELECT COUNT(*) FROM stage_memory WHERE stage = ? AND oom = 1",
+                                (stage,)).fetchone()[0]
+            per_job, builds = learned_per_job(conn, stage) or (None, 0)
+            print(f"{stage:<24} {human_size(per_job):>9} {builds:>6} {last['jobs']:>9} "
+                  f"{human_size(last['used_bytes']):>10} {ooms:>4}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Size the compile job count of the stages from free memory")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    cmd = sub.add_parser('decide', help="print the job count, a tab and the reason")
+    cmd.add_argument('stage')
+    cmd.add_argument('--db', required=True)
+    cmd.add_argument('--share', type=int, default=1, help="stages building at the same time")
+    cmd.add_argument('--dockerfile', help="Dockerfile of the stage (its '# mem-per-job:' header field)")
+    cmd.set_defaults(func=cmd_decide)
+
+    cmd = sub.add_parser('watch', help="sample free memory and swap until terminated")
+    cmd.add_argument('--out', required=True)
+    cmd.add_argument('--interval', type=float, default=1.0)
+    cmd.set_defaults(func=cmd_watch)
+
+    cmd = sub.add_parser('record', help="store the memory a stage build used per job")
+    cmd.add_argument('stage')
+    cmd.add_argument('--db', required=True)
+    cmd.add_argument('--run-id', required=True)
+    cmd.add_argument('--log', required=True, help="plain-progress output of the build")
+    cmd.add_argument('--watch', help="file written by 'watch' during the build")
+    cmd.set_defaults(func=cmd_record)
+
+    cmd = sub.add_parser('profile', help="print the learned memory per job of the stages")
+    cmd.add_argument('--db', required=True)
+    cmd.set_defaults(func=cmd_profile)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+# --- Footer ---
+# File location diagram:
+# jetc/                          <- Main project folder
+# ├── buildx/                    <- Parent directory
+# │   └── scripts/               <- Current directory
+# │       └── build_governor.py  <- THIS FILE
+# └── ...                        <- Other project files
+#
+# Description: Sizes the compile job count of each stage from free memory, swap and the memory per job learned from earlier builds (OOM builds included).
+# Author: Mr K / GitHub Copilot
+# COMMIT-TRACKING: UUID-20261017-030500-MJOB
@@ -0,0 +1,247 @@
+#!/bin/bash
+# filepath: /workspaces/jetc/buildx/scripts/build_journal.sh
+
+# =========================================================================
+# Build Journal Script
+# Responsibility: Keep a crash-safe, append-only journal of the current build
+#                 run (selections, completed stages with tag and digest, failed
+#                 stage) and restore that state for './build.sh --resume'.
+# Relies on logging functions sourced by the main script and on
+# resolve_image_digest from docker_helpers.sh.
+# =========================================================================
+
+# --- Dependencies ---
+SCRIPT_DIR_JOURNAL="$(cd "$(dirname "${BASH_SOURCE[0]:-$0}")" && pwd)"
+
+# DO NOT source logging.sh or env_setup.sh here.
+# Assume they are sourced by the main build.sh script; fall back to basic echo otherwise.
+if ! declare -f log_info > /dev/null; then
+    log_info() { echo "INFO: $1"; }
+    log_warning() { echo "WARNING: $1" >&2; }
+    log_error() { echo "ERROR: $1" >&2; }
+    log_success() { echo "SUCCESS: $1"; }
+fi
+declare -f log_debug > /dev/null || log_debug() { :; }
+
+# --- Global Variables ---
+# Journal format: one tab-separated record per line, each written with a single
+# append so a crash can never leave a half-written stage record behind.
+#   <timestamp> run       <run_id>
+#   <timestamp> setting   <name> <value>
+#   <timestamp> resume    <run_id>
+#   <timestamp> done      <folder> <tag> <digest> [<handoff oci-layout:// reference>]
+#   <timestamp> failed    <folder>
+#   <timestamp> complete
+BUILD_JOURNAL_FILE="${BUILD_JOURNAL_FILE:-${LOG_DIR:-$SCRIPT_DIR_JOURNAL/../logs}/build_journal.log}"
+
+# Selections needed to rebuild the same stage list on resume
+JOURNAL_SETTINGS=(SELECTED_BASE_IMAGE SELECTED_FOLDERS_LIST use_cache use_squash skip_intermediate_push_pull use_builder PLATFORM BUILD_SCHEDULER STAGE_HANDOFF USE_BUILD_LOCK BUILD_LOCKFILE BUILD_ARGS_LIVE CUDA_ARCH_PROFILE USE_WHEELHOUSE USE_COMPILER_CACHE BUILD_JOB_GOVERNOR SQUASH_POLICY IMAGE_COMPRESSION)
+
+# JOURNAL_DONE_TAG[folder] / JOURNAL_DONE_DIGEST[folder] = completed stages loaded for resume
+# JOURNAL_DONE_HANDOFF[folder] = OCI layout reference the next stage builds on (STAGE_HANDOFF=oci)
+declare -gA JOURNAL_DONE_TAG=()
+declare -gA JOURNAL_DONE_DIGEST=()
+declare -gA JOURNAL_DONE_HANDOFF=()
+
+# =========================================================================
+# Function: Append one record to the build journal
+# Arguments: $1 = event, $2.. = fields
+# Returns: 0 on success, 1 if the journal could not be written
+# =========================================================================
+_journal_append() {
+    local record
+    record="$(date -u +'%Y-%m-%dT%H:%M:%SZ')"
+    local field
+    for field in "$@"; do
+        record+=$'\t'"${field//$'\t'/ }"
+    done
+    printf '%s\n' "$record" >> "$BUILD_JOURNAL_FILE" || { log_warning "Failed to write build journal: $BUILD_JOURNAL_FILE"; return 1; }
+    return 0
+}
+
+# =========================================================================
+# Function: Start a new journal for a fresh build run
+# Writes the run header and current selections to a temp file and moves it
+# into place, replacing the journal of the previous run.
+# Relies on: the variables in JOURNAL_SETTINGS
+# Exports: BUILD_RUN_ID
+# Returns: 0 on success, 1 on failure
+# =========================================================================
+journal_begin_run() {
+    export BUILD_RUN_ID="${BUILD_RUN_ID:-$(date -u +'%Y%m%d-%H%M%S')}"
+    mkdir -p "$(dirname "$BUILD_JOURNAL_FILE")" || return 1
+
+    local tmp_journal="${BUILD_JOURNAL_FILE}.tmp.$$"
+    (
+        BUILD_JOURNAL_FILE="$tmp_journal"
+        _journal_append "run" "$BUILD_RUN_ID" || exit 1
+        for name in "${JOURNAL_SETTINGS[@]}"; do
+            _journal_append "setting" "$name" "${!name:-}" || exit 1
+        done
+    ) && mv -f "$tmp_journal" "$BUILD_JOURNAL_FILE" || {
+        rm -f "$tmp_journal"
+        log_warning "Failed to initialise build journal: $BUILD_JOURNAL_FILE"
+        return 1
+    }
+    log_debug "Build journal started: $BUILD_JOURNAL_FILE (run $BUILD_RUN_ID)"
+    return 0
+}
+
+# =========================================================================
+# Function: Record a completed stage
+# Arguments: $1 = folder name, $2 = image tag,
+#            $3 = optional oci-layout:// reference the stage was handed off as
+# Returns: 0 on success, 1 on failure
+# =========================================================================
+journal_record_stage_done() {
+    local folder="$1"
+    local image_tag="$2"
+    local handoff="${3:-}"
+    local digest
+    digest=$(resolve_image_digest "${handoff:-$image_tag}" 2>/dev/null || echo "$image_tag")
+    if [[ -n "$handoff" ]]; then
+        _journal_append "done" "$folder" "$image_tag" "$digest" "$handoff"
+    else
+        _journal_append "done" "$folder" "$image_tag" "$digest"
+    fi
+}
+
+# =========================================================================
+# Function: Record a failed stage
+# Arguments: $1 = folder name
+# Returns: 0 on success, 1 on failure
+# =========================================================================
+journal_record_stage_failed() {
+    _journal_append "failed" "$1"
+}
+
+# =========================================================================
+# Function: Mark the journaled run as finished (nothing left to resume)
+# Returns: 0 on success, 1 on failure
+# =========================================================================
+journal_finish_run() {
+    _journal_append "complete"
+}
+
+# =========================================================================
+# Function: Load the journal of an interrupted run for resuming
+# Restores the selections of that run and the list of completed stages.
+# Exports: the variables in JOURNAL_SETTINGS, BUILD_RUN_ID,
+#          JOURNAL_DONE_TAG, JOURNAL_DONE_DIGEST, JOURNAL_DONE_HANDOFF
+# Returns: 0 if there is a run to resume, 1 otherwise
+# =========================================================================
+journal_load_resume_state() {
+    JOURNAL_DONE_TAG=()
+    JOURNAL_DONE_DIGEST=()
+    JOURNAL_DONE_HANDOFF=()
+
+    if [[ ! -s "$BUILD_JOURNAL_FILE" ]]; then
+        log_error "No build journal found at $BUILD_JOURNAL_FILE. Nothing to resume."
+        return 1
+    fi
+
+    local run_id="" complete=0 failed_stage=""
+    local -A settings=()
+    local timestamp event f1 f2 f3 f4
+    while IFS=$'\t' read -r timestamp event f1 f2 f3 f4; do
+        case "$event" in
+            run) run_id="$f1" ;;
+            setting) settings["$f1"]="$f2" ;;
+            done)
+                JOURNAL_DONE_TAG["$f1"]="$f2"
+                JOURNAL_DONE_DIGEST["$f1"]="$f3"
+                JOURNAL_DONE_HANDOFF["$f1"]="$f4"
+                ;;
+            failed) failed_stage="$f1" ;;
+            complete) complete=1 ;;
+            resume) complete=0 ;;
+        esac
+    done < "$BUILD_JOURNAL_FILE"
+
+    if [[ -z "$run_id" ]]; then
+        log_error "Build journal $BUILD_JOURNAL_FILE has no run header. Nothing to resume."
+        return 1
+    fi
+    if [[ $complete -eq 1 ]]; then
+        log_error "Build run $run_id finished successfully. Nothing to resume."
+        return 1
+    fi
+
+    local name
+    for name in "${JOURNAL_SETTINGS[@]}"; do
+        [[ -n "${settings[$name]+x}" ]] && export "$name=${settings[$name]}"
+    done
+    export BUILD_RUN_ID="$run_id"
+    _journal_append "resume" "$run_id"
+
+    log_info "Resuming build run $run_id: ${#JOURNAL_DONE_TAG[@]} stage(s) already completed."
+    [[ -n "$failed_stage" ]] && log_info "  Last failed stage: $failed_stage"
+    return 0
+}
+
+# =========================================================================
+# Function: Check whether a stage can be skipped on resume
+# The stage must be recorded as done and its image (or OCI layout handoff) must
+# still resolve to the recorded digest, so a re-tagged or deleted image is rebuilt.
+# Arguments: $1 = folder name
+# Returns: Image tag to stdout and exit code 0 if the stage can be skipped,
+#          exit code 1 otherwise
+# =========================================================================
+journal_get_completed_stage() {
+    local folder="$1"
+    local image_tag="${JOURNAL_DONE_TAG[$folder]:-}"
+    [[ -n "$image_tag" ]] || return 1
+
+    local recorded="${JOURNAL_DONE_DIGEST[$folder]:-}"
+    local reference="${JOURNAL_DONE_HANDOFF[$folder]:-$image_tag}"
+    local current
+    current=$(resolve_image_digest "$reference" 2>/dev/null || echo "$reference")
+    if [[ -z "$recorded" || "$recorded" == "$reference" || "$current" != "$recorded" ]]; then
+        log_warning "Journaled image for '$folder' ($image_tag) no longer matches its recorded digest. Rebuilding."
+        return 1
+    fi
+    echo "$image_tag"
+    return 0
+}
+
+# --- Main Execution (for testing) ---
+if [[ "${BASH_SOURCE[0]}" == "${0}" ]]; then
+    set -euo pipefail
+    log_info "Running build_journal.sh directly for testing..."
+
+    if ! declare -f resolve_image_digest > /dev/null; then
+        resolve_image_digest() { echo "sha256:mock-${1##*:}"; }
+    fi
+    BUILD_JOURNAL_FILE="$(mktemp)"
+    SELECTED_BASE_IMAGE="mock/repo:base"
+    SELECTED_FOLDERS_LIST="01-first 02-second 03-third"
+    use_cache="y"
+
+    journal_begin_run
+    journal_record_stage_done "01-first" "mockuser/mockrepo:01-first"
+    journal_record_stage_failed "02-second"
+
+    unset SELECTED_FOLDERS_LIST
+    journal_load_resume_state
+    log_info "Restored SELECTED_FOLDERS_LIST: $SELECTED_FOLDERS_LIST"
+    log_info "01-first reusable as: $(journal_get_completed_stage "01-first" || echo '<rebuild>')"
+    log_info "02-second reusable as: $(journal_get_completed_stage "02-second" || echo '<rebuild>')"
+
+    journal_finish_run
+    journal_load_resume_state || log_info "Completed run correctly refuses to resume."
+    rm -f "$BUILD_JOURNAL_FILE"
+    log_info "Build journal script test finished."
+    exit 0
+fi
+
+# --- Footer ---
+# File location diagram:
+# jetc/                          <- Main project folder
+# ├── buildx/                    <- Parent directory
+# │   └── scripts/               <- Current directory
+# │       └── build_journal.sh   <- THIS FILE
+# └── ...                        <- Other project files
+#
+# Description: Crash-safe build journal used to resume a failed build at the failed stage (with its build-lock, CUDA arch profile, wheelhouse, compiler cache, build job governor, squash policy and image compression settings).
+# Author: Mr K / GitHub Copilot
+# COMMIT-TRACKING: UUID-20261017-051000-FX25
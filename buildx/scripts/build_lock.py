@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+# filepath: /workspaces/jetc/buildx/scripts/build_lock.py
+"""
+Build lockfile: pins every floating input of the build stages.
+
+'lock' resolves, for each stage, the build args of its default package from
+config.py ('latest' versions and branch commits, looked up in one concurrent
+wave), the commits of the repositories its Dockerfile clones without a ref, and
+the digests of the external base images, and writes them to a JSON lockfile:
+
+    {"version": 1, "generated_at": ..., "target": {platform, L4T, CUDA, ...},
+     "base_images": {"<image>": "<image>@sha256:..."},
+     "stages": {"<folder>": {"package": ..., "build_args": {...}, "git_pins": {"<url>": "<sha>"}}}}
+
+With USE_BUILD_LOCK=y a build passes the locked config.py build args of each
+stage (only those its Dockerfile declares; 'args', GIT_PINS included for
+Dockerfiles that declare it) and builds on the pinned base image ('base'), so
+repeated builds see identical inputs and reuse the layer cache. Without the
+lock a stage builds with its Dockerfile defaults. BUILD_ARGS_LIVE=y opts into
+resolving the config.py values when the build starts ('args --live'), for the
+args whose Dockerfile default floats anyway: no default, 'latest', or a
+*_BRANCH that is not a commit. Pinned defaults are never overridden by a newer
+release. 'table' prints all of it at once, so a build reads the lockfile (or
+resolves the versions) once instead of once per stage and lookup.
+
+A lookup that fails is not written into the lock: the entry is left out and
+listed under "partial", 'lock' exits non-zero, and locked builds refuse the
+lockfile ('check') until a later 'lock' resolves it.
+
+Usage:
+    build_lock.py lock [--lockfile FILE] [--base IMAGE]... [STAGE...]
+    build_lock.py check [--lockfile FILE]
+    build_lock.py args [--lockfile FILE] [--live] STAGE
+    build_lock.py base [--lockfile FILE] IMAGE
+    build_lock.py table [--lockfile FILE] [--live]
+"""
+import argparse
+import json
+import os
+import re
+import shlex
+import subprocess
+import sys
+import time
+
+from package_index import DEFAULT_BUILD_DIR, SCRIPT_DIR, load_index, log_warning
+
+DEFAULT_LOCKFILE = os.path.join(SCRIPT_DIR, '..', 'build.lock.json')
+LOCK_VERSION = 1
+GITHUB_URL = re.compile(r'^https://github\.com/([^/\s]+/[^/\s]+?)(?:\.git)?/?$')
+COMMIT_SHA = re.compile(r'^[0-9a-f]{40}$')
+
+
+def dockerfile_instructions(path):
+    """Instructions of a Dockerfile with comments dropped and continuation lines joined."""
+    try:
+        with open(path) as f:
+            lines = [line for line in f.read().splitlines() if not line.lstrip().startswith('#')]
+    except OSError:
+        return []
+    return [line.strip() for line in re.sub(r'\\[ \t]*\n', ' ', '\n'.join(lines)).splitlines() if line.strip()]
+
+
+def arg_defaults(instructions):
+    """{name: default} of the build args a Dockerfile declares (None when it has no default)."""
+    defaults = {}
+    for line in instructions:
+        if re.match(r'ARG\s', line, re.IGNORECASE):
+            try:
+                tokens = shlex.split(line[4:], comments=True)
+            except ValueError:
+                tokens = line[4:].split()
+            for token in tokens:
+                name, sep, value = token.partition('=')
+                defaults[name] = value if sep else None
+    return defaults
+
+
+def declared_args(instructions):
+    """Names of the build args a Dockerfile declares."""
+    return set(arg_defaults(instructions))
+
+
+def floating_default(name, default):
+    """True when a Dockerfile default follows upstream anyway: none, 'latest', or a branch that is not a commit."""
+    if not default or default == 'latest':
+        return True
+    return name.endswith('_BRANCH') and not COMMIT_SHA.match(default)
+
+
+def unpinned_clones(instructions):
+    """URLs the Dockerfile 'git clone's without a branch/tag (so they follow the default branch)."""
+    urls = []
+    for line in instructions:
+        for match in re.finditer(r'git\s+clone\s+([^;&|]*)', line):
+            tokens = match.group(1).split()
+            if any(token in ('-b', '--branch') or token.startswith('--branch=') for token in tokens):
+                continue
+            url = next((token.strip('"\'') for token in tokens if token.strip('"\'').startswith('https://')), None)
+            if url and '$' not in url and url not in urls:
+                urls.append(url)
+    return urls
+
+
+def lock_target():
+    """Target system the config.py build args were evaluated for."""
+    from jetson_containers import CUDA_ARCHITECTURES, CUDA_VERSION, L4T_VERSION, PYTHON_VERSION
+    return {
+        'platform': os.environ.get('PLATFORM') or 'linux/arm64',
+        'l4t_version': str(L4T_VERSION),
+        'cuda_version': str(CUDA_VERSION),
+        'python_version': str(PYTHON_VERSION),
+        'cuda_architectures': CUDA_ARCHITECTURES,
+    }
+
+
+def pin_base_image(image):
+    """'<image>@sha256:...' of a registry image, or None when the digest cannot be looked up."""
+    if '@sha256:' in image:
+        return image
+    try:
+        result = subprocess.run(['docker', 'buildx', 'imagetools', 'inspect', '--format', '{{.Manifest.Digest}}', image],
+                                capture_output=True, text=True, timeout=120)
+    except (OSError, subprocess.TimeoutExpired) as error:
+        log_warning(f"cannot pin base image {image}: {error}")
+        return None
+    digest = result.stdout.strip()
+    if result.returncode != 0 or not digest.startswith('sha256:'):
+        log_warning(f"cannot pin base image {image}: {result.stderr.strip() or 'no digest'}")
+        return None
+    return f"{image}@{digest}"
+
+
+def load_lockfile(path):
+    try:
+        with open(path) as f:
+            lock = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return lock if lock.get('version') == LOCK_VERSION else None
+
+
+def save_lockfile(path, lock):
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(tmp_path, 'w') as f:
+        json.dump(lock, f, indent=2, sort_keys=True)
+        f.write('\n')
+    os.replace(tmp_path, path)
+
+
+def stage_inputs(index, build_dir, folder, name):
+    """Floating inputs of a stage: (default package, its declared build args, {clone url: commit placeholder})."""
+    from jetson_containers import github_branch_commit
+    instructions = dockerfile_instructions(os.path.join(build_dir, folder, 'Dockerfile'))
+    declared = declared_args(instructions)
+    package = index.resolve(name)
+    build_args = {}
+    if package and index.packages[package]['path'] == folder:
+        build_args = {key: str(value) for key, value in (index.packages[package].get('build_args') or {}).items()
+                      if key in declared and key != 'BASE_IMAGE'}
+    git_pins = {}
+    for url in unpinned_clones(instructions):
+        repo = GITHUB_URL.match(url)
+        if 'GIT_PINS' not in declared:
+            log_warning(f"{folder}: clones {url} without a ref and has no GIT_PINS build arg; it stays unpinned")
+        elif not repo:
+            log_warning(f"{folder}: cannot pin {url} (only GitHub repositories are looked up)")
+        else:
+            git_pins[url] = github_branch_commit(repo.group(1))
+    return package, build_args, git_pins
+
+
+def cmd_lock(args):
+    if SCRIPT_DIR not in sys.path:
+        sys.path.insert(0, SCRIPT_DIR)
+    from jetson_containers import find_placeholders, resolve_version, resolve_versions
+
+    index = load_index(args.build_dir, args.cache)
+    stages = {folder: name for folder, name, depends in index.stages() if depends is not None}
+    selected = args.stages or sorted(stages)
+    unknown = [folder for folder in selected if folder not in stages]
+    if unknown:
+        log_warning(f"not a stage with a Dockerfile: {' '.join(unknown)}")
+        return 1
+
+    inputs = {folder: stage_inputs(index, args.build_dir, folder, stages[folder]) for folder in selected}
+    try:
+        resolved = resolve_versions(inputs)
+    except ValueError as error:
+        log_warning(str(error))
+        return 1
+    unresolved = set()
+    for source, name in find_placeholders(inputs):
+        try:
+            resolve_version(source, name)  # memoized: raises only when the lookup failed
+        except ValueError:
+            unresolved.add((source, name))
+
+    lock = load_lockfile(args.lockfile) or {'version': LOCK_VERSION, 'base_images': {}, 'stages': {}}
+    partial = lock.setdefault('partial', {})
+    partial_stages = partial.setdefault('stages', {})
+    lock['generated_at'] = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+    lock['target'] = lock_target()
+    for folder, (package, build_args, git_pins) in resolved.items():
+        # A failed lookup resolved to its default (or branch name): leave it out, never lock the fallback
+        _, floating_args, floating_pins = inputs[folder]
+        missing = [key for key in build_args if find_placeholders(floating_args[key]) & unresolved]
+        missing += [url for url, sha in git_pins.items() if not COMMIT_SHA.match(sha)]
+        for key in missing:
+            build_args.pop(key, None)
+            git_pins.pop(key, None)
+        lock['stages'][folder] = {'package': package, 'build_args': build_args, 'git_pins': git_pins}
+        if missing:
+            partial_stages[folder] = sorted(missing)
+        else:
+            partial_stages.pop(folder, None)
+
+    images = args.base or [image for image in (os.environ.get('SELECTED_BASE_IMAGE'), os.environ.get('DEFAULT_BASE_IMAGE')) if image]
+    unpinned = set(partial.get('base_images', []))
+    for image in dict.fromkeys(images):
+        pinned = pin_base_image(image)
+        if pinned:
+            lock['base_images'][image] = pinned
+            unpinned.discard(image)
+        else:
+            lock['base_images'].pop(image, None)
+            unpinned.add(image)
+    partial['base_images'] = sorted(unpinned)
+    if not partial_stages and not unpinned:
+        del lock['partial']
+
+    save_lockfile(args.lockfile, lock)
+    print(f"Locked {len(selected)} stages and {len(lock['base_images'])} base images in {args.lockfile}")
+    if lock.get('partial'):
+        log_warning(f"{args.lockfile} is partial, locked builds refuse it until 'lock' succeeds: {partial_summary(lock)}")
+        return 1
+    return 0
+
+
+def partial_summary(lock):
+    partial = lock.get('partial') or {}
+    entries = [f"{folder}:{key}" for folder, keys in sorted(partial.get('stages', {}).items()) for key in keys]
+    entries += partial.get('base_images', [])
+    return ' '.join(entries)
+
+
+def usable_lockfile(path):
+    """Lockfile a locked build may use (None, with a warning, when it is missing or partial)."""
+    lock = load_lockfile(path)
+    if lock is None:
+        log_warning(f"no lockfile at {path} (run 'build_lock.py lock')")
+        return None
+    if lock.get('partial'):
+        log_warning(f"{path} is partial (lookups failed for {partial_summary(lock)}); run 'build_lock.py lock' again")
+        return None
+    if SCRIPT_DIR not in sys.path:
+        sys.path.insert(0, SCRIPT_DIR)
+    target = lock_target()
+    if lock.get('target') != target:
+        log_warning(f"{path} was locked for {lock.get('target')}, building for {target}")
+    return lock
+
+
+def locked_stage_args(stage):
+    build_args = dict(stage['build_args'])
+    if stage.get('git_pins'):
+        build_args['GIT_PINS'] = ' '.join(f"{url}={sha}" for url, sha in sorted(stage['git_pins'].items()))
+    return build_args
+
+
+def live_stage_args(build_dir, cache, selected=None):
+    """{folder: build args} of the stages' config.py, with the floating versions looked up now.
+
+    Only args whose Dockerfile default floats are passed (floating_default); a
+    pinned default stays in effect.
+    """
+    if SCRIPT_DIR not in sys.path:
+        sys.path.insert(0, SCRIPT_DIR)
+    from jetson_containers import prefetch_versions, resolve_versions
+
+    index = load_index(build_dir, cache)
+    stages = {folder: name for folder, name, depends in index.stages()
+              if depends is not None and (selected is None or folder in selected)}
+    build_args = {}
+    for folder, name in stages.items():
+        defaults = arg_defaults(dockerfile_instructions(os.path.join(build_dir, folder, 'Dockerfile')))
+        build_args[folder] = {key: value for key, value in stage_inputs(index, build_dir, folder, name)[1].items()
+                              if floating_default(key, defaults.get(key))}
+    prefetch_versions(build_args)
+    live = {}
+    for folder, args in sorted(build_args.items()):
+        try:
+            live[folder] = resolve_versions(args)
+        except ValueError as error:
+            log_warning(f"{folder}: {error}; building it with its Dockerfile defaults")
+    return live
+
+
+def cmd_check(args):
+    return 0 if usable_lockfile(args.lockfile) is not None else 1
+
+
+def cmd_args(args):
+    if args.live:
+        build_args = live_stage_args(args.build_dir, args.cache, {args.stage}).get(args.stage, {})
+    else:
+        lock = usable_lockfile(args.lockfile)
+        if lock is None:
+            return 1
+        stage = lock['stages'].get(args.stage)
+        if stage is None:
+            log_warning(f"stage {args.stage} is not in the lockfile {args.lockfile}")
+            return 1
+        build_args = locked_stage_args(stage)
+    for key, value in sorted(build_args.items()):
+        print(f"{key}={value}")
+    return 0
+
+
+def cmd_table(args):
+    # Tab-separated for docker_helpers.sh: 'args <stage> KEY=VALUE' and 'base <image> <pinned ref>'
+    if args.live:
+        for folder, build_args in live_stage_args(args.build_dir, args.cache).items():
+            for key, value in sorted(build_args.items()):
+                print(f"args\t{folder}\t{key}={value}")
+        return 0
+    lock = usable_lockfile(args.lockfile)
+    if lock is None:
+        return 1
+    for folder, stage in sorted(lock['stages'].items()):
+        for key, value in sorted(locked_stage_args(stage).items()):
+            print(f"args\t{folder}\t{key}={value}")
+    for image, pinned in sorted(lock['base_images'].items()):
+        print(f"base\t{image}\t{pinned}")
+    return 0
+
+
+def cmd_base(args):
+    lock = load_lockfile(args.lockfile) or {}
+    print(lock.get('base_images', {}).get(args.image, args.image))
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lockfile of the floating versions, refs and base images of the build stages")
+    parser.add_argument('--lockfile', default=os.environ.get('BUILD_LOCKFILE') or DEFAULT_LOCKFILE)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    cmd = sub.add_parser('lock', help="resolve and write the lockfile (updates only the named stages of an existing one)")
+    cmd.add_argument('stages', nargs='*', help="stage folders to lock (default: every stage)")
+    cmd.add_argument('--base', action='append', default=[], metavar='IMAGE',
+                     help="base image to pin (default: $SELECTED_BASE_IMAGE and $DEFAULT_BASE_IMAGE)")
+    cmd.add_argument('--build-dir', default=DEFAULT_BUILD_DIR)
+    cmd.add_argument('--cache', help="package index cache (default: $PACKAGE_INDEX_CACHE)")
+    cmd.set_defaults(func=cmd_lock)
+    cmd = sub.add_parser('check', help="fail unless the lockfile exists and is complete")
+    cmd.set_defaults(func=cmd_check)
+    for name, func, help_text in (('args', cmd_args, "locked build args of a stage, one KEY=VALUE per line"),
+                                  ('table', cmd_table, "locked build args of every stage and the pinned base images")):
+        cmd = sub.add_parser(name, help=help_text)
+        if name == 'args':
+            cmd.add_argument('stage')
+        cmd.add_argument('--live', action='store_true', help="the config.py build args resolved now (only those whose Dockerfile default floats) instead of the locked ones")
+        cmd.add_argument('--build-dir', default=DEFAULT_BUILD_DIR)
+        cmd.add_argument('--cache', help="package index cache (default: $PACKAGE_INDEX_CACHE)")
+        cmd.set_defaults(func=func)
+    cmd = sub.add_parser('base', help="pinned reference of a base image (the image itself when not locked)")
+    cmd.add_argument('image')
+    cmd.set_defaults(func=cmd_base)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+# --- Footer ---
+# File location diagram:
+# jetc/                          <- Main project folder
+# ├── buildx/                    <- Parent directory
+# │   └── scripts/               <- Current directory
+# │       └── build_lock.py      <- THIS FILE
+# └── ...                        <- Other project files
+#
+# Description: Writes the build lockfile (resolved build args, git commits, base image digests; failed lookups marked partial) and serves it to locked builds, or the live config.py build args to unlocked ones.
+# Author: Mr K / GitHub Copilot
+# COMMIT-TRACKING: UUID-20261017-051000-FX25
@@ -24,6 +24,12 @@ else
     log_debug() { :; }
 fi
 
+# stage_graph provides build_stage_graph / get_stage_ancestors (selection closure)
+if [ -f "$SCRIPT_DIR_ORDER/stage_graph.sh" ]; then
+    # shellcheck disable=SC1091
+    source "$SCRIPT_DIR_ORDER/stage_graph.sh"
+fi
+
 # --- Constants ---
 # BUILD_DIR is now passed as an argument
 
@@ -33,6 +39,7 @@ fi
 #            $2 = selected_folders_list (space-separated string of folder basenames from user interaction, or empty/null to build all)
 # Exports:   ORDERED_FOLDERS (global array of full paths)
 #            SELECTED_FOLDERS_MAP (global associative array [basename]=1)
+#            STAGE_CHAIN_BASE_IMAGE (base image of the first stage; see expand_selection_closure)
 # Returns:   Exit code 0 on success, 1 on error.
 # =========================================================================
 determine_build_order() {
@@ -102,6 +109,12 @@ determine_build_order() {
          return 0
     fi
 
+    # Add the stale ancestors of the selected stages (STAGE_SELECTION_CLOSURE=y)
+    export STAGE_CHAIN_BASE_IMAGE="${SELECTED_BASE_IMAGE:-}"
+    if [[ -n "$selected_folders_list" && "${STAGE_SELECTION_CLOSURE:-n}" == "y" ]]; then
+        expand_selection_closure "${potential_stage_dirs[@]}" || log_warning "Could not expand stage selection with its ancestors; building the selection as is."
+    fi
+
     log_info "Final determined build order (${#ORDERED_FOLDERS[@]} stages):"
     for folder in "${ORDERED_FOLDERS[@]}"; do
         log_info "  - $(basename "$folder")"
@@ -111,6 +124,115 @@ determine_build_order() {
     return 0
 }
 
+# =========================================================================
+# Function: Expand the selected stages with the ancestors that must be rebuilt
+# Follows the Dockerfile 'depends:' names of every selected stage, transitively,
+# to the stages providing them. Folders without a Dockerfile are never added:
+# like any name no stage provides, their names are expected in the base image.
+# A stage without a '#---' header depends on the stage before it, as in the
+# dependency graph. Only this set is linearised (the graph of unselected
+# stages must not move its ancestors). Leading ancestors whose existing image
+# is still current (unchanged since it was built, on a base that is unchanged
+# too: is_stage_image_current) are not rebuilt; the chain starts on the image
+# of the last of them instead. From the first stale ancestor on, every
+# ancestor is rebuilt, since its base changes.
+# Arguments: $@ = all stage folder paths, in build order
+# Relies on: ORDERED_FOLDERS, SELECTED_FOLDERS_MAP, SELECTED_BASE_IMAGE,
+#            DOCKER_USERNAME, DOCKER_REPO_PREFIX, DOCKER_REGISTRY, PLATFORM, use_squash
+# Exports:   ORDERED_FOLDERS, SELECTED_FOLDERS_MAP (minimal rebuild set),
+#            STAGE_CHAIN_BASE_IMAGE (image the first stage of the set builds on)
+# Returns:   0 on success, 1 if the dependency graph is unavailable
+# =========================================================================
+expand_selection_closure() {
+    local all_stage_dirs=("$@")
+    if ! declare -f build_stage_graph > /dev/null; then
+        log_warning "stage_graph.sh not loaded; cannot resolve stage ancestors."
+        return 1
+    fi
+
+    # Names and dependencies of every buildable stage (the parents are not used)
+    local selected_folders=("${ORDERED_FOLDERS[@]}")
+    local buildable=() folder_path folder
+    for folder_path in "${all_stage_dirs[@]}"; do
+        [[ -f "$folder_path/Dockerfile" ]] && buildable+=("$folder_path")
+    done
+    ORDERED_FOLDERS=("${buildable[@]}")
+    build_stage_graph --quiet || { ORDERED_FOLDERS=("${selected_folders[@]}"); return 1; }
+
+    # Transitive closure over the 'depends:' names
+    local -A closure=()
+    local pending=() dep provider
+    for folder_path in "${selected_folders[@]}"; do
+        folder=$(basename "$folder_path")
+        closure["$folder"]=1
+        pending+=("$folder")
+    done
+    while [[ ${#pending[@]} -gt 0 ]]; do
+        folder="${pending[0]}"
+        pending=("${pending[@]:1}")
+        [[ -n "${STAGE_INDEX[$folder]+x}" ]] || continue
+        local providers=()
+        if [[ "${STAGE_DEPENDS[$folder]}" == "?" ]]; then
+            local index="${STAGE_INDEX[$folder]}"
+            [[ $index -gt 0 ]] && providers=("$(basename "${buildable[$((index - 1))]}")")
+        else
+            for dep in ${STAGE_DEPENDS[$folder]}; do
+                # shellcheck disable=SC2207
+                providers+=($(_resolve_stage_dependency "$dep" "${STAGE_INDEX[$folder]}"))
+            done
+        fi
+        for provider in "${providers[@]}"; do
+            [[ -n "${closure[$provider]:-}" ]] && continue
+            closure["$provider"]=1
+            pending+=("$provider")
+        done
+    done
+
+    # Dependency graph of the closure only
+    ORDERED_FOLDERS=()
+    for folder_path in "${all_stage_dirs[@]}"; do
+        [[ -n "${closure[$(basename "$folder_path")]:-}" ]] && ORDERED_FOLDERS+=("$folder_path")
+    done
+    build_stage_graph --quiet || { ORDERED_FOLDERS=("${selected_folders[@]}"); return 1; }
+
+    # Keep the leading ancestors whose images are current
+    local chain_base="${SELECTED_BASE_IMAGE:-}"
+    local current=() rebuild=() walking="y"
+    for folder_path in "${all_stage_dirs[@]}"; do
+        folder=$(basename "$folder_path")
+        [[ -n "${closure[$folder]:-}" ]] || continue
+        if [[ "$walking" == "y" && -z "${SELECTED_FOLDERS_MAP[$folder]:-}" ]] && declare -f is_stage_image_current > /dev/null; then
+            local tag
+            tag=$(get_stage_image_tag "$folder" "${DOCKER_USERNAME}" "${DOCKER_REPO_PREFIX}" "${DOCKER_REGISTRY:-}")
+            if is_stage_image_current "$folder_path" "$tag" "$chain_base" "${PLATFORM:-linux/arm64}" "${use_squash:-n}"; then
+                current+=("$folder")
+                chain_base="$tag"
+                continue
+            fi
+        fi
+        walking="n"
+        rebuild+=("$folder_path")
+        SELECTED_FOLDERS_MAP["$folder"]=1
+    done
+
+    ORDERED_FOLDERS=("${rebuild[@]}")
+    export STAGE_CHAIN_BASE_IMAGE="$chain_base"
+
+    local added=()
+    for folder_path in "${rebuild[@]}"; do
+        folder=$(basename "$folder_path")
+        local was_selected="n" sel
+        for sel in "${selected_folders[@]}"; do
+            [[ "$(basename "$sel")" == "$folder" ]] && was_selected="y"
+        done
+        [[ "$was_selected" == "y" ]] || added+=("$folder")
+    done
+    [[ ${#current[@]} -gt 0 ]] && log_info "Ancestors with current images (not rebuilt): ${current[*]}"
+    [[ ${#added[@]} -gt 0 ]] && log_info "Stale ancestors added to the build: ${added[*]}"
+    log_info "Chain base image: ${STAGE_CHAIN_BASE_IMAGE:-<none>}"
+    return 0
+}
+
 # --- Main Execution (for testing) ---
 if [[ "${BASH_SOURCE[0]}" == "${0}" ]]; then
     log_info "Running build_order.sh directly for testing..."
@@ -155,6 +277,7 @@ if [[ "${BASH_SOURCE[0]}" == "${0}" ]]; then
 
 
     # --- Test Cases --- #
+    STAGE_SELECTION_CLOSURE="n"
     run_test "Test 1: Build all" "$test_build_dir" ""
     run_test "Test 2: Select specific stages (01-first 10-last)" "$test_build_dir" "01-first 10-last"
     run_test "Test 3: Select specific stages (out of order: 05-middle 01-first)" "$test_build_dir" "05-middle 01-first"
@@ -163,6 +286,11 @@ if [[ "${BASH_SOURCE[0]}" == "${0}" ]]; then
     run_test "Test 6: Select non-numbered stage (should be ignored)" "$test_build_dir" "non-numbered"
     run_test "Test 7: Invalid build dir" "/tmp/nonexistent_dir_$$" ""
 
+    # Closure over the real stage headers; no images exist, so every ancestor is stale
+    STAGE_SELECTION_CLOSURE="y"
+    run_test "Test 8: Select 13-transformers with ancestor closure" "$SCRIPT_DIR_ORDER/../build" "13-transformers"
+    STAGE_SELECTION_CLOSURE="n"
+
 
     # --- Cleanup --- #
     log_info ""
@@ -181,6 +309,6 @@ fi
 # │       └── build_order.sh     <- THIS FILE
 # └── ...                        <- Other project files
 #
-# Description: Determines the correct build order for Docker stages.
+# Description: Determines the correct build order for Docker stages, adding stale ancestors of the selection.
 # Author: Mr K / GitHub Copilot
-# COMMIT-TRACKING: UUID-20250425-080000-42595D
+# COMMIT-TRACKING: UUID-20261017-050500-FX24
@@ -39,18 +39,70 @@ else
     # Allow to continue but warn, maybe updates aren't critical
     update_available_images_in_env() { log_warning "update_available_images_in_env: env_update.sh not loaded"; return 0; }
 fi
+# stage_graph provides build_stage_graph (used by the 'dag' scheduler)
+if [ -f "$SCRIPT_DIR_STAGES/stage_graph.sh" ]; then
+    # shellcheck disable=SC1091
+    source "$SCRIPT_DIR_STAGES/stage_graph.sh"
+else
+    log_error "stage_graph.sh not found. BUILD_SCHEDULER=dag will fail."
+fi
+# bake_plan provides generate_bake_plan (used by the 'bake' scheduler)
+if [ -f "$SCRIPT_DIR_STAGES/bake_plan.sh" ]; then
+    # shellcheck disable=SC1091
+    source "$SCRIPT_DIR_STAGES/bake_plan.sh"
+else
+    log_error "bake_plan.sh not found. BUILD_SCHEDULER=bake will fail."
+fi
+# build_journal provides journal_record_stage_done/_failed and resume lookups
+if [ -f "$SCRIPT_DIR_STAGES/build_journal.sh" ]; then
+    # shellcheck disable=SC1091
+    source "$SCRIPT_DIR_STAGES/build_journal.sh"
+else
+    log_warning "build_journal.sh not found. Builds will not be journaled or resumable."
+    journal_record_stage_done() { return 0; }
+    journal_record_stage_failed() { return 0; }
+    journal_get_completed_stage() { return 1; }
+fi
+# wheelhouse provides start_wheelhouse / stop_wheelhouse (local wheel index, USE_WHEELHOUSE=y)
+if [ -f "$SCRIPT_DIR_STAGES/wheelhouse.sh" ]; then
+    # shellcheck disable=SC1091
+    source "$SCRIPT_DIR_STAGES/wheelhouse.sh"
+else
+    log_warning "wheelhouse.sh not found. Builds will not use the local wheelhouse."
+    start_wheelhouse() { export WHEELHOUSE_URL=""; return 0; }
+    stop_wheelhouse() { return 0; }
+fi
 
 
 # --- Global Variables ---
 # ORDERED_FOLDERS, SELECTED_FOLDERS_MAP, DOCKER_USERNAME, DOCKER_REPO_PREFIX,
-# DOCKER_REGISTRY, SELECTED_BASE_IMAGE, use_cache, use_squash,
-# skip_intermediate_push_pull, use_builder, PLATFORM
+# DOCKER_REGISTRY, SELECTED_BASE_IMAGE, STAGE_CHAIN_BASE_IMAGE, use_cache, use_squash,
+# skip_intermediate_push_pull, use_builder, PLATFORM,
+# BUILD_SCHEDULER ('serial', 'dag' or 'bake'), BUILD_MAX_PARALLEL, BAKE_USE_GRAPH,
+# BUILD_RESUME ('y' skips stages completed by the journaled run),
+# STAGE_HANDOFF ('load' or 'oci')
 
 # Declare global map for skipping specific apps within stages (initialize as empty)
 declare -gA skip_apps_map=()
 
 # --- Functions ---
 
+# =========================================================================
+# Function: Check whether stages are handed to each other as OCI layouts
+# STAGE_HANDOFF=oci keeps intermediate stages out of the docker daemon: each
+# one is exported as an OCI layout directory and passed to the next stage as a
+# named build context. Only applies to local builds with the buildx builder.
+# Returns: 0 if the OCI handoff is active, 1 otherwise
+# =========================================================================
+use_oci_stage_handoff() {
+    [[ "${STAGE_HANDOFF:-load}" == "oci" ]] || return 1
+    if [[ "${skip_intermediate_push_pull:-y}" != "y" || "${use_builder:-y}" != "y" ]]; then
+        log_warning "STAGE_HANDOFF=oci needs local builds with the buildx builder. Using --load/--push."
+        return 1
+    fi
+    return 0
+}
+
 # =========================================================================
 # Function: Build all selected stages in order
 # Relies on global variables: ORDERED_FOLDERS, SELECTED_USE_CACHE, DOCKER_USERNAME,
@@ -61,6 +113,17 @@ declare -gA skip_apps_map=()
 # Returns: 0 if all selected stages build successfully, 1 otherwise
 # =========================================================================
 build_selected_stages() {
+    case "${BUILD_SCHEDULER:-serial}" in
+        dag)
+            build_selected_stages_dag
+            return $?
+            ;;
+        bake)
+            build_selected_stages_bake
+            return $?
+            ;;
+    esac
+
     log_info "--- Starting Build Stages ---"
     local overall_status=0
     export LAST_SUCCESSFUL_TAG="${LAST_SUCCESSFUL_TAG:-}" # Ensure it's exported and initialized
@@ -71,6 +134,12 @@ build_selected_stages() {
     fi
 
     log_info "Found ${#ORDERED_FOLDERS[@]} stages to process."
+    local resuming="${BUILD_RESUME:-n}"
+    local oci_handoff
+    oci_handoff=$(use_oci_stage_handoff && echo "y" || echo "n")
+    local next_base_image="${LAST_SUCCESSFUL_TAG:-${STAGE_CHAIN_BASE_IMAGE:-$SELECTED_BASE_IMAGE}}"
+    local last_folder
+    last_folder=$(basename "${ORDERED_FOLDERS[$((${#ORDERED_FOLDERS[@]} - 1))]}")
 
     for folder_path in "${ORDERED_FOLDERS[@]}"; do
         local folder_name
@@ -78,10 +147,28 @@ build_selected_stages() {
         log_info "--- Processing Stage: $folder_name ---"
         echo "DEBUG ECHO: Processing $folder_name" # Added for visibility
 
+        # On resume, reuse the leading stages the journal recorded as completed.
+        # Once a stage is rebuilt, every later stage is rebuilt on top of it.
+        local journaled_tag=""
+        if [[ "$resuming" == "y" ]]; then
+            if journaled_tag=$(journal_get_completed_stage "$folder_name"); then
+                export LAST_SUCCESSFUL_TAG="$journaled_tag"
+                next_base_image="${JOURNAL_DONE_HANDOFF[$folder_name]:-$journaled_tag}"
+                log_info "Resume: skipping completed stage '$folder_name' ($journaled_tag)"
+                continue
+            fi
+            resuming="n"
+            log_info "Resume: continuing build at stage '$folder_name'."
+        fi
+
         # Determine the base image for the current stage
-        local current_base_image="${LAST_SUCCESSFUL_TAG:-$SELECTED_BASE_IMAGE}"
+        local current_base_image="$next_base_image"
         log_debug "Using base image for '$folder_name': $current_base_image"
 
+        # Only the final stage is loaded into docker when stages are handed off as OCI layouts
+        export STAGE_OUTPUT=""
+        [[ "$oci_handoff" == "y" && "$folder_name" != "$last_folder" ]] && STAGE_OUTPUT="oci"
+
         # Call build_folder_image with all required arguments from global scope
         # Ensure the order matches the function definition in docker_helpers.sh
         # build_folder_image "$folder_path" "$use_cache" "$docker_username" "$use_squash" "$skip_intermediate" "$base_image_tag" "$docker_repo_prefix" "$docker_registry" "$use_builder"
@@ -100,10 +187,12 @@ build_selected_stages() {
             # On success, update LAST_SUCCESSFUL_TAG with the tag just built (fixed_tag is exported by build_folder_image)
             if [[ -n "${fixed_tag:-}" ]]; then
                  export LAST_SUCCESSFUL_TAG="$fixed_tag"
+                 next_base_image="${STAGE_OCI_REF:-$fixed_tag}"
                  log_success "Stage '$folder_name' completed successfully."
                  log_info "  Output Image: $LAST_SUCCESSFUL_TAG"
-                 # Update AVAILABLE_IMAGES in .env
-                 update_available_images_in_env "$LAST_SUCCESSFUL_TAG"
+                 # Update AVAILABLE_IMAGES in .env (OCI handoff stages never reach the docker daemon)
+                 [[ -z "${STAGE_OCI_REF:-}" ]] && update_available_images_in_env "$LAST_SUCCESSFUL_TAG"
+                 journal_record_stage_done "$folder_name" "$LAST_SUCCESSFUL_TAG" "${STAGE_OCI_REF:-}"
                  log_info "--- Stage Complete: $folder_name ---"
             else
                  log_error "Build succeeded for '$folder_name' but fixed_tag was not exported correctly."
@@ -112,6 +201,7 @@ build_selected_stages() {
             fi
         else
             log_error "Stage '$folder_name' failed with exit code $?."
+            journal_record_stage_failed "$folder_name"
             overall_status=1
             break # Stop build process on first failure
         fi
@@ -126,6 +216,263 @@ build_selected_stages() {
     return $overall_status
 }
 
+# =========================================================================
+# Function: Wait for one of the running stage build jobs to finish
+# Uses 'wait -n -p' on bash >= 5.1. Older bash lacks '-p', so the jobs are
+# polled with 'kill -0' once a second and the finished one is reaped with 'wait'.
+# Arguments: $@ = PIDs of the running stage build jobs
+# Exports: FINISHED_STAGE_PID, FINISHED_STAGE_RC (exit code of that job)
+# Returns: 0, or 1 if no job is running
+# =========================================================================
+wait_for_stage_job() {
+    FINISHED_STAGE_PID=""
+    FINISHED_STAGE_RC=0
+    [[ $# -gt 0 ]] || return 1
+    if (( BASH_VERSINFO[0] > 5 || (BASH_VERSINFO[0] == 5 && BASH_VERSINFO[1] >= 1) )); then
+        wait -n -p FINISHED_STAGE_PID "$@" || FINISHED_STAGE_RC=$?
+        return 0
+    fi
+    local pid
+    while true; do
+        for pid in "$@"; do
+            if ! kill -0 "$pid" 2>/dev/null; then
+                FINISHED_STAGE_PID="$pid"
+                wait "$pid" || FINISHED_STAGE_RC=$?
+                return 0
+            fi
+        done
+        sleep 1
+    done
+}
+
+# =========================================================================
+# Function: Build all selected stages following the Dockerfile 'depends:' graph
+# Stages whose parent image is ready are built concurrently, up to
+# BUILD_MAX_PARALLEL at a time. Each stage uses its graph parent (not the
+# previous folder) as BASE_IMAGE. Output of every stage goes to its own log
+# file in LOG_DIR. When a stage fails its descendants are skipped, while
+# independent branches keep building.
+# Relies on global variables: same as build_selected_stages, plus BUILD_MAX_PARALLEL
+# Exports: LAST_SUCCESSFUL_TAG (image of the last stage in build order that succeeded)
+# Returns: 0 if all selected stages build successfully, 1 otherwise
+# =========================================================================
+build_selected_stages_dag() {
+    log_info "--- Starting Build Stages (dependency graph scheduler) ---"
+    export LAST_SUCCESSFUL_TAG="${LAST_SUCCESSFUL_TAG:-}"
+
+    if [ ${#ORDERED_FOLDERS[@]} -eq 0 ]; then
+        log_warning "No build stages found or selected in ORDERED_FOLDERS. Nothing to build."
+        return 0
+    fi
+
+    local max_parallel="${BUILD_MAX_PARALLEL:-2}"
+    if ! [[ "$max_parallel" =~ ^[0-9]+$ ]] || [[ "$max_parallel" -lt 1 ]]; then
+        log_warning "Invalid BUILD_MAX_PARALLEL '$max_parallel'. Using 1."
+        max_parallel=1
+    fi
+    log_info "Found ${#ORDERED_FOLDERS[@]} stages to process (max $max_parallel in parallel)."
+
+    build_stage_graph || { log_error "Failed to build stage dependency graph."; return 1; }
+
+    local status_dir
+    status_dir=$(mktemp -d) || { log_error "Failed to create scheduler status directory."; return 1; }
+    local run_id
+    run_id=$(date -u +'%Y%m%d-%H%M%S')
+
+    local -A stage_state=()   # pending | running | done | reused | failed | skipped
+    local -A stage_tag=()
+    local -A stage_ref=()     # what children use as BASE_IMAGE (tag or oci-layout:// reference)
+    local -A pid_stage=()
+    local folder_path folder
+    for folder_path in "${ORDERED_FOLDERS[@]}"; do
+        stage_state["$(basename "$folder_path")"]="pending"
+    done
+
+    local oci_handoff
+    oci_handoff=$(use_oci_stage_handoff && echo "y" || echo "n")
+
+    local running=0 overall_status=0
+    while true; do
+        # Launch every stage whose parent is ready, up to the concurrency limit
+        for folder_path in "${ORDERED_FOLDERS[@]}"; do
+            [[ $running -lt $max_parallel ]] || break
+            folder=$(basename "$folder_path")
+            [[ "${stage_state[$folder]}" == "pending" ]] || continue
+
+            local parent="${STAGE_PARENT[$folder]:-}"
+            local journaled_tag=""
+            # On resume, reuse journaled stages whose parent was reused as well
+            if [[ "${BUILD_RESUME:-n}" == "y" && ( -z "$parent" || "${stage_state[$parent]}" == "reused" ) ]] \
+                && journaled_tag=$(journal_get_completed_stage "$folder"); then
+                log_info "Resume: skipping completed stage '$folder' ($journaled_tag)"
+                stage_state["$folder"]="reused"
+                stage_tag["$folder"]="$journaled_tag"
+                stage_ref["$folder"]="${JOURNAL_DONE_HANDOFF[$folder]:-$journaled_tag}"
+                continue
+            fi
+            local base_image="${STAGE_CHAIN_BASE_IMAGE:-$SELECTED_BASE_IMAGE}"
+            if [[ -n "$parent" ]]; then
+                case "${stage_state[$parent]}" in
+                    done|reused) base_image="${stage_ref[$parent]}" ;;
+                    failed|skipped)
+                        log_warning "Skipping stage '$folder': parent stage '$parent' did not build."
+                        stage_state["$folder"]="skipped"
+                        continue
+                        ;;
+                    *) continue ;;
+                esac
+            fi
+
+            local stage_log="$LOG_DIR/stage-${folder}-${run_id}.log"
+            log_info "--- Starting Stage: $folder (base: $base_image) ---"
+            log_info "  Stage log: $stage_log"
+            # Stages other stages build on stay in OCI layouts; leaves are loaded into docker
+            local stage_output=""
+            [[ "$oci_handoff" == "y" && -n "$(get_stage_children "$folder")" ]] && stage_output="oci"
+            (
+                set +e
+                export STAGE_OUTPUT="$stage_output"
+                build_folder_image \
+                    "$folder_path" \
+                    "${use_cache:-y}" \
+                    "${DOCKER_USERNAME}" \
+                    "${use_squash:-n}" \
+                    "${skip_intermediate_push_pull:-n}" \
+                    "$base_image" \
+                    "${DOCKER_REPO_PREFIX}" \
+                    "${DOCKER_REGISTRY:-}" \
+                    "${use_builder:-y}" > "$stage_log" 2>&1
+                build_rc=$?
+                if [[ $build_rc -eq 0 ]]; then
+                    echo "${fixed_tag:-}" > "$status_dir/$folder.tag"
+                    echo "${STAGE_OCI_REF:-}" > "$status_dir/$folder.ref"
+                fi
+                exit $build_rc
+            ) &
+            pid_stage[$!]="$folder"
+            stage_state["$folder"]="running"
+            running=$((running + 1))
+        done
+
+        [[ $running -gt 0 ]] || break
+
+        # Wait for any running stage to finish
+        wait_for_stage_job "${!pid_stage[@]}"
+        local finished_pid="$FINISHED_STAGE_PID" stage_rc="$FINISHED_STAGE_RC"
+        running=$((running - 1))
+        folder="${pid_stage[$finished_pid]:-}"
+        [[ -n "$folder" ]] || { log_error "Scheduler lost track of a finished build job."; overall_status=1; continue; }
+        unset "pid_stage[$finished_pid]"
+
+        local built_tag=""
+        [[ -f "$status_dir/$folder.tag" ]] && built_tag=$(<"$status_dir/$folder.tag")
+        if [[ $stage_rc -eq 0 && -n "$built_tag" ]]; then
+            local oci_ref=""
+            [[ -f "$status_dir/$folder.ref" ]] && oci_ref=$(<"$status_dir/$folder.ref")
+            stage_state["$folder"]="done"
+            stage_tag["$folder"]="$built_tag"
+            stage_ref["$folder"]="${oci_ref:-$built_tag}"
+            log_success "Stage '$folder' completed successfully."
+            log_info "  Output Image: $built_tag"
+            [[ -z "$oci_ref" ]] && update_available_images_in_env "$built_tag"
+            journal_record_stage_done "$folder" "$built_tag" "$oci_ref"
+        else
+            stage_state["$folder"]="failed"
+            journal_record_stage_failed "$folder"
+            overall_status=1
+            log_error "Stage '$folder' failed with exit code $stage_rc. See $LOG_DIR/stage-${folder}-${run_id}.log"
+        fi
+    done
+    rm -rf "$status_dir"
+
+    # The last stage in build order that succeeded becomes the final image
+    local leaves=()
+    for folder_path in "${ORDERED_FOLDERS[@]}"; do
+        folder=$(basename "$folder_path")
+        [[ "${stage_state[$folder]}" == "done" || "${stage_state[$folder]}" == "reused" ]] || continue
+        export LAST_SUCCESSFUL_TAG="${stage_tag[$folder]}"
+        [[ -z "$(get_stage_children "$folder")" ]] && leaves+=("${stage_tag[$folder]}")
+    done
+    [[ ${#leaves[@]} -gt 0 ]] && log_info "Leaf images built: ${leaves[*]}"
+
+    if [[ $overall_status -eq 0 ]]; then
+        log_success "--- All Selected Build Stages Completed Successfully ---"
+    else
+        local failed=()
+        for folder in "${!stage_state[@]}"; do
+            [[ "${stage_state[$folder]}" == "failed" || "${stage_state[$folder]}" == "skipped" ]] && failed+=("$folder:${stage_state[$folder]}")
+        done
+        log_error "--- Build Process Finished With Failed Stages: ${failed[*]} ---"
+    fi
+
+    return $overall_status
+}
+
+# =========================================================================
+# Function: Build all selected stages with a single 'docker buildx bake' run
+# The stages become linked targets of one bake file, so BuildKit schedules,
+# dedupes and caches the whole chain in one session and only the leaf images
+# are exported. Stage fingerprints and --squash do not apply in this mode.
+# Relies on global variables: same as build_selected_stages, plus BAKE_USE_GRAPH
+# Exports: LAST_SUCCESSFUL_TAG (last exported image in build order)
+# Returns: 0 if the bake run succeeds, 1 otherwise
+# =========================================================================
+build_selected_stages_bake() {
+    log_info "--- Starting Build Stages (buildx bake) ---"
+    export LAST_SUCCESSFUL_TAG="${LAST_SUCCESSFUL_TAG:-}"
+
+    if [ ${#ORDERED_FOLDERS[@]} -eq 0 ]; then
+        log_warning "No build stages found or selected in ORDERED_FOLDERS. Nothing to build."
+        return 0
+    fi
+
+    [[ "${use_squash:-n}" != "n" || -n "${SQUASH_POLICY:-}" ]] && log_warning "--squash is not supported by buildx bake; squash policies are ignored."
+    [[ "${BUILD_RESUME:-n}" == "y" ]] && log_info "Resume: completed stages are served from the BuildKit cache in bake mode."
+    if [[ "${BAKE_USE_GRAPH:-n}" == "y" ]]; then
+        build_stage_graph || { log_error "Failed to build stage dependency graph."; return 1; }
+    fi
+
+    local run_id
+    run_id=$(date -u +'%Y%m%d-%H%M%S')
+    local bake_file="$LOG_DIR/bake-${run_id}.json"
+    local bake_log="$LOG_DIR/bake-${run_id}.log"
+    generate_bake_plan "$bake_file" || { log_error "Failed to generate bake plan."; return 1; }
+
+    local bake_cmd=("docker" "buildx" "bake" "-f" "$bake_file" "--progress=plain")
+    if [[ "${use_builder:-y}" == "y" ]]; then
+        bake_cmd+=("--builder" "${BUILDER_NAME:-jetson-builder}")
+    else
+        log_warning "buildx bake runs on the current builder; named contexts between stages may need the docker-container driver."
+    fi
+    bake_cmd+=("default")
+
+    log_info "Running Bake Command:"
+    echo "CMD: ${bake_cmd[*]}"
+    log_info "  Bake log: $bake_log"
+    "${bake_cmd[@]}" 2>&1 | tee "$bake_log"
+    local bake_status=${PIPESTATUS[0]}
+    report_stage_cache_hits "bake-${run_id}" "$bake_log"
+
+    if [[ $bake_status -ne 0 ]]; then
+        log_error "--- buildx bake failed with exit code $bake_status. See $bake_log ---"
+        return 1
+    fi
+
+    local folder_path folder
+    for folder_path in "${ORDERED_FOLDERS[@]}"; do
+        finalize_stage_cache "$(basename "$folder_path")"
+    done
+    for folder in "${BAKE_EXPORTED_FOLDERS[@]}"; do
+        export LAST_SUCCESSFUL_TAG="${BAKE_STAGE_TAG[$folder]}"
+        log_success "Stage '$folder' exported: $LAST_SUCCESSFUL_TAG"
+        update_available_images_in_env "$LAST_SUCCESSFUL_TAG"
+        journal_record_stage_done "$folder" "$LAST_SUCCESSFUL_TAG"
+    done
+
+    log_success "--- All Selected Build Stages Completed Successfully ---"
+    return 0
+}
+
 # --- Main Execution (for testing) ---
 if [[ "${BASH_SOURCE[0]}" == "${0}" ]]; then
     # Minimal setup for testing if run directly
@@ -178,6 +525,7 @@ if [[ "${BASH_SOURCE[0]}" == "${0}" ]]; then
     use_builder="y"
     PLATFORM="linux/arm64"
     SELECTED_FOLDERS_LIST="01-first 02-second-fails 03-third"
+    BUILD_JOURNAL_FILE="$(mktemp)" # Keep test records out of the real journal
 
     # --- Test Cases --- #
     log_info ""
@@ -190,6 +538,40 @@ if [[ "${BASH_SOURCE[0]}" == "${0}" ]]; then
     log_info "Test 1 LAST_SUCCESSFUL_TAG: ${LAST_SUCCESSFUL_TAG:-<unset>}"
     echo "--------------------"
 
+    log_info ""
+    log_info "*** Test 2: Dependency graph scheduler with one failure ***"
+    export LOG_DIR="${LOG_DIR:-/tmp}"
+    LAST_SUCCESSFUL_TAG=""
+    BUILD_SCHEDULER="dag"
+    BUILD_MAX_PARALLEL=2
+    if build_selected_stages; then
+         log_success "Test 2 Result: build_selected_stages reported SUCCESS (unexpected)."
+    else
+         log_error "Test 2 Result: build_selected_stages reported FAILURE (expected)."
+    fi
+    log_info "Test 2 LAST_SUCCESSFUL_TAG: ${LAST_SUCCESSFUL_TAG:-<unset>}"
+    BUILD_SCHEDULER="serial"
+    echo "--------------------"
+
+    log_info ""
+    log_info "*** Test 3: Resume after a failure at 02-second-fails ***"
+    resolve_image_digest() { echo "sha256:mock-${1##*:}"; }
+    journal_begin_run
+    journal_record_stage_done "01-first" "mockuser/mockrepo:01-first-success"
+    journal_record_stage_failed "02-second-fails"
+    journal_load_resume_state
+    BUILD_RESUME="y"
+    LAST_SUCCESSFUL_TAG=""
+    if build_selected_stages; then
+         log_success "Test 3 Result: build_selected_stages reported SUCCESS (unexpected)."
+    else
+         log_error "Test 3 Result: build_selected_stages reported FAILURE (expected, 02 fails again)."
+    fi
+    log_info "Test 3 LAST_SUCCESSFUL_TAG: ${LAST_SUCCESSFUL_TAG:-<unset>}"
+    BUILD_RESUME="n"
+    rm -f "$BUILD_JOURNAL_FILE"
+    echo "--------------------"
+
     # ... (rest of tests omitted for brevity) ...
 
     # --- Cleanup --- #
@@ -207,6 +589,6 @@ fi
 # │       └── build_stages.sh    <- THIS FILE
 # └── ...                        <- Other project files
 #
-# Description: Manages the execution of build stages in the correct order.
+# Description: Manages the execution of build stages in order, serially, by dependency graph or as one bake plan, with journaled resume, optional OCI layout handoff, the local wheelhouse and per-stage squash policies (ignored by bake).
 # Author: Mr K / GitHub Copilot
-# COMMIT-TRACKING: UUID-20250425-080000-42595D
+# COMMIT-TRACKING: UUID-20261017-052500-FX28
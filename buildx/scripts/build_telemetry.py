@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+# filepath: /workspaces/jetc/buildx/scripts/build_telemetry.py
+"""
+Per-stage build telemetry.
+
+Stores one row per stage build (wall time, layer cache hits, compiler cache
+hits, pip/apt download volume, image size and size delta, digest) in a local
+SQLite history, and reports stages that got slower or bigger than their previous
+builds. The download volume is recorded as downloaded and served by the shared
+download cache mounts; together they are what the stage downloads without them.
+The squash decision of each build is kept with its reason; the layers measured
+for the 'auto' squash policy (scripts/squash_policy.py) live in stage_layers,
+the memory compile stages used per job (scripts/build_governor.py) in stage_memory.
+
+Usage:
+    build_telemetry.py record  --db DB --run-id ID --stage FOLDER --tag TAG --status built|reused|failed
+                               [--wall-time SECONDS] [--cache-hits N] [--cache-steps N]
+                               [--ccache-hits N] [--ccache-misses N]
+                               [--download-bytes N] [--download-cached-bytes N]
+                               [--squash y|n] [--squash-reason TEXT]
+                               [--metadata-file FILE] [--image-size BYTES] [--oci-layout DIR]
+    build_telemetry.py report  --db DB [--run-id ID] [--window N] [--slower-pct P] [--bigger-pct P]
+    build_telemetry.py summary --db DB --run-id ID --output FILE
+"""
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import sys
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stage_builds (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id      TEXT NOT NULL,
+    stage       TEXT NOT NULL,
+    tag         TEXT,
+    status      TEXT NOT NULL,
+    started_at  REAL NOT NULL,
+    wall_time   REAL,
+    cache_hits  INTEGER,
+    cache_steps INTEGER,
+    image_size  INTEGER,
+    size_delta  INTEGER,
+    digest      TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_stage_builds_stage ON stage_builds (stage, id);
+CREATE INDEX IF NOT EXISTS idx_stage_builds_run ON stage_builds (run_id);
+CREATE TABLE IF NOT EXISTS stage_layers (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id       TEXT NOT NULL,
+    stage        TEXT NOT NULL,
+    position     INTEGER NOT NULL,
+    diff_id      TEXT NOT NULL,
+    size         INTEGER,
+    pull_seconds REAL
+);
+CREATE INDEX IF NOT EXISTS idx_stage_layers_stage ON stage_layers (stage, id);
+CREATE TABLE IF NOT EXISTS stage_memory (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id       TEXT NOT NULL,
+    stage        TEXT NOT NULL,
+    jobs         INTEGER NOT NULL,
+    used_bytes   INTEGER,
+    budget_bytes INTEGER,
+    swap_bytes   INTEGER,
+    oom          INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_stage_memory_stage ON stage_memory (stage, id);
+"""
+
+# Columns added after the first schema; databases of older builds get them on connect
+ADDED_COLUMNS = (
+    ('stage_builds', 'ccache_hits', 'INTEGER'),
+    ('stage_builds', 'ccache_misses', 'INTEGER'),
+    ('stage_builds', 'download_bytes', 'INTEGER'),
+    ('stage_builds', 'download_cached_bytes', 'INTEGER'),
+    ('stage_builds', 'squash', 'TEXT'),
+    ('stage_builds', 'squash_reason', 'TEXT'),
+    ('stage_layers', 'squashed', 'INTEGER NOT NULL DEFAULT 0'),
+)
+
+
+def connect(db_path):
+    """Open (and create if needed) the telemetry database."""
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    # Parallel stages (BUILD_SCHEDULER=dag) record concurrently; wait for the lock
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    existing = {}
+    for table, name, sql_type in ADDED_COLUMNS:
+        if table not in existing:
+            existing[table] = {row['name'] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if name not in existing[table]:
+            try:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {sql_type}")
+            except sqlite3.OperationalError:
+                pass  # added by a stage recording in parallel
+    return conn
+
+
+def read_metadata(path):
+    """Return the digest recorded by 'docker buildx build --metadata-file'."""
+    if not path or not os.path.isfile(path):
+        return None
+    try:
+        with open(path) as f:
+            metadata = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return metadata.get('containerimage.digest') or metadata.get('containerimage.config.digest')
+
+
+def oci_layout_size(layout_dir):
+    """Sum of config and layer sizes of the image stored in an OCI layout directory."""
+    try:
+        with open(os.path.join(layout_dir, 'index.json')) as f:
+            index = json.load(f)
+        algo, digest = index['manifests'][0]['digest'].split(':', 1)
+        with open(os.path.join(layout_dir, 'blobs', algo, digest)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError, KeyError, IndexError):
+        return None
+    return manifest.get('config', {}).get('size', 0) + sum(layer.get('size', 0) for layer in manifest.get('layers', []))
+
+
+def previous_builds(conn, stage, before_id, window):
+    """Last `window` real builds (not reused/failed) of a stage before row `before_id`."""
+    return conn.execute(
+        "SELECT * FROM stage_builds WHERE stage = ? AND id < ? AND status = 'built' "
+        "ORDER BY id DESC LIMIT ?", (stage, before_id, window)).fetchall()
+
+
+def cmd_record(args):
+    image_size = args.image_size
+    if image_size is None and args.oci_layout:
+        image_size = oci_layout_size(args.oci_layout)
+    digest = read_metadata(args.metadata_file) or args.digest
+
+    with connect(args.db) as conn:
+        size_delta = None
+        if image_size is not None:
+            row = conn.execute(
+                "SELECT image_size FROM stage_builds WHERE stage = ? AND status = 'built' "
+                "AND image_size IS NOT NULL ORDER BY id DESC LIMIT 1", (args.stage,)).fetchone()
+            if row:
+                size_delta = image_size - row['image_size']
+        conn.execute(
+            "INSERT INTO stage_builds (run_id, stage, tag, status, started_at, wall_time, cache_hits, "
+            "cache_steps, ccache_hits, ccache_misses, download_bytes, download_cached_bytes, image_size, "
+            "size_delta, digest, squash, squash_reason) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (args.run_id, args.stage, args.tag, args.status, time.time() - (args.wall_time or 0),
+             args.wall_time, args.cache_hits, args.cache_steps, args.ccache_hits, args.ccache_misses,
+             args.download_bytes, args.download_cached_bytes, image_size, size_delta, digest,
+             args.squash, args.squash_reason))
+    return 0
+
+
+def find_regressions(conn, rows, window, slower_pct, bigger_pct):
+    """Yield (row, reasons) for rows slower/bigger than the median of their previous builds."""
+    for row in rows:
+        if row['status'] != 'built':
+            continue
+        history = previous_builds(conn, row['stage'], row['id'], window)
+        if not history:
+            continue
+        reasons = []
+        times = [h['wall_time'] for h in history if h['wall_time']]
+        if row['wall_time'] and times:
+            baseline = statistics.median(times)
+            if row['wall_time'] > baseline * (1 + slower_pct / 100.0):
+                reasons.append(f"slower: {row['wall_time']:.0f}s vs median {baseline:.0f}s of last {len(times)}")
+        sizes = [h['image_size'] for h in history if h['image_size']]
+        if row['image_size'] and sizes:
+            baseline = statistics.median(sizes)
+            if row['image_size'] > baseline * (1 + bigger_pct / 100.0):
+                reasons.append(f"bigger: {human_size(row['image_size'])} vs median {human_size(baseline)} of last {len(sizes)}")
+        if reasons:
+            yield row, reasons
+
+
+def run_rows(conn, run_id):
+    """Rows of one run (default: the latest run) in build order."""
+    if not run_id:
+        latest = conn.execute("SELECT run_id FROM stage_builds ORDER BY id DESC LIMIT 1").fetchone()
+        if not latest:
+            return None, []
+        run_id = latest['run_id']
+    return run_id, conn.execute("SELECT * FROM stage_builds WHERE run_id = ? ORDER BY id", (run_id,)).fetchall()
+
+
+def human_size(size):
+    if size is None:
+        return '-'
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(size) < 1024 or unit == 'GB':
+            return f"{size:.0f}{unit}" if unit == 'B' else f"{size:.1f}{unit}"
+        size /= 1024.0
+
+
+def format_downloads(downloaded, cached):
+    """'12.0MB of 820.0MB': downloaded, and what it would have been without the download cache."""
+    total = (downloaded or 0) + (cached or 0)
+    return f"{human_size(downloaded or 0)} of {human_size(total)}" if total else '-'
+
+
+def download_totals(rows):
+    """(downloaded, served from the cache) over the rows of a run."""
+    return (sum(r['download_bytes'] or 0 for r in rows), sum(r['download_cached_bytes'] or 0 for r in rows))
+
+
+def format_squash(row):
+    """'y' / 'n' as declared, 'auto:y' / 'auto:n' when decided by the 'auto' policy."""
+    if not row['squash']:
+        return '-'
+    return row['squash'] if row['squash_reason'] in (None, '', 'policy') else f"auto:{row['squash']}"
+
+
+def squash_decisions(rows):
+    """(stage, 'y'/'n', reason) of the stages whose squash was decided by the 'auto' policy."""
+    return [(r['stage'], r['squash'], r['squash_reason']) for r in rows
+            if r['squash'] and r['squash_reason'] not in (None, '', 'policy')]
+
+
+def format_row(row):
+    hits = f"{row['cache_hits']}/{row['cache_steps']}" if row['cache_steps'] else '-'
+    compiled = (row['ccache_hits'] or 0) + (row['ccache_misses'] or 0)
+    ccache = f"{row['ccache_hits']}/{compiled} ({row['ccache_hits'] * 100 // compiled}%)" if compiled else '-'
+    wall = f"{row['wall_time']:.0f}s" if row['wall_time'] is not None else '-'
+    delta = '-' if row['size_delta'] is None else ('+' if row['size_delta'] >= 0 else '-') + human_size(abs(row['size_delta']))
+    downloads = format_downloads(row['download_bytes'], row['download_cached_bytes'])
+    return [row['stage'], row['status'], wall, hits, ccache, downloads, format_squash(row),
+            human_size(row['image_size']), delta, (row['digest'] or '-')[:19]]
+
+
+def cmd_report(args):
+    with connect(args.db) as conn:
+        run_id, rows = run_rows(conn, args.run_id)
+        if not rows:
+            print("No telemetry recorded yet.")
+            return 0
+        print(f"Build telemetry for run {run_id}:")
+        header = ['STAGE', 'STATUS', 'WALL', 'CACHED', 'CCACHE', 'DOWNLOADED', 'SQUASH', 'SIZE', 'DELTA', 'DIGEST']
+        table = [header] + [format_row(r) for r in rows]
+        widths = [max(len(line[i]) for line in table) for i in range(len(header))]
+        for line in table:
+            print('  ' + '  '.join(col.ljust(w) for col, w in zip(line, widths)))
+        downloaded, cached = download_totals(rows)
+        if downloaded or cached:
+            print(f"Downloads: {format_downloads(downloaded, cached)} without the download cache")
+        for stage, squash, reason in squash_decisions(rows):
+            print(f"Squash {stage}: {'merged' if squash == 'y' else 'kept layers'} - {reason}")
+
+        regressions = list(find_regressions(conn, rows, args.window, args.slower_pct, args.bigger_pct))
+        if regressions:
+            print(f"Regressions against the previous {args.window} builds:")
+            for row, reasons in regressions:
+                print(f"  REGRESSION {row['stage']}: {'; '.join(reasons)}")
+        else:
+            print("No regressions against the previous builds.")
+    return 0
+
+
+def cmd_summary(args):
+    with connect(args.db) as conn:
+        run_id, rows = run_rows(conn, args.run_id)
+        regressions = {row['id']: reasons for row, reasons in find_regressions(conn, rows, args.window, args.slower_pct, args.bigger_pct)}
+    with open(args.output, 'w') as f:
+        f.write(f"# Build Summary Log - {run_id}\n\n")
+        f.write("## Build Information\n")
+        f.write(f"- Date: {time.strftime('%a %b %d %H:%M:%S %Z %Y')}\n")
+        f.write(f"- Build ID: {run_id}\n\n")
+        f.write("## Build Stages\n\n")
+        if rows:
+            f.write("| Stage | Status | Wall time | Cached steps | Compiler cache hits | Downloaded (of total without cache) "
+                    "| Squash | Size | Size delta | Digest |\n")
+            f.write("|---|---|---|---|---|---|---|---|---|---|\n")
+            for row in rows:
+                f.write('| ' + ' | '.join(format_row(row)) + ' |\n')
+            downloaded, cached = download_totals(rows)
+            if downloaded or cached:
+                f.write(f"\nDownloads: {format_downloads(downloaded, cached)} without the download cache "
+                        f"({human_size(cached)} served from the cache).\n")
+            decisions = squash_decisions(rows)
+            if decisions:
+                f.write("\n## Squash Decisions\n\n")
+                for stage, squash, reason in decisions:
+                    f.write(f"- {stage}: {'merged' if squash == 'y' else 'kept layers'} - {reason}\n")
+        if regressions:
+            f.write("\n## Regressions\n\n")
+            for row in rows:
+                if row['id'] in regressions:
+                    f.write(f"- {row['stage']}: {'; '.join(regressions[row['id']])}\n")
+    print(args.output)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-stage build telemetry")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    record = sub.add_parser('record', help="record one stage build")
+    record.add_argument('--db', required=True)
+    record.add_argument('--run-id', required=True)
+    record.add_argument('--stage', required=True)
+    record.add_argument('--tag')
+    record.add_argument('--status', required=True, choices=['built', 'reused', 'failed'])
+    record.add_argument('--wall-time', type=float)
+    record.add_argument('--cache-hits', type=int)
+    record.add_argument('--cache-steps', type=int)
+    record.add_argument('--ccache-hits', type=int, help="compiler cache hits reported by the stage")
+    record.add_argument('--ccache-misses', type=int)
+    record.add_argument('--download-bytes', type=int, help="pip/apt bytes downloaded by the stage")
+    record.add_argument('--download-cached-bytes', type=int, help="pip/apt bytes served by the download cache")
+    record.add_argument('--squash', choices=['y', 'n'], help="whether the stage was built with --squash")
+    record.add_argument('--squash-reason', help="'policy' when declared, the reason of the 'auto' decision otherwise")
+    record.add_argument('--metadata-file')
+    record.add_argument('--digest')
+    record.add_argument('--image-size', type=int)
+    record.add_argument('--oci-layout')
+    record.set_defaults(func=cmd_record)
+
+    for name, func in (('report', cmd_report), ('summary', cmd_summary)):
+        cmd = sub.add_parser(name, help=f"{name} of a build run")
+        cmd.add_argument('--db', required=True)
+        cmd.add_argument('--run-id')
+        cmd.add_argument('--window', type=int, default=5, help="number of previous builds to compare with")
+        cmd.add_argument('--slower-pct', type=float, default=20.0)
+        cmd.add_argument('--bigger-pct', type=float, default=10.0)
+        if name == 'summary':
+            cmd.add_argument('--output', required=True)
+        cmd.set_defaults(func=func)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+# --- Footer ---
+# File location diagram:
+# jetc/                          <- Main project folder
+# ├── buildx/                    <- Parent directory
+# │   └── scripts/               <- Current directory
+# │       └── build_telemetry.py <- THIS FILE
+# └── ...                        <- Other project files
+#
+# Description: SQLite history of per-stage build metrics (layer and compiler cache hits, download volume, squash decision, size, digest), measured stage layers and the memory per compile job, with regression reports.
+# Author: Mr K / GitHub Copilot
+# COMMIT-TRACKING: UUID-20261017-044000-FX19
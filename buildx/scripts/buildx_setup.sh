@@ -4,6 +4,8 @@
 # =========================================================================
 # Docker Buildx Setup Script
 # Responsibility: Ensure the specified Buildx builder instance exists and is used.
+#                 With USE_BASE_MIRROR=y the base image mirror is started first
+#                 and the builder is (re)created to pull Docker Hub images from it.
 # Relies on logging functions sourced by the main script and BUILDER_NAME from env_setup.sh.
 # =========================================================================
 
@@ -26,6 +28,16 @@ else
     log_debug() { :; }
     BUILDER_NAME="jetson-builder" # Fallback
 fi
+# base_mirror provides start_base_mirror and the builder configuration that uses it
+if [ -f "$SCRIPT_DIR_BUILDX_SETUP/base_mirror.sh" ]; then
+    # shellcheck disable=SC1091
+    source "$SCRIPT_DIR_BUILDX_SETUP/base_mirror.sh"
+else
+    start_base_mirror() { export BASE_MIRROR_HOST=""; return 0; }
+    get_base_mirror_builder_config() { return 0; }
+    prefetch_stage_bases() { return 0; }
+    finish_base_prefetch() { return 0; }
+fi
 
 # --- Functions ---\
 
@@ -58,7 +70,11 @@ create_builder_if_not_exists() {
     fi
 
     log_info "Buildx builder '$builder_name' not found. Attempting to create..."
-    if docker buildx create --name "$builder_name" --driver docker-container --use --bootstrap; then
+    local config_args=()
+    local config_file
+    config_file=$(get_builder_config_file "$builder_name")
+    [[ -f "$config_file" ]] && config_args=("--config" "$config_file")
+    if docker buildx create --name "$builder_name" --driver docker-container "${config_args[@]}" --use --bootstrap; then
         log_success " -> Successfully created and selected builder '$builder_name'." # Uses global log_success
         # Verify creation just in case
         if check_builder_exists "$builder_name"; then
@@ -74,6 +90,40 @@ create_builder_if_not_exists() {
     fi
 }
 
+# Path of the buildkitd configuration a builder is created with
+# Input: $1 = builder_name
+# Return: path to stdout (the file only exists while a base image mirror is configured)
+get_builder_config_file() {
+    echo "${BASE_MIRROR_DIR:-$SCRIPT_DIR_BUILDX_SETUP/../.buildcache/base-mirror}/buildkitd-$1.toml"
+}
+
+# Bring the builder's buildkitd configuration in line with the base image mirror
+# The configuration is only read when a builder is created, so an existing
+# builder created with another one is removed (keeping its state volume, so the
+# build cache survives) and created again by create_builder_if_not_exists.
+# Input: $1 = builder_name
+# Return: 0 on success, 1 if the outdated builder could not be removed
+sync_builder_config() {
+    local builder_name="$1"
+    local config_file wanted current
+    config_file=$(get_builder_config_file "$builder_name")
+    wanted=$(get_base_mirror_builder_config)
+    current=$(cat "$config_file" 2>/dev/null || true)
+    [[ "$wanted" == "$current" ]] && return 0
+
+    if check_builder_exists "$builder_name"; then
+        log_info "Base image mirror changed; recreating builder '$builder_name' (build cache is kept)."
+        docker buildx rm --keep-state "$builder_name" > /dev/null || { log_error " -> Failed to remove builder '$builder_name'."; return 1; }
+    fi
+    if [[ -n "$wanted" ]]; then
+        mkdir -p "$(dirname "$config_file")"
+        echo "$wanted" > "$config_file"
+    else
+        rm -f "$config_file"
+    fi
+    return 0
+}
+
 # Ensure the specified builder is the current one being used
 # Input: $1 = builder_name
 # Return: 0 on success, 1 on failure
@@ -106,6 +156,11 @@ setup_buildx() {
 
     log_info "Target builder instance: '$BUILDER_NAME'"
 
+    start_base_mirror
+    if ! sync_builder_config "$BUILDER_NAME"; then
+        log_warning "Builder '$BUILDER_NAME' keeps its previous registry configuration."
+    fi
+
     if ! create_builder_if_not_exists "$BUILDER_NAME"; then
         log_error "Buildx setup failed: Could not ensure builder '$BUILDER_NAME' exists."
         return 1
@@ -149,6 +204,6 @@ fi
 # │       └── buildx_setup.sh    <- THIS FILE
 # └── ...                        <- Other project files
 #
-# Description: Sets up and configures Docker Buildx.
+# Description: Sets up and configures Docker Buildx, including the builder's use of the base image mirror.
 # Author: Mr K / GitHub Copilot
-# COMMIT-TRACKING: UUID-20250425-080000-42595D
+# COMMIT-TRACKING: UUID-20261017-024500-MIRR
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# filepath: /workspaces/jetc/buildx/scripts/compression_bench.py
+"""
+Pull and start-time benchmark of an image for each layer compression format.
+
+'export' pushes a variant of the image per format, tagged '<tag>-<format>', with
+every layer recompressed ('FROM IMAGE' built with force-compression: nothing
+is rebuilt). 'run' measures each variant on the host it runs on, after
+removing the variant locally:
+
+    pull    seconds to pull the variant
+    start   seconds of 'run --rm' with --command (default 'true'): container
+            creation and start, plus the files an eStargz image fetches lazily
+
+Formats: gzip (the default of docker push), zstd (faster to decompress; needs
+Docker 23+ or containerd 1.5+) and estargz (seekable gzip). Docker pulls
+eStargz like gzip; with '--runtime nerdctl --snapshotter stargz' the pull
+only fetches the manifest and the table of contents of each layer, and files
+are fetched when the container reads them.
+
+Layers are stored by their uncompressed digest, so a variant is not pulled
+again over local images that share its layers (the image itself, its stage
+images, their bases). A format is only measured on a host without such
+images: a device that does not hold the image, or any host with
+--remove-shared, which removes them first. Run it on demand, not on the build
+host after a build: IMAGE itself is never removed, so it would share every
+layer there.
+
+Usage:
+    compression_bench.py export IMAGE [--formats gzip,zstd,estargz] [--level N] [--platform P]
+    compression_bench.py run IMAGE [--formats gzip,zstd,estargz] [--runs N] [--platform P]
+                         [--runtime docker|nerdctl] [--snapshotter NAME] [--command CMD]
+                         [--run-arg ARG]... [--remove-shared] [--json FILE]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from build_telemetry import human_size
+from layer_analyzer import RegistrySource
+from package_index import log_warning
+from registry import RegistryError, image_size
+
+FORMATS = ('gzip', 'zstd', 'estargz')
+
+
+def parse_formats(value):
+    formats = [name for name in value.replace(',', ' ').split() if name]
+    unknown = [name for name in formats if name not in FORMATS]
+    if unknown or not formats:
+        raise argparse.ArgumentTypeError(f"formats are {', '.join(FORMATS)} (got {value!r})")
+    return formats
+
+
+def variant_ref(image, compression):
+    """'kairin/001:final' -> 'kairin/001:final-zstd'"""
+    if '@' in image:
+        raise ValueError(f"{image}: variants need a tag, not a digest")
+    name, tag = image, 'latest'
+    if ':' in image.rsplit('/', 1)[-1]:
+        name, tag = image.rsplit(':', 1)
+    return f"{name}:{tag}-{compression}"
+
+
+def export_variant(image, ref, compression, level, platform):
+    """Push `image` as `ref` with every layer compressed as `compression`; returns True on success."""
+    output = f"type=registry,name={ref},compression={compression},force-compression=true,oci-mediatypes=true"
+    if level is not None:
+        output += f",compression-level={level}"
+    result = subprocess.run(['docker', 'buildx', 'build', '--platform', platform, '--output', output, '-'],
+                            input=f"FROM {image}\n", text=True)
+    return result.returncode == 0
+
+
+def runtime_command(args):
+    return [args.runtime] + (['--snapshotter', args.snapshotter] if args.snapshotter else [])
+
+
+def timed(command):
+    """Seconds a command takes; raises OSError when it fails."""
+    start = time.monotonic()
+    result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        lines = result.stderr.strip().splitlines()
+        raise OSError(f"{' '.join(command[:3])} ...: {lines[-1] if lines else f'exit code {result.returncode}'}")
+    return time.monotonic() - start
+
+
+def remove_images(runtime, refs):
+    subprocess.run(runtime + ['image', 'rm', '-f'] + list(refs), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def images_sharing(runtime, diff_ids):
+    """IDs of the local images whose layers include the first layer of `diff_ids`."""
+    listed = subprocess.run(runtime + ['image', 'ls', '-q'], capture_output=True, text=True).stdout.split()
+    if not listed or not diff_ids:
+        return []
+    result = subprocess.run(runtime + ['image', 'inspect', '--format', '{{.Id}} {{json .RootFS.Layers}}'] + sorted(set(listed)),
+                            capture_output=True, text=True)
+    sharing = []
+    for line in result.stdout.splitlines():
+        image_id, _, layers = line.partition(' ')
+        try:
+            if diff_ids[0] in (json.loads(layers) or []):
+                sharing.append(image_id)
+        except ValueError:
+            continue
+    return sharing
+
+
+def compressed_size(ref, platform):
+    try:
+        return image_size(ref, platform)
+    except (RegistryError, OSError) as error:
+        log_warning(f"cannot read the size of {ref}: {error}")
+        return None
+
+
+def cmd_export(args):
+    status = 0
+    for compression in args.formats:
+        ref = variant_ref(args.image, compression)
+        if not export_variant(args.image, ref, compression, args.level, args.platform):
+            log_warning(f"failed to push {ref}")
+            status = 1
+            continue
+        print(f"{ref}: {human_size(compressed_size(ref, args.platform))}", flush=True)
+    return status
+
+
+def cmd_run(args):
+    runtime = runtime_command(args)
+    refs = {compression: variant_ref(args.image, compression) for compression in args.formats}
+    results = []
+    for compression, ref in refs.items():
+        try:
+            diff_ids = RegistrySource(ref, args.platform).diff_ids()
+        except (RegistryError, OSError) as error:
+            log_warning(f"skipping {compression}: {error} (push the variants with 'export' first)")
+            continue
+        remove_images(runtime, refs.values())
+        shared = images_sharing(runtime, diff_ids)
+        if shared and args.remove_shared:
+            remove_images(runtime, shared)
+            shared = images_sharing(runtime, diff_ids)
+        if shared:
+            log_warning(f"skipping {compression}: {len(shared)} local image(s) share layers with {ref}, which would "
+                        f"not be pulled (run on a device without them, or with --remove-shared): "
+                        f"{' '.join(image_id[:19] for image_id in shared)}")
+            continue
+
+        entry = {'format': compression, 'ref': ref, 'size': compressed_size(ref, args.platform),
+                 'pull_seconds': [], 'start_seconds': []}
+        for run in range(args.runs):
+            if run:
+                remove_images(runtime, [ref])
+            try:
+                entry['pull_seconds'].append(timed(runtime + ['pull', '--quiet', ref]))
+                entry['start_seconds'].append(timed(runtime + ['run', '--rm'] + args.run_arg
+                                                    + ['--entrypoint', 'sh', ref, '-c', args.command]))
+            except OSError as error:
+                log_warning(f"{ref}: {error}")
+                del entry['pull_seconds'][len(entry['start_seconds']):]
+                break
+        remove_images(runtime, [ref])
+        if entry['start_seconds']:
+            results.append(entry)
+        print(f"{ref}: measured {len(entry['start_seconds'])} run(s)", file=sys.stderr, flush=True)
+
+    print_results(args, results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'image': args.image, 'runtime': ' '.join(runtime), 'command': args.command,
+                       'platform': args.platform, 'results': results}, f, indent=2)
+    return 0 if len(results) == len(refs) else 1
+
+
+def print_results(args, results):
+    print(f"# Compression benchmark: {args.image}")
+    print(f"Runtime: {' '.join(runtime_command(args))}, {args.runs} run(s) per format (medians), command: {args.command}")
+    print()
+    print(f"{'FORMAT':<9} {'SIZE':>9} {'PULL':>9} {'START':>9} {'TOTAL':>9} {'VS GZIP':>8}")
+    totals = {}
+    for entry in results:
+        pull = statistics.median(entry['pull_seconds'])
+        start = statistics.median(entry['start_seconds'])
+        totals[entry['format']] = pull + start
+        versus = f"{totals[entry['format']] / totals['gzip'] * 100:.0f}%" if totals.get('gzip') else '-'
+        print(f"{entry['format']:<9} {human_size(entry['size']):>9} {pull:>8.1f}s {start:>8.1f}s "
+              f"{pull + start:>8.1f}s {versus:>8}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pull and start-time benchmark per layer compression format")
+    sub = parser.add_subparsers(dest='command_name', required=True)
+
+    cmd = sub.add_parser('export', help="push a '<tag>-<format>' variant of the image per format")
+    cmd.add_argument('image')
+    cmd.add_argument('--formats', type=parse_formats, default=list(FORMATS))
+    cmd.add_argument('--level', type=int, help="compression level (default: the format's)")
+    cmd.add_argument('--platform', default=os.environ.get('PLATFORM') or 'linux/arm64')
+    cmd.set_defaults(func=cmd_export)
+
+    cmd = sub.add_parser('run', help="measure pull and start time of the variants on this host")
+    cmd.add_argument('image')
+    cmd.add_argument('--formats', type=parse_formats, default=list(FORMATS))
+    cmd.add_argument('--runs', type=int, default=3)
+    cmd.add_argument('--platform', default=os.environ.get('PLATFORM') or 'linux/arm64')
+    cmd.add_argument('--runtime', choices=['docker', 'nerdctl'], default='docker')
+    cmd.add_argument('--snapshotter', help="nerdctl snapshotter ('stargz' pulls eStargz images lazily)")
+    cmd.add_argument('--command', default='true', help="shell command the container runs (default: 'true')")
+    cmd.add_argument('--run-arg', action='append', default=[], help="extra argument of 'run' (e.g. --run-arg=--runtime=nvidia)")
+    cmd.add_argument('--remove-shared', action='store_true', help="remove local images that share layers with the variants (the measurement needs a clean host)")
+    cmd.add_argument('--json', help="also write the measurements to this file")
+    cmd.set_defaults(func=cmd_run)
+
+    args = parser.parse_args(argv)
+    try:
+        return args.func(args)
+    except ValueError as error:
+        log_warning(str(error))
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+# --- Footer ---
+# File location diagram:
+# jetc/                          <- Main project folder
+# ├── buildx/                    <- Parent directory
+# │   └── scripts/               <- Current directory
+# │       └── compression_bench.py <- THIS FILE
+# └── ...                        <- Other project files
+#
+# Description: Pushes gzip, zstd and eStargz variants of an image and measures their pull and container start times on a device.
+# Author: Mr K / GitHub Copilot
+# COMMIT-TRACKING: UUID-20261017-045500-FX22
@@ -60,19 +60,918 @@ verify_image_exists() {
 }
 
 
+# =========================================================================
+# Function: Read a label from an image (local daemon first, then registry)
+# Arguments: $1 = image tag, $2 = label key
+# Returns: Label value to stdout (empty if image or label not found)
+# =========================================================================
+get_image_label() {
+    local image_tag="$1"
+    local label_key="$2"
+    local value=""
+    if docker image inspect "$image_tag" &> /dev/null; then
+        value=$(docker image inspect --format "{{ index .Config.Labels \"$label_key\" }}" "$image_tag" 2>/dev/null || true)
+        [[ "$value" == "<no value>" ]] && value=""
+    else
+        # Image may only exist in the registry (push mode); read its config there
+        value=$(docker buildx imagetools inspect --format '{{json .Image}}' "$image_tag" 2>/dev/null \
+            | grep -o "\"${label_key//./\\.}\":\"[^\"]*\"" | head -n 1 | cut -d'"' -f4 || true)
+    fi
+    echo "$value"
+}
+
+# =========================================================================
+# Function: Resolve an image tag to a content digest
+# Arguments: $1 = image tag (or an oci-layout://<dir>@<digest> handoff reference)
+# Returns: Local image ID, registry manifest digest or OCI layout digest to stdout.
+#          Falls back to the tag itself (with a warning) when none can be resolved.
+# =========================================================================
+resolve_image_digest() {
+    local image_tag="$1"
+    local digest=""
+    # OCI layout handoff reference (oci-layout://<dir>@<digest>): valid while the layout still holds it
+    if [[ "$image_tag" == oci-layout://*@sha256:* ]]; then
+        local layout_dir="${image_tag#oci-layout://}"
+        layout_dir="${layout_dir%@*}"
+        if grep -q "${image_tag##*@}" "$layout_dir/index.json" 2>/dev/null; then
+            echo "${image_tag##*@}"
+            return 0
+        fi
+    fi
+    digest=$(docker image inspect --format '{{.Id}}' "$image_tag" 2>/dev/null || true)
+    if [[ -z "$digest" ]]; then
+        digest=$(docker buildx imagetools inspect --format '{{.Manifest.Digest}}' "$image_tag" 2>/dev/null || true)
+    fi
+    if [[ -z "$digest" ]]; then
+        log_warning "Could not resolve digest for '$image_tag'; using the tag name instead."
+        digest="$image_tag"
+    fi
+    echo "$digest"
+}
+
+# =========================================================================
+# Function: Get the manifest digest of an image in its registry
+# A HEAD request (scripts/registry.py) answers it without pulling anything;
+# 'docker buildx imagetools inspect' is the fallback without python3.
+# Arguments: $1 = image tag
+# Returns: sha256 digest to stdout, exit code 1 if the registry has no such tag
+# =========================================================================
+get_registry_digest() {
+    local image_tag="$1"
+    local digest=""
+    if command -v python3 > /dev/null 2>&1; then
+        digest=$(python3 "$SCRIPT_DIR_DOCKER/registry.py" digest "$image_tag" 2>/dev/null || true)
+    fi
+    if [[ "$digest" != sha256:* ]]; then
+        digest=$(docker buildx imagetools inspect --format '{{.Manifest.Digest}}' "$image_tag" 2>/dev/null || true)
+    fi
+    [[ "$digest" == sha256:* ]] || return 1
+    echo "$digest"
+}
+
+# =========================================================================
+# Function: Make the local image of a pushed tag the one its registry serves
+# A local image under the tag may be an older build: unless its RepoDigests
+# contain the digest the registry serves for the tag, the image is pulled.
+# Arguments: $1 = image tag
+# Returns: 0 if the local image is current (or was pulled), 1 otherwise
+# =========================================================================
+sync_local_image() {
+    local image_tag="$1"
+    local registry_digest
+    if ! registry_digest=$(get_registry_digest "$image_tag"); then
+        log_warning "Cannot resolve $image_tag in the registry; the local image (if any) is used as is."
+        verify_image_exists "$image_tag"
+        return
+    fi
+    local repo_digests
+    repo_digests=$(docker image inspect --format '{{join .RepoDigests "\n"}}' "$image_tag" 2>/dev/null || true)
+    if grep -q "@${registry_digest}\$" <<< "$repo_digests"; then
+        log_debug " -> Local $image_tag is the registry's $registry_digest."
+        return 0
+    fi
+    log_info "Local $image_tag is missing or not the registry's $registry_digest."
+    pull_image "$image_tag"
+}
+
+# =========================================================================
+# Function: Get the manifest digest a buildx build pushed, from its --metadata-file
+# Arguments: $1 = metadata file
+# Returns: sha256 digest to stdout (nothing if the file has none)
+# =========================================================================
+get_metadata_digest() {
+    [[ -s "${1:-}" ]] || return 0
+    grep -o '"containerimage.digest"[[:space:]]*:[[:space:]]*"sha256:[0-9a-f]*"' "$1" 2>/dev/null \
+        | grep -o 'sha256:[0-9a-f]*' | head -n 1 || true
+}
+
+# =========================================================================
+# Function: Verify a pushed image by comparing manifest digests
+# Replaces pulling the image back: the registry must serve the digest the
+# build pushed for the tag.
+# Arguments: $1 = image tag, $2 = expected digest (optional: then the tag only has to exist)
+# Returns: 0 if verified, 1 otherwise
+# =========================================================================
+verify_pushed_image() {
+    local image_tag="$1"
+    local expected_digest="${2:-}"
+    local digest
+    if ! digest=$(get_registry_digest "$image_tag"); then
+        log_error " -> $image_tag not found in the registry."
+        return 1
+    fi
+    if [[ -n "$expected_digest" && "$digest" != "$expected_digest" ]]; then
+        log_error " -> Registry serves $digest for $image_tag, but $expected_digest was pushed."
+        return 1
+    fi
+    log_success " -> Verified $image_tag in the registry: $digest"
+    return 0
+}
+
+# =========================================================================
+# Function: Tag an image in its registry without moving its layers
+# The target tag gets a copy of the source manifest (scripts/registry.py
+# retag; 'docker buildx imagetools create' without python3 or across registries).
+# Arguments: $1 = source image tag, $2 = target image tag
+# Returns: 0 on success (target verified to serve the source digest), 1 otherwise
+# =========================================================================
+retag_registry_image() {
+    local source_tag="$1"
+    local target_tag="$2"
+    local source_digest
+    if ! source_digest=$(get_registry_digest "$source_tag"); then
+        log_error "Cannot retag: $source_tag not found in the registry."
+        return 1
+    fi
+    if ! { command -v python3 > /dev/null 2>&1 && python3 "$SCRIPT_DIR_DOCKER/registry.py" retag "$source_tag" "$target_tag" > /dev/null; }; then
+        log_debug "Manifest retag via registry.py failed; trying docker buildx imagetools create."
+        docker buildx imagetools create --tag "$target_tag" "$source_tag" > /dev/null || return 1
+    fi
+    verify_pushed_image "$target_tag" "$source_digest"
+}
+
+# =========================================================================
+# Function: Get the compression attributes of a pushed image output
+# gzip (the default) keeps buildx's plain --push. zstd and estargz (seekable
+# gzip that devices with the stargz snapshotter pull lazily) recompress every
+# layer, inherited base layers included, and need OCI media types.
+# Arguments: $1 = compression (default IMAGE_COMPRESSION),
+#            $2 = 'y' to recompress gzip layers too (default 'n')
+# Returns: ',compression=...' output attributes to stdout (nothing for gzip)
+# =========================================================================
+get_image_compression_attrs() {
+    local compression="${1:-${IMAGE_COMPRESSION:-gzip}}"
+    local force="${2:-n}"
+    case "$compression" in
+        gzip) [[ "$force" == "y" ]] || return 0 ;;
+        zstd|estargz) ;;
+        *) log_warning "Unknown image compression '$compression'; pushing gzip layers."; return 0 ;;
+    esac
+    local attrs=",compression=$compression,force-compression=true,oci-mediatypes=true"
+    [[ -n "${IMAGE_COMPRESSION_LEVEL:-}" ]] && attrs+=",compression-level=$IMAGE_COMPRESSION_LEVEL"
+    echo "$attrs"
+}
+
+# =========================================================================
+# Function: Push a copy of an image with its layers recompressed
+# Builds 'FROM source' (nothing is rebuilt: the layers come from the builder's
+# cache or the registry) and pushes it as target with every layer compressed
+# in the given format.
+# Arguments: $1 = source image tag, $2 = target image tag, $3 = gzip, zstd or estargz
+# Returns: 0 on success (target verified in the registry), 1 otherwise
+# =========================================================================
+export_image_variant() {
+    local source_tag="$1"
+    local target_tag="$2"
+    local compression="$3"
+    local attrs
+    attrs=$(get_image_compression_attrs "$compression" y)
+    log_info "Pushing $target_tag: $source_tag with $compression layers"
+    if ! printf 'FROM %s\n' "$source_tag" | docker buildx build --platform "${PLATFORM:-linux/arm64}" \
+            --output "type=registry,name=${target_tag}${attrs}" -; then
+        log_error "Failed to push $target_tag with $compression layers."
+        return 1
+    fi
+    verify_pushed_image "$target_tag"
+}
+
+# =========================================================================
+# Function: Compute the content fingerprint of a build stage
+# Arguments: $1 = folder_path (build context)
+#            $2 = base_image_tag
+#            $3.. = build settings that affect the result (build args, platform, flags)
+# Returns: sha256 fingerprint to stdout
+# =========================================================================
+compute_stage_fingerprint() {
+    local folder_path="$1"
+    local base_image_tag="$2"
+    shift 2
+
+    hash_stage_fingerprint "$folder_path" "$(resolve_image_digest "$base_image_tag")" "$@"
+}
+
+# =========================================================================
+# Function: Hash a stage fingerprint from an already resolved base image digest
+# Arguments: $1 = folder_path (build context), $2 = base image digest,
+#            $3.. = build settings (as for compute_stage_fingerprint)
+# Returns: sha256 fingerprint to stdout
+# =========================================================================
+hash_stage_fingerprint() {
+    local folder_path="$1"
+    local base_digest="$2"
+    shift 2
+
+    local context_hash scripts_context scripts_hash=""
+    context_hash=$(cd "$folder_path" && find . -type f -print0 | LC_ALL=C sort -z | xargs -0 -r sha256sum | sha256sum | cut -d' ' -f1)
+    # The shared RUN-step helpers the stage mounts are part of its inputs too
+    scripts_context=$(get_stage_scripts_context "$folder_path")
+    [[ -n "$scripts_context" ]] && scripts_hash=$(cd "$scripts_context" && find . -type f -print0 | LC_ALL=C sort -z | xargs -0 -r sha256sum | sha256sum | cut -d' ' -f1)
+
+    {
+        echo "context=$context_hash"
+        [[ -n "$scripts_hash" ]] && echo "scripts=$scripts_hash"
+        echo "base=$base_digest"
+        printf 'arg=%s\n' "$@"
+    } | sha256sum | cut -d' ' -f1
+}
+
+# =========================================================================
+# Function: Get the jetc-scripts build context of a stage
+# Stages bind-mount shared RUN-step helpers (scripts/stage, e.g.
+# wheelhouse-env.sh) from the named build context jetc-scripts, so they are
+# neither copied into every stage folder nor left in the image.
+# Arguments: $1 = folder_path
+# Returns: The scripts/stage directory to stdout when the stage's Dockerfile
+#          mounts it (nothing otherwise)
+# =========================================================================
+get_stage_scripts_context() {
+    grep -qs 'from=jetc-scripts' "$1/Dockerfile" && echo "$SCRIPT_DIR_DOCKER/stage"
+    return 0
+}
+
+# =========================================================================
+# Function: Get the image tag of a build stage
+# Arguments: $1 = folder_basename, $2 = docker_username, $3 = docker_repo_prefix,
+#            $4 = optional docker_registry
+# Returns: Lowercase tag (<registry>/<user>/<prefix>:<folder>) to stdout
+# =========================================================================
+get_stage_image_tag() {
+    local folder_basename="$1"
+    local registry_prefix=""
+    [[ -n "${4:-}" ]] && registry_prefix="${4}/"
+    echo "${registry_prefix}${2}/${3}:${folder_basename}" | tr '[:upper:]' '[:lower:]'
+}
+
+# =========================================================================
+# Function: Read the config.py build args of every stage once per build
+# With USE_BUILD_LOCK=y they come from BUILD_LOCKFILE (with the pinned base
+# images). Without it the stages keep their Dockerfile defaults, unless
+# BUILD_ARGS_LIVE=y resolves the args whose default floats anyway now
+# ('build_lock.py table --live').
+# Arguments: None
+# Exports: STAGE_BUILD_ARGS_FILE (tab-separated table read by get_stage_build_args
+#          and get_locked_base_image; unset when it could not be written)
+# Returns: 0 on success, 1 when the table could not be written (the lookups then
+#          fall back to one build_lock.py call each)
+# =========================================================================
+prepare_stage_build_args() {
+    unset STAGE_BUILD_ARGS_FILE
+    [[ "${USE_BUILD_LOCK:-n}" == "y" || "${BUILD_ARGS_LIVE:-n}" == "y" ]] || return 0
+    if ! command -v python3 > /dev/null 2>&1; then
+        log_warning "python3 not found; stages are built with their Dockerfile defaults."
+        return 1
+    fi
+    local table_file="$PROJECT_ROOT/.buildcache/stage_build_args.tsv"
+    local mode=(--live)
+    [[ "${USE_BUILD_LOCK:-n}" == "y" ]] && mode=()
+    mkdir -p "$(dirname "$table_file")" || return 1
+    if ! python3 "$SCRIPT_DIR_DOCKER/build_lock.py" --lockfile "${BUILD_LOCKFILE:-$PROJECT_ROOT/build.lock.json}" table "${mode[@]}" > "$table_file"; then
+        log_warning "Failed to read the stage build args; looking them up per stage."
+        return 1
+    fi
+    export STAGE_BUILD_ARGS_FILE="$table_file"
+    log_debug "Stage build args: $(grep -c '^args' "$table_file") from ${mode[*]:-$BUILD_LOCKFILE}"
+    return 0
+}
+
+# =========================================================================
+# Function: Get the config.py build args of a stage
+# Locked values with USE_BUILD_LOCK=y (BUILD_LOCKFILE, written by
+# 'python3 scripts/build_lock.py lock'). Without the lock none (the Dockerfile
+# defaults), or with BUILD_ARGS_LIVE=y the values resolved for this build of
+# the args whose Dockerfile default floats.
+# Arguments: $1 = folder_basename
+# Relies on: STAGE_BUILD_ARGS_FILE (prepare_stage_build_args)
+# Returns: One 'KEY=VALUE' build arg per line to stdout
+# =========================================================================
+get_stage_build_args() {
+    local folder_basename="$1"
+    [[ "${USE_BUILD_LOCK:-n}" == "y" || "${BUILD_ARGS_LIVE:-n}" == "y" ]] || return 0
+    if [[ -n "${STAGE_BUILD_ARGS_FILE:-}" && -f "$STAGE_BUILD_ARGS_FILE" ]]; then
+        awk -F'\t' -v stage="$folder_basename" '$1 == "args" && $2 == stage { print $3 }' "$STAGE_BUILD_ARGS_FILE"
+        return 0
+    fi
+    if ! command -v python3 > /dev/null 2>&1; then
+        log_warning "python3 not found; building $folder_basename with its Dockerfile defaults."
+        return 0
+    fi
+    local mode=(--live)
+    [[ "${USE_BUILD_LOCK:-n}" == "y" ]] && mode=()
+    python3 "$SCRIPT_DIR_DOCKER/build_lock.py" --lockfile "${BUILD_LOCKFILE:-$PROJECT_ROOT/build.lock.json}" args "${mode[@]}" "$folder_basename" \
+        || log_warning "No build args for $folder_basename; it is built with its Dockerfile defaults."
+    return 0
+}
+
+# =========================================================================
+# Function: Get the digest-pinned reference of a base image (USE_BUILD_LOCK=y)
+# Arguments: $1 = base image tag
+# Relies on: STAGE_BUILD_ARGS_FILE (prepare_stage_build_args)
+# Returns: '<image>@sha256:...' from BUILD_LOCKFILE, or the image itself when
+#          the lock is off or does not pin it
+# =========================================================================
+get_locked_base_image() {
+    local image="$1"
+    if [[ "${USE_BUILD_LOCK:-n}" != "y" || "$image" == oci-layout://* ]] || ! command -v python3 > /dev/null 2>&1; then
+        echo "$image"
+        return 0
+    fi
+    if [[ -n "${STAGE_BUILD_ARGS_FILE:-}" && -f "$STAGE_BUILD_ARGS_FILE" ]]; then
+        awk -F'\t' -v image="$image" '$1 == "base" && $2 == image { pinned = $3 } END { print (pinned != "" ? pinned : image) }' "$STAGE_BUILD_ARGS_FILE"
+        return 0
+    fi
+    python3 "$SCRIPT_DIR_DOCKER/build_lock.py" --lockfile "${BUILD_LOCKFILE:-$PROJECT_ROOT/build.lock.json}" base "$image" 2>/dev/null \
+        || echo "$image"
+}
+
+# =========================================================================
+# Function: Get the CUDA architecture build args of a stage (CUDA_ARCH_PROFILE set)
+# Narrows CUDA_ARCH_BIN, CUDA_ARCH_LIST, ... to the SMs of the deployed devices
+# (see 'python3 scripts/arch_profile.py'); only args the Dockerfile declares.
+# Arguments: $1 = folder_basename
+# Returns: One 'KEY=VALUE' build arg per line to stdout (nothing without a profile)
+# =========================================================================
+get_stage_arch_args() {
+    local folder_basename="$1"
+    [[ -n "${CUDA_ARCH_PROFILE:-}" ]] || return 0
+    if ! command -v python3 > /dev/null 2>&1; then
+        log_warning "python3 not found; building $folder_basename for every CUDA architecture."
+        return 0
+    fi
+    python3 "$SCRIPT_DIR_DOCKER/arch_profile.py" args "$folder_basename" \
+        || log_warning "Cannot apply CUDA_ARCH_PROFILE=$CUDA_ARCH_PROFILE to $folder_basename."
+    return 0
+}
+
+# =========================================================================
+# Function: Get the CUDA architecture list of the build (CUDA_ARCH_PROFILE set)
+# Arguments: None
+# Returns: The narrowed list ('87' or '72;87') to stdout (nothing without a profile)
+# =========================================================================
+get_cuda_arch_profile_list() {
+    [[ -n "${CUDA_ARCH_PROFILE:-}" ]] && command -v python3 > /dev/null 2>&1 || return 0
+    python3 "$SCRIPT_DIR_DOCKER/arch_profile.py" archs 2>/dev/null
+    return 0
+}
+
+# =========================================================================
+# Function: Get the squash policy of a stage
+# SQUASH_POLICY entries ('<folder>=y|n|auto', '*=...' for the rest) win over the
+# 'squash:' field of the Dockerfile's '#---' header, which wins over use_squash.
+# Arguments: $1 = folder_basename, $2 = use_squash (build option)
+# Returns: 'y', 'n' or 'auto' to stdout
+# =========================================================================
+get_stage_squash_policy() {
+    local folder_basename="$1"
+    local policy="" default_policy="" entry
+    for entry in ${SQUASH_POLICY:-}; do
+        case "${entry%%=*}" in
+            "$folder_basename") policy="${entry#*=}" ;;
+            "*") default_policy="${entry#*=}" ;;
+        esac
+    done
+    local dockerfile="${BUILD_DIR:-$PROJECT_ROOT/build}/$folder_basename/Dockerfile"
+    if [[ -z "$policy" && -f "$dockerfile" ]]; then
+        policy=$(sed -n '/^#---/,/^#---/s/^#[[:space:]]*squash:[[:space:]]*\([A-Za-z]*\).*/\1/p' "$dockerfile" | head -n 1)
+    fi
+    case "${policy:-${default_policy:-${2:-n}}}" in
+        y|yes|on|true) echo "y" ;;
+        auto) echo "auto" ;;
+        *) echo "n" ;;
+    esac
+}
+
+# =========================================================================
+# Function: Decide whether a stage is squashed (see flatten_stage_image)
+# Policy 'auto' asks scripts/squash_policy.py, which weighs the measured
+# per-layer pull cost against the unchanged bytes a squashed stage re-pulls.
+# Arguments: $1 = folder_basename, $2 = squash policy ('y', 'n' or 'auto')
+# Exports: STAGE_SQUASH ('y'/'n'), STAGE_SQUASH_REASON ('policy' or the auto reason)
+# Returns: 0
+# =========================================================================
+decide_stage_squash() {
+    local folder_basename="$1"
+    local policy="$2"
+    export STAGE_SQUASH="$policy"
+    export STAGE_SQUASH_REASON="policy"
+    [[ "$policy" == "auto" ]] || return 0
+
+    STAGE_SQUASH="n"
+    STAGE_SQUASH_REASON="no telemetry to decide from"
+    if [[ "${BUILD_TELEMETRY:-y}" == "y" ]] && command -v python3 > /dev/null 2>&1; then
+        local decision
+        decision=$(python3 "$SCRIPT_DIR_DOCKER/squash_policy.py" decide "$folder_basename" \
+            --db "${BUILD_TELEMETRY_DB:-$PROJECT_ROOT/logs/build_telemetry.db}" 2>/dev/null || true)
+        if [[ "$decision" == [yn]$'\t'* ]]; then
+            STAGE_SQUASH="${decision%%$'\t'*}"
+            STAGE_SQUASH_REASON="${decision#*$'\t'}"
+        fi
+    fi
+    log_info "Squash (auto): $STAGE_SQUASH - $STAGE_SQUASH_REASON"
+    return 0
+}
+
+# =========================================================================
+# Function: Measure the layers a stage adds, for the 'auto' squash policy
+# Pushed images are read from the registry and their layer pulls are timed
+# (SQUASH_MEASURE_PULL=y); local images are only sized. Squashed builds are
+# recorded as such: they count towards re-measuring the stage unsquashed.
+# Arguments: $1 = folder_basename, $2 = image (tag or oci-layout:// reference),
+#            $3 = base_image_tag, $4 = 'y' if the image was pushed,
+#            $5 = 'y' if the stage was squashed
+# Returns: 0 (measuring never fails a build)
+# =========================================================================
+measure_stage_layers() {
+    local folder_basename="$1"
+    [[ "${BUILD_TELEMETRY:-y}" == "y" ]] && command -v python3 > /dev/null 2>&1 || return 0
+    local args=(measure "$folder_basename" "$2" --base "$3"
+        --db "${BUILD_TELEMETRY_DB:-$PROJECT_ROOT/logs/build_telemetry.db}"
+        --run-id "${BUILD_RUN_ID:-$(date -u +'%Y%m%d-%H%M%S')}")
+    if [[ "$4" == "y" ]]; then
+        args+=(--from registry)
+        [[ "${SQUASH_MEASURE_PULL:-y}" == "y" ]] && args+=(--time-pull)
+    fi
+    [[ "${5:-n}" == "y" ]] && args+=(--squashed)
+    python3 "$SCRIPT_DIR_DOCKER/squash_policy.py" "${args[@]}" || log_warning "Failed to measure the layers of $folder_basename."
+    return 0
+}
+
+# =========================================================================
+# Function: Squash the layers a stage added and export the result
+# buildx has no working --squash: the stage is built into an OCI layout first,
+# scripts/squash_policy.py flatten merges the layers above the base image into
+# one, and a FROM-only build exports that image (config and labels unchanged)
+# the way the stage build would have (--push, --load or an OCI layout).
+# If the layers cannot be merged the stage is exported unsquashed.
+# Arguments: $1 = folder_basename, $2 = OCI layout dir of the unsquashed build,
+#            $3 = base_image_tag, $4 = platform, $5 = image tag,
+#            $6 = output flag of the stage build, $7 = metadata file ('' for none)
+# Exports: STAGE_SQUASH ('y' only when the layers were merged), STAGE_SQUASH_REASON
+# Returns: 0 when the image was exported, 1 otherwise
+# =========================================================================
+flatten_stage_image() {
+    local folder_basename="$1"
+    local layout_dir="$2"
+    local image_ref
+    if image_ref=$(python3 "$SCRIPT_DIR_DOCKER/squash_policy.py" flatten "$layout_dir" --base "$3" --platform "$4"); then
+        log_info "Squashed the layers of $folder_basename: $image_ref"
+    else
+        log_warning "Failed to squash the layers of $folder_basename; exporting it unsquashed."
+        export STAGE_SQUASH="n"
+        export STAGE_SQUASH_REASON="squash failed (${STAGE_SQUASH_REASON:-policy})"
+        local layout_digest
+        layout_digest=$(get_oci_layout_digest "$layout_dir") || return 1
+        image_ref="oci-layout://${layout_dir}@${layout_digest}"
+    fi
+    local export_dir
+    export_dir=$(mktemp -d) || { log_error "Failed to create temp dir for the squashed export."; return 1; }
+    echo "FROM jetc-squashed" > "$export_dir/Dockerfile"
+    local export_args=("--platform" "$4" "-t" "$5" "--build-context" "jetc-squashed=$image_ref" "--progress=plain")
+    [[ -n "$6" ]] && export_args+=("$6")
+    [[ -n "$7" ]] && export_args+=("--metadata-file" "$7")
+    echo "CMD: docker buildx build ${export_args[*]} $export_dir"
+    docker buildx build "${export_args[@]}" "$export_dir"
+    local export_status=$?
+    rm -rf "$export_dir"
+    [[ $export_status -eq 0 ]] || log_error "Failed to export the squashed image of $folder_basename."
+    return $export_status
+}
+
+# =========================================================================
+# Function: Decide the compile job count of a stage from free memory (BUILD_JOB_GOVERNOR=y)
+# Only stages whose Dockerfile mounts the 'jetc-jobs' secret are governed; the
+# count is passed as that secret, not a build arg, so it never invalidates the
+# layer cache and stays out of the fingerprint.
+# Arguments: $1 = folder_path, $2 = stages building at the same time (default 1)
+# Exports: STAGE_BUILD_JOBS (empty when the stage is not governed), STAGE_BUILD_JOBS_REASON
+# Returns: 0 if the stage is governed, 1 otherwise
+# =========================================================================
+decide_stage_build_jobs() {
+    local folder_path="$1"
+    export STAGE_BUILD_JOBS=""
+    export STAGE_BUILD_JOBS_REASON=""
+    [[ "${BUILD_JOB_GOVERNOR:-y}" == "y" ]] && grep -q 'id=jetc-jobs' "$folder_path/Dockerfile" 2>/dev/null || return 1
+    command -v python3 > /dev/null 2>&1 || return 1
+
+    local decision
+    decision=$(python3 "$SCRIPT_DIR_DOCKER/build_governor.py" decide "$(basename "$folder_path")" \
+        --db "${BUILD_TELEMETRY_DB:-$PROJECT_ROOT/logs/build_telemetry.db}" \
+        --share "${2:-1}" --dockerfile "$folder_path/Dockerfile" 2>/dev/null || true)
+    [[ "$decision" == [0-9]*$'\t'* ]] || { log_warning "Cannot size the build jobs of $(basename "$folder_path"); the stage uses every core."; return 1; }
+    STAGE_BUILD_JOBS="${decision%%$'\t'*}"
+    STAGE_BUILD_JOBS_REASON="${decision#*$'\t'}"
+    log_info "Build Jobs: $STAGE_BUILD_JOBS - $STAGE_BUILD_JOBS_REASON"
+    return 0
+}
+
+# =========================================================================
+# Function: Start sampling free memory and swap for the build of a governed stage
+# Arguments: $1 = file the sampler writes its summary to when stopped
+# Exports: BUILD_MEMORY_WATCH_PID (empty if the sampler did not start)
+# Returns: 0
+# =========================================================================
+start_build_memory_watch() {
+    export BUILD_MEMORY_WATCH_PID=""
+    [[ "${BUILD_TELEMETRY:-y}" == "y" ]] || return 0
+    python3 "$SCRIPT_DIR_DOCKER/build_governor.py" watch --out "$1" &
+    BUILD_MEMORY_WATCH_PID=$!
+    return 0
+}
+
+# =========================================================================
+# Function: Stop the memory sampler and record what a governed stage used per job
+# The stage prints 'jetc-jobs: N' when it compiles; a build that ran out of
+# memory is recorded as such, so the next build of the stage runs fewer jobs.
+# Arguments: $1 = folder_basename, $2 = path to the build output (--progress=plain),
+#            $3 = file the sampler wrote (start_build_memory_watch)
+# Returns: 0 (recording never fails a build)
+# =========================================================================
+finish_build_memory_watch() {
+    local folder_basename="$1"
+    local progress_log="$2"
+    local watch_file="$3"
+    if [[ -n "${BUILD_MEMORY_WATCH_PID:-}" ]]; then
+        kill "$BUILD_MEMORY_WATCH_PID" 2>/dev/null
+        wait "$BUILD_MEMORY_WATCH_PID" 2>/dev/null
+        BUILD_MEMORY_WATCH_PID=""
+    fi
+    [[ "${BUILD_TELEMETRY:-y}" == "y" && -f "$progress_log" ]] || return 0
+    python3 "$SCRIPT_DIR_DOCKER/build_governor.py" record "$folder_basename" \
+        --db "${BUILD_TELEMETRY_DB:-$PROJECT_ROOT/logs/build_telemetry.db}" \
+        --run-id "${BUILD_RUN_ID:-$(date -u +'%Y%m%d-%H%M%S')}" \
+        --log "$progress_log" --watch "$watch_file" \
+        || log_warning "Failed to record the build memory of $folder_basename."
+    return 0
+}
+
+# =========================================================================
+# Function: Get the build settings that are part of a stage fingerprint
+# Arguments: $1 = platform, $2 = use_squash, $3 = optional folder_basename
+#            (resolves the stage's squash policy, adds the CUDA architecture args
+#            of the stage when CUDA_ARCH_PROFILE is set and its config.py build
+#            args, locked when USE_BUILD_LOCK=y)
+# Relies on: skip_intermediate_push_pull, IMAGE_COMPRESSION (pushed layer format),
+#            use_builder (squashing needs the buildx builder)
+# Returns: One 'key=value' input per line to stdout
+# =========================================================================
+get_stage_fingerprint_inputs() {
+    # The policy, not the 'auto' decision, so an unchanged stage stays reusable;
+    # 'n' where no squash can be produced
+    local squash="$2"
+    [[ -n "${3:-}" ]] && squash=$(get_stage_squash_policy "$3" "$2")
+    [[ "${use_builder:-y}" == "y" ]] || squash="n"
+    printf '%s\n' "platform=$1" "squash=$squash"
+    # Pushed layers in another format are another image (gzip keeps the fingerprints of earlier builds)
+    [[ "${skip_intermediate_push_pull:-y}" == "n" && "${IMAGE_COMPRESSION:-gzip}" != "gzip" ]] \
+        && echo "compression=${IMAGE_COMPRESSION}${IMAGE_COMPRESSION_LEVEL:+:$IMAGE_COMPRESSION_LEVEL}"
+    [[ -n "${3:-}" ]] && get_stage_arch_args "$3" 2>/dev/null | sed 's/^/arch:/'
+    [[ -n "${3:-}" ]] && get_stage_build_args "$3" 2>/dev/null | sed 's/^/args:/'
+    return 0
+}
+
+# =========================================================================
+# Function: Check whether the existing image of a stage is current
+# The image was built on the base recorded in its labels (jetc.stage.base and
+# jetc.stage.base.digest): the serial predecessor, a graph parent or an OCI
+# handoff. It is current when its fingerprint matches a build of the stage's
+# context and settings on that digest, and that base still has that digest
+# (or base_image_tag does). Images without the base labels must match a build
+# on base_image_tag.
+# Arguments: $1 = folder_path, $2 = image tag, $3 = base_image_tag,
+#            $4 = platform, $5 = use_squash
+# Returns: 0 if the image is current, 1 otherwise
+# =========================================================================
+is_stage_image_current() {
+    local folder_path="$1"
+    local image_tag="$2"
+    local base_image_tag
+    base_image_tag=$(get_locked_base_image "$3")
+    local inputs=()
+    mapfile -t inputs < <(get_stage_fingerprint_inputs "$4" "$5" "$(basename "$folder_path")")
+
+    local existing_fingerprint
+    existing_fingerprint=$(get_image_label "$image_tag" "jetc.stage.fingerprint")
+    [[ -n "$existing_fingerprint" ]] || return 1
+    local built_base built_base_digest
+    built_base=$(get_image_label "$image_tag" "jetc.stage.base")
+    built_base_digest=$(get_image_label "$image_tag" "jetc.stage.base.digest")
+    if [[ -z "$built_base_digest" ]]; then
+        [[ "$existing_fingerprint" == "$(compute_stage_fingerprint "$folder_path" "$base_image_tag" "${inputs[@]}" 2>/dev/null)" ]]
+        return
+    fi
+    [[ "$existing_fingerprint" == "$(hash_stage_fingerprint "$folder_path" "$built_base_digest" "${inputs[@]}")" ]] || return 1
+    [[ -n "$built_base" && "$(resolve_image_digest "$built_base" 2>/dev/null)" == "$built_base_digest" ]] \
+        || [[ -n "$base_image_tag" && "$(resolve_image_digest "$base_image_tag" 2>/dev/null)" == "$built_base_digest" ]]
+}
+
+# =========================================================================
+# Function: Get the BuildKit cache-from/cache-to arguments for a stage
+# Uses BUILD_CACHE_BACKEND ('none', 'local' or 'registry'), BUILD_CACHE_DIR,
+# BUILD_CACHE_REF and BUILD_CACHE_MODE from .env.
+# Arguments: $1 = folder_basename, $2 = use_cache ('y' enables cache-from),
+#            $3 = default registry cache repository (e.g. registry/user/prefix-cache)
+# Returns: One build argument per line to stdout (nothing for backend 'none')
+# =========================================================================
+get_stage_cache_args() {
+    local folder_basename="$1"
+    local use_cache="$2"
+    local default_cache_repo="$3"
+    local cache_mode="${BUILD_CACHE_MODE:-max}"
+
+    case "${BUILD_CACHE_BACKEND:-none}" in
+        local)
+            local cache_dir="${BUILD_CACHE_DIR:-$PROJECT_ROOT/.buildcache}/$folder_basename"
+            [[ "$use_cache" == "y" && -d "$cache_dir" ]] && printf '%s\n' "--cache-from" "type=local,src=$cache_dir"
+            # Export to a fresh directory and swap afterwards, so old blobs don't pile up
+            printf '%s\n' "--cache-to" "type=local,dest=${cache_dir}.new,mode=$cache_mode"
+            ;;
+        registry)
+            local cache_ref="${BUILD_CACHE_REF:-$default_cache_repo}:$folder_basename"
+            cache_ref=$(echo "$cache_ref" | tr '[:upper:]' '[:lower:]')
+            [[ "$use_cache" == "y" ]] && printf '%s\n' "--cache-from" "type=registry,ref=$cache_ref"
+            printf '%s\n' "--cache-to" "type=registry,ref=$cache_ref,mode=$cache_mode"
+            ;;
+        none|"") ;;
+        *) log_warning "Unknown BUILD_CACHE_BACKEND '${BUILD_CACHE_BACKEND}'. Persistent cache disabled." ;;
+    esac
+    return 0
+}
+
+# =========================================================================
+# Function: Promote the freshly exported local cache of a stage
+# Arguments: $1 = folder_basename
+# Returns: 0 (always; a failed swap only costs cache reuse)
+# =========================================================================
+finalize_stage_cache() {
+    local folder_basename="$1"
+    [[ "${BUILD_CACHE_BACKEND:-none}" == "local" ]] || return 0
+    local cache_dir="${BUILD_CACHE_DIR:-$PROJECT_ROOT/.buildcache}/$folder_basename"
+    if [[ -d "${cache_dir}.new" ]]; then
+        rm -rf "$cache_dir" && mv "${cache_dir}.new" "$cache_dir" || log_warning "Failed to update local build cache at $cache_dir"
+    fi
+    return 0
+}
+
+# =========================================================================
+# Function: Report layer cache hits from a plain-progress build log
+# Arguments: $1 = folder_basename, $2 = path to the build output (--progress=plain)
+# Exports: STAGE_CACHE_HITS, STAGE_CACHE_STEPS
+# Returns: 0
+# =========================================================================
+report_stage_cache_hits() {
+    local folder_basename="$1"
+    local progress_log="$2"
+    export STAGE_CACHE_HITS=0
+    export STAGE_CACHE_STEPS=0
+    [[ -f "$progress_log" ]] || return 0
+
+    # Steps look like '#7 [3/5] RUN ...'; a cached step later prints '#7 CACHED'
+    STAGE_CACHE_STEPS=$(grep -E '^#[0-9]+ \[[^]]*[0-9]+/[0-9]+\]' "$progress_log" | awk '{print $1}' | sort -u | wc -l)
+    STAGE_CACHE_HITS=$(grep -E '^#[0-9]+ CACHED' "$progress_log" | awk '{print $1}' | sort -u | wc -l)
+    local ratio=0
+    [[ $STAGE_CACHE_STEPS -gt 0 ]] && ratio=$((STAGE_CACHE_HITS * 100 / STAGE_CACHE_STEPS))
+    log_info "Cache hits for $folder_basename: $STAGE_CACHE_HITS/$STAGE_CACHE_STEPS steps (${ratio}%)"
+    return 0
+}
+
+# =========================================================================
+# Function: Report compiler cache hits from a plain-progress build log
+# Source-building stages print 'jetc-ccache: hits=N misses=M' after compiling
+# with USE_CCACHE=on (scripts/stage/ccache-report.sh); a stage with several
+# compiling steps prints several.
+# Arguments: $1 = folder_basename, $2 = path to the build output (--progress=plain)
+# Exports: STAGE_CCACHE_HITS, STAGE_CCACHE_MISSES
+# Returns: 0
+# =========================================================================
+report_stage_compiler_cache() {
+    local folder_basename="$1"
+    local progress_log="$2"
+    export STAGE_CCACHE_HITS=0
+    export STAGE_CCACHE_MISSES=0
+    [[ -f "$progress_log" ]] || return 0
+
+    local counts
+    counts=$( (grep -oE 'jetc-ccache: hits=[0-9]+ misses=[0-9]+' "$progress_log" || true) \
+        | awk -F'[= ]' '{h += $3; m += $5} END {if (NR) print h, m}')
+    [[ -n "$counts" ]] || return 0
+    read -r STAGE_CCACHE_HITS STAGE_CCACHE_MISSES <<< "$counts"
+    local compiled=$((STAGE_CCACHE_HITS + STAGE_CCACHE_MISSES))
+    local ratio=0
+    [[ $compiled -gt 0 ]] && ratio=$((STAGE_CCACHE_HITS * 100 / compiled))
+    log_info "Compiler cache hits for $folder_basename: $STAGE_CCACHE_HITS/$compiled compilations (${ratio}%)"
+    return 0
+}
+
+# =========================================================================
+# Function: Report the pip/apt download volume of a build from its plain-progress log
+# pip logs 'Downloading <file> (<size>)' or 'Using cached <file> (<size>)', apt
+# logs 'Need to get <new>/<total> of archives' and 'Fetched <size>'. What the
+# shared download cache mounts served is what the stage would have downloaded
+# on top without them.
+# Arguments: $1 = folder_basename, $2 = path to the build output (--progress=plain)
+# Exports: STAGE_DOWNLOAD_BYTES (downloaded), STAGE_DOWNLOAD_CACHED_BYTES (served from the cache)
+# Returns: 0
+# =========================================================================
+report_stage_downloads() {
+    local folder_basename="$1"
+    local progress_log="$2"
+    export STAGE_DOWNLOAD_BYTES=0
+    export STAGE_DOWNLOAD_CACHED_BYTES=0
+    [[ -f "$progress_log" ]] || return 0
+
+    local counts
+    counts=$(awk '
+        function bytes(value, unit) {
+            gsub(/,/, "", value)
+            return value * (unit ~ /^G/ ? 1e9 : unit ~ /^M/ ? 1e6 : unit ~ /^k/ ? 1e3 : 1)
+        }
+        # "(14.2 MB)" at the end of a pip line
+        function pip_size(line,    parts) {
+            if (!match(line, /\([0-9.,]+ [kMG]?B\)/)) return 0
+            split(substr(line, RSTART + 1, RLENGTH - 2), parts, " ")
+            return bytes(parts[1], parts[2])
+        }
+        / Downloading [^ ]+ \(/ { downloaded += pip_size($0) }
+        / Using cached [^ ]+ \(/ { cached += pip_size($0) }
+        / Need to get [0-9.,]+ [kMG]?B\/[0-9.,]+ [kMG]?B of archives/ {
+            match($0, /Need to get [0-9.,]+ [kMG]?B\/[0-9.,]+ [kMG]?B/)
+            split(substr($0, RSTART + 12, RLENGTH - 12), parts, /[ \/]/)
+            cached += bytes(parts[3], parts[4]) - bytes(parts[1], parts[2])
+        }
+        / Fetched [0-9.,]+ [kMG]?B in / {
+            match($0, /Fetched [0-9.,]+ [kMG]?B/)
+            split(substr($0, RSTART + 8, RLENGTH - 8), parts, " ")
+            downloaded += bytes(parts[1], parts[2])
+        }
+        END { printf "%.0f %.0f\n", downloaded, cached }' "$progress_log")
+    read -r STAGE_DOWNLOAD_BYTES STAGE_DOWNLOAD_CACHED_BYTES <<< "$counts"
+    local total=$((STAGE_DOWNLOAD_BYTES + STAGE_DOWNLOAD_CACHED_BYTES))
+    [[ $total -gt 0 ]] || return 0
+    log_info "Downloads for $folder_basename: $((STAGE_DOWNLOAD_BYTES / 1048576))MB of $((total / 1048576))MB without the download cache"
+    return 0
+}
+
+# =========================================================================
+# Function: Record per-stage build telemetry in the SQLite history
+# Uses BUILD_TELEMETRY ('y'/'n'), BUILD_TELEMETRY_DB and BUILD_RUN_ID. Reads
+# STAGE_CACHE_HITS / STAGE_CACHE_STEPS from the last report_stage_cache_hits and
+# STAGE_CCACHE_HITS / STAGE_CCACHE_MISSES from the last report_stage_compiler_cache and
+# STAGE_DOWNLOAD_BYTES / STAGE_DOWNLOAD_CACHED_BYTES from the last report_stage_downloads and
+# STAGE_SQUASH / STAGE_SQUASH_REASON from the last decide_stage_squash.
+# Arguments: $1 = folder_basename, $2 = image tag, $3 = status (built|reused|failed),
+#            $4 = wall time in seconds, $5 = optional --metadata-file output,
+#            $6 = optional OCI layout directory holding the result
+# Returns: 0 (telemetry never fails a build)
+# =========================================================================
+record_stage_telemetry() {
+    local folder_basename="$1"
+    local image_tag="$2"
+    local status="$3"
+    local wall_time="$4"
+    local metadata_file="${5:-}"
+    local oci_dir="${6:-}"
+
+    [[ "${BUILD_TELEMETRY:-y}" == "y" ]] || return 0
+    if ! command -v python3 > /dev/null 2>&1; then
+        log_debug "python3 not found; skipping build telemetry."
+        return 0
+    fi
+
+    local args=(record --db "${BUILD_TELEMETRY_DB:-$PROJECT_ROOT/logs/build_telemetry.db}"
+        --run-id "${BUILD_RUN_ID:-$(date -u +'%Y%m%d-%H%M%S')}" --stage "$folder_basename"
+        --tag "$image_tag" --status "$status" --wall-time "$wall_time"
+        --cache-hits "${STAGE_CACHE_HITS:-0}" --cache-steps "${STAGE_CACHE_STEPS:-0}"
+        --ccache-hits "${STAGE_CCACHE_HITS:-0}" --ccache-misses "${STAGE_CCACHE_MISSES:-0}"
+        --download-bytes "${STAGE_DOWNLOAD_BYTES:-0}" --download-cached-bytes "${STAGE_DOWNLOAD_CACHED_BYTES:-0}")
+    [[ -n "${STAGE_SQUASH:-}" ]] && args+=(--squash "$STAGE_SQUASH" --squash-reason "${STAGE_SQUASH_REASON:-policy}")
+    [[ -n "$metadata_file" && -s "$metadata_file" ]] && args+=(--metadata-file "$metadata_file")
+    if [[ -n "$oci_dir" ]]; then
+        args+=(--oci-layout "$oci_dir")
+    elif [[ "$status" != "failed" ]]; then
+        local image_size
+        image_size=$(docker image inspect --format '{{.Size}}' "$image_tag" 2>/dev/null || true)
+        # Pushed and not pulled back: compressed size from the registry manifest (like OCI layout stages)
+        [[ "$image_size" =~ ^[0-9]+$ ]] || image_size=$(python3 "$SCRIPT_DIR_DOCKER/registry.py" size "$image_tag" 2>/dev/null || true)
+        [[ "$image_size" =~ ^[0-9]+$ ]] && args+=(--image-size "$image_size")
+        [[ -z "$metadata_file" || ! -s "$metadata_file" ]] && args+=(--digest "$(resolve_image_digest "$image_tag" 2>/dev/null)")
+    fi
+
+    python3 "$SCRIPT_DIR_DOCKER/build_telemetry.py" "${args[@]}" || log_warning "Failed to record build telemetry for $folder_basename."
+    return 0
+}
+
+# =========================================================================
+# Function: Report the telemetry of a build run and write its summary file
+# Flags stages that got slower or bigger than their previous builds
+# (BUILD_TELEMETRY_WINDOW, BUILD_TELEMETRY_SLOWER_PCT, BUILD_TELEMETRY_BIGGER_PCT).
+# Arguments: $1 = run id (default: BUILD_RUN_ID)
+# Returns: 0 (reporting never fails a build)
+# =========================================================================
+report_build_telemetry() {
+    local run_id="${1:-${BUILD_RUN_ID:-}}"
+    [[ "${BUILD_TELEMETRY:-y}" == "y" && -n "$run_id" ]] || return 0
+    command -v python3 > /dev/null 2>&1 || return 0
+
+    local args=(--db "${BUILD_TELEMETRY_DB:-$PROJECT_ROOT/logs/build_telemetry.db}" --run-id "$run_id"
+        --window "${BUILD_TELEMETRY_WINDOW:-5}"
+        --slower-pct "${BUILD_TELEMETRY_SLOWER_PCT:-20}" --bigger-pct "${BUILD_TELEMETRY_BIGGER_PCT:-10}")
+    python3 "$SCRIPT_DIR_DOCKER/build_telemetry.py" report "${args[@]}" || log_warning "Failed to report build telemetry."
+    local summary_file="${LOG_DIR:-$PROJECT_ROOT/logs}/summary-${run_id}.md"
+    python3 "$SCRIPT_DIR_DOCKER/build_telemetry.py" summary "${args[@]}" --output "$summary_file" > /dev/null \
+        && log_info "Build summary written to $summary_file" \
+        || log_warning "Failed to write build summary $summary_file."
+    return 0
+}
+
+# =========================================================================
+# Function: Write the layer report of the final image (LAYER_REPORT=y)
+# Streams the image layers through scripts/layer_analyzer.py (nothing is
+# extracted) and attributes them to the stages of the build journal: bytes per
+# stage, largest files, and files overwritten, deleted or duplicated across stages.
+# Arguments: $1 = final image tag, $2 = run id (default: BUILD_RUN_ID)
+# Returns: 0 (reporting never fails a build)
+# =========================================================================
+report_image_layers() {
+    local image_tag="$1"
+    local run_id="${2:-${BUILD_RUN_ID:-latest}}"
+    [[ "${LAYER_REPORT:-n}" == "y" && -n "$image_tag" ]] || return 0
+    command -v python3 > /dev/null 2>&1 || return 0
+
+    local report_file="${LOG_DIR:-$PROJECT_ROOT/logs}/layers-${run_id}.txt"
+    log_info "Analyzing the layers of $image_tag..."
+    local args=("$image_tag" --top "${LAYER_REPORT_TOP:-20}" --json "${report_file%.txt}.json")
+    [[ -f "${BUILD_JOURNAL_FILE:-}" ]] && args+=(--journal "$BUILD_JOURNAL_FILE")
+    python3 "$SCRIPT_DIR_DOCKER/layer_analyzer.py" "${args[@]}" > "$report_file" \
+        && log_info "Layer report written to $report_file" \
+        || log_warning "Failed to analyze the layers of $image_tag."
+    return 0
+}
+
+# =========================================================================
+# Function: Get the OCI layout directory used to hand a stage to the next one
+# Arguments: $1 = folder_basename
+# Returns: Directory path to stdout
+# =========================================================================
+get_stage_oci_dir() {
+    echo "${STAGE_OCI_DIR:-$PROJECT_ROOT/.buildcache/oci}/$1"
+}
+
+# =========================================================================
+# Function: Read the manifest digest of a single-image OCI layout
+# Arguments: $1 = OCI layout directory
+# Returns: sha256 digest to stdout, exit code 1 if not found
+# =========================================================================
+get_oci_layout_digest() {
+    local layout_dir="$1"
+    local digest
+    digest=$(grep -o '"digest"[[:space:]]*:[[:space:]]*"sha256:[0-9a-f]*"' "$layout_dir/index.json" 2>/dev/null | head -n 1 | grep -o 'sha256:[0-9a-f]*')
+    [[ -n "$digest" ]] || return 1
+    echo "$digest"
+}
+
 # =========================================================================
 # Function: Build a Docker image from a specific folder
 # Arguments:
 #   $1: folder_path - Path to the build context folder
 #   $2: use_cache - 'y' or 'n'
 #   $3: docker_username - Docker username
-#   $4: use_squash - 'y' or 'n'
+#   $4: use_squash - 'y', 'n' or 'auto' (default squash policy, see get_stage_squash_policy)
 #   $5: skip_intermediate - 'y' or 'n' (y=local build only, n=push/pull)
 #   $6: base_image_tag - Tag of the base image to use (passed as BASE_IMAGE build-arg)
 #   $7: docker_repo_prefix - Prefix for the image repository
 #   $8: docker_registry - Optional Docker registry hostname
 #   $9: use_builder - 'y' or 'n' (whether to use buildx builder)
 # Exports: fixed_tag - The final tag of the successfully built image
+#          STAGE_REUSED - 'y' if an up-to-date image was reused instead of built
+#          STAGE_CACHE_HITS / STAGE_CACHE_STEPS - layer cache hits of the build
+#          STAGE_CCACHE_HITS / STAGE_CCACHE_MISSES - compiler cache hits (USE_COMPILER_CACHE=y)
+#          STAGE_DOWNLOAD_BYTES / STAGE_DOWNLOAD_CACHED_BYTES - pip/apt bytes downloaded / served by the download cache
+#          STAGE_OCI_REF - oci-layout:// reference of the result when STAGE_OUTPUT=oci
+#          STAGE_SQUASH / STAGE_SQUASH_REASON - whether the stage was squashed and why (decide_stage_squash, flatten_stage_image)
+#          STAGE_BUILD_JOBS / STAGE_BUILD_JOBS_REASON - compile job count of the build (decide_stage_build_jobs)
+# Telemetry: every built, reused or failed stage is recorded by record_stage_telemetry.
+# Globals: STAGE_OUTPUT - 'oci' keeps the result in an OCI layout directory for the
+#                         next stage instead of --load (set by the stage scheduler)
+#          A base_image_tag of the form oci-layout://... is passed as a named build context.
 # Returns: 0 on success, 1 on failure
 # =========================================================================
 build_folder_image() {
@@ -98,12 +997,30 @@ build_folder_image() {
 
     local folder_basename
     folder_basename=$(basename "$folder_path") # Line 72 approx in original file context
+    local squash_policy
+    squash_policy=$(get_stage_squash_policy "$folder_basename" "$use_squash")
 
     # --- Construct Tag ---
     local registry_prefix=""
     [[ -n "$docker_registry" ]] && registry_prefix="${docker_registry}/"
-    export fixed_tag="${registry_prefix}${docker_username}/${docker_repo_prefix}:${folder_basename}"
-    fixed_tag=$(echo "$fixed_tag" | tr '[:upper:]' '[:lower:]')
+    export fixed_tag
+    fixed_tag=$(get_stage_image_tag "$folder_basename" "$docker_username" "$docker_repo_prefix" "$docker_registry")
+
+    # --- Build Args / Build Lock ---
+    # config.py build args (versions, branch commits), locked with GIT_PINS and the
+    # pinned base image digest when USE_BUILD_LOCK=y; floating ones with BUILD_ARGS_LIVE=y
+    local lock_args=()
+    [[ "${USE_BUILD_LOCK:-n}" == "y" ]] && base_image_tag=$(get_locked_base_image "$base_image_tag")
+    mapfile -t lock_args < <(get_stage_build_args "$folder_basename")
+
+    # --- CUDA Architecture Profile ---
+    # Compile only for the SMs of the deployed devices; the list goes into the image labels
+    local arch_args=()
+    local cuda_archs=""
+    if [[ -n "${CUDA_ARCH_PROFILE:-}" ]]; then
+        mapfile -t arch_args < <(get_stage_arch_args "$folder_basename")
+        cuda_archs=$(get_cuda_arch_profile_list)
+    fi
 
     log_info "--------------------------------------------------"
     log_info "Building image from folder: $folder_path"
@@ -114,21 +1031,126 @@ build_folder_image() {
     log_info "Skip Intermediate Push/Pull: $skip_intermediate" # Log the received value
     log_info "Use Buildx Builder: $use_builder"                 # Log the received value
     log_info "Use Cache: $use_cache"
-    log_info "Use Squash: $use_squash"
+    log_info "Squash Policy: $squash_policy"
+    if [[ "${USE_BUILD_LOCK:-n}" == "y" ]]; then
+        log_info "Build Lock: ${#lock_args[@]} locked build args from ${BUILD_LOCKFILE:-$PROJECT_ROOT/build.lock.json}"
+    else
+        [[ "${BUILD_ARGS_LIVE:-n}" == "y" ]] && log_info "Build Args: ${#lock_args[@]} floating args resolved from config.py"
+    fi
+    [[ -n "${CUDA_ARCH_PROFILE:-}" ]] && log_info "CUDA Arch Profile: $CUDA_ARCH_PROFILE -> ${cuda_archs:-unknown} (${#arch_args[@]} build args)"
+    [[ "${USE_COMPILER_CACHE:-n}" == "y" ]] && log_info "Compiler Cache: ccache (max ${COMPILER_CACHE_SIZE:-5G})"
     log_info "--------------------------------------------------"
 
+    local platform="${PLATFORM:-linux/arm64}"
+    export STAGE_REUSED="n"
+    export STAGE_CACHE_HITS=0
+    export STAGE_CACHE_STEPS=0
+    export STAGE_CCACHE_HITS=0
+    export STAGE_CCACHE_MISSES=0
+    export STAGE_DOWNLOAD_BYTES=0
+    export STAGE_DOWNLOAD_CACHED_BYTES=0
+    export STAGE_OCI_REF=""
+    export STAGE_SQUASH=""
+    export STAGE_SQUASH_REASON=""
+    export STAGE_BUILD_JOBS=""
+    export STAGE_BUILD_JOBS_REASON=""
+    local stage_start=$SECONDS
+
+    # --- Stage Fingerprint ---
+    # Hash of the build context (Dockerfile included), the resolved base image
+    # digest and every setting that changes the output. Stored as an image label
+    # so an unchanged stage can be reused instead of rebuilt.
+    local fingerprint_inputs=()
+    mapfile -t fingerprint_inputs < <(get_stage_fingerprint_inputs "$platform" "$use_squash" "$folder_basename")
+    local base_image_digest stage_fingerprint
+    base_image_digest=$(resolve_image_digest "$base_image_tag")
+    stage_fingerprint=$(hash_stage_fingerprint "$folder_path" "$base_image_digest" "${fingerprint_inputs[@]}")
+    log_info "Stage Fingerprint: $stage_fingerprint"
+
+    if [[ "${SKIP_UNCHANGED_STAGES:-y}" == "y" && "$use_cache" == "y" ]]; then
+        local existing_fingerprint
+        existing_fingerprint=$(get_image_label "$fixed_tag" "jetc.stage.fingerprint")
+        if [[ -n "$existing_fingerprint" && "$existing_fingerprint" == "$stage_fingerprint" ]]; then
+            log_success "Fingerprint unchanged, reusing existing image: $fixed_tag"
+            export STAGE_REUSED="y"
+            record_stage_telemetry "$folder_basename" "$fixed_tag" "reused" "$((SECONDS - stage_start))"
+            return 0
+        fi
+        log_debug "No up-to-date image for $fixed_tag (existing fingerprint: '${existing_fingerprint:-none}')."
+    fi
+
+    decide_stage_squash "$folder_basename" "$squash_policy"
+    if [[ "$STAGE_SQUASH" == "y" && "$use_builder" != "y" ]]; then
+        log_warning "Squashing needs the buildx builder; $folder_basename is built unsquashed."
+        STAGE_SQUASH="n"
+        STAGE_SQUASH_REASON="no buildx builder"
+    fi
+
     local build_cmd_base="docker buildx build" # Assume buildx initially
-    local build_args=("--platform" "$platform" "-t" "$full_tag" "--build-arg" "BASE_IMAGE=$base_image_tag")
+    local build_args=("--platform" "$platform" "-t" "$fixed_tag")
+    if [[ "$base_image_tag" == oci-layout://* ]]; then
+        # Previous stage was kept in an OCI layout: feed it to FROM ${BASE_IMAGE} as a named context
+        build_args+=("--build-arg" "BASE_IMAGE=jetc-stage-base" "--build-context" "jetc-stage-base=$base_image_tag")
+    else
+        build_args+=("--build-arg" "BASE_IMAGE=$base_image_tag")
+    fi
+    local scripts_context
+    scripts_context=$(get_stage_scripts_context "$folder_path")
+    [[ -n "$scripts_context" ]] && build_args+=("--build-context" "jetc-scripts=$scripts_context")
+    # Locked build args come last so they win over the profile's
+    local extra_arg
+    for extra_arg in "${arch_args[@]}" "${lock_args[@]}"; do
+        build_args+=("--build-arg" "$extra_arg")
+    done
+    # The base it was built on lets is_stage_image_current check the image later
+    build_args+=("--label" "jetc.stage.fingerprint=$stage_fingerprint"
+        "--label" "jetc.stage.base=$base_image_tag" "--label" "jetc.stage.base.digest=$base_image_digest")
+    if [[ -n "$cuda_archs" ]]; then
+        build_args+=("--label" "jetc.cuda.arch_profile=$CUDA_ARCH_PROFILE" "--label" "jetc.cuda.architectures=$cuda_archs")
+    fi
+    # Local wheelhouse: builders publish their wheels to it (with the upload token as the
+    # jetc-wheelhouse secret), pip finds its wheels of the profile. Not part of the
+    # fingerprint: where a wheel comes from does not change the image.
+    if [[ "${USE_WHEELHOUSE:-n}" == "y" && -n "${WHEELHOUSE_URL:-}" ]]; then
+        build_args+=("--build-arg" "WHEELHOUSE_URL=$WHEELHOUSE_URL")
+        [[ -n "${WHEELHOUSE_TOKEN:-}" ]] && build_args+=("--secret" "id=jetc-wheelhouse,env=WHEELHOUSE_TOKEN")
+    fi
+    # Compiler cache: source-building stages compile through ccache over a BuildKit
+    # cache mount shared by all stages. Not part of the fingerprint either.
+    if [[ "${USE_COMPILER_CACHE:-n}" == "y" ]]; then
+        build_args+=("--build-arg" "USE_CCACHE=on" "--build-arg" "CCACHE_MAXSIZE=${COMPILER_CACHE_SIZE:-5G}")
+    fi
+    # Build jobs: compiling stages get a job count their memory fits, as the jetc-jobs secret.
+    # Stages built in parallel by the 'dag' scheduler share the memory.
+    local build_share=1
+    [[ "${BUILD_SCHEDULER:-serial}" == "dag" && "${BUILD_MAX_PARALLEL:-2}" =~ ^[1-9][0-9]*$ ]] && build_share="$BUILD_MAX_PARALLEL"
+    if decide_stage_build_jobs "$folder_path" "$build_share"; then
+        export JETC_BUILD_JOBS="$STAGE_BUILD_JOBS"
+        build_args+=("--secret" "id=jetc-jobs,env=JETC_BUILD_JOBS")
+    fi
     local push_flag=""
+    local oci_dir=""
 
     # REVERTED: Simplified logic, potentially ignoring use_builder='n' from UI
     if [[ "$skip_intermediate" == "n" ]]; then
         push_flag="--push"
-        log_info "Using --push (buildx)"
+        local compression_attrs
+        compression_attrs=$(get_image_compression_attrs)
+        if [[ -n "$compression_attrs" ]]; then
+            push_flag="--output=type=registry${compression_attrs}"
+            log_info "Using --push with ${IMAGE_COMPRESSION} layers (buildx)"
+        else
+            log_info "Using --push (buildx)"
+        fi
     else
         # If not pushing, assume buildx load or standard build (logic was complex, reverting to simpler state)
         # This might incorrectly use --load even if use_builder was 'n'
-        if [[ "$use_builder" == "y" ]]; then
+        if [[ "$use_builder" == "y" && "${STAGE_OUTPUT:-}" == "oci" ]]; then
+             oci_dir=$(get_stage_oci_dir "$folder_basename")
+             rm -rf "$oci_dir" && mkdir -p "$(dirname "$oci_dir")"
+             push_flag="--output=type=oci,dest=$oci_dir,tar=false"
+             log_info "Using OCI layout output (not loaded into docker): $oci_dir"
+        elif [[ "$use_builder" == "y" ]]; then
              push_flag="--load"
              log_info "Using --load (buildx)"
         else
@@ -142,10 +1164,27 @@ build_folder_image() {
         log_info "Using --no-cache"
     fi
 
-    if [[ "$use_squash" == "y" ]]; then
-        # Reverted: Simple squash logic, might conflict with buildx
-        build_args+=("--squash")
-        log_info "Using --squash"
+    # Squash: build into an OCI layout, flatten_stage_image merges the layers and exports
+    # the result with the output chosen above
+    local squash_dir="" squash_output=""
+    if [[ "$STAGE_SQUASH" == "y" ]]; then
+        squash_dir=$(get_stage_oci_dir "${folder_basename}.squash")
+        rm -rf "$squash_dir" && mkdir -p "$(dirname "$squash_dir")"
+        squash_output="$push_flag"
+        push_flag="--output=type=oci,dest=$squash_dir,tar=false"
+        log_info "Squashing: building into $squash_dir first"
+    fi
+
+    # Persistent BuildKit cache (needs the docker-container builder, not plain 'docker build')
+    if [[ "$build_cmd_base" == "docker buildx build" ]]; then
+        local cache_args=()
+        mapfile -t cache_args < <(get_stage_cache_args "$folder_basename" "$use_cache" "${registry_prefix}${docker_username}/${docker_repo_prefix}-cache")
+        if [[ ${#cache_args[@]} -gt 0 ]]; then
+            build_args+=("${cache_args[@]}")
+            log_info "Using persistent build cache (${BUILD_CACHE_BACKEND}, mode=${BUILD_CACHE_MODE:-max})"
+        fi
+    elif [[ "${BUILD_CACHE_BACKEND:-none}" != "none" ]]; then
+        log_warning "BUILD_CACHE_BACKEND=${BUILD_CACHE_BACKEND} requires the buildx builder. Persistent cache skipped."
     fi
 
     # Add push/load flag if determined
@@ -153,31 +1192,93 @@ build_folder_image() {
         build_args+=("$push_flag")
     fi
 
+    # Plain progress output lets us count cached steps afterwards
+    build_args+=("--progress=plain")
+
+    # Digest and build details for telemetry (buildx only)
+    local metadata_file=""
+    if [[ "$build_cmd_base" == "docker buildx build" ]]; then
+        metadata_file=$(mktemp) || { log_error "Failed to create temp file for build metadata."; return 1; }
+        build_args+=("--metadata-file" "$metadata_file")
+    fi
+
     # Add build context
     build_args+=("$folder_path")
 
     # Execute the build command
+    local progress_log
+    progress_log=$(mktemp) || { log_error "Failed to create temp file for build output."; return 1; }
+    local memory_watch=""
+    if [[ -n "$STAGE_BUILD_JOBS" ]]; then
+        memory_watch="${progress_log}.memory"
+        start_build_memory_watch "$memory_watch"
+    fi
     log_info "Running Build Command:"
     echo "CMD: $build_cmd_base ${build_args[*]}" # Log the exact command
-    if ! $build_cmd_base "${build_args[@]}"; then
+    $build_cmd_base "${build_args[@]}" 2>&1 | tee "$progress_log"
+    local build_status=${PIPESTATUS[0]}
+    [[ -n "$memory_watch" ]] && finish_build_memory_watch "$folder_basename" "$progress_log" "$memory_watch"
+    if [[ $build_status -ne 0 ]]; then
         log_error "!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!"
-        log_error "Error: Failed to build image for $image_name ($folder_path)."
+        log_error "Error: Failed to build image for $folder_basename ($folder_path)."
         log_error "!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!"
+        report_stage_cache_hits "$folder_basename" "$progress_log"
+        report_stage_compiler_cache "$folder_basename" "$progress_log"
+        report_stage_downloads "$folder_basename" "$progress_log"
+        record_stage_telemetry "$folder_basename" "$fixed_tag" "failed" "$((SECONDS - stage_start))"
+        rm -f "$progress_log" "$memory_watch" "$metadata_file"
         return 1
     fi
+    local build_seconds=$((SECONDS - stage_start))
+    report_stage_cache_hits "$folder_basename" "$progress_log"
+    report_stage_compiler_cache "$folder_basename" "$progress_log"
+    report_stage_downloads "$folder_basename" "$progress_log"
+    rm -f "$progress_log" "$memory_watch"
+    finalize_stage_cache "$folder_basename"
 
-    # Reverted: Simplified pull-back logic
+    if [[ -n "$squash_dir" ]]; then
+        local squash_status=0
+        flatten_stage_image "$folder_basename" "$squash_dir" "$base_image_tag" "$platform" "$fixed_tag" \
+            "$squash_output" "$metadata_file" || squash_status=1
+        rm -rf "$squash_dir"
+        if [[ $squash_status -ne 0 ]]; then
+            record_stage_telemetry "$folder_basename" "$fixed_tag" "failed" "$((SECONDS - stage_start))"
+            rm -f "$metadata_file"
+            return 1
+        fi
+    fi
+
+    if [[ -n "$oci_dir" ]]; then
+        local oci_digest
+        if ! oci_digest=$(get_oci_layout_digest "$oci_dir"); then
+            log_error "Build finished but no image digest was found in OCI layout $oci_dir."
+            record_stage_telemetry "$folder_basename" "$fixed_tag" "failed" "$((SECONDS - stage_start))"
+            rm -f "$metadata_file"
+            return 1
+        fi
+        export STAGE_OCI_REF="oci-layout://${oci_dir}@${oci_digest}"
+        log_info "Stage kept for the next stage as: $STAGE_OCI_REF"
+    fi
+
+    # Pushed: compare the registry's manifest digest with the pushed one instead of pulling the image back
     if [[ "$skip_intermediate" == "n" ]]; then
-        log_info "Pulling back pushed image to verify: $full_tag"
-        if ! pull_docker_image "$full_tag"; then
-            log_error "Pull-back verification failed for $full_tag."
-            # return 1 # Reverted: Don't fail build on pull-back error
+        log_info "Verifying pushed image by digest: $fixed_tag"
+        if ! verify_pushed_image "$fixed_tag" "$(get_metadata_digest "$metadata_file")"; then
+            log_error "Push verification failed for $fixed_tag."
+            # return 1 # Don't fail build on verification error
         else
-            log_success "Pull-back verification successful."
+            log_success "Push verification successful."
         fi
     fi
 
-    log_success "Build process completed successfully for: $full_tag"
+    record_stage_telemetry "$folder_basename" "$fixed_tag" "built" "$build_seconds" "$metadata_file" "$oci_dir"
+    rm -f "$metadata_file"
+    if [[ "$squash_policy" == "auto" ]]; then
+        measure_stage_layers "$folder_basename" "${STAGE_OCI_REF:-$fixed_tag}" "$base_image_tag" \
+            "$([[ "$skip_intermediate" == "n" ]] && echo y || echo n)" "$STAGE_SQUASH"
+    fi
+
+    log_success "Build process completed successfully for: $fixed_tag"
     return 0
 }
 
@@ -218,6 +1319,6 @@ fi
 # │       └── docker_helpers.sh  <- THIS FILE
 # └── ...                        <- Other project files
 #
-# Description: Helper functions for Docker operations (build, pull, etc.).
+# Description: Helper functions for Docker operations (build, pull, stage fingerprints, build cache, OCI handoff, telemetry, build lock, CUDA arch profile, wheelhouse, compiler cache, download volume, layer report, squash policy, digest push verification and manifest retags, zstd/eStargz layer compression and its benchmark, memory-governed build jobs, etc.).
 # Author: Mr K / GitHub Copilot
-# COMMIT-TRACKING: UUID-20250425-080000-42595D
+# COMMIT-TRACKING: UUID-20261017-052000-FX27
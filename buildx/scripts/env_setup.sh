@@ -68,6 +68,66 @@ export DEFAULT_BASE_IMAGE="${DEFAULT_BASE_IMAGE:-nvcr.io/nvidia/l4t-base:r35.4.1
 export BUILDER_NAME="${BUILDER_NAME:-jetson-builder}"
 export PLATFORM="${PLATFORM:-linux/arm64}"
 export AVAILABLE_IMAGES="${AVAILABLE_IMAGES:-}" # Initialize as empty string
+export BUILD_SCHEDULER="${BUILD_SCHEDULER:-serial}" # 'serial' (chain every stage), 'dag' (follow Dockerfile depends: headers) or 'bake' (one buildx bake run)
+export BUILD_MAX_PARALLEL="${BUILD_MAX_PARALLEL:-2}" # Max stages built at the same time by the 'dag' scheduler
+export BAKE_USE_GRAPH="${BAKE_USE_GRAPH:-n}" # 'bake' scheduler: link stages by the dependency graph instead of the serial chain
+export BAKE_EXPORT_ALL="${BAKE_EXPORT_ALL:-n}" # 'bake' scheduler: also load/push intermediate stage images (default: leaf images only)
+export SKIP_UNCHANGED_STAGES="${SKIP_UNCHANGED_STAGES:-y}" # Reuse a stage image whose fingerprint label still matches (only when cache is on)
+export STAGE_SELECTION_CLOSURE="${STAGE_SELECTION_CLOSURE:-n}" # 'y' adds the stale 'depends:' ancestors of the selected stages to the build
+export BUILD_CACHE_BACKEND="${BUILD_CACHE_BACKEND:-none}" # Persistent BuildKit cache per stage: none, local or registry
+export BUILD_CACHE_DIR="${BUILD_CACHE_DIR:-$PROJECT_ROOT/.buildcache}" # Root of the local cache backend (one subdirectory per stage)
+export BUILD_CACHE_REF="${BUILD_CACHE_REF:-}" # Registry cache repository (default: <registry>/<user>/<prefix>-cache, tagged per stage)
+export BUILD_CACHE_MODE="${BUILD_CACHE_MODE:-max}" # 'max' exports all intermediate layers, 'min' only the final ones
+export STAGE_HANDOFF="${STAGE_HANDOFF:-load}" # Local builds: 'load' every stage into docker, or 'oci' to pass intermediate stages as OCI layouts (final stage only is loaded)
+export STAGE_OCI_DIR="${STAGE_OCI_DIR:-$PROJECT_ROOT/.buildcache/oci}" # Where 'oci' handoff layouts are kept (one directory per stage)
+export BUILD_RESUME="${BUILD_RESUME:-n}" # 'y' continues the journaled run at its failed stage (same as build.sh --resume)
+export BUILD_JOURNAL_FILE="${BUILD_JOURNAL_FILE:-${LOG_DIR:-$PROJECT_ROOT/logs}/build_journal.log}" # Append-only record of the current build run
+export BUILD_TELEMETRY="${BUILD_TELEMETRY:-y}" # Record per-stage wall time, cache hits, size and digest in a SQLite history
+export BUILD_TELEMETRY_DB="${BUILD_TELEMETRY_DB:-$PROJECT_ROOT/logs/build_telemetry.db}" # Telemetry history database
+export BUILD_TELEMETRY_WINDOW="${BUILD_TELEMETRY_WINDOW:-5}" # Number of previous builds a stage is compared with
+export BUILD_TELEMETRY_SLOWER_PCT="${BUILD_TELEMETRY_SLOWER_PCT:-20}" # Flag a stage slower than the median of that window by this percentage
+export BUILD_TELEMETRY_BIGGER_PCT="${BUILD_TELEMETRY_BIGGER_PCT:-10}" # Flag a stage bigger than the median of that window by this percentage
+export PACKAGE_INDEX="${PACKAGE_INDEX:-y}" # Read stage headers from the cached package index (scripts/package_index.py)
+export PACKAGE_INDEX_CACHE="${PACKAGE_INDEX_CACHE:-$PROJECT_ROOT/.buildcache/package_index.json}" # Package index cache (keyed on Dockerfile/config.py mtimes and hashes)
+export METADATA_CACHE_DIR="${METADATA_CACHE_DIR:-$PROJECT_ROOT/.buildcache/metadata}" # Per-package PyPI/GitHub metadata cache used to resolve 'latest' versions
+export METADATA_TTL="${METADATA_TTL:-3600}" # Seconds before a cached metadata entry is revalidated (ETag/Last-Modified)
+export METADATA_MAX_WORKERS="${METADATA_MAX_WORKERS:-8}" # Concurrent metadata requests when resolving a build plan
+export METADATA_OFFLINE="${METADATA_OFFLINE:-n}" # 'y' resolves 'latest' versions only from the local snapshot (air-gapped builds)
+export METADATA_SNAPSHOT_DIR="${METADATA_SNAPSHOT_DIR:-$PROJECT_ROOT/.buildcache/metadata-snapshot}" # Snapshot written by 'package_index.py sync-metadata'
+export USE_BUILD_LOCK="${USE_BUILD_LOCK:-n}" # 'y' builds with the pinned build args and base image digests of BUILD_LOCKFILE instead of the Dockerfile defaults (also: build.sh --locked)
+export BUILD_ARGS_LIVE="${BUILD_ARGS_LIVE:-n}" # 'y' (without the lock) resolves the config.py args whose Dockerfile default floats (none, 'latest', a branch) when the build starts
+export BUILD_LOCKFILE="${BUILD_LOCKFILE:-$PROJECT_ROOT/build.lock.json}" # Lockfile written by 'python3 scripts/build_lock.py lock'
+export CUDA_ARCH_PROFILE="${CUDA_ARCH_PROFILE:-}" # Devices/SMs deployed to ('orin', 'xavier,orin', '87'); narrows CUDA_ARCHITECTURES (also: build.sh --arch-profile=...)
+export USE_WHEELHOUSE="${USE_WHEELHOUSE:-n}" # 'y' starts the local wheel index: builder stages publish wheels to it, pip finds them with --find-links
+export WHEELHOUSE_DIR="${WHEELHOUSE_DIR:-$PROJECT_ROOT/.buildcache/wheelhouse}" # Wheels served by scripts/wheelhouse.py
+export WHEELHOUSE_PORT="${WHEELHOUSE_PORT:-8099}" # Port of the local wheelhouse
+export WHEELHOUSE_URL="${WHEELHOUSE_URL:-}" # Use the wheelhouse of another host instead of starting one (e.g. http://192.168.1.10:8099)
+export WHEELHOUSE_HOST="${WHEELHOUSE_HOST:-}" # Address the local wheelhouse binds to (default: the Docker bridge gateway)
+export WHEELHOUSE_TOKEN="${WHEELHOUSE_TOKEN:-}" # Upload token (default: generated into WHEELHOUSE_DIR/token; set it to upload to WHEELHOUSE_URL)
+export USE_COMPILER_CACHE="${USE_COMPILER_CACHE:-n}" # 'y' compiles the source-building stages through ccache on a shared BuildKit cache mount
+export COMPILER_CACHE_SIZE="${COMPILER_CACHE_SIZE:-5G}" # Maximum size of the ccache mount (CCACHE_MAXSIZE)
+export BUILD_JOB_GOVERNOR="${BUILD_JOB_GOVERNOR:-y}" # 'y' sizes the compile job count of compiling stages from free memory and their learned memory per job
+export BUILD_MEM_PER_JOB="${BUILD_MEM_PER_JOB:-2G}" # Memory per compile job assumed for a stage before it is measured (unless its Dockerfile sets 'mem-per-job:')
+export BUILD_MEM_RESERVE="${BUILD_MEM_RESERVE:-1G}" # Memory left to the system when sizing the job count
+export BUILD_SWAP_FRACTION="${BUILD_SWAP_FRACTION:-0.25}" # Share of the free swap counted as build memory (swapping compilers thrash)
+export BUILD_MAX_JOBS="${BUILD_MAX_JOBS:-}" # Upper bound of the job count (empty: the number of cores)
+export LAYER_REPORT="${LAYER_REPORT:-n}" # 'y' writes logs/layers-<run>.txt: per-stage layer sizes, largest, overwritten and duplicate files of the final image
+export LAYER_REPORT_TOP="${LAYER_REPORT_TOP:-20}" # Rows per section of the layer report
+export SQUASH_POLICY="${SQUASH_POLICY:-}" # Per-stage squash policy overrides: '<folder>=y|n|auto' entries, '*=...' for the stages without a Dockerfile 'squash:' field
+export SQUASH_LAYER_SECONDS="${SQUASH_LAYER_SECONDS:-0.5}" # 'auto' squash: per-layer pull overhead assumed until enough layer pulls are timed
+export SQUASH_PULL_MBPS="${SQUASH_PULL_MBPS:-40}" # 'auto' squash: pull throughput (MB/s) assumed until enough layer pulls are timed
+export SQUASH_MEASURE_PULL="${SQUASH_MEASURE_PULL:-y}" # 'auto' squash: time the layer pulls of pushed stages from the registry
+export SQUASH_REMEASURE_BUILDS="${SQUASH_REMEASURE_BUILDS:-5}" # 'auto' squash: squashed builds after which a stage is built unsquashed to measure its layers again
+export INSECURE_REGISTRIES="${INSECURE_REGISTRIES:-}" # Registry hosts spoken to over plain http (localhost is always)
+export USE_BASE_MIRROR="${USE_BASE_MIRROR:-n}" # 'y' runs a local pull-through mirror of Docker Hub (registry:2) that the builder pulls base images from
+export BASE_MIRROR_HOST="${BASE_MIRROR_HOST:-}" # Use the mirror of another host instead of starting one (host:port, plain http)
+export BASE_MIRROR_PORT="${BASE_MIRROR_PORT:-5001}" # Port of the local mirror
+export BASE_MIRROR_BIND="${BASE_MIRROR_BIND:-}" # Address the local mirror is published on (default: the docker bridge gateway, not reachable from the LAN)
+export BASE_MIRROR_DIR="${BASE_MIRROR_DIR:-$PROJECT_ROOT/.buildcache/base-mirror}" # Mirrored blobs and the builder's buildkitd configuration
+export IMAGE_COMPRESSION="${IMAGE_COMPRESSION:-gzip}" # Layer compression of pushed images: gzip, zstd or estargz (seekable, lazily pullable)
+export IMAGE_COMPRESSION_LEVEL="${IMAGE_COMPRESSION_LEVEL:-}" # Compression level (empty: the format's default)
+export FINAL_IMAGE_COMPRESSION="${FINAL_IMAGE_COMPRESSION:-}" # Layer compression of the final timestamp tag (empty: IMAGE_COMPRESSION)
+export BASE_PREFETCH="${BASE_PREFETCH:-y}" # Prefetch the upstream base images of the selected stages into the mirror while the stages build
 
 # Load the primary .env file
 load_dotenv "$ENV_FILE"
@@ -110,6 +170,6 @@ log_debug "Environment setup script completed."
 # │       └── env_setup.sh       <- THIS FILE
 # └── ...                        <- Other project files
 #
-# Description: Initializes environment variables and loads .env file.
+# Description: Initializes environment variables and loads .env file. Adds build scheduler (serial/dag/bake), stage fingerprint, selection closure, build cache, stage handoff, journal, telemetry, package index, metadata client (online/offline snapshot), build lock, CUDA arch profile, wheelhouse, compiler cache, layer report, squash policy, registry, base image mirror, image compression and build job governor defaults.
 # Author: Mr K / GitHub Copilot
-# COMMIT-TRACKING: UUID-20250425-080000-42595D
+# COMMIT-TRACKING: UUID-20261017-051000-FX25
@@ -0,0 +1,254 @@
+# filepath: /workspaces/jetc/buildx/scripts/jetson_containers/__init__.py
+"""
+Local stand-in for the `jetson_containers` helpers imported by build/*/config.py.
+
+The target system is described by environment variables (set them in buildx/.env);
+anything not set is derived from L4T_VERSION and PLATFORM:
+
+    L4T_VERSION, JETPACK_VERSION, CUDA_VERSION, PYTHON_VERSION, LSB_RELEASE,
+    CUDA_ARCHITECTURES (e.g. '87' or '72;87'), PLATFORM (linux/arm64, linux/amd64), IS_SBSA
+
+CUDA_ARCH_PROFILE narrows CUDA_ARCHITECTURES to the SMs of the devices the images
+are deployed to ('orin', 'xavier,orin' or SM numbers such as '87'), so the
+compile-heavy builders only generate code for those.
+
+`package` is replaced by package_index.py with the package being configured
+before each config.py is evaluated. Latest-version lookups (github_latest_tag,
+github_branch_commit, pypi_utils.get_latest_version) return placeholders resolved
+by resolve_versions.
+"""
+import os
+import re
+import sys
+
+from packaging.version import Version
+
+
+def _env(name, default=None):
+    value = os.environ.get(name, '').strip()
+    return value if value else default
+
+
+def _env_flag(name):
+    return _env(name, 'n').lower() in ('y', 'yes', '1', 'true', 'on')
+
+
+# --- Target platform ---
+SYSTEM_ARCH = 'x86_64' if _env('PLATFORM', 'linux/arm64').split('/')[-1] in ('amd64', 'x86_64') else 'aarch64'
+SYSTEM_ARM = SYSTEM_ARCH == 'aarch64'
+SYSTEM_X86 = SYSTEM_ARCH == 'x86_64'
+DOCKER_ARCH = 'arm64' if SYSTEM_ARM else 'amd64'
+IS_SBSA = SYSTEM_ARM and _env_flag('IS_SBSA')
+IS_TEGRA = SYSTEM_ARM and not IS_SBSA
+
+# --- Software versions ---
+# L4T major -> (JetPack, Ubuntu, CUDA, CUDA architectures)
+_L4T_DEFAULTS = {
+    36: ('6.1', '22.04', '12.6', '87'),
+    35: ('5.1', '20.04', '11.4', '72;87'),
+    34: ('5.0', '20.04', '11.4', '72;87'),
+    32: ('4.6', '18.04', '10.2', '53;62;72'),
+}
+_PYTHON_DEFAULTS = {'18.04': '3.6', '20.04': '3.8', '22.04': '3.10', '24.04': '3.12'}
+
+L4T_VERSION = Version(_env('L4T_VERSION', '36.4.0'))
+_jetpack, _lsb, _cuda, _archs = _L4T_DEFAULTS.get(L4T_VERSION.major, _L4T_DEFAULTS[36])
+if not IS_TEGRA:
+    _lsb, _cuda, _archs = '24.04', '12.8', '90' if IS_SBSA else '80;86;89;90'
+
+JETPACK_VERSION = Version(_env('JETPACK_VERSION', _jetpack))
+LSB_RELEASE = _env('LSB_RELEASE', _lsb)
+CUDA_VERSION = Version(_env('CUDA_VERSION', _cuda))
+PYTHON_VERSION = Version(_env('PYTHON_VERSION', _PYTHON_DEFAULTS.get(LSB_RELEASE, '3.10')))
+CUDA_ARCHITECTURES = [int(x) for x in re.split(r'[\s,;]+', _env('CUDA_ARCHITECTURES', _archs)) if x]
+
+# --- Deployment profile ---
+# Device name -> SM of its GPU
+DEVICE_SMS = {'nano': 53, 'tx1': 53, 'tx2': 62, 'xavier': 72, 'agx-xavier': 72, 'xavier-nx': 72,
+              'orin': 87, 'agx-orin': 87, 'orin-nx': 87, 'orin-nano': 87}
+
+
+def profile_architectures(profile):
+    """SMs named by a CUDA_ARCH_PROFILE value ('orin', 'xavier,orin', '87', 'sm_87', '8.7')."""
+    sms = []
+    for item in re.split(r'[\s,;]+', profile.strip().lower()):
+        if not item:
+            continue
+        if item in DEVICE_SMS:
+            sm = DEVICE_SMS[item]
+        elif re.fullmatch(r'(sm_?)?\d+(\.\d)?', item):
+            number = item.removeprefix('sm').lstrip('_')
+            sm = int(number.replace('.', '')) if '.' in number else int(number)
+        else:
+            raise ValueError(f"unknown device '{item}' in CUDA_ARCH_PROFILE (known: {', '.join(sorted(DEVICE_SMS))}, or an SM number)")
+        if sm not in sms:
+            sms.append(sm)
+    return sms
+
+
+CUDA_ARCH_PROFILE = _env('CUDA_ARCH_PROFILE')
+if CUDA_ARCH_PROFILE:
+    try:
+        _deployed = profile_architectures(CUDA_ARCH_PROFILE)
+    except ValueError as _error:
+        print(f"WARNING: {_error}; keeping every target architecture", file=sys.stderr)
+        _deployed = CUDA_ARCHITECTURES
+    _narrowed = [x for x in CUDA_ARCHITECTURES if x in _deployed]
+    if _narrowed:
+        CUDA_ARCHITECTURES = _narrowed
+    else:
+        print(f"WARNING: CUDA_ARCH_PROFILE={CUDA_ARCH_PROFILE} shares no SM with the target architectures "
+              f"{';'.join(map(str, CUDA_ARCHITECTURES))}; keeping them all", file=sys.stderr)
+
+
+def cuda_arch_build_args(architectures=None):
+    """The architecture list in the forms the builders' build args take."""
+    archs = CUDA_ARCHITECTURES if architectures is None else architectures
+    return {
+        'CUDA_ARCHITECTURES': ';'.join(str(x) for x in archs),
+        'CUDA_ARCH_LIST': ';'.join(str(x) for x in archs),
+        'CUDA_ARCH_BIN': ','.join(f'{x/10:.1f}' for x in archs),
+        'TORCH_CUDA_ARCH_LIST': ';'.join(f'{x/10:.1f}' for x in archs),
+        'CUPY_NVCC_GENERATE_CODE': ';'.join(f"arch=compute_{x},code=sm_{x}" for x in archs),
+        'FLASH_ATTN_CUDA_ARCHS': ';'.join(str(x) for x in archs),
+    }
+
+# Package being configured (set by package_index.py before a config.py is evaluated)
+package = {}
+
+
+def log_warning(*args):
+    print('WARNING:', *args, file=sys.stderr)
+
+
+def package_requires(pkg, system_arch=None):
+    """Restrict a package to a system architecture unless its requirements already name one."""
+    requires = pkg.get('requires') or []
+    if isinstance(requires, str):
+        requires = [requires]
+    requires = list(requires)
+    if system_arch and not any(r in ('aarch64', 'x86_64') for r in requires):
+        requires.append(system_arch)
+    pkg['requires'] = requires
+    return pkg
+
+
+def update_dependencies(old, new):
+    """Add dependencies, replacing existing ones of the same package family ('cuda' vs 'cuda:12.6')."""
+    if isinstance(new, str):
+        new = [new]
+    old = list(old or [])
+    for dep in new:
+        family = dep.split(':')[0]
+        old = [d for d in old if d.split(':')[0] != family]
+        old.append(dep)
+    return old
+
+
+# --- Lazy versions ---
+# Floating versions ('latest') are stored in package definitions as placeholder
+# strings and only resolved (network lookup) for packages that are part of the
+# build plan, so evaluating the config.py files never waits on the network.
+# With METADATA_OFFLINE=y they are resolved from a local snapshot (see metadata.py).
+VERSION_PLACEHOLDER = re.compile(r'\{latest:(pypi|github|git):([^|}]+)(?:\|([^}]*))?\}')
+_resolved_versions = {}
+
+
+def version_placeholder(source, name, default=None):
+    """Placeholder for the latest version of a PyPI package ('pypi'), GitHub release ('github') or branch commit ('git')."""
+    return f"{{latest:{source}:{name}{'|' + default if default else ''}}}"
+
+
+def github_latest_tag(repo, default=None):
+    """Latest release tag of a GitHub repository (lazy placeholder, see resolve_versions)."""
+    return version_placeholder('github', repo, default)
+
+
+def github_branch_commit(repo, branch='HEAD'):
+    """
+    Commit a branch of a GitHub repository currently points to (lazy placeholder, see
+    resolve_versions). Falls back to the branch name itself when it cannot be looked up.
+    """
+    return version_placeholder('git', f"{repo}@{branch}", branch)
+
+
+def fetch_github_latest_tag(repo):
+    """Latest release tag of a GitHub repository, or None when it cannot be fetched."""
+    from .metadata import get_client, github_request
+    value = get_client().get(*github_request(repo))
+    return value['tag'] if value else None
+
+
+def _placeholder_request(source, name):
+    from .metadata import git_request, github_request, pypi_request
+    return {'pypi': pypi_request, 'github': github_request, 'git': git_request}[source](name)
+
+
+def _placeholder_value(source, value):
+    if not value:
+        return None
+    return value[{'pypi': 'version', 'github': 'tag', 'git': 'sha'}[source]]
+
+
+def find_placeholders(value, found=None):
+    """(source, name) of every version placeholder in a str/list/dict value."""
+    found = set() if found is None else found
+    if isinstance(value, str):
+        found.update((m.group(1), m.group(2)) for m in VERSION_PLACEHOLDER.finditer(value))
+    elif isinstance(value, dict):
+        for item in value.values():
+            find_placeholders(item, found)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            find_placeholders(item, found)
+    return found
+
+
+def prefetch_versions(value):
+    """Look up every placeholder found in `value` concurrently (one request wave)."""
+    from .metadata import get_client
+    missing = find_placeholders(value) - _resolved_versions.keys()
+    results = get_client().fetch_many({key: _placeholder_request(*key) for key in missing})
+    for key, result in results.items():
+        _resolved_versions[key] = _placeholder_value(key[0], result)
+
+
+def resolve_version(source, name, default=None):
+    """Resolve one placeholder (once per process); falls back to its default."""
+    key = (source, name)
+    if key not in _resolved_versions:
+        from .metadata import get_client
+        _resolved_versions[key] = _placeholder_value(source, get_client().get(*_placeholder_request(source, name)))
+    version = _resolved_versions[key] or default
+    if not version:
+        raise ValueError(f"could not resolve the latest version of {source}:{name} and it has no default")
+    return version
+
+
+def _substitute_versions(value):
+    if isinstance(value, str):
+        return VERSION_PLACEHOLDER.sub(lambda m: resolve_version(*m.groups()), value)
+    if isinstance(value, dict):
+        return {key: _substitute_versions(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_substitute_versions(item) for item in value]
+    return value
+
+
+def resolve_versions(value):
+    """Copy of a package (or list of packages, or any str/list/dict) with every version placeholder resolved."""
+    prefetch_versions(value)
+    return _substitute_versions(value)
+
+# --- Footer ---
+# File location diagram:
+# jetc/                              <- Main project folder
+# ├── buildx/                        <- Parent directory
+# │   └── scripts/                   <- Scripts directory
+# │       └── jetson_containers/     <- Current directory
+# │           └── __init__.py        <- THIS FILE
+# └── ...                            <- Other project files
+#
+# Description: Stand-in for the jetson_containers helpers used by build/*/config.py, with lazily resolved latest versions and branch commits (fetched in one concurrent wave) and deployment-profile CUDA architectures.
+# Author: Mr K / GitHub Copilot
+# COMMIT-TRACKING: UUID-20261017-013500-SMPR
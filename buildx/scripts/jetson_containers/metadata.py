@@ -0,0 +1,285 @@
+# filepath: /workspaces/jetc/buildx/scripts/jetson_containers/metadata.py
+"""
+Shared PyPI/GitHub metadata client of the jetson_containers stand-in.
+
+- keeps one keep-alive HTTPS connection per host and thread (no new session per request)
+- caches one small JSON entry per document (written atomically, each with its own TTL)
+- revalidates expired entries with ETag / Last-Modified, so unchanged documents cost a 304
+- fetches many documents concurrently (fetch_many), so a build plan is resolved in one wave
+
+With METADATA_OFFLINE=y nothing goes to the network: documents are read from a
+local snapshot (METADATA_SNAPSHOT_DIR), written by 'package_index.py sync-metadata':
+
+    <snapshot>/pypi/<package>.json        PyPI JSON document
+    <snapshot>/github/<owner>/<repo>.json {"tag_name": <latest release>, "tags": [...]}
+    <snapshot>/git/<owner>/<repo>@<ref>.json {"sha": <commit the branch/ref points to>}
+    <snapshot>/manifest.json              sync time and documents
+
+Settings: METADATA_CACHE_DIR (default .buildcache/metadata), METADATA_TTL (seconds,
+default 3600), METADATA_MAX_WORKERS (default 8), METADATA_OFFLINE (default n),
+METADATA_SNAPSHOT_DIR (default .buildcache/metadata-snapshot).
+"""
+import gzip
+import hashlib
+import http.client
+import json
+import os
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+from . import log_warning
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '.buildcache', 'metadata')
+DEFAULT_SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '.buildcache', 'metadata-snapshot')
+USER_AGENT = 'jetc-build/1.0'
+TIMEOUT = 10
+
+
+class MetadataClient:
+    """Conditional, cached JSON GETs over pooled connections."""
+
+    def __init__(self, cache_dir=None, ttl=None, max_workers=None, offline=None, snapshot_dir=None):
+        self.cache_dir = cache_dir or os.environ.get('METADATA_CACHE_DIR') or DEFAULT_CACHE_DIR
+        self.ttl = float(ttl if ttl is not None else os.environ.get('METADATA_TTL') or 3600)
+        self.max_workers = int(max_workers or os.environ.get('METADATA_MAX_WORKERS') or 8)
+        if offline is None:
+            offline = os.environ.get('METADATA_OFFLINE', 'n').lower() in ('y', 'yes', '1', 'true', 'on')
+        self.offline = offline
+        self.snapshot_dir = snapshot_dir or os.environ.get('METADATA_SNAPSHOT_DIR') or DEFAULT_SNAPSHOT_DIR
+        self._local = threading.local()
+
+    # --- cache entries ---
+
+    def _entry_path(self, key):
+        safe = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in key)
+        return os.path.join(self.cache_dir, f"{safe}-{hashlib.sha256(key.encode()).hexdigest()[:8]}.json")
+
+    def load_entry(self, key):
+        try:
+            with open(self._entry_path(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save_entry(self, key, entry):
+        path = self._entry_path(key)
+        tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_path, 'w') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path)
+        except OSError as error:
+            log_warning(f"failed to write metadata cache entry {path}: {error}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    # --- HTTP ---
+
+    def _connection(self, host):
+        pool = self._local.__dict__.setdefault('pool', {})
+        if host not in pool:
+            pool[host] = http.client.HTTPSConnection(host, timeout=TIMEOUT)
+        return pool[host]
+
+    def _request(self, url, headers):
+        parts = urllib.parse.urlsplit(url)
+        path = parts.path + (f"?{parts.query}" if parts.query else '')
+        for attempt in range(2):
+            conn = self._connection(parts.netloc)
+            try:
+                conn.request('GET', path, headers=headers)
+                response = conn.getresponse()
+                body = response.read()
+                return response.status, response.headers, body
+            except (http.client.HTTPException, OSError):
+                # stale keep-alive connection: reconnect once
+                conn.close()
+                self._local.pool.pop(parts.netloc, None)
+                if attempt:
+                    raise
+
+    def fetch_json(self, url, headers=None):
+        """Uncached GET of a JSON document (raises OSError/ValueError on failure)."""
+        request_headers = {'User-Agent': USER_AGENT, 'Accept': 'application/json', 'Accept-Encoding': 'gzip'}
+        request_headers.update(headers or {})
+        status, response_headers, body = self._request(url, request_headers)
+        if status != 200:
+            raise OSError(f"HTTP {status}")
+        if response_headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        return json.loads(body)
+
+    # --- offline snapshot ---
+
+    def snapshot_path(self, key):
+        return os.path.join(self.snapshot_dir, *key.split('/')) + '.json'
+
+    def _snapshot_value(self, key, extract):
+        try:
+            with open(self.snapshot_path(key)) as f:
+                return extract(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError) as error:
+            log_warning(f"offline: '{key}' is not in the metadata snapshot {self.snapshot_dir} ({error})")
+            return None
+
+    def save_snapshot(self, key, document):
+        path = self.snapshot_path(key)
+        tmp_path = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, 'w') as f:
+            json.dump(document, f)
+        os.replace(tmp_path, path)
+
+    def sync_snapshot(self, keys):
+        """
+        Download the snapshot documents of `keys` ('pypi/<package>', 'github/<owner>/<repo>',
+        'git/<owner>/<repo>@<ref>') concurrently. Returns the keys that failed.
+        """
+        def sync(key):
+            source, name = key.split('/', 1)
+            try:
+                self.save_snapshot(key, snapshot_document(self, source, name))
+                return None
+            except (OSError, ValueError, KeyError, http.client.HTTPException) as error:
+                log_warning(f"failed to snapshot {key}: {error}")
+                return key
+
+        keys = sorted(set(keys))
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(keys)))) as pool:
+            failed = [key for key in pool.map(sync, keys) if key]
+        manifest = {'synced_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                    'documents': [key for key in keys if key not in failed]}
+        try:
+            with open(self.snapshot_path('manifest')) as f:
+                manifest['documents'] = sorted(set(json.load(f).get('documents', [])) | set(manifest['documents']))
+        except (OSError, ValueError):
+            pass
+        self.save_snapshot('manifest', manifest)
+        return failed
+
+    # --- cached lookups ---
+
+    def get(self, key, url, extract, ttl=None, headers=None):
+        """
+        Cached value of `extract(document)` for the JSON document at `url`
+        (read from the snapshot in offline mode).
+        Returns None when the document is unavailable and nothing is cached.
+        """
+        if self.offline:
+            return self._snapshot_value(key, extract)
+
+        entry = self.load_entry(key)
+        now = time.time()
+        if entry and now - entry.get('fetched_at', 0) < entry.get('ttl', self.ttl):
+            return entry['value']
+
+        request_headers = {'User-Agent': USER_AGENT, 'Accept': 'application/json', 'Accept-Encoding': 'gzip'}
+        request_headers.update(headers or {})
+        if entry and entry.get('etag'):
+            request_headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            request_headers['If-Modified-Since'] = entry['last_modified']
+
+        try:
+            status, response_headers, body = self._request(url, request_headers)
+            if status == 304 and entry:
+                entry['fetched_at'] = now
+                self.save_entry(key, entry)
+                return entry['value']
+            if status != 200:
+                raise OSError(f"HTTP {status}")
+            if response_headers.get('Content-Encoding') == 'gzip':
+                body = gzip.decompress(body)
+            value = extract(json.loads(body))
+        except (OSError, ValueError, KeyError, http.client.HTTPException) as error:
+            if entry:
+                log_warning(f"{url}: {error}; using the cached value from {time.ctime(entry.get('fetched_at', 0))}")
+                return entry['value']
+            log_warning(f"{url}: {error}")
+            return None
+
+        self.save_entry(key, {
+            'url': url,
+            'value': value,
+            'fetched_at': now,
+            'ttl': ttl if ttl is not None else self.ttl,
+            'etag': response_headers.get('ETag'),
+            'last_modified': response_headers.get('Last-Modified'),
+        })
+        return value
+
+    def fetch_many(self, requests):
+        """Run several get() calls concurrently. `requests` = {name: (args...)}; returns {name: value}."""
+        if not requests:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(requests))) as pool:
+            futures = {name: pool.submit(self.get, *args) for name, args in requests.items()}
+            return {name: future.result() for name, future in futures.items()}
+
+
+_client = None
+
+
+def get_client():
+    """Process-wide metadata client (shared connection pool)."""
+    global _client
+    if _client is None:
+        _client = MetadataClient()
+    return _client
+
+
+def pypi_request(package_name):
+    """get() arguments for the latest version and release list of a PyPI package."""
+    return (f"pypi/{package_name}", f"https://pypi.org/pypi/{package_name}/json",
+            lambda doc: {'version': doc['info']['version'], 'releases': list(doc.get('releases', {}))})
+
+
+def _github_headers():
+    headers = {'Accept': 'application/vnd.github+json'}
+    if os.environ.get('GITHUB_TOKEN'):
+        headers['Authorization'] = f"token {os.environ['GITHUB_TOKEN']}"
+    return headers
+
+
+def github_request(repo):
+    """get() arguments for the latest release tag of a GitHub repository."""
+    return (f"github/{repo}", f"https://api.github.com/repos/{repo}/releases/latest",
+            lambda doc: {'tag': doc['tag_name']}, None, _github_headers())
+
+
+def git_request(name):
+    """get() arguments for the commit a branch/ref of a GitHub repository points to ('<owner>/<repo>@<ref>')."""
+    repo, ref = name.rsplit('@', 1)
+    return (f"git/{name}", f"https://api.github.com/repos/{repo}/commits/{urllib.parse.quote(ref, safe='')}",
+            lambda doc: {'sha': doc['sha']}, None, _github_headers())
+
+
+def snapshot_document(client, source, name):
+    """Document stored in the offline snapshot for a PyPI package, GitHub repository or branch commit."""
+    if source == 'pypi':
+        return client.fetch_json(f"https://pypi.org/pypi/{name}/json")
+    if source == 'git':
+        _, url, extract, _, headers = git_request(name)
+        return extract(client.fetch_json(url, headers))
+    tags = [tag['name'] for tag in client.fetch_json(f"https://api.github.com/repos/{name}/tags?per_page=100", _github_headers())]
+    try:
+        latest = client.fetch_json(f"https://api.github.com/repos/{name}/releases/latest", _github_headers())['tag_name']
+    except OSError:
+        latest = tags[0] if tags else None  # repository without releases
+    return {'tag_name': latest, 'tags': tags}
+
+# --- Footer ---
+# File location diagram:
+# jetc/                              <- Main project folder
+# ├── buildx/                        <- Parent directory
+# │   └── scripts/                   <- Scripts directory
+# │       └── jetson_containers/     <- Current directory
+# │           └── metadata.py        <- THIS FILE
+# └── ...                            <- Other project files
+#
+# Description: Pooled, conditional (ETag/Last-Modified), cached PyPI/GitHub metadata client (versions, release tags, branch commits) with an offline snapshot mode.
+# Author: Mr K / GitHub Copilot
+# COMMIT-TRACKING: UUID-20261017-010500-LOCK
@@ -0,0 +1,28 @@
+# filepath: /workspaces/jetc/buildx/scripts/jetson_containers/pypi_utils.py
+"""PyPI helpers of the jetson_containers stand-in."""
+from . import version_placeholder
+from .metadata import get_client, pypi_request
+
+
+def get_latest_version(package_name, default=None):
+    """Latest released version of a PyPI package (lazy placeholder, see resolve_versions)."""
+    return version_placeholder('pypi', package_name, default)
+
+
+def fetch_latest_version(package_name):
+    """Latest released version of a PyPI package, or None when it cannot be fetched."""
+    value = get_client().get(*pypi_request(package_name))
+    return value['version'] if value else None
+
+# --- Footer ---
+# File location diagram:
+# jetc/                              <- Main project folder
+# ├── buildx/                        <- Parent directory
+# │   └── scripts/                   <- Scripts directory
+# │       └── jetson_containers/     <- Current directory
+# │           └── pypi_utils.py      <- THIS FILE
+# └── ...                            <- Other project files
+#
+# Description: Lazy PyPI version lookups for build/*/config.py (through the shared metadata client).
+# Author: Mr K / GitHub Copilot
+# COMMIT-TRACKING: UUID-20261017-004500-MDCL
@@ -0,0 +1,497 @@
+#!/usr/bin/env python3
+# filepath: /workspaces/jetc/buildx/scripts/layer_analyzer.py
+"""
+Layer-size and cross-stage duplication analyzer.
+
+Streams the layers of an image through tarfile in stream mode, from the docker
+daemon ('docker image save'), from a registry (scripts/registry.py, anonymous or
+with the credentials of ~/.docker/config.json) or from an OCI layout directory such as
+the STAGE_HANDOFF=oci stage outputs. Nothing is extracted or written to disk;
+only the names, sizes and content hashes of the files are kept.
+
+Each layer is attributed to the stage that added it: the first stage image (in
+build order) whose layer list (rootfs diff_ids) contains it. The stages come
+from --stage, or from the last run in the build journal (base image first).
+
+The report shows:
+    - per stage: the layers, bytes and files it adds, the bytes it overwrites
+      or deletes from earlier stages and the bytes of it that later stages
+      overwrite or delete (still pulled and stored on the device)
+    - the largest files
+    - shadowed files: overwritten or deleted by a later layer, grouped by
+      Python package or directory ('identical' = replaced by the same content,
+      e.g. a package reinstalled at the same version)
+    - duplicate files: the same content stored at several paths
+
+Usage:
+    layer_analyzer.py [IMAGE] [--stage [NAME=]REF]... [--journal FILE]
+                      [--from auto|docker|registry|oci] [--platform P]
+                      [--top N] [--min-size BYTES] [--no-hash] [--json FILE]
+
+IMAGE and REF are docker image references or oci-layout://DIR[@sha256:...].
+Without IMAGE the last stage of the journal is analyzed.
+"""
+import argparse
+import hashlib
+import heapq
+import io
+import json
+import os
+import posixpath
+import re
+import shutil
+import subprocess
+import sys
+import tarfile
+from bisect import bisect_left
+from collections import namedtuple
+
+from build_telemetry import human_size
+from package_index import SCRIPT_DIR, log_warning
+from registry import client_for, select_platform
+
+DEFAULT_JOURNAL = os.path.join(SCRIPT_DIR, '..', 'logs', 'build_journal.log')
+SMALL_MEMBER = 1 << 20      # 'docker image save' members read into memory (JSON documents, tiny layers)
+CHUNK = 1 << 20
+SITE_PACKAGES = re.compile(r'^(.*/(?:site|dist)-packages/[^/]+)')
+
+# One layer of the analyzed image: diff_id, compressed size (None from the daemon), LayerScan
+Layer = namedtuple('Layer', ('diff_id', 'compressed', 'scan'))
+
+
+class LayerScan:
+    """Files of one layer (path -> (size, content hash or None)) and the paths it deletes."""
+
+    __slots__ = ('files', 'whiteouts', 'opaque', 'size')
+
+    def __init__(self):
+        self.files = {}
+        self.whiteouts = []     # deleted paths (files or whole directories)
+        self.opaque = []        # directories whose lower-layer content is hidden
+        self.size = 0
+
+
+def scan_layer(fileobj, mode='r|*', min_hash_size=1 << 20):
+    """Read a layer tar stream; content of files of at least `min_hash_size` bytes is hashed (None: never)."""
+    scan = LayerScan()
+    with tarfile.open(fileobj=fileobj, mode=mode) as tar:
+        for member in tar:
+            path = posixpath.normpath('/' + member.name.lstrip('/'))
+            parent, base = posixpath.split(path)
+            if base == '.wh..wh..opq':
+                scan.opaque.append(parent)
+            elif base.startswith('.wh.'):
+                scan.whiteouts.append(posixpath.join(parent, base[4:]))
+            elif member.isfile():
+                digest = None
+                if min_hash_size is not None and member.size >= min_hash_size:
+                    content = tar.extractfile(member)
+                    hasher = hashlib.blake2b(digest_size=16)
+                    for chunk in iter(lambda: content.read(CHUNK), b''):
+                        hasher.update(chunk)
+                    digest = hasher.hexdigest()
+                scan.files[path] = (member.size, digest)
+                scan.size += member.size
+            elif member.issym() or member.islnk():
+                scan.files[path] = (0, None)    # replaces whatever the lower layers had there
+    return scan
+
+
+# --- Image sources ---
+
+class DockerSource:
+    """Image of the local docker daemon, streamed with 'docker image save'."""
+
+    def __init__(self, ref, platform=None):
+        self.ref = ref
+
+    def diff_ids(self):
+        result = subprocess.run(['docker', 'image', 'inspect', '--format', '{{json .RootFS.Layers}}', self.ref],
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            raise LookupError(f"{self.ref}: not found in the docker daemon")
+        return json.loads(result.stdout) or []
+
+    def layers(self, min_hash_size):
+        # The archive order of the layers is arbitrary; manifest.json (at the end) gives the order
+        process = subprocess.Popen(['docker', 'image', 'save', self.ref], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        scans, documents = {}, {}
+        try:
+            with tarfile.open(fileobj=process.stdout, mode='r|') as archive:
+                for member in archive:
+                    if not member.isfile():
+                        continue
+                    content = archive.extractfile(member)
+                    if member.size > SMALL_MEMBER:
+                        scans[member.name] = scan_layer(content, 'r|*', min_hash_size)
+                        continue
+                    data = content.read()
+                    try:
+                        documents[member.name] = json.loads(data)
+                        continue
+                    except ValueError:
+                        pass
+                    try:
+                        scans[member.name] = scan_layer(io.BytesIO(data), 'r:*', min_hash_size)
+                    except tarfile.TarError:
+                        pass
+        except tarfile.TarError as error:
+            raise LookupError(f"{self.ref}: cannot read 'docker image save' output: {error}") from None
+        finally:
+            process.stdout.close()
+            stderr = process.stderr.read().decode(errors='replace').strip()
+            if process.wait() != 0:
+                raise LookupError(f"{self.ref}: docker image save failed: {stderr}")
+        manifest = (documents.get('manifest.json') or [{}])[0]
+        config = documents.get(manifest.get('Config'), {})
+        diff_ids = config.get('rootfs', {}).get('diff_ids', [])
+        return [Layer(diff_id, None, scans.get(name) or LayerScan()) for name, diff_id in zip(manifest.get('Layers', []), diff_ids)]
+
+
+class ManifestSource:
+    """Image described by manifests and blobs (registry or OCI layout)."""
+
+    def __init__(self, platform):
+        self.platform = platform
+        self._manifest = None
+
+    def manifest(self):
+        if self._manifest is None:
+            document = self.root()
+            while document.get('manifests') is not None:  # image index / manifest list
+                document = self.read_manifest(select_platform(document['manifests'], self.platform)['digest'])
+            self._manifest = document
+        return self._manifest
+
+    def diff_ids(self):
+        config = json.loads(self.read_blob(self.manifest()['config']['digest']))
+        return config.get('rootfs', {}).get('diff_ids', [])
+
+    def layers(self, min_hash_size):
+        layers = []
+        for descriptor, diff_id in zip(self.manifest().get('layers', []), self.diff_ids()):
+            if 'zstd' in descriptor.get('mediaType', ''):
+                log_warning(f"{descriptor['digest'][:19]}: zstd layers cannot be streamed with tarfile; counted by size only")
+                layers.append(Layer(diff_id, descriptor.get('size'), LayerScan()))
+                continue
+            with self.open_blob(descriptor['digest']) as stream:
+                layers.append(Layer(diff_id, descriptor.get('size'), scan_layer(stream, 'r|*', min_hash_size)))
+        return layers
+
+
+class OCILayoutSource(ManifestSource):
+    """Image in an OCI layout directory: oci-layout://DIR[@sha256:...] or DIR."""
+
+    def __init__(self, ref, platform):
+        super().__init__(platform)
+        path = ref[len('oci-layout://'):] if ref.startswith('oci-layout://') else ref
+        self.dir, _, self.digest = path.partition('@')
+
+    def _blob_path(self, digest):
+        algorithm, _, hex_digest = digest.partition(':')
+        return os.path.join(self.dir, 'blobs', algorithm, hex_digest)
+
+    def root(self):
+        if self.digest:
+            return self.read_manifest(self.digest)
+        try:
+            with open(os.path.join(self.dir, 'index.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError) as error:
+            raise LookupError(f"{self.dir}: not an OCI layout ({error})") from None
+
+    def read_manifest(self, digest):
+        return json.loads(self.read_blob(digest))
+
+    def read_blob(self, digest):
+        try:
+            with open(self._blob_path(digest), 'rb') as f:
+                return f.read()
+        except OSError as error:
+            raise LookupError(f"{self.dir}: missing blob {digest}") from error
+
+    def open_blob(self, digest):
+        return open(self._blob_path(digest), 'rb')
+
+
+class RegistrySource(ManifestSource):
+    """Image in a registry (distribution API v2), blobs streamed over HTTP."""
+
+    def __init__(self, ref, platform):
+        super().__init__(platform)
+        self.client, self.reference = client_for(ref)
+
+    def root(self):
+        return self.read_manifest(self.reference)
+
+    def read_manifest(self, reference):
+        return json.loads(self.client.get_manifest(reference)[0])
+
+    def read_blob(self, digest):
+        with self.client.open_blob(digest) as response:
+            return response.read()
+
+    def open_blob(self, digest):
+        return self.client.open_blob(digest)
+
+
+
+def open_source(ref, kind='auto', platform='linux/arm64'):
+    """Image source of a reference ('auto': OCI layout, else the daemon if it has the image, else the registry)."""
+    if kind == 'oci' or ref.startswith('oci-layout://') or (kind == 'auto' and os.path.isfile(os.path.join(ref, 'index.json'))):
+        return OCILayoutSource(ref, platform)
+    if kind == 'docker':
+        return DockerSource(ref)
+    if kind == 'registry':
+        return RegistrySource(ref, platform)
+    if shutil.which('docker') and subprocess.run(['docker', 'image', 'inspect', ref], capture_output=True).returncode == 0:
+        return DockerSource(ref)
+    return RegistrySource(ref, platform)
+
+
+# --- Stages ---
+
+def journal_stages(path):
+    """[(name, ref)] of the last run in the build journal: its base image, then the completed stages."""
+    stages, base = [], None
+    with open(path) as f:
+        for line in f:
+            fields = line.rstrip('\n').split('\t')
+            event = fields[1] if len(fields) > 1 else ''
+            if event == 'run':
+                stages, base = [], None
+            elif event == 'setting' and len(fields) > 3 and fields[2] == 'SELECTED_BASE_IMAGE':
+                base = fields[3] or None
+            elif event == 'done' and len(fields) > 3:
+                # A stage kept in an OCI layout (STAGE_HANDOFF=oci) is read from there
+                handoff = fields[5] if len(fields) > 5 else ''
+                stages.append((fields[2], handoff or fields[3]))
+    return ([('base', base)] if base else []) + stages
+
+
+def stage_owners(stages, kind, platform):
+    """{diff_id: stage name}: every layer belongs to the first stage image that has it."""
+    owners = {}
+    for name, ref in stages:
+        try:
+            diff_ids = open_source(ref, kind, platform).diff_ids()
+        except LookupError as error:
+            log_warning(f"stage {name}: {error}; its layers are attributed to the next stage")
+            continue
+        for diff_id in diff_ids:
+            owners.setdefault(diff_id, name)
+    return owners
+
+
+# --- Analysis ---
+
+def path_group(path):
+    """Python package directory of a path, or its directory three levels deep."""
+    match = SITE_PACKAGES.match(path)
+    if match:
+        return match.group(1)
+    parts = path.split('/')
+    return '/'.join(parts[:4]) if len(parts) > 4 else posixpath.dirname(path)
+
+
+class Analysis:
+    """Per-stage sizes, largest files, shadowed and duplicate files of the streamed layers."""
+
+    def __init__(self, layers, labels, top, min_size):
+        self.stages = {}        # label -> counters, in layer order
+        self.shadowed = {}      # (group, from label, by label) -> [bytes, files, identical bytes]
+        largest = []            # min-heap of (size, path, label, layer index)
+        visible = {}            # path -> (size, digest, layer index)
+
+        for index, (layer, label) in enumerate(zip(layers, labels)):
+            stage = self.stages.setdefault(label, {'layers': 0, 'bytes': 0, 'compressed': 0, 'files': 0,
+                                                   'shadows': 0, 'shadowed_later': 0})
+            stage['layers'] += 1
+            stage['bytes'] += layer.scan.size
+            stage['compressed'] = None if layer.compressed is None or stage['compressed'] is None \
+                else stage['compressed'] + layer.compressed
+            stage['files'] += len(layer.scan.files)
+
+            # Deletions apply to the lower layers only, so they go first
+            deleted = [(path, True) for path in layer.scan.whiteouts] + [(path, False) for path in layer.scan.opaque]
+            paths = sorted(visible) if deleted else []
+            for directory_or_file, include_self in deleted:
+                if include_self and directory_or_file in visible:
+                    self._shadow(directory_or_file, visible.pop(directory_or_file), None, labels, label)
+                prefix = directory_or_file.rstrip('/') + '/'
+                for position in range(bisect_left(paths, prefix), len(paths)):
+                    path = paths[position]
+                    if not path.startswith(prefix):
+                        break
+                    if path in visible:
+                        self._shadow(path, visible.pop(path), None, labels, label)
+
+            for path, (size, digest) in layer.scan.files.items():
+                previous = visible.get(path)
+                if previous is not None:
+                    self._shadow(path, previous, digest, labels, label)
+                visible[path] = (size, digest, index)
+                if size >= min_size:
+                    entry = (size, path, label, index)
+                    if len(largest) < top:
+                        heapq.heappush(largest, entry)
+                    elif entry > largest[0]:
+                        heapq.heapreplace(largest, entry)
+
+        self.largest = sorted(largest, reverse=True)
+        self.total = sum(stage['bytes'] for stage in self.stages.values())
+        self.visible_bytes = sum(size for size, _, _ in visible.values())
+
+        groups = {}
+        for path, (size, digest, index) in visible.items():
+            if digest is not None and size >= min_size:
+                groups.setdefault(digest, []).append((path, labels[index], size))
+        self.duplicates = sorted(((copies[0][2] * (len(copies) - 1), copies) for copies in groups.values() if len(copies) > 1),
+                                 key=lambda item: -item[0])
+
+    def _shadow(self, path, previous, digest, labels, label):
+        """Account the bytes of `previous` (size, digest, layer) that a later layer overwrites or deletes."""
+        size, old_digest, index = previous
+        if not size:
+            return
+        old_label = labels[index]
+        entry = self.shadowed.setdefault((path_group(path), old_label, label), [0, 0, 0])
+        entry[0] += size
+        entry[1] += 1
+        if digest is not None and digest == old_digest:
+            entry[2] += size
+        self.stages[old_label]['shadowed_later'] += size
+        self.stages[label]['shadows'] += size
+
+    def shadowed_groups(self):
+        return sorted(((key, value) for key, value in self.shadowed.items()), key=lambda item: -item[1][0])
+
+    def to_json(self, image, top):
+        return {
+            'image': image,
+            'total_bytes': self.total,
+            'visible_bytes': self.visible_bytes,
+            'stages': [dict(stage, name=name) for name, stage in self.stages.items()],
+            'largest': [{'path': path, 'size': size, 'stage': label} for size, path, label, _ in self.largest],
+            'shadowed': [{'group': group, 'stage': old, 'by': new, 'bytes': value[0], 'files': value[1], 'identical_bytes': value[2]}
+                         for (group, old, new), value in self.shadowed_groups()[:top]],
+            'duplicates': [{'wasted': wasted, 'copies': [{'path': p, 'stage': s, 'size': size} for p, s, size in copies]}
+                           for wasted, copies in self.duplicates[:top]],
+        }
+
+
+def print_table(rows):
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    for row in rows:
+        print('  ' + '  '.join(col.ljust(w) for col, w in zip(row, widths)).rstrip())
+
+
+def print_report(analysis, image, top):
+    wasted = analysis.total - analysis.visible_bytes
+    print(f"Image: {image}")
+    print(f"  {human_size(analysis.total)} in layers, {human_size(analysis.visible_bytes)} visible, "
+          f"{human_size(wasted)} overwritten or deleted by later layers")
+
+    print("Per stage:")
+    rows = [['STAGE', 'LAYERS', 'SIZE', 'COMPRESSED', 'FILES', 'OVERWRITES', 'OVERWRITTEN-LATER']]
+    for name, stage in analysis.stages.items():
+        rows.append([name, str(stage['layers']), human_size(stage['bytes']), human_size(stage['compressed']),
+                     str(stage['files']), human_size(stage['shadows']), human_size(stage['shadowed_later'])])
+    print_table(rows)
+
+    if analysis.largest:
+        print(f"Largest files (top {top}):")
+        print_table([['SIZE', 'STAGE', 'PATH']] + [[human_size(size), label, path] for size, path, label, _ in analysis.largest])
+
+    groups = analysis.shadowed_groups()
+    if groups:
+        print(f"Overwritten or deleted by a later stage (top {top} of {len(groups)}):")
+        rows = [['BYTES', 'FILES', 'IDENTICAL', 'STAGE', 'BY', 'PATH']]
+        for (group, old, new), (size, files, identical) in groups[:top]:
+            rows.append([human_size(size), str(files), human_size(identical), old, new, group])
+        print_table(rows)
+
+    if analysis.duplicates:
+        total = sum(wasted for wasted, _ in analysis.duplicates)
+        print(f"Duplicate files: {human_size(total)} in {len(analysis.duplicates)} groups (top {top}):")
+        rows = [['WASTED', 'COPIES', 'STAGES', 'PATHS']]
+        for wasted, copies in analysis.duplicates[:top]:
+            stages = ','.join(sorted({label for _, label, _ in copies}))
+            paths = ' '.join(path for path, _, _ in copies[:2]) + (' ...' if len(copies) > 2 else '')
+            rows.append([human_size(wasted), f"{len(copies)}x{human_size(copies[0][2])}", stages, paths])
+        print_table(rows)
+
+
+def parse_stage(value):
+    """'NAME=REF' or 'REF' (named after its tag)."""
+    name, sep, ref = value.partition('=')
+    if sep and '/' not in name and ':' not in name:
+        return name, ref
+    return value.rstrip('/').rsplit('/', 1)[-1].rsplit(':', 1)[-1], value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream image layers and report sizes, shadowed and duplicate files per stage")
+    parser.add_argument('image', nargs='?', help="image to analyze (default: the last stage of the journal)")
+    parser.add_argument('--stage', action='append', default=[], metavar='[NAME=]REF',
+                        help="stage image, in build order (repeat); layers are attributed to the first stage that has them")
+    parser.add_argument('--journal', nargs='?', const=os.environ.get('BUILD_JOURNAL_FILE') or DEFAULT_JOURNAL,
+                        help="take the stages from the last run in the build journal")
+    parser.add_argument('--from', dest='kind', choices=['auto', 'docker', 'registry', 'oci'], default='auto')
+    parser.add_argument('--platform', default=os.environ.get('PLATFORM') or 'linux/arm64')
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--min-size', type=int, default=1 << 20,
+                        help="smallest file (bytes) listed as largest or duplicate (default: 1 MiB)")
+    parser.add_argument('--no-hash', action='store_true', help="do not hash file contents (no duplicate detection)")
+    parser.add_argument('--json', metavar='FILE', help="also write the report as JSON")
+    args = parser.parse_args(argv)
+
+    stages = [parse_stage(value) for value in args.stage]
+    if args.journal:
+        try:
+            stages = journal_stages(args.journal) + stages
+        except OSError as error:
+            log_warning(f"cannot read the build journal: {error}")
+            return 1
+    image = args.image or (stages[-1][1] if stages else None)
+    if not image:
+        parser.error("no image given and no stages found")
+
+    owners = stage_owners(stages, args.kind, args.platform)
+    try:
+        layers = open_source(image, args.kind, args.platform).layers(None if args.no_hash else args.min_size)
+    except (LookupError, OSError, tarfile.TarError) as error:
+        log_warning(str(error))
+        return 1
+    if not layers:
+        log_warning(f"{image}: no layers found")
+        return 1
+
+    labels, label = [], 'base'
+    for index, layer in enumerate(layers):
+        # A layer no stage image has (unknown base, stage not found) stays with the stage before it
+        label = owners.get(layer.diff_id) or (label if owners else f"layer {index:02d}")
+        labels.append(label)
+
+    analysis = Analysis(layers, labels, args.top, args.min_size)
+    print_report(analysis, image, args.top)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(analysis.to_json(image, args.top), f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+# --- Footer ---
+# File location diagram:
+# jetc/                          <- Main project folder
+# ├── buildx/                    <- Parent directory
+# │   └── scripts/               <- Current directory
+# │       └── layer_analyzer.py  <- THIS FILE
+# └── ...                        <- Other project files
+#
+# Description: Streams image layers (daemon, registry or OCI layout) and reports per-stage sizes, largest files, overwritten/deleted and duplicate files.
+# Author: Mr K / GitHub Copilot
+# COMMIT-TRACKING: UUID-20261017-023500-RGST
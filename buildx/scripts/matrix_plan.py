@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+# filepath: /workspaces/jetc/buildx/scripts/matrix_plan.py
+"""
+Build-matrix planner.
+
+Expands the chosen (platform, L4T, CUDA, Python) combinations into build plans
+(package_index.py 'plan', evaluated for each combination in parallel, each with
+its own index cache) and merges them into one prefix tree. A stage node is
+identified by its parent node, platform, package folder, Dockerfile, name and
+build args, so a stage that is the same in several combinations (build-essential,
+python, ...) becomes one node, built once for the whole matrix; combinations
+only fork where their plans start to differ. Nodes are ordered depth first, so
+every combination follows the one it shares the longest stage prefix with.
+
+The plan can be written as JSON (--json) or as a 'docker buildx bake' file
+(--bake) in which every node is one target built on its parent target through
+a named context, as in bake_plan.sh; its 'latest' versions are looked up once
+for the whole matrix.
+
+Usage:
+    matrix_plan.py PACKAGE... [--platform P]... [--l4t V]... [--cuda V]... [--python V]...
+                   [--base IMAGE] [--repo REPO] [--push] [--json FILE] [--bake FILE]
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import re
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from package_index import DEFAULT_BUILD_DIR, DEFAULT_CACHE, SCRIPT_DIR, log_warning
+
+STAGE_SCRIPTS_DIR = os.path.join(SCRIPT_DIR, 'stage')
+
+
+class Combination:
+    """One point of the build matrix and the environment the config.py files are evaluated with."""
+
+    def __init__(self, platform, l4t, cuda, python):
+        self.platform, self.l4t, self.cuda, self.python = platform, l4t, cuda, python
+
+    @property
+    def label(self):
+        parts = [self.platform.split('/')[-1]]
+        parts += [f"{prefix}{value}" for prefix, value in (('r', self.l4t), ('cu', self.cuda), ('py', self.python)) if value]
+        return '-'.join(parts)
+
+    def env(self):
+        env = dict(os.environ, PLATFORM=self.platform)
+        for name, value in (('L4T_VERSION', self.l4t), ('CUDA_VERSION', self.cuda), ('PYTHON_VERSION', self.python)):
+            if value:
+                env[name] = value
+            else:
+                env.pop(name, None)  # derived from L4T_VERSION/PLATFORM by the stand-in
+        return env
+
+
+def expand(platforms, l4ts, cudas, pythons):
+    """Every combination of the given values (None = derived)."""
+    return [Combination(*values) for values in itertools.product(platforms, l4ts or [None], cudas or [None], pythons or [None])]
+
+
+def combination_plan(combination, packages, build_dir, cache_dir):
+    """Packages (dependencies first) of the build plan of one combination."""
+    command = [sys.executable, os.path.join(SCRIPT_DIR, 'package_index.py'), '--build-dir', build_dir,
+               '--cache', os.path.join(cache_dir, f"package_index-{combination.label}.json"), 'plan', *packages]
+    result = subprocess.run(command, env=combination.env(), capture_output=True, text=True)
+    for line in result.stderr.splitlines():
+        log_warning(f"{combination.label}: {line.removeprefix('WARNING: ')}")
+    if result.returncode != 0:
+        raise RuntimeError(f"{combination.label}: package_index.py plan failed")
+    return json.loads(result.stdout)
+
+
+def node_key(parent, platform, pkg):
+    """Identity of a stage image: same parent and same inputs = same image."""
+    inputs = [parent, platform, pkg['path'], pkg.get('dockerfile'), pkg['name'], sorted((pkg.get('build_args') or {}).items())]
+    return hashlib.sha256(json.dumps(inputs, default=str).encode()).hexdigest()[:16]
+
+
+class MatrixPlan:
+    """Prefix tree of the build plans of a matrix."""
+
+    def __init__(self):
+        self.nodes = {}      # key -> node
+        self.roots = []
+        self.leaves = {}     # combination label -> key of its last stage
+        self.naive = 0       # stage builds without sharing
+
+    def add(self, combination, plan):
+        parent = None
+        for pkg in plan:
+            key = node_key(parent, combination.platform, pkg)
+            node = self.nodes.get(key)
+            if node is None:
+                node = self.nodes[key] = {'key': key, 'parent': parent, 'package': pkg, 'platform': combination.platform,
+                                          'children': [], 'combinations': []}
+                (self.nodes[parent]['children'] if parent else self.roots).append(key)
+            node['combinations'].append(combination.label)
+            parent = key
+        self.naive += len(plan)
+        if parent:
+            self.leaves[combination.label] = parent
+
+    def order(self):
+        """Node keys depth first: each node once, after its parent, sharing combinations next to each other."""
+        ordered = []
+
+        def visit(key):
+            ordered.append(key)
+            # Children used by more combinations first, so the widest shared prefix is finished early
+            for child in sorted(self.nodes[key]['children'], key=lambda k: (-len(self.nodes[k]['combinations']), k)):
+                visit(child)
+
+        for root in sorted(self.roots, key=lambda k: (-len(self.nodes[k]['combinations']), k)):
+            visit(root)
+        return ordered
+
+    def combination_order(self):
+        """Combinations in the order their last stage is reached."""
+        position = {key: i for i, key in enumerate(self.order())}
+        return sorted(self.leaves, key=lambda label: position[self.leaves[label]])
+
+    def depth(self, key):
+        depth = 0
+        while self.nodes[key]['parent']:
+            key = self.nodes[key]['parent']
+            depth += 1
+        return depth
+
+
+def uses_stage_scripts(dockerfile):
+    """Whether a Dockerfile bind-mounts the shared RUN-step helpers (the jetc-scripts context)."""
+    try:
+        with open(dockerfile) as f:
+            return 'from=jetc-scripts' in f.read()
+    except OSError:
+        return False
+
+
+def target_name(node):
+    """Bake target name of a node (bake only allows [a-zA-Z0-9_-])."""
+    return re.sub(r'[^a-zA-Z0-9_-]', '_', f"{node['package']['name']}-{node['key'][:8]}")
+
+
+def bake_file(matrix, build_dir, base_image, repo, push):
+    """'docker buildx bake' file of the matrix: one target per node, leaves exported and tagged."""
+    targets, group = {}, []
+    leaf_tags = {}
+    for label, key in matrix.leaves.items():
+        name = matrix.nodes[key]['package']['name'].replace(':', '-')
+        leaf_tags.setdefault(key, []).append(f"{repo}:{name}-{label}".lower())
+    for key in matrix.order():
+        node = matrix.nodes[key]
+        pkg = node['package']
+        args = {name: str(value) for name, value in (pkg.get('build_args') or {}).items()}
+        target = {
+            'context': os.path.join(build_dir, pkg['path']),
+            'dockerfile': pkg.get('dockerfile') or 'Dockerfile',
+            'platforms': [node['platform']],
+            'args': args,
+        }
+        contexts = {}
+        if node['parent']:
+            parent = target_name(matrix.nodes[node['parent']])
+            args['BASE_IMAGE'] = f"jetc-matrix/{parent.lower()}"
+            contexts[args['BASE_IMAGE']] = f"target:{parent}"
+        else:
+            args['BASE_IMAGE'] = base_image
+        if uses_stage_scripts(os.path.join(target['context'], target['dockerfile'])):
+            contexts['jetc-scripts'] = STAGE_SCRIPTS_DIR
+        if contexts:
+            target['contexts'] = contexts
+        if key in leaf_tags:
+            target['tags'] = sorted(leaf_tags[key])
+            target['output'] = ['type=registry' if push else 'type=docker']
+            group.append(target_name(node))
+        targets[target_name(node)] = target
+    return {'group': {'default': {'targets': group}}, 'target': targets}
+
+
+def print_tree(matrix):
+    for key in matrix.order():
+        node = matrix.nodes[key]
+        combos = node['combinations']
+        print(f"{'  ' * matrix.depth(key)}{node['package']['name']}  [{node['platform']}; "
+              f"{len(combos)} combination{'s' if len(combos) > 1 else ''}]")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Plan a build matrix so shared stage prefixes are built once")
+    parser.add_argument('packages', nargs='+', help="packages to build for every combination")
+    parser.add_argument('--platform', action='append', help="linux/arm64 or linux/amd64 (default: $PLATFORM or linux/arm64)")
+    parser.add_argument('--l4t', action='append', help="L4T version (default: derived / $L4T_VERSION)")
+    parser.add_argument('--cuda', action='append', help="CUDA version (default: derived from L4T/platform)")
+    parser.add_argument('--python', action='append', help="Python version (default: derived from the Ubuntu release)")
+    parser.add_argument('--build-dir', default=DEFAULT_BUILD_DIR)
+    parser.add_argument('--cache-dir', help="directory of the per-combination index caches (default: next to $PACKAGE_INDEX_CACHE)")
+    parser.add_argument('--base', default=os.environ.get('SELECTED_BASE_IMAGE') or os.environ.get('DEFAULT_BASE_IMAGE'),
+                        help="base image of the root stages (default: $SELECTED_BASE_IMAGE or $DEFAULT_BASE_IMAGE)")
+    parser.add_argument('--repo', help="repository of the leaf image tags (default: $DOCKER_USERNAME/$DOCKER_REPO_PREFIX)")
+    parser.add_argument('--push', action='store_true', help="push the leaf images instead of loading them")
+    parser.add_argument('--json', metavar='FILE', help="write the plan (nodes in build order) as JSON")
+    parser.add_argument('--bake', metavar='FILE', help="write a 'docker buildx bake' file of the plan")
+    args = parser.parse_args(argv)
+
+    build_dir = os.path.abspath(args.build_dir)
+    cache_dir = args.cache_dir or os.path.dirname(os.environ.get('PACKAGE_INDEX_CACHE') or DEFAULT_CACHE)
+    os.makedirs(cache_dir, exist_ok=True)
+    combinations = expand(args.platform or [os.environ.get('PLATFORM') or 'linux/arm64'], args.l4t, args.cuda, args.python)
+
+    with ThreadPoolExecutor(max_workers=min(len(combinations), os.cpu_count() or 4)) as pool:
+        try:
+            plans = list(pool.map(lambda c: combination_plan(c, args.packages, build_dir, cache_dir), combinations))
+        except (RuntimeError, ValueError) as error:
+            log_warning(str(error))
+            return 1
+
+    matrix = MatrixPlan()
+    for combination, plan in zip(combinations, plans):
+        matrix.add(combination, plan)
+
+    print_tree(matrix)
+    print(f"{len(combinations)} combinations: {len(matrix.nodes)} stage builds with shared prefixes "
+          f"instead of {matrix.naive}")
+    print(f"Combination order: {' '.join(matrix.combination_order())}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'combinations': matrix.combination_order(),
+                       'nodes': [{key: value for key, value in matrix.nodes[k].items() if key != 'children'}
+                                 for k in matrix.order()]}, f, indent=2)
+    if args.bake:
+        if not args.base:
+            log_warning("--bake needs a base image (--base, $SELECTED_BASE_IMAGE or $DEFAULT_BASE_IMAGE)")
+            return 1
+        repo = args.repo or f"{os.environ.get('DOCKER_USERNAME') or 'jetc'}/{os.environ.get('DOCKER_REPO_PREFIX') or 'matrix'}"
+        from jetson_containers import resolve_versions
+        try:
+            # 'latest' versions and branch commits: one lookup wave for the whole matrix
+            bake = resolve_versions(bake_file(matrix, build_dir, args.base, repo, args.push))
+        except ValueError as error:
+            log_warning(str(error))
+            return 1
+        with open(args.bake, 'w') as f:
+            json.dump(bake, f, indent=2)
+        print(f"Bake file written to {args.bake} (docker buildx bake -f {args.bake})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+# --- Footer ---
+# File location diagram:
+# jetc/                          <- Main project folder
+# ├── buildx/                    <- Parent directory
+# │   └── scripts/               <- Current directory
+# │       └── matrix_plan.py     <- THIS FILE
+# └── ...                        <- Other project files
+#
+# Description: Expands (platform, L4T, CUDA, Python) combinations into build plans merged into a shared-prefix tree (JSON or bake output).
+# Author: Mr K / GitHub Copilot
+# COMMIT-TRACKING: UUID-20261017-043000-FX17
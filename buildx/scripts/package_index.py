@@ -0,0 +1,743 @@
+#!/usr/bin/env python3
+# filepath: /workspaces/jetc/buildx/scripts/package_index.py
+"""
+Cached package index of the build stages.
+
+Parses the '#---' header of every stage Dockerfile, evaluates each config.py
+against the local `jetson_containers` stand-in (with the header package injected
+as `package`), and builds a package graph (names, aliases, dependencies).
+The result is persisted to a JSON cache keyed on the mtime, size and sha256 of
+every Dockerfile/config.py, so later runs only re-read the folders that changed.
+Floating versions stay placeholders in the index and are only looked up for the
+packages of a build plan ('resolve'), so loading the index never uses the network.
+'sync-metadata' stores the documents those lookups need in a local snapshot,
+which METADATA_OFFLINE=y resolves against without any network access.
+
+The compiled 'requires' index of the variants is cached with the packages, so
+'variants' answers any target (L4T, CUDA, arch, Python) in-process. When a
+config.py is indexed it is also evaluated for the PROBE_TARGETS; a folder whose
+variant names or 'requires' differ between them builds its variant list from
+the environment, and only its families are re-evaluated (in a subprocess with
+the target's environment) for targets other than the configured system.
+
+Usage:
+    package_index.py [--build-dir DIR] [--cache FILE] [--refresh] list [--json]
+    package_index.py ... show NAME
+    package_index.py ... deps NAME
+    package_index.py ... resolve NAME... [--no-deps]
+    package_index.py ... plan NAME... [--no-deps]
+    package_index.py ... sync-metadata [NAME...] [--snapshot DIR] [--pypi PACKAGE] [--github OWNER/REPO]
+    package_index.py ... variants FAMILY... [--l4t V]... [--cuda V]... [--arch A]... [--python V]...
+    package_index.py ... stages
+    package_index.py ... errors
+    package_index.py self-test
+"""
+import argparse
+import contextlib
+import copy
+import hashlib
+import io
+import itertools
+import json
+import os
+import re
+import socket
+import sys
+import tempfile
+import traceback
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BUILD_DIR = os.path.join(SCRIPT_DIR, '..', 'build')
+DEFAULT_CACHE = os.path.join(SCRIPT_DIR, '..', '.buildcache', 'package_index.json')
+CACHE_VERSION = 2
+
+# Environment read by the jetson_containers stand-in and the config.py files;
+# a change to any of them re-evaluates every config.py
+ENV_INPUTS = (
+    'L4T_VERSION', 'JETPACK_VERSION', 'CUDA_VERSION', 'PYTHON_VERSION', 'LSB_RELEASE',
+    'CUDA_ARCHITECTURES', 'CUDA_ARCH_PROFILE', 'PLATFORM', 'IS_SBSA', 'CUDNN_VERSION', 'CUDA_PACKAGES', 'CUDNN_PACKAGES',
+    'PIP_UPLOAD_REPO', 'PIP_UPLOAD_HOST', 'PIP_UPLOAD_USER', 'PIP_UPLOAD_PASS',
+    'SCP_UPLOAD_URL', 'SCP_UPLOAD_HOST', 'SCP_UPLOAD_USER', 'SCP_UPLOAD_PASS',
+)
+INDEXED_FILES = ('Dockerfile', 'config.py')
+
+# Targets (L4T, CUDA, arch, Python) every indexed config.py is also evaluated for,
+# spanning the L4T releases and the CUDA versions config.py files branch on
+PROBE_TARGETS = (
+    ('32.7.1', '10.2', 'aarch64', '3.6'),
+    ('35.4.1', '11.4', 'aarch64', '3.8'),
+    ('36.2.0', '12.2', 'aarch64', '3.10'),
+    ('36.4.0', '12.6', 'aarch64', '3.10'),
+    ('36.4.0', '12.8', 'x86_64', '3.12'),
+    ('38.2.0', '13.0', 'aarch64', '3.12'),
+)
+
+
+def log_warning(message):
+    print(f"WARNING: {message}", file=sys.stderr)
+
+
+# --- Headers ---
+
+def parse_header(dockerfile):
+    """Fields of the first '#---' block of a Dockerfile (first occurrence of each field wins)."""
+    fields = {}
+    try:
+        with open(dockerfile, errors='replace') as f:
+            in_block = False
+            for line in f:
+                if re.match(r'^#---\s*$', line):
+                    if in_block:
+                        break
+                    in_block = True
+                    continue
+                if not in_block:
+                    continue
+                match = re.match(r'^#\s*([A-Za-z_][\w-]*):(.*)$', line.rstrip('\n'))
+                if match and match.group(1) not in fields:
+                    fields[match.group(1)] = re.sub(r'\s+#.*$', '', match.group(2)).strip()
+    except OSError:
+        return None
+    return fields if in_block else None
+
+
+def parse_list(value):
+    """'[a, b] trailing text' or 'a, b' -> ['a', 'b']"""
+    if not value:
+        return []
+    match = re.match(r'^\[([^\]]*)\]', value)
+    if match:
+        value = match.group(1)
+    items = []
+    for item in value.split(','):
+        item = item.strip().strip('\'"')
+        if item and item not in items:
+            items.append(item)
+    return items
+
+
+def folder_package_name(folder):
+    """Folder name without its numeric prefix ('01-00-build-essential' -> 'build-essential')."""
+    return re.sub(r'^([0-9]+-)+', '', folder)
+
+
+def header_package(rel_dir, header):
+    """Package dict described by a Dockerfile header, as injected into config.py."""
+    header = header or {}
+    name = (header.get('name') or '').split()
+    return {
+        'name': name[0] if name else folder_package_name(os.path.basename(rel_dir)),
+        'group': header.get('group', ''),
+        'depends': parse_list(header.get('depends')),
+        'requires': parse_list(header.get('requires')),
+        'notes': header.get('notes', ''),
+        'dockerfile': 'Dockerfile',
+        'build_args': {},
+        'path': rel_dir,
+        'stage': rel_dir.split('/')[0],
+    }
+
+
+# --- config.py evaluation ---
+
+def _flatten(value):
+    if isinstance(value, dict):
+        yield value
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _flatten(item)
+
+
+def normalize_package(pkg, rel_dir):
+    """JSON-safe copy of a configured package with list-valued depends/requires/alias."""
+    pkg = json.loads(json.dumps(pkg, default=str))
+    for key in ('depends', 'requires', 'alias'):
+        value = pkg.get(key)
+        if value is None:
+            pkg[key] = []
+        elif isinstance(value, str):
+            pkg[key] = [value]
+    pkg.setdefault('path', rel_dir)
+    pkg.setdefault('stage', rel_dir.split('/')[0])
+    return pkg
+
+
+def evaluate_config(config_path, rel_dir, pkg):
+    """Run a config.py with `package` injected. Returns (packages, error)."""
+    if SCRIPT_DIR not in sys.path:
+        sys.path.insert(0, SCRIPT_DIR)
+    import jetson_containers
+
+    injected = copy.deepcopy(pkg)
+    jetson_containers.package = injected
+    scope = {'__name__': 'config', '__file__': config_path, 'package': injected}
+    try:
+        with open(config_path) as f:
+            code = compile(f.read(), config_path, 'exec')
+        exec(code, scope)
+    except BaseException as error:  # config.py files may even sys.exit()
+        if isinstance(error, KeyboardInterrupt):
+            raise
+        detail = traceback.format_exception_only(type(error), error)[-1].strip()
+        return [normalize_package(pkg, rel_dir)], f"{rel_dir}/config.py: {detail}"
+    finally:
+        jetson_containers.package = {}
+    return [normalize_package(p, rel_dir) for p in _flatten(scope.get('package'))], None
+
+
+def target_environment(l4t, cuda, arch, python):
+    """Environment variables describing a target to the jetson_containers stand-in."""
+    return {'L4T_VERSION': str(l4t), 'CUDA_VERSION': str(cuda), 'PYTHON_VERSION': str(python),
+            'PLATFORM': 'linux/amd64' if arch == 'x86_64' else 'linux/arm64'}
+
+
+@contextlib.contextmanager
+def probe_environment(environment):
+    """jetson_containers reloaded for another target's environment (restored on exit); output is discarded."""
+    import importlib
+    import jetson_containers
+    saved = {name: os.environ.get(name) for name in environment}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            os.environ.update(environment)
+            importlib.reload(jetson_containers)
+            yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        importlib.reload(jetson_containers)
+
+
+def variant_signature(packages):
+    """Variant-defining fields of a folder's packages: sorted (name, sorted 'requires') pairs."""
+    return sorted((pkg['name'], sorted(str(spec) for spec in pkg.get('requires', []))) for pkg in packages)
+
+
+def probe_target_dependence(build_dir, folders):
+    """
+    Flag the folders (`{rel_dir: entry}`, evaluated for the configured system) whose
+    config.py yields other variants or 'requires' for any of the PROBE_TARGETS.
+    """
+    signatures = {rel_dir: variant_signature(entry['packages']) for rel_dir, entry in folders.items()}
+    for entry in folders.values():
+        entry['target_dependent'] = False
+    if SCRIPT_DIR not in sys.path:
+        sys.path.insert(0, SCRIPT_DIR)
+    for target in PROBE_TARGETS:
+        with probe_environment(target_environment(*target)):
+            for rel_dir, entry in folders.items():
+                if entry['target_dependent']:
+                    continue
+                base = header_package(rel_dir, entry['header'])
+                packages, error = evaluate_config(os.path.join(build_dir, rel_dir, 'config.py'), rel_dir, base)
+                entry['target_dependent'] = bool(error) or variant_signature(packages) != signatures[rel_dir]
+
+
+def index_folder(build_dir, rel_dir):
+    """Index entry (header + configured packages) of one package folder."""
+    folder = os.path.join(build_dir, rel_dir)
+    header = parse_header(os.path.join(folder, 'Dockerfile'))
+    base = header_package(rel_dir, header)
+    entry = {'header': header, 'packages': [], 'error': None}
+    config_path = os.path.join(folder, 'config.py')
+    if os.path.isfile(config_path):
+        entry['packages'], entry['error'] = evaluate_config(config_path, rel_dir, base)
+    elif header is not None or os.path.isfile(os.path.join(folder, 'Dockerfile')):
+        entry['packages'] = [normalize_package(base, rel_dir)]
+    return entry
+
+
+# --- Cache ---
+
+def file_signature(path, previous=None):
+    """[mtime_ns, size, sha256] of a file; the hash is reused while mtime and size are unchanged."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if previous and previous[0] == st.st_mtime_ns and previous[1] == st.st_size:
+        return previous
+    with open(path, 'rb') as f:
+        return [st.st_mtime_ns, st.st_size, hashlib.sha256(f.read()).hexdigest()]
+
+
+def folder_signatures(build_dir, rel_dir, previous=None):
+    previous = previous or {}
+    signatures = {}
+    for name in INDEXED_FILES:
+        sig = file_signature(os.path.join(build_dir, rel_dir, name), previous.get(name))
+        if sig:
+            signatures[name] = sig
+    return signatures
+
+
+def same_content(old, new):
+    """Signatures match when every file has the same hash (mtime-only changes are ignored)."""
+    return old.keys() == new.keys() and all(old[k][1:] == new[k][1:] for k in old)
+
+
+def context_key():
+    """Hash of the stand-in sources and the environment that config.py evaluation depends on."""
+    digest = hashlib.sha256()
+    standin = os.path.join(SCRIPT_DIR, 'jetson_containers')
+    for name in sorted(os.listdir(standin)) if os.path.isdir(standin) else []:
+        if name.endswith('.py'):
+            with open(os.path.join(standin, name), 'rb') as f:
+                digest.update(name.encode() + b'\0' + f.read())
+    for name in ENV_INPUTS:
+        digest.update(f"{name}={os.environ.get(name, '')}\n".encode())
+    return digest.hexdigest()
+
+
+def discover_folders(build_dir):
+    """Package folders: stage folders and their direct subfolders holding a Dockerfile or config.py."""
+    folders = []
+    for stage in sorted(os.listdir(build_dir)):
+        stage_path = os.path.join(build_dir, stage)
+        if not os.path.isdir(stage_path) or not re.match(r'^[0-9]+-', stage):
+            continue
+        folders.append(stage)
+        for sub in sorted(os.listdir(stage_path)):
+            if re.match(r'^[0-9]+-', sub) and any(os.path.isfile(os.path.join(stage_path, sub, f)) for f in INDEXED_FILES):
+                folders.append(f"{stage}/{sub}")
+    return folders
+
+
+def load_cache(cache_path):
+    try:
+        with open(cache_path) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return cache if cache.get('version') == CACHE_VERSION else None
+
+
+def save_cache(cache_path, cache):
+    os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+    tmp_path = f"{cache_path}.tmp.{os.getpid()}"
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(cache, f, separators=(',', ':'))
+        os.replace(tmp_path, cache_path)
+    except OSError as error:
+        log_warning(f"failed to write package index cache {cache_path}: {error}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+# --- Index ---
+
+class PackageIndex:
+    """Packages of the build tree with alias resolution and the dependency graph."""
+
+    def __init__(self, folders, graph=None, requirements=None):
+        self.folders = folders
+        self.packages = {}
+        self.aliases = {}
+        for rel_dir, entry in folders.items():
+            for pkg in entry['packages']:
+                self.packages.setdefault(pkg['name'], pkg)
+                for alias in pkg.get('alias', []):
+                    self.aliases.setdefault(alias, pkg['name'])
+        self.graph = graph if graph is not None else self._build_graph()
+        self._requirements = requirements
+
+    @property
+    def requirements(self):
+        """RequirementIndex of the 'requires' specs of every package (compiled on first use, or restored from the cache state)."""
+        if SCRIPT_DIR not in sys.path:
+            sys.path.insert(0, SCRIPT_DIR)
+        from requirement_index import RequirementIndex
+        if self._requirements is None:
+            dependent = {pkg['name'].split(':')[0] for entry in self.folders.values() if entry.get('target_dependent')
+                         for pkg in entry['packages']}
+            self._requirements = RequirementIndex(self.packages, dependent)
+        elif not isinstance(self._requirements, RequirementIndex):
+            self._requirements = RequirementIndex.from_state(self._requirements)
+        return self._requirements
+
+    def variants(self, name, target=None):
+        """Variants of a package family that apply to a target (default: the configured system)."""
+        requirements = self.requirements
+        from requirement_index import current_target
+        return requirements.select((self.resolve(name) or name).split(':')[0], target or current_target())
+
+    def resolve(self, name):
+        """Package name for a name, alias or family ('protobuf' -> 'protobuf:apt'); None if unknown."""
+        if name in self.packages:
+            return name
+        if name in self.aliases:
+            return self.aliases[name]
+        for candidate in self.packages:
+            if candidate.split(':')[0] == name:
+                return candidate
+        return None
+
+    def _build_graph(self):
+        graph = {}
+        for name, pkg in self.packages.items():
+            resolved = []
+            for dep in pkg.get('depends', []):
+                target = self.resolve(dep)
+                if target and target != name and target not in resolved:
+                    resolved.append(target)
+            graph[name] = resolved
+        return graph
+
+    def dependencies(self, name):
+        """All (transitive) dependencies of a package, dependencies first."""
+        order, seen = [], set()
+
+        def visit(node):
+            for dep in self.graph.get(node, []):
+                if dep not in seen:
+                    seen.add(dep)
+                    visit(dep)
+                    order.append(dep)
+        visit(self.resolve(name) or name)
+        return order
+
+    def plan(self, names, with_dependencies=True):
+        """Package names of a build plan (dependencies first); unknown names are skipped."""
+        order = []
+        for name in names:
+            resolved = self.resolve(name)
+            if not resolved:
+                log_warning(f"unknown package '{name}'")
+                continue
+            for dep in (self.dependencies(resolved) if with_dependencies else []) + [resolved]:
+                if dep not in order:
+                    order.append(dep)
+        return order
+
+    def resolved_packages(self, names):
+        """Packages with their lazy version placeholders ('latest') looked up in one concurrent wave."""
+        if SCRIPT_DIR not in sys.path:
+            sys.path.insert(0, SCRIPT_DIR)
+        from jetson_containers import resolve_versions
+        return resolve_versions([self.packages[self.resolve(name) or name] for name in names])
+
+    def errors(self):
+        return {rel_dir: entry['error'] for rel_dir, entry in self.folders.items() if entry.get('error')}
+
+    def stages(self):
+        """(folder, name, depends) of each top-level stage, from its Dockerfile header (depends None without header)."""
+        for rel_dir, entry in self.folders.items():
+            if '/' in rel_dir:
+                continue
+            pkg = header_package(rel_dir, entry['header'])
+            yield rel_dir, pkg['name'], (sorted(pkg['depends']) if entry['header'] is not None else None)
+
+
+def load_index(build_dir=DEFAULT_BUILD_DIR, cache_path=None, refresh=False):
+    """
+    Load the package index, re-reading only the folders whose Dockerfile/config.py
+    content changed since the cache was written (everything when `refresh` is set
+    or the stand-in/environment changed).
+    """
+    build_dir = os.path.abspath(build_dir)
+    cache_path = cache_path or os.environ.get('PACKAGE_INDEX_CACHE') or DEFAULT_CACHE
+    cache = None if refresh else load_cache(cache_path)
+    context = context_key()
+    if not cache or cache.get('build_dir') != build_dir or cache.get('context') != context:
+        cache = {'version': CACHE_VERSION, 'build_dir': build_dir, 'context': context, 'folders': {}, 'graph': None,
+                 'requirements': None}
+
+    folders, evaluated, dirty, changed = {}, {}, False, False
+    for rel_dir in discover_folders(build_dir):
+        cached = cache['folders'].get(rel_dir)
+        signatures = folder_signatures(build_dir, rel_dir, cached and cached['files'])
+        if cached and same_content(cached['files'], signatures):
+            dirty |= cached['files'] != signatures
+            cached['files'] = signatures
+            folders[rel_dir] = cached
+            continue
+        entry = index_folder(build_dir, rel_dir)
+        if entry['error']:
+            log_warning(f"package index: {entry['error']}")
+        entry['files'] = signatures
+        folders[rel_dir] = entry
+        if 'config.py' in signatures and not entry['error']:
+            evaluated[rel_dir] = entry
+        dirty = changed = True
+    if folders.keys() != cache['folders'].keys():
+        dirty = changed = True
+    if evaluated:
+        probe_target_dependence(build_dir, evaluated)
+
+    index = PackageIndex(folders, *((None, None) if changed else (cache.get('graph'), cache.get('requirements'))))
+    if dirty or cache.get('graph') is None or cache.get('requirements') is None:
+        cache['folders'] = folders
+        cache['graph'] = index.graph
+        cache['requirements'] = index.requirements.state()
+        save_cache(cache_path, cache)
+    return index
+
+
+# --- CLI ---
+
+def cmd_list(index, args):
+    if args.json:
+        print(json.dumps(index.packages, indent=2))
+        return 0
+    for name, pkg in sorted(index.packages.items()):
+        print(f"{name}\t{pkg['path']}\t{' '.join(index.graph.get(name, [])) or '-'}")
+    return 0
+
+
+def cmd_show(index, args):
+    name = index.resolve(args.name)
+    if not name:
+        log_warning(f"unknown package '{args.name}'")
+        return 1
+    print(json.dumps(index.packages[name], indent=2))
+    return 0
+
+
+def cmd_deps(index, args):
+    if not index.resolve(args.name):
+        log_warning(f"unknown package '{args.name}'")
+        return 1
+    for dep in index.dependencies(args.name):
+        print(dep)
+    return 0
+
+
+def target_variants(target, families, args):
+    """
+    {family: variants} of target-dependent families for another target: their config.py
+    is evaluated in a subprocess with the target's environment (and its own index cache).
+    """
+    import subprocess
+    label = f"{target.arch}-r{target.l4t}-cu{target.cuda}-py{target.python}"
+    cache = os.path.join(os.path.dirname(args.cache or os.environ.get('PACKAGE_INDEX_CACHE') or DEFAULT_CACHE),
+                         f"package_index-{label}.json")
+    env = dict(os.environ, **target_environment(target.l4t, target.cuda, target.arch, target.python))
+    command = [sys.executable, os.path.abspath(__file__), '--build-dir', args.build_dir, '--cache', cache, 'variants',
+               *families, '--l4t', str(target.l4t), '--cuda', str(target.cuda), '--arch', target.arch,
+               '--python', str(target.python)]
+    result = subprocess.run(command, env=env, capture_output=True, text=True)
+    sys.stderr.write(result.stderr)
+    if result.returncode != 0:
+        raise RuntimeError(f"variants failed for {label}")
+    answers = {}
+    for line in result.stdout.splitlines():
+        _label, family, variants = line.split('\t')
+        answers[family] = tuple(variants.split()) if variants != '-' else ()
+    return answers
+
+
+def cmd_variants(index, args):
+    # Every target is answered from the cached requirement index; only the families whose
+    # config.py builds its variant list from the environment (flagged by the PROBE_TARGETS)
+    # are re-evaluated in a subprocess for targets other than the configured system
+    from concurrent.futures import ThreadPoolExecutor
+    from requirement_index import current_target, make_target, target_label
+    current = current_target()
+    try:
+        targets = [make_target(*values) for values in itertools.product(
+            args.l4t or [current.l4t], args.cuda or [current.cuda], args.arch or [current.arch], args.python or [current.python])]
+    except ValueError as error:
+        log_warning(f"invalid target: {error}")
+        return 1
+    families = [(index.resolve(name) or name).split(':')[0] for name in args.families]
+    for name, error in sorted(index.requirements.errors.items()):
+        log_warning(f"{name}: {error}")
+    dependent = [family for family in families if family in index.requirements.dependent]
+    others = [target for target in targets if target != current] if dependent else []
+    with ThreadPoolExecutor(max_workers=max(1, min(len(others), os.cpu_count() or 4))) as pool:
+        futures = {target: pool.submit(target_variants, target, dependent, args) for target in others}
+        try:
+            for target, answers in index.requirements.matrix(families, targets).items():
+                if target in futures:
+                    answers.update(futures[target].result())
+                for family, variants in answers.items():
+                    print(f"{target_label(target)}\t{family}\t{' '.join(variants) or '-'}")
+        except RuntimeError as error:
+            log_warning(str(error))
+            return 1
+    return 0
+
+
+def cmd_stages(index, args):
+    # Tab-separated for build_stage_graph ('-' = no dependencies, '?' = no header)
+    for folder, name, depends in index.stages():
+        print(f"{folder}\t{name}\t{'?' if depends is None else ' '.join(depends) or '-'}")
+    return 0
+
+
+def cmd_resolve(index, args):
+    names = index.plan(args.names, not args.no_deps)
+    try:
+        packages = index.resolved_packages(names)
+    except ValueError as error:
+        log_warning(str(error))
+        return 1
+    print(json.dumps(packages, indent=2))
+    return 0
+
+
+def cmd_plan(index, args):
+    # Build plan as configured, without looking up placeholders (used by matrix_plan.py)
+    from requirement_index import current_target, target_label
+    names = index.plan(args.names, not args.no_deps)
+    target = current_target()
+    for name in names:
+        if name in index.requirements.predicate_of and not index.requirements.applies(name, target):
+            log_warning(f"{name} requires {index.packages[name].get('requires')}, which excludes {target_label(target)}")
+    print(json.dumps([index.packages[name] for name in names], indent=2))
+    return 0
+
+
+def cmd_sync_metadata(index, args):
+    if SCRIPT_DIR not in sys.path:
+        sys.path.insert(0, SCRIPT_DIR)
+    from jetson_containers import find_placeholders
+    from jetson_containers.metadata import MetadataClient
+
+    names = index.plan(args.names) if args.names else list(index.packages)
+    keys = {f"{source}/{name}" for source, name in find_placeholders([index.packages[n] for n in names])}
+    keys.update(f"pypi/{name}" for name in args.pypi)
+    keys.update(f"github/{repo}" for repo in args.github)
+    client = MetadataClient(offline=False, snapshot_dir=args.snapshot)
+    failed = client.sync_snapshot(keys)
+    print(f"Synced {len(keys) - len(failed)} of {len(keys)} metadata documents to {client.snapshot_dir}")
+    return 1 if failed else 0
+
+
+def cmd_errors(index, args):
+    for rel_dir, error in sorted(index.errors().items()):
+        print(f"{rel_dir}\t{error}")
+    return 0
+
+
+def cmd_self_test(index, args):
+    # Offline resolution against a fixture snapshot, with every socket connect refused
+    if SCRIPT_DIR not in sys.path:
+        sys.path.insert(0, SCRIPT_DIR)
+    import jetson_containers
+    from jetson_containers import github_branch_commit, github_latest_tag, version_placeholder
+    from jetson_containers import metadata
+
+    documents = {
+        'pypi/transformers': {'info': {'version': '4.46.3'}, 'releases': {'4.46.2': [], '4.46.3': []}},
+        'github/microsoft/onnxruntime': {'tag_name': 'v1.20.1', 'tags': ['v1.20.1', 'v1.20.0']},
+        'git/pytorch/vision@main': {'sha': '0123456789abcdef0123456789abcdef01234567'},
+    }
+    package = {'name': 'selftest', 'depends': [], 'build_args': {
+        'TRANSFORMERS_VERSION': version_placeholder('pypi', 'transformers'),
+        'ONNXRUNTIME_TAG': github_latest_tag('microsoft/onnxruntime'),
+        'TORCHVISION_COMMIT': github_branch_commit('pytorch/vision', 'main'),
+        'MISSING_VERSION': version_placeholder('pypi', 'not-in-snapshot', '1.0'),
+    }}
+    expected = {'TRANSFORMERS_VERSION': '4.46.3', 'ONNXRUNTIME_TAG': 'v1.20.1',
+                'TORCHVISION_COMMIT': '0123456789abcdef0123456789abcdef01234567', 'MISSING_VERSION': '1.0'}
+
+    def refuse(*_args, **_kwargs):
+        raise OSError("network access during the offline self-test")
+
+    saved_env = {name: os.environ.get(name) for name in ('METADATA_OFFLINE', 'METADATA_SNAPSHOT_DIR')}
+    saved_socket = (socket.socket.connect, socket.create_connection)
+    failures = []
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        try:
+            os.environ['METADATA_OFFLINE'] = 'y'
+            os.environ['METADATA_SNAPSHOT_DIR'] = snapshot_dir
+            socket.socket.connect, socket.create_connection = refuse, refuse
+            metadata._client = None
+            jetson_containers._resolved_versions.clear()
+            client = metadata.get_client()
+            for key, document in documents.items():
+                client.save_snapshot(key, document)
+
+            fixture = PackageIndex({'selftest': {'packages': [package]}}, graph={'selftest': []})
+            resolved = fixture.resolved_packages(['selftest'])[0]['build_args']
+            for name, value in expected.items():
+                if resolved.get(name) != value:
+                    failures.append(f"{name}: expected {value!r}, got {resolved.get(name)!r}")
+            try:
+                jetson_containers.resolve_versions(version_placeholder('pypi', 'no-default'))
+                failures.append("a placeholder without snapshot entry or default resolved")
+            except ValueError:
+                pass
+        except OSError as error:
+            failures.append(str(error))
+        finally:
+            socket.socket.connect, socket.create_connection = saved_socket
+            for name, value in saved_env.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+            metadata._client = None
+            jetson_containers._resolved_versions.clear()
+
+    for failure in failures:
+        log_warning(f"self-test: {failure}")
+    print(f"self-test {'failed' if failures else 'passed'}: offline resolution of {len(expected)} placeholders")
+    return 1 if failures else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cached package index of the build stages")
+    parser.add_argument('--build-dir', default=DEFAULT_BUILD_DIR)
+    parser.add_argument('--cache', help="cache file (default: $PACKAGE_INDEX_CACHE or .buildcache/package_index.json)")
+    parser.add_argument('--refresh', action='store_true', help="ignore the cache and re-read every folder")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    cmd = sub.add_parser('list', help="packages with their path and resolved dependencies")
+    cmd.add_argument('--json', action='store_true')
+    cmd.set_defaults(func=cmd_list)
+    for name, func, help_text in (('show', cmd_show, "configured package as JSON"),
+                                  ('deps', cmd_deps, "transitive dependencies, dependencies first")):
+        cmd = sub.add_parser(name, help=help_text)
+        cmd.add_argument('name')
+        cmd.set_defaults(func=func)
+    cmd = sub.add_parser('resolve', help="packages of a build plan with their latest versions looked up")
+    cmd.add_argument('names', nargs='+')
+    cmd.add_argument('--no-deps', action='store_true', help="only the named packages, not their dependencies")
+    cmd.set_defaults(func=cmd_resolve)
+    cmd = sub.add_parser('plan', help="packages of a build plan as configured (placeholders not looked up)")
+    cmd.add_argument('names', nargs='+')
+    cmd.add_argument('--no-deps', action='store_true', help="only the named packages, not their dependencies")
+    cmd.set_defaults(func=cmd_plan)
+    cmd = sub.add_parser('sync-metadata', help="download the PyPI/GitHub documents used for METADATA_OFFLINE=y")
+    cmd.add_argument('names', nargs='*', help="packages of the plan to snapshot (default: every package)")
+    cmd.add_argument('--snapshot', help="snapshot directory (default: $METADATA_SNAPSHOT_DIR)")
+    cmd.add_argument('--pypi', action='append', default=[], metavar='PACKAGE', help="also snapshot this PyPI package")
+    cmd.add_argument('--github', action='append', default=[], metavar='OWNER/REPO', help="also snapshot this repository")
+    cmd.set_defaults(func=cmd_sync_metadata)
+    cmd = sub.add_parser('variants', help="variants of package families whose 'requires' allow a target (or a matrix of targets)")
+    cmd.add_argument('families', nargs='+')
+    for option, help_text in (('--l4t', "L4T version, e.g. 36.4.0"), ('--cuda', "CUDA version, e.g. 12.6"),
+                              ('--arch', "aarch64 or x86_64"), ('--python', "Python version, e.g. 3.10")):
+        cmd.add_argument(option, action='append', help=f"{help_text} (repeat for a matrix; default: the configured system)")
+    cmd.set_defaults(func=cmd_variants)
+    sub.add_parser('stages', help="name and header dependencies of each stage folder").set_defaults(func=cmd_stages)
+    sub.add_parser('errors', help="config.py files that failed to evaluate").set_defaults(func=cmd_errors)
+    sub.add_parser('self-test', help="resolve placeholders from a fixture snapshot with networking disabled").set_defaults(func=cmd_self_test)
+
+    args = parser.parse_args(argv)
+    if args.func is cmd_self_test:
+        return cmd_self_test(None, args)
+    index = load_index(args.build_dir, args.cache, args.refresh)
+    return args.func(index, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+# --- Footer ---
+# File location diagram:
+# jetc/                          <- Main project folder
+# ├── buildx/                    <- Parent directory
+# │   └── scripts/               <- Current directory
+# │       └── package_index.py   <- THIS FILE
+# └── ...                        <- Other project files
+#
+# Description: Evaluates build/*/config.py and Dockerfile headers into a cached package graph; resolves latest versions per build plan (online or from a snapshot), selects variants per target from the cached requirement index (re-evaluating only target-dependent config.py in a subprocess) and prints per-target build plans.
+# Author: Mr K / GitHub Copilot
+# COMMIT-TRACKING: UUID-20261017-051500-FX26
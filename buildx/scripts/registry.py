@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+# filepath: /workspaces/jetc/buildx/scripts/registry.py
+"""
+Minimal registry client (distribution API v2) for manifest-level operations.
+
+Pushed stages are verified by the manifest digest the registry answers to a
+HEAD request, and the timestamp tag is pushed as a copy of the final image's
+manifest: no image data is pulled back or pushed again.
+
+    digest REF            manifest digest of a tag (HEAD request)
+    verify REF DIGEST     exit 0 when the registry serves DIGEST for REF
+    retag SOURCE TARGET   point TARGET at SOURCE's manifest: one manifest PUT in the same
+                          repository; another repository of the same registry gets the
+                          blobs by cross-repository mount (nothing is transferred)
+    size REF              compressed size (config + layers) of the image for --platform
+    prefetch REF... --via MIRROR
+                          pull Docker Hub images through a pull-through mirror (registry:2
+                          with REGISTRY_PROXY_REMOTEURL) so it has their blobs before a build
+                          needs them; the data is read and discarded
+
+Credentials come from the 'auths' of ~/.docker/config.json (credential helpers
+are not used). localhost/127.0.0.1 registries and the hosts in
+INSECURE_REGISTRIES are spoken to over plain HTTP, like dockerd does, so a local
+registry can stand in for the real one when testing:
+
+    docker run -d -p 5000:5000 registry:2
+    DOCKER_REGISTRY=localhost:5000 ./build.sh     (push mode)
+    registry.py digest localhost:5000/kairin/001:01-00-build-essential
+
+Usage:
+    registry.py digest REF
+    registry.py verify REF DIGEST
+    registry.py retag SOURCE TARGET
+    registry.py size REF [--platform P]
+    registry.py prefetch REF... --via HOST:PORT [--platform P]
+"""
+import argparse
+import base64
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from build_telemetry import human_size
+from package_index import log_warning
+
+MANIFEST_TYPES = (
+    'application/vnd.oci.image.index.v1+json',
+    'application/vnd.docker.distribution.manifest.list.v2+json',
+    'application/vnd.oci.image.manifest.v1+json',
+    'application/vnd.docker.distribution.manifest.v2+json',
+)
+MANIFEST_ACCEPT = ', '.join(MANIFEST_TYPES)
+READ_CHUNK = 1 << 20
+
+
+class RegistryError(LookupError):
+    """Failed registry request; `status` is the HTTP status (None when the registry was not reached)."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_reference(ref):
+    """'kairin/001:tag' -> ('registry-1.docker.io', 'kairin/001', 'tag')"""
+    name, _, digest = ref.partition('@')
+    tag = None
+    if ':' in name.rsplit('/', 1)[-1]:
+        name, tag = name.rsplit(':', 1)
+    first, _, rest = name.partition('/')
+    if rest and ('.' in first or ':' in first or first == 'localhost'):
+        host, repo = first, rest
+    else:
+        host, repo = 'docker.io', name
+    if host in ('docker.io', 'index.docker.io'):
+        host = 'registry-1.docker.io'
+        if '/' not in repo:
+            repo = f"library/{repo}"
+    return host, repo, digest or tag or 'latest'
+
+
+def is_insecure(host):
+    """Whether a registry is spoken to over plain HTTP (loopback or INSECURE_REGISTRIES)."""
+    name = host.rsplit(':', 1)[0] if not host.startswith('[') else host.split(']')[0] + ']'
+    return (name in ('localhost', '[::1]') or name.startswith('127.')
+            or host in os.environ.get('INSECURE_REGISTRIES', '').split())
+
+
+def docker_credentials(host):
+    """'user:password' for a registry from ~/.docker/config.json ('auths' only; credential helpers are not used)."""
+    config_dir = os.environ.get('DOCKER_CONFIG') or os.path.expanduser('~/.docker')
+    try:
+        with open(os.path.join(config_dir, 'config.json')) as f:
+            auths = json.load(f).get('auths', {})
+    except (OSError, ValueError):
+        return None
+    keys = [host, f"https://{host}", f"http://{host}"]
+    if host == 'registry-1.docker.io':
+        keys += ['https://index.docker.io/v1/', 'index.docker.io', 'docker.io']
+    for key in keys:
+        auth = auths.get(key, {}).get('auth')
+        if auth:
+            return base64.b64decode(auth).decode()
+    return None
+
+
+def select_platform(manifests, platform):
+    """Descriptor of an image index that matches 'os/arch[/variant]' (attestations skipped)."""
+    wanted = platform.split('/')
+    candidates = [m for m in manifests if m.get('platform', {}).get('os') != 'unknown']
+    for descriptor in candidates:
+        p = descriptor.get('platform')
+        if not p:
+            continue
+        have = [p.get('os'), p.get('architecture')] + ([p['variant']] if p.get('variant') else [])
+        if have[:len(wanted)] == wanted or have[:2] == wanted[:2]:
+            return descriptor
+    if len(candidates) == 1:
+        return candidates[0]
+    raise RegistryError(f"no {platform} image in the index")
+
+
+class RegistryClient:
+    """Requests to one repository of a registry, with token (or basic) authentication."""
+
+    def __init__(self, host, repo):
+        self.host = host
+        self.repo = repo
+        self.base_url = f"{'http' if is_insecure(host) else 'https'}://{host}/v2/{repo}/"
+        self.authorization = None
+
+    def _authenticate(self, challenge, scopes):
+        scheme, _, params = challenge.partition(' ')
+        credentials = docker_credentials(self.host)
+        basic = f"Basic {base64.b64encode(credentials.encode()).decode()}" if credentials else None
+        if scheme.lower() == 'basic':
+            self.authorization = basic
+            return basic is not None
+        fields = dict(re.findall(r'(\w+)="([^"]*)"', params))
+        if scheme.lower() != 'bearer' or 'realm' not in fields:
+            return False
+        query = [('service', fields['service'])] if 'service' in fields else []
+        for scope in [fields.get('scope') or f"repository:{self.repo}:pull"] + list(scopes):
+            query.append(('scope', scope))
+        request = urllib.request.Request(f"{fields['realm']}?{urllib.parse.urlencode(query)}")
+        if basic:
+            request.add_header('Authorization', basic)
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                token = json.load(response)
+        except (urllib.error.URLError, ValueError, OSError):
+            return False
+        token = token.get('token') or token.get('access_token')
+        self.authorization = f"Bearer {token}" if token else None
+        return token is not None
+
+    def request(self, method, path, headers=None, data=None, scopes=()):
+        """Open a request below /v2/<repo>/; `scopes` are extra token scopes (cross-repository mounts)."""
+        for attempt in range(2):
+            request = urllib.request.Request(self.base_url + path, data=data, method=method, headers=dict(headers or {}))
+            if self.authorization:
+                # Not forwarded to the storage backends blobs redirect to
+                request.add_unredirected_header('Authorization', self.authorization)
+            try:
+                return urllib.request.urlopen(request, timeout=60)
+            except urllib.error.HTTPError as error:
+                if error.code == 401 and attempt == 0 and self._authenticate(error.headers.get('WWW-Authenticate', ''), scopes):
+                    continue
+                raise RegistryError(f"{self.host}/{self.repo}: {method} {path.split('?')[0]}: HTTP {error.code}", error.code) from None
+            except (urllib.error.URLError, OSError) as error:
+                raise RegistryError(f"{self.host}: {error}") from None
+        raise RegistryError(f"{self.host}/{self.repo}: {path}: not authorized", 401)
+
+    def manifest_digest(self, reference):
+        """Digest the registry serves for a tag (None if it has no such tag), without fetching the manifest."""
+        try:
+            with self.request('HEAD', f"manifests/{reference}", {'Accept': MANIFEST_ACCEPT}) as response:
+                digest = response.headers.get('Docker-Content-Digest')
+        except RegistryError as error:
+            if error.status == 404:
+                return None
+            raise
+        if not digest:  # registries that do not send the header on HEAD
+            body, _ = self.get_manifest(reference)
+            digest = f"sha256:{hashlib.sha256(body).hexdigest()}"
+        return digest
+
+    def get_manifest(self, reference):
+        """(raw manifest bytes, media type) of a tag or digest."""
+        with self.request('GET', f"manifests/{reference}", {'Accept': MANIFEST_ACCEPT}) as response:
+            body = response.read()
+            content_type = response.headers.get('Content-Type', '').split(';')[0]
+        return body, content_type or json.loads(body).get('mediaType', MANIFEST_TYPES[3])
+
+    def put_manifest(self, reference, body, content_type):
+        """Store raw manifest bytes under a tag or digest; returns the digest of the stored manifest."""
+        with self.request('PUT', f"manifests/{reference}", {'Content-Type': content_type}, body,
+                          scopes=[f"repository:{self.repo}:pull,push"]) as response:
+            return response.headers.get('Docker-Content-Digest') or f"sha256:{hashlib.sha256(body).hexdigest()}"
+
+    def mount_blob(self, digest, from_repo):
+        """Link a blob of another repository of the same registry into this one."""
+        path = f"blobs/uploads/?{urllib.parse.urlencode({'mount': digest, 'from': from_repo})}"
+        with self.request('POST', path, data=b'', scopes=[f"repository:{self.repo}:pull,push", f"repository:{from_repo}:pull"]) as response:
+            if response.status != 201:
+                raise RegistryError(f"{self.host}: blob {digest[:19]} of {from_repo} could not be mounted into {self.repo}")
+
+    def open_blob(self, digest):
+        return self.request('GET', f"blobs/{digest}")
+
+
+def client_for(ref):
+    """(RegistryClient, tag or digest) of an image reference."""
+    host, repo, reference = parse_reference(ref)
+    return RegistryClient(host, repo), reference
+
+
+def copy_blobs(source, target, body):
+    """Make the blobs (and child manifests) of a manifest available in the target repository."""
+    document = json.loads(body)
+    for descriptor in document.get('manifests', []):
+        child, content_type = source.get_manifest(descriptor['digest'])
+        copy_blobs(source, target, child)
+        target.put_manifest(descriptor['digest'], child, content_type)
+    for descriptor in ([document['config']] if 'config' in document else []) + document.get('layers', []):
+        target.mount_blob(descriptor['digest'], source.repo)
+
+
+def retag(source_ref, target_ref):
+    """Point target_ref at the manifest of source_ref (same registry); returns the manifest digest."""
+    source, source_reference = client_for(source_ref)
+    target, target_reference = client_for(target_ref)
+    if source.host != target.host:
+        raise RegistryError(f"cannot retag across registries ({source.host} -> {target.host}); "
+                            "use 'docker buildx imagetools create'")
+    if target.repo == source.repo:
+        target = source     # reuse the token
+    body, content_type = source.get_manifest(source_reference)
+    if target is not source:
+        copy_blobs(source, target, body)
+    digest = target.put_manifest(target_reference, body, content_type)
+    expected = f"sha256:{hashlib.sha256(body).hexdigest()}"
+    if digest != expected:
+        raise RegistryError(f"{target_ref}: registry stored {digest}, expected {expected}")
+    return digest
+
+
+def image_size(ref, platform):
+    """Compressed size of the image (config + layers) for a platform."""
+    client, reference = client_for(ref)
+    document = json.loads(client.get_manifest(reference)[0])
+    while document.get('manifests') is not None:
+        document = json.loads(client.get_manifest(select_platform(document['manifests'], platform)['digest'])[0])
+    return document.get('config', {}).get('size', 0) + sum(layer.get('size', 0) for layer in document.get('layers', []))
+
+
+def prefetch(ref, mirror, platform):
+    """Pull a Docker Hub image through a pull-through mirror, which keeps its blobs; returns (blobs, bytes read)."""
+    host, repo, reference = parse_reference(ref)
+    if host != 'registry-1.docker.io':
+        raise RegistryError(f"{ref}: only Docker Hub images go through the mirror")
+    client = RegistryClient(mirror, repo)
+    document = json.loads(client.get_manifest(reference)[0])
+    while document.get('manifests') is not None:
+        document = json.loads(client.get_manifest(select_platform(document['manifests'], platform)['digest'])[0])
+    blobs = ([document['config']] if 'config' in document else []) + document.get('layers', [])
+    total = 0
+    for descriptor in blobs:
+        with client.open_blob(descriptor['digest']) as stream:
+            for chunk in iter(lambda: stream.read(READ_CHUNK), b''):
+                total += len(chunk)
+    return len(blobs), total
+
+
+def cmd_digest(args):
+    client, reference = client_for(args.ref)
+    digest = client.manifest_digest(reference)
+    if not digest:
+        log_warning(f"{args.ref}: not in the registry")
+        return 1
+    print(digest)
+    return 0
+
+
+def cmd_verify(args):
+    client, reference = client_for(args.ref)
+    digest = client.manifest_digest(reference)
+    if digest != args.digest:
+        log_warning(f"{args.ref}: registry has {digest or 'no such tag'}, expected {args.digest}")
+        return 1
+    print(f"{args.ref}: {digest}")
+    return 0
+
+
+def cmd_retag(args):
+    print(retag(args.source, args.target))
+    return 0
+
+
+def cmd_size(args):
+    print(image_size(args.ref, args.platform))
+    return 0
+
+
+def cmd_prefetch(args):
+    status = 0
+    for ref in args.refs:
+        start = time.monotonic()
+        try:
+            blobs, total = prefetch(ref, args.via, args.platform)
+        except (RegistryError, OSError) as error:
+            log_warning(f"cannot prefetch {ref}: {error}")
+            status = 1
+            continue
+        print(f"{ref}: {blobs} blobs, {human_size(total)} through {args.via} in {time.monotonic() - start:.1f}s", flush=True)
+    return status
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manifest-level registry operations (digest, verify, retag, size, prefetch)")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    cmd = sub.add_parser('digest', help="print the manifest digest of a tag (HEAD request)")
+    cmd.add_argument('ref')
+    cmd.set_defaults(func=cmd_digest)
+    cmd = sub.add_parser('verify', help="check that the registry serves a digest for a tag")
+    cmd.add_argument('ref')
+    cmd.add_argument('digest')
+    cmd.set_defaults(func=cmd_verify)
+    cmd = sub.add_parser('retag', help="point TARGET at the manifest of SOURCE (no layer transfer)")
+    cmd.add_argument('source')
+    cmd.add_argument('target')
+    cmd.set_defaults(func=cmd_retag)
+    cmd = sub.add_parser('size', help="print the compressed size of an image")
+    cmd.add_argument('ref')
+    cmd.add_argument('--platform', default=os.environ.get('PLATFORM') or 'linux/arm64')
+    cmd.set_defaults(func=cmd_size)
+    cmd = sub.add_parser('prefetch', help="pull Docker Hub images through a pull-through mirror to warm it")
+    cmd.add_argument('refs', nargs='+', metavar='ref')
+    cmd.add_argument('--via', required=True, metavar='HOST:PORT', help="the mirror")
+    cmd.add_argument('--platform', default=os.environ.get('PLATFORM') or 'linux/arm64')
+    cmd.set_defaults(func=cmd_prefetch)
+
+    args = parser.parse_args(argv)
+    try:
+        return args.func(args)
+    except RegistryError as error:
+        log_warning(str(error))
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+# --- Footer ---
+# File location diagram:
+# jetc/                          <- Main project folder
+# ├── buildx/                    <- Parent directory
+# │   └── scripts/               <- Current directory
+# │       └── registry.py        <- THIS FILE
+# └── ...                        <- Other project files
+#
+# Description: Minimal registry API client: manifest digests by HEAD request, push verification, manifest-only retags, image sizes and base-image prefetch through a pull-through mirror; shared by the layer analyzer.
+# Author: Mr K / GitHub Copilot
+# COMMIT-TRACKING: UUID-20261017-024500-MIRR
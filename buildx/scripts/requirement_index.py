@@ -0,0 +1,181 @@
+# filepath: /workspaces/jetc/buildx/scripts/requirement_index.py
+"""
+Compiled 'requires' predicates of the package variants.
+
+A package variant restricts the systems it applies to with 'requires' specs:
+
+    '>=36', '==35.*', '<36', 'r36.2'     L4T version (optional 'r' prefix)
+    '>=cu126', '<=cu122', '==cu12.*'     CUDA version ('cu126' = 12.6, 'cu130' = 13.0)
+    '>=py310', '==py3.12'                Python version ('py310' = 3.10)
+    'aarch64', 'x86_64' (arm64, amd64)   system architecture
+
+Every distinct spec list is compiled once into a Requirement over a Target
+(L4T, CUDA, arch, Python). RequirementIndex groups the variants by package family
+and predicate, so each target is evaluated once per distinct predicate (a handful
+for the whole tree, however many factories and builder twins share them); after
+that 'which onnxruntime variants apply to this target' is a dict lookup, also when
+whole platform matrices are queried. The index (variant names, spec lists and
+predicate ids) is stored in the package index cache, so any target is answered
+in-process without re-evaluating config.py. Families whose config.py yields other
+variants or specs on other targets are listed in `dependent`: only those have to
+be re-evaluated with the environment of a target (see package_index.py).
+"""
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+from packaging.specifiers import InvalidSpecifier, SpecifierSet
+from packaging.version import Version
+
+# Target system a variant is checked against (Version, Version, str, Version)
+Target = namedtuple('Target', ('l4t', 'cuda', 'arch', 'python'))
+
+SPEC = re.compile(r'^(===|==|!=|~=|>=|<=|>|<)?\s*(cu|py|r)?(\d[\w.*+]*)$')
+ARCHES = {'aarch64': 'aarch64', 'arm64': 'aarch64', 'tegra-aarch64': 'aarch64', 'x86_64': 'x86_64', 'amd64': 'x86_64'}
+
+
+def make_target(l4t, cuda, arch, python):
+    """Target from version strings ('36.4.0', '12.6', 'aarch64', '3.10')."""
+    return Target(Version(str(l4t)), Version(str(cuda)), ARCHES.get(arch, arch), Version(str(python)))
+
+
+def target_label(target):
+    """'l4t=36.4.0 cuda=12.6 arch=aarch64 python=3.10'"""
+    return f"l4t={target.l4t} cuda={target.cuda} arch={target.arch} python={target.python}"
+
+
+def current_target():
+    """Target described by the environment (see the jetson_containers stand-in)."""
+    from jetson_containers import CUDA_VERSION, L4T_VERSION, PYTHON_VERSION, SYSTEM_ARCH
+    return Target(L4T_VERSION, CUDA_VERSION, SYSTEM_ARCH, PYTHON_VERSION)
+
+
+def _spec_version(prefix, version):
+    """'126' with prefix 'cu' -> '12.6'; 'py310' -> '3.10'; dotted versions are kept."""
+    if '.' in version or '*' in version or prefix not in ('cu', 'py') or len(version) < 2:
+        return version
+    return f"{version[:-1]}.{version[-1]}" if prefix == 'cu' else f"{version[0]}.{version[1:]}"
+
+
+class Requirement:
+    """Compiled 'requires' specs of a variant; call it with a Target."""
+
+    __slots__ = ('specs', 'l4t', 'cuda', 'python', 'arches')
+
+    def __init__(self, specs):
+        self.specs = specs
+        fields = {'r': [], 'cu': [], 'py': []}
+        arches = set()
+        for spec in specs:
+            spec = spec.strip().lower()
+            if spec in ARCHES:
+                arches.add(ARCHES[spec])
+                continue
+            match = SPEC.match(spec)
+            if not match:
+                raise ValueError(f"unsupported requirement '{spec}'")
+            operator, prefix, version = match.group(1) or '==', match.group(2) or 'r', match.group(3)
+            fields[prefix].append(f"{operator}{_spec_version(prefix, version)}")
+        try:
+            self.l4t, self.cuda, self.python = (SpecifierSet(','.join(fields[key])) if fields[key] else None
+                                                for key in ('r', 'cu', 'py'))
+        except InvalidSpecifier as error:
+            raise ValueError(f"unsupported requirement {list(specs)}: {error}") from None
+        self.arches = frozenset(arches) or None
+
+    def __call__(self, target):
+        return ((self.arches is None or target.arch in self.arches)
+                and (self.l4t is None or self.l4t.contains(target.l4t, prereleases=True))
+                and (self.cuda is None or self.cuda.contains(target.cuda, prereleases=True))
+                and (self.python is None or self.python.contains(target.python, prereleases=True)))
+
+    def __repr__(self):
+        return f"Requirement({list(self.specs)})"
+
+
+@lru_cache(maxsize=None)
+def _compile(specs):
+    return Requirement(specs)
+
+
+def compile_requires(requires):
+    """Compiled Requirement of a 'requires' value (str or list); identical spec lists share one."""
+    if isinstance(requires, str):
+        requires = [requires]
+    return _compile(tuple(sorted(str(spec) for spec in requires or [])))
+
+
+class RequirementIndex:
+    """Package variants indexed by family and compiled requirement, with per-target answers cached."""
+
+    def __init__(self, packages, dependent=()):
+        """`packages` = {name: package dict with an optional 'requires'}; `dependent` = target-dependent families."""
+        self.predicates = []        # distinct compiled requirements
+        self.predicate_of = {}      # package name -> index into predicates
+        self.families = {}          # family -> [(package name, predicate index)]
+        self.errors = {}            # package name -> requirement error (variant never applies)
+        self.dependent = frozenset(dependent)
+        ids = {}
+        for name, pkg in packages.items():
+            try:
+                requirement = compile_requires(pkg.get('requires'))
+            except ValueError as error:
+                self.errors[name] = str(error)
+                continue
+            if requirement not in ids:
+                ids[requirement] = len(self.predicates)
+                self.predicates.append(requirement)
+            self.predicate_of[name] = ids[requirement]
+            self.families.setdefault(name.split(':')[0], []).append((name, ids[requirement]))
+        self._selections = {}
+
+    def state(self):
+        """JSON-safe form of the index (spec lists, variants per family, errors) for the package index cache."""
+        return {'predicates': [list(predicate.specs) for predicate in self.predicates],
+                'families': {family: [list(variant) for variant in variants] for family, variants in self.families.items()},
+                'errors': self.errors, 'dependent': sorted(self.dependent)}
+
+    @classmethod
+    def from_state(cls, state):
+        """Index restored from state(); each spec list is compiled once."""
+        index = cls({}, state['dependent'])
+        index.predicates = [_compile(tuple(specs)) for specs in state['predicates']]
+        index.families = {family: [tuple(variant) for variant in variants] for family, variants in state['families'].items()}
+        index.predicate_of = {name: pid for variants in index.families.values() for name, pid in variants}
+        index.errors = dict(state['errors'])
+        return index
+
+    def _selection(self, target):
+        """{family: (applicable variant names...)} of a target, computed once per target."""
+        selection = self._selections.get(target)
+        if selection is None:
+            satisfied = [predicate(target) for predicate in self.predicates]
+            selection = {family: tuple(name for name, pid in variants if satisfied[pid])
+                         for family, variants in self.families.items()}
+            selection['*'] = frozenset(name for name, pid in self.predicate_of.items() if satisfied[pid])
+            self._selections[target] = selection
+        return selection
+
+    def select(self, family, target):
+        """Variants of a package family ('onnxruntime') that apply to a target."""
+        return self._selection(target).get(family.split(':')[0], ())
+
+    def applies(self, name, target):
+        """Whether the requirements of a package allow the target."""
+        return name in self._selection(target)['*']
+
+    def matrix(self, families, targets):
+        """{target: {family: variants}} for every target of a platform matrix."""
+        return {target: {family: self.select(family, target) for family in families} for target in targets}
+
+# --- Footer ---
+# File location diagram:
+# jetc/                              <- Main project folder
+# ├── buildx/                        <- Parent directory
+# │   └── scripts/                   <- Current directory
+# │       └── requirement_index.py   <- THIS FILE
+# └── ...                            <- Other project files
+#
+# Description: Compiles package 'requires' specs into predicates over (L4T, CUDA, arch, Python) and indexes variants by family for constant-time per-target queries; the index round-trips through the package index cache and flags target-dependent families. Formats targets for the plan and matrix tools.
+# Author: Mr K / GitHub Copilot
+# COMMIT-TRACKING: UUID-20261017-051500-FX26
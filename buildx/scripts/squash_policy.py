@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+# filepath: /workspaces/jetc/buildx/scripts/squash_policy.py
+"""
+Squash policy of the stages: measure the layers a stage adds, decide whether
+merging them pays off and merge them.
+
+A stage declares its policy in the '#---' header of its Dockerfile
+('# squash: y|n|auto'). SQUASH_POLICY in .env overrides it per stage
+('18-comfyui=y 10-onnxruntime=auto', '*=auto' for the stages without a header
+field) and the build option (use_squash) applies to the rest. 'auto' decides on
+every build from the measurements kept in the telemetry database:
+
+    'measure' records the layers a stage adds to its base image (diff_id and
+    size) after each build. With --time-pull (the image was pushed) it
+    also streams those layers from the registry and times download, decompression
+    and untar of each one, without writing them to disk.
+
+    'decide' fits the pull cost of a layer, seconds = per-layer overhead +
+    bytes / throughput, over the timed layers of all stages (SQUASH_LAYER_SECONDS
+    and SQUASH_PULL_MBPS until enough are timed) and compares for the stage:
+
+        gain = (layers - 1) x per-layer overhead   fewer layers to fetch and unpack on each pull
+        loss = unchanged bytes / throughput        layers identical to the previous build, which
+                                                   devices already have; squashed, they are pulled again
+
+    The stage is squashed only when the gain is larger. The unchanged bytes are
+    known after two measured unsquashed builds; until then the stage is not
+    squashed. Squashed builds are measured too (one layer); after
+    SQUASH_REMEASURE_BUILDS of them the next build is unsquashed and measured,
+    so the decision follows the stage when its layers change.
+
+    'flatten' does the squash, which buildx has no option for: the stage is
+    built into an OCI layout and the layers above its base image are merged
+    into one (whiteouts of the merged layers applied, those against the base
+    kept), like 'docker build --squash' did.
+
+Usage:
+    squash_policy.py measure STAGE IMAGE --db DB --run-id ID [--base REF] [--from auto|docker|registry|oci] [--time-pull] [--squashed]
+    squash_policy.py decide STAGE --db DB
+    squash_policy.py flatten LAYOUT_DIR --base REF [--platform PLATFORM]
+    squash_policy.py model --db DB
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+import subprocess
+import sys
+import tarfile
+import time
+
+from build_telemetry import connect, human_size
+from layer_analyzer import ManifestSource, OCILayoutSource, RegistrySource, open_source, scan_layer
+from package_index import log_warning
+
+MIN_TIMED_LAYERS = 8        # timed layer pulls needed before the fitted model replaces the defaults
+OPAQUE = '.wh..wh..opq'     # whiteout markers of the OCI layer format
+WHITEOUT = '.wh.'
+# 'docker image history' entries that do not create a layer
+METADATA_ONLY = re.compile(r'^(/bin/sh -c #\(nop\)|ENV|LABEL|ARG|CMD|ENTRYPOINT|EXPOSE|USER|WORKDIR|SHELL'
+                           r'|STOPSIGNAL|HEALTHCHECK|VOLUME|ONBUILD|MAINTAINER)\b')
+
+
+def docker_layer_sizes(ref, count):
+    """Uncompressed size of each layer of a daemon image, from its history (None when it does not line up)."""
+    result = subprocess.run(['docker', 'image', 'history', '--no-trunc', '--human=false',
+                             '--format', '{{.Size}}\t{{.CreatedBy}}', ref], capture_output=True, text=True)
+    sizes = []
+    for line in reversed(result.stdout.splitlines()):
+        size, _, created_by = line.partition('\t')
+        if size == '0' and METADATA_ONLY.match(created_by.strip()):
+            continue
+        sizes.append(int(size) if size.isdigit() else None)
+    return sizes if result.returncode == 0 and len(sizes) == count else [None] * count
+
+
+def stage_layers(source, ref, base_ids):
+    """[(diff_id, size, descriptor)] of the layers of `source` that are not in its base image."""
+    diff_ids = source.diff_ids()
+    if isinstance(source, ManifestSource):
+        descriptors = source.manifest().get('layers', [])
+        sizes = [descriptor.get('size') for descriptor in descriptors]
+    else:
+        descriptors = [None] * len(diff_ids)
+        sizes = docker_layer_sizes(ref, len(diff_ids))
+    return [(diff_id, size, descriptor) for diff_id, size, descriptor in zip(diff_ids, sizes, descriptors)
+            if diff_id not in base_ids]
+
+
+def time_layer_pull(source, descriptor):
+    """Seconds to stream, decompress and untar one layer (nothing is written to disk)."""
+    start = time.monotonic()
+    with source.open_blob(descriptor['digest']) as stream:
+        scan_layer(stream, 'r|*', None)
+    return time.monotonic() - start
+
+
+def measurements(conn, stage, limit=2):
+    """Layers of the last `limit` unsquashed measured builds of a stage, newest first: [[row(diff_id, size)]]"""
+    runs = conn.execute("SELECT run_id, MAX(id) AS last FROM stage_layers WHERE stage = ? AND squashed = 0 "
+                        "GROUP BY run_id ORDER BY last DESC LIMIT ?", (stage, limit)).fetchall()
+    return [conn.execute("SELECT diff_id, size FROM stage_layers WHERE stage = ? AND run_id = ? ORDER BY position",
+                         (stage, run['run_id'])).fetchall() for run in runs]
+
+
+def squashed_builds_since(conn, stage):
+    """Squashed builds of a stage measured since its last unsquashed measurement."""
+    last = conn.execute("SELECT MAX(id) FROM stage_layers WHERE stage = ? AND squashed = 0", (stage,)).fetchone()[0]
+    return conn.execute("SELECT COUNT(DISTINCT run_id) FROM stage_layers WHERE stage = ? AND squashed = 1 AND id > ?",
+                        (stage, last or 0)).fetchone()[0]
+
+
+def fit_line(xs, ys):
+    """Least-squares (intercept, slope) of ys over xs; None when xs do not vary."""
+    n = len(xs)
+    mean_x, mean_y = sum(xs) / n, sum(ys) / n
+    variance = sum((x - mean_x) ** 2 for x in xs)
+    if variance == 0:
+        return None
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / variance
+    return mean_y - slope * mean_x, slope
+
+
+def pull_model(conn):
+    """(seconds per layer, seconds per byte, where they come from), fitted over the timed layer pulls."""
+    default = (float(os.environ.get('SQUASH_LAYER_SECONDS') or 0.5),
+               1.0 / (float(os.environ.get('SQUASH_PULL_MBPS') or 40) * 1e6),
+               'SQUASH_LAYER_SECONDS/SQUASH_PULL_MBPS')
+    rows = conn.execute("SELECT size, pull_seconds FROM stage_layers WHERE pull_seconds IS NOT NULL "
+                        "AND size IS NOT NULL ORDER BY id DESC LIMIT 500").fetchall()
+    if len(rows) < MIN_TIMED_LAYERS:
+        return default
+    fit = fit_line([row['size'] for row in rows], [row['pull_seconds'] for row in rows])
+    if fit is None or fit[1] <= 0:
+        return default
+    return max(fit[0], 0.0), fit[1], f"measured over {len(rows)} layer pulls"
+
+
+def decide(conn, stage):
+    """(squash?, reason) of a stage with policy 'auto'."""
+    squashed = squashed_builds_since(conn, stage)
+    remeasure = int(os.environ.get('SQUASH_REMEASURE_BUILDS') or 5)
+    if squashed >= remeasure:
+        return False, f"{squashed} squashed builds since the last layer measurement, measuring again"
+    history = measurements(conn, stage)
+    if not history:
+        return False, "no layer measurement yet"
+    layers = history[0]
+    if len(layers) < 2:
+        return False, f"{len(layers)} layer, nothing to merge"
+    if len(history) < 2:
+        return False, f"{len(layers)} layers; unchanged bytes known after the next measured build"
+    if any(row['size'] is None for row in layers):
+        return False, f"{len(layers)} layers of unknown size"
+    previous = {row['diff_id'] for row in history[1]}
+    unchanged = sum(row['size'] for row in layers if row['diff_id'] in previous)
+    per_layer, per_byte, model = pull_model(conn)
+    gain = (len(layers) - 1) * per_layer
+    loss = unchanged * per_byte
+    return gain > loss, (f"{len(layers)} layers: merging saves {gain:.1f}s per pull, re-pulls "
+                         f"{human_size(unchanged)} unchanged since the last build ({loss:.1f}s) [{model}]")
+
+
+class HashingWriter:
+    """Write-through file object that hashes and counts the bytes written to `target`."""
+
+    def __init__(self, target):
+        self.target = target
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.sha256.update(data)
+        self.size += len(data)
+        return self.target.write(data)
+
+    def flush(self):
+        self.target.flush()
+
+    def digest(self):
+        return 'sha256:' + self.sha256.hexdigest()
+
+
+def hidden(path, deleted, opaque):
+    """Whether a lower-layer path is deleted (or replaced) by a higher layer, or under one of its opaque directories."""
+    parent = posixpath.dirname(path)
+    if path in deleted:
+        return True
+    while parent:
+        if parent in deleted or parent in opaque:
+            return True
+        parent = posixpath.dirname(parent)
+    return False
+
+
+def merged_members(source, descriptors):
+    """Per layer, the member indexes of the merged layer: the top-most version of each path,
+    nothing a higher layer deleted, whiteouts only where they still delete something below."""
+    keep = [set() for _ in descriptors]
+    seen, deleted, opaque = set(), set(), set()
+    for layer in range(len(descriptors) - 1, -1, -1):
+        layer_deleted, layer_opaque = set(), set()
+        with source.open_blob(descriptors[layer]['digest']) as stream, tarfile.open(fileobj=stream, mode='r|*') as tar:
+            for index, member in enumerate(tar):
+                path = posixpath.normpath('/' + member.name).lstrip('/')
+                parent, base = posixpath.split(path)
+                if hidden(path, deleted, opaque) or path in seen:
+                    continue
+                if base == OPAQUE:
+                    layer_opaque.add(parent)
+                elif base.startswith(WHITEOUT):
+                    target = posixpath.join(parent, base[len(WHITEOUT):])
+                    if target in seen:
+                        continue
+                    layer_deleted.add(target)
+                elif not member.isdir():
+                    layer_deleted.add(path)     # a file replacing a directory hides what was below it
+                seen.add(path)
+                keep[layer].add(index)
+        deleted |= layer_deleted
+        opaque |= layer_opaque
+    return keep
+
+
+def flatten(layout_dir, base_ids, platform):
+    """Merge the layers of the OCI layout image above its base into one; returns the new manifest digest (None: nothing to merge)."""
+    source = OCILayoutSource(layout_dir, platform)
+    manifest = source.manifest()
+    config = json.loads(source.read_blob(manifest['config']['digest']))
+    diff_ids = config.get('rootfs', {}).get('diff_ids', [])
+    shared = 0
+    while shared < min(len(diff_ids), len(base_ids)) and diff_ids[shared] == base_ids[shared]:
+        shared += 1
+    descriptors = manifest.get('layers', [])[shared:]
+    if len(descriptors) < 2:
+        return None
+    keep = merged_members(source, descriptors)
+
+    # Bottom-up, so the targets of hard links are written before the links
+    blob_dir = os.path.join(layout_dir, 'blobs', 'sha256')
+    partial = os.path.join(blob_dir, 'jetc-squash.partial')
+    with open(partial, 'wb') as blob:
+        compressed = HashingWriter(blob)
+        with gzip.GzipFile(fileobj=compressed, mode='wb', mtime=0) as gz:
+            uncompressed = HashingWriter(gz)
+            with tarfile.open(fileobj=uncompressed, mode='w|', format=tarfile.PAX_FORMAT) as out:
+                for layer, descriptor in enumerate(descriptors):
+                    with source.open_blob(descriptor['digest']) as stream, tarfile.open(fileobj=stream, mode='r|*') as tar:
+                        for index, member in enumerate(tar):
+                            if index in keep[layer]:
+                                out.addfile(member, tar.extractfile(member) if member.isreg() else None)
+    os.replace(partial, os.path.join(blob_dir, compressed.digest().split(':', 1)[1]))
+
+    docker_format = 'docker' in manifest.get('mediaType', '')
+    layer = {'mediaType': 'application/vnd.docker.image.rootfs.diff.tar.gzip' if docker_format
+             else 'application/vnd.oci.image.layer.v1.tar+gzip',
+             'digest': compressed.digest(), 'size': compressed.size}
+    config['rootfs']['diff_ids'] = diff_ids[:shared] + [uncompressed.digest()]
+    history, layers = [], 0
+    for entry in config.get('history', []):
+        if not entry.get('empty_layer'):
+            if layers >= shared:
+                entry = dict(entry, empty_layer=True)
+            layers += 1
+        history.append(entry)
+    history.append({'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                    'created_by': f"jetc: squashed {len(descriptors)} layers", 'comment': 'squash_policy.py flatten'})
+    config['history'] = history
+
+    def write_blob(document):
+        data = json.dumps(document, separators=(',', ':')).encode()
+        digest = 'sha256:' + hashlib.sha256(data).hexdigest()
+        with open(os.path.join(blob_dir, digest.split(':', 1)[1]), 'wb') as f:
+            f.write(data)
+        return digest, len(data)
+
+    config_digest, config_size = write_blob(config)
+    manifest = dict(manifest, layers=manifest['layers'][:shared] + [layer],
+                    config=dict(manifest['config'], digest=config_digest, size=config_size))
+    manifest_digest, manifest_size = write_blob(manifest)
+    # The layout now holds just the squashed image (attestations of the unsquashed one no longer apply)
+    with open(os.path.join(layout_dir, 'index.json')) as f:
+        index = json.load(f)
+    top = (index.get('manifests') or [{}])[0]
+    descriptor = {'mediaType': manifest.get('mediaType', 'application/vnd.oci.image.manifest.v1+json'),
+                  'digest': manifest_digest, 'size': manifest_size,
+                  'platform': {key: config[key] for key in ('architecture', 'os', 'variant') if config.get(key)}}
+    if top.get('annotations'):
+        descriptor['annotations'] = top['annotations']
+    with open(os.path.join(layout_dir, 'index.json'), 'w') as f:
+        json.dump({'schemaVersion': 2, 'mediaType': 'application/vnd.oci.image.index.v1+json',
+                   'manifests': [descriptor]}, f)
+    return manifest_digest
+
+
+def cmd_measure(args):
+    try:
+        source = open_source(args.image, args.kind, args.platform)
+        base_ids = set(open_source(args.base, 'auto', args.platform).diff_ids()) if args.base else set()
+        layers = stage_layers(source, args.image, base_ids)
+    except (LookupError, OSError) as error:
+        log_warning(f"cannot measure the layers of {args.stage}: {error}")
+        return 1
+
+    timed = args.time_pull and isinstance(source, RegistrySource)
+    rows = []
+    for position, (diff_id, size, descriptor) in enumerate(layers):
+        seconds = None
+        if timed and descriptor is not None:
+            try:
+                seconds = time_layer_pull(source, descriptor)
+            except (LookupError, OSError) as error:
+                log_warning(f"cannot time the pull of {descriptor['digest'][:19]}: {error}")
+        rows.append((args.run_id, args.stage, position, diff_id, size, seconds, int(args.squashed)))
+
+    with connect(args.db) as conn:
+        conn.execute("DELETE FROM stage_layers WHERE run_id = ? AND stage = ?", (args.run_id, args.stage))
+        conn.executemany("INSERT INTO stage_layers (run_id, stage, position, diff_id, size, pull_seconds, squashed) "
+                         "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    sizes = [row[4] for row in rows]
+    total = None if None in sizes else sum(sizes)
+    pulled = sum(row[5] or 0 for row in rows)
+    print(f"{args.stage}: {len(rows)} layers, {human_size(total)}" + (f", pulled in {pulled:.1f}s" if timed else '')
+          + (" (squashed)" if args.squashed else ''))
+    return 0
+
+
+def cmd_decide(args):
+    with connect(args.db) as conn:
+        squash, reason = decide(conn, args.stage)
+    print(f"{'y' if squash else 'n'}\t{reason}")
+    return 0
+
+
+def cmd_flatten(args):
+    try:
+        base_ids = open_source(args.base, 'auto', args.platform).diff_ids()
+        digest = flatten(args.layout, base_ids, args.platform)
+    except (LookupError, OSError, tarfile.TarError, KeyError, ValueError) as error:
+        log_warning(f"cannot squash the layers of {args.layout}: {error}")
+        return 1
+    if digest is None:
+        digest = OCILayoutSource(args.layout, args.platform).root()['manifests'][0]['digest']
+    print(f"oci-layout://{os.path.abspath(args.layout)}@{digest}")
+    return 0
+
+
+def cmd_model(args):
+    with connect(args.db) as conn:
+        per_layer, per_byte, model = pull_model(conn)
+    print(f"Layer pull cost: {per_layer:.2f}s per layer + {1 / per_byte / 1e6:.1f} MB/s ({model})")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure stage layers, decide the 'auto' squash policy and squash")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    cmd = sub.add_parser('measure', help="record the layers a stage adds after its build")
+    cmd.add_argument('stage')
+    cmd.add_argument('image', help="stage image: tag, registry reference or oci-layout://DIR@DIGEST")
+    cmd.add_argument('--db', required=True)
+    cmd.add_argument('--run-id', required=True)
+    cmd.add_argument('--base', help="base image of the stage (its layers are not counted)")
+    cmd.add_argument('--from', dest='kind', choices=['auto', 'docker', 'registry', 'oci'], default='auto')
+    cmd.add_argument('--platform', default=os.environ.get('PLATFORM') or 'linux/arm64')
+    cmd.add_argument('--time-pull', action='store_true', help="time streaming each layer from the registry")
+    cmd.add_argument('--squashed', action='store_true', help="the stage was squashed (its layers are not weighed)")
+    cmd.set_defaults(func=cmd_measure)
+
+    cmd = sub.add_parser('decide', help="print 'y' or 'n', a tab and the reason")
+    cmd.add_argument('stage')
+    cmd.add_argument('--db', required=True)
+    cmd.set_defaults(func=cmd_decide)
+
+    cmd = sub.add_parser('flatten', help="merge the layers above the base image of an OCI layout into one "
+                                        "and print its oci-layout:// reference")
+    cmd.add_argument('layout', help="OCI layout directory of the unsquashed stage build")
+    cmd.add_argument('--base', required=True, help="base image of the stage (its layers are kept)")
+    cmd.add_argument('--platform', default=os.environ.get('PLATFORM') or 'linux/arm64')
+    cmd.set_defaults(func=cmd_flatten)
+
+    cmd = sub.add_parser('model', help="print the layer pull cost model")
+    cmd.add_argument('--db', required=True)
+    cmd.set_defaults(func=cmd_model)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+# --- Footer ---
+# File location diagram:
+# jetc/                          <- Main project folder
+# ├── buildx/                    <- Parent directory
+# │   └── scripts/               <- Current directory
+# │       └── squash_policy.py   <- THIS FILE
+# └── ...                        <- Other project files
+#
+# Description: Measures the layers each stage adds (and their pull time), decides the 'auto' squash policy from the fitted pull cost versus the unchanged bytes squashing would re-pull, and merges a stage's layers in its OCI layout.
+# Author: Mr K / GitHub Copilot
+# COMMIT-TRACKING: UUID-20261017-044000-FX19
@@ -0,0 +1,51 @@
+#!/bin/sh
+# filepath: /workspaces/jetc/buildx/scripts/stage/ccache-env.sh
+
+# =========================================================================
+# Stage Compiler Cache Environment
+# Responsibility: Turn on ccache for the compiling RUN step of a stage
+#                 (USE_COMPILER_CACHE=y passes USE_CCACHE=on). Bind-mounted
+#                 from the jetc-scripts build context and sourced:
+#                     RUN --mount=type=cache,target=/root/.ccache,id=jetc-ccache \
+#                         --mount=type=bind,from=jetc-scripts,target=/opt/jetc-scripts \
+#                         . /opt/jetc-scripts/ccache-env.sh && <build> && \
+#                         sh /opt/jetc-scripts/ccache-report.sh
+#                 ccache is installed for this step only when the image
+#                 lacks it; ccache-report.sh removes it again so it never
+#                 reaches the layer. CMake builds pick it up through the
+#                 CMAKE_*_COMPILER_LAUNCHER variables.
+# POSIX sh: RUN steps run /bin/sh. Does nothing unless USE_CCACHE=on.
+# =========================================================================
+
+if [ "${USE_CCACHE:-off}" = "on" ]; then
+    JETC_CCACHE_PACKAGES=""
+    if ! command -v ccache > /dev/null; then
+        dpkg-query -W -f='${Package}\n' | sort > /tmp/jetc-ccache-before
+        apt-get update && apt-get install -y --no-install-recommends ccache
+        # Everything this install added, removed by ccache-report.sh
+        JETC_CCACHE_PACKAGES="$(dpkg-query -W -f='${Package}\n' | sort | comm -13 /tmp/jetc-ccache-before - | tr '\n' ' ')"
+        rm -f /tmp/jetc-ccache-before
+    fi
+    CCACHE_DIR=/root/.ccache
+    CCACHE_MAXSIZE="${CCACHE_MAXSIZE:-5G}"
+    CCACHE_COMPILERCHECK=content
+    CMAKE_C_COMPILER_LAUNCHER=ccache
+    CMAKE_CXX_COMPILER_LAUNCHER=ccache
+    CMAKE_CUDA_COMPILER_LAUNCHER=ccache
+    export JETC_CCACHE_PACKAGES CCACHE_DIR CCACHE_MAXSIZE CCACHE_COMPILERCHECK \
+        CMAKE_C_COMPILER_LAUNCHER CMAKE_CXX_COMPILER_LAUNCHER CMAKE_CUDA_COMPILER_LAUNCHER
+    ccache --zero-stats
+fi
+
+# --- Footer ---
+# File location diagram:
+# jetc/                              <- Main project folder
+# ├── buildx/                        <- Parent directory
+# │   └── scripts/                   <- Scripts directory
+# │       └── stage/                 <- Current directory (jetc-scripts build context)
+# │           └── ccache-env.sh      <- THIS FILE
+# └── ...                            <- Other project files
+#
+# Description: Sourced by the compiling stages: installs ccache for the step if needed, points it at the jetc-ccache mount and sets the CMake compiler launchers.
+# Author: Mr K / GitHub Copilot
+# COMMIT-TRACKING: UUID-20261017-043500-FX18
@@ -0,0 +1,43 @@
+#!/bin/sh
+# filepath: /workspaces/jetc/buildx/scripts/stage/ccache-report.sh
+
+# =========================================================================
+# Stage Compiler Cache Report
+# Responsibility: Print the ccache hit/miss counts of a compiling RUN step
+#                 as "jetc-ccache: hits=N misses=M" (summed per stage by
+#                 report_stage_compiler_cache) and uninstall the ccache that
+#                 ccache-env.sh installed for the step. Run after the build:
+#                     ... && sh /opt/jetc-scripts/ccache-report.sh
+# POSIX sh. Does nothing unless USE_CCACHE=on; never fails the step.
+# =========================================================================
+
+[ "${USE_CCACHE:-off}" = "on" ] || exit 0
+
+# ccache 4.x: --print-stats (machine readable); 3.x: -s (human readable)
+echo "jetc-ccache: $( (ccache --print-stats 2>/dev/null || ccache -s) | awk '
+    /^(direct_cache_hit|preprocessed_cache_hit)[ \t]/ {h += $2}
+    /^cache_miss[ \t]/ {m += $2}
+    /^cache hit \((direct|preprocessed)\)/ {h += $NF}
+    /^cache miss/ {m += $NF}
+    END {printf "hits=%d misses=%d", h, m}')"
+
+# Keep ccache out of the image: remove what ccache-env.sh installed
+if [ -n "${JETC_CCACHE_PACKAGES:-}" ]; then
+    # shellcheck disable=SC2086
+    apt-get purge -y ${JETC_CCACHE_PACKAGES} || true
+    grep -qs " /var/lib/apt/lists " /proc/mounts || rm -rf /var/lib/apt/lists/*
+fi
+exit 0
+
+# --- Footer ---
+# File location diagram:
+# jetc/                              <- Main project folder
+# ├── buildx/                        <- Parent directory
+# │   └── scripts/                   <- Scripts directory
+# │       └── stage/                 <- Current directory (jetc-scripts build context)
+# │           └── ccache-report.sh   <- THIS FILE
+# └── ...                            <- Other project files
+#
+# Description: Run after a compiling stage step: prints its ccache hit/miss counts and uninstalls the ccache installed for the step.
+# Author: Mr K / GitHub Copilot
+# COMMIT-TRACKING: UUID-20261017-043500-FX18
@@ -0,0 +1,39 @@
+#!/bin/sh
+# filepath: /workspaces/jetc/buildx/scripts/stage/wheelhouse-env.sh
+
+# =========================================================================
+# Stage Wheelhouse Environment
+# Responsibility: Point pip and twine at the local wheelhouse inside a stage
+#                 RUN step (USE_WHEELHOUSE=y). Bind-mounted from the
+#                 jetc-scripts build context and sourced:
+#                     RUN --mount=type=bind,from=jetc-scripts,target=/opt/jetc-scripts \
+#                         --mount=type=secret,id=jetc-wheelhouse \
+#                         . /opt/jetc-scripts/wheelhouse-env.sh && ...
+#                 pip keeps its index (PyPI or the image's) and finds the
+#                 wheels of this profile with --find-links; twine uploads to
+#                 the wheelhouse with the token of the jetc-wheelhouse secret.
+# POSIX sh: RUN steps run /bin/sh. Does nothing without WHEELHOUSE_URL.
+# =========================================================================
+
+if [ -n "${WHEELHOUSE_URL:-}" ]; then
+    PIP_FIND_LINKS="${WHEELHOUSE_URL}/links/${PIP_FIND_LINKS:+ $PIP_FIND_LINKS}"
+    PIP_TRUSTED_HOST="$(echo "${WHEELHOUSE_URL}" | sed -E 's#^[a-z]+://([^/]+).*#\1#')${PIP_TRUSTED_HOST:+ $PIP_TRUSTED_HOST}"
+    TWINE_REPOSITORY_URL="${WHEELHOUSE_URL}/"
+    TWINE_USERNAME=jetc
+    TWINE_PASSWORD="$(cat /run/secrets/jetc-wheelhouse 2>/dev/null)"
+    TWINE_NON_INTERACTIVE=1
+    export PIP_FIND_LINKS PIP_TRUSTED_HOST TWINE_REPOSITORY_URL TWINE_USERNAME TWINE_PASSWORD TWINE_NON_INTERACTIVE
+fi
+
+# --- Footer ---
+# File location diagram:
+# jetc/                              <- Main project folder
+# ├── buildx/                        <- Parent directory
+# │   └── scripts/                   <- Scripts directory
+# │       └── stage/                 <- Current directory (jetc-scripts build context)
+# │           └── wheelhouse-env.sh  <- THIS FILE
+# └── ...                            <- Other project files
+#
+# Description: Sourced by the wheelhouse stages: adds the wheelhouse of the build's wheel profile as pip --find-links and sets the twine upload URL and token.
+# Author: Mr K / GitHub Copilot
+# COMMIT-TRACKING: UUID-20261017-043000-FX17
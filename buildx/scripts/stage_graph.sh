@@ -0,0 +1,306 @@
+#!/bin/bash
+# filepath: /workspaces/jetc/buildx/scripts/stage_graph.sh
+
+# =========================================================================
+# Stage Dependency Graph Script
+# Responsibility: Parse the '#---' YAML headers of each stage Dockerfile and
+#                 build a dependency graph (parent image per stage) for the
+#                 stages in ORDERED_FOLDERS.
+# Relies on logging functions sourced by the main script.
+# =========================================================================
+
+# --- Dependencies ---
+SCRIPT_DIR_GRAPH="$(cd "$(dirname "${BASH_SOURCE[0]:-$0}")" && pwd)"
+
+# DO NOT source logging.sh or env_setup.sh here.
+# Assume they are sourced by the main build.sh script; fall back to basic echo otherwise.
+if ! declare -f log_info > /dev/null; then
+    log_info() { echo "INFO: $1"; }
+    log_warning() { echo "WARNING: $1" >&2; }
+    log_error() { echo "ERROR: $1" >&2; }
+    log_success() { echo "SUCCESS: $1"; }
+fi
+declare -f log_debug > /dev/null || log_debug() { :; }
+
+# --- Global Variables ---
+# STAGE_NAME[folder]    = package name from the header (e.g. 'protobuf:apt')
+# STAGE_DEPENDS[folder] = space-separated dependency names from the header
+# STAGE_INDEX[folder]   = position of the stage in ORDERED_FOLDERS
+# STAGE_PATH[folder]    = full path of the stage folder
+# STAGE_PARENT[folder]  = folder whose image is used as BASE_IMAGE ('' = SELECTED_BASE_IMAGE)
+declare -gA STAGE_NAME=()
+declare -gA STAGE_DEPENDS=()
+declare -gA STAGE_INDEX=()
+declare -gA STAGE_PATH=()
+declare -gA STAGE_PARENT=()
+
+# =========================================================================
+# Function: Read a field from the '#---' header block of a stage Dockerfile
+# Arguments: $1 = path to Dockerfile, $2 = field name (e.g. 'name', 'depends')
+# Returns: Field values to stdout (one line per occurrence, comments stripped)
+# =========================================================================
+get_stage_header_field() {
+    local dockerfile="$1"
+    local field="$2"
+    [[ -f "$dockerfile" ]] || return 0
+    awk -v field="$field" '
+        /^#---[[:space:]]*$/ { if (in_block) exit; in_block = 1; next }
+        in_block {
+            line = $0
+            sub(/^#[[:space:]]*/, "", line)
+            if (index(line, field ":") == 1) {
+                value = substr(line, length(field) + 2)
+                sub(/[[:space:]]+#.*$/, "", value)
+                gsub(/^[[:space:]]+|[[:space:]]+$/, "", value)
+                print value
+            }
+        }
+    ' "$dockerfile"
+}
+
+# =========================================================================
+# Function: Get the package name declared by a stage
+# Arguments: $1 = stage folder path
+# Returns: Name from the header, or the folder name without its numeric prefix
+# =========================================================================
+get_stage_name() {
+    local folder_path="$1"
+    local name
+    name=$(get_stage_header_field "$folder_path/Dockerfile" "name" | head -n 1 | awk '{print $1}')
+    if [[ -z "$name" ]]; then
+        name=$(basename "$folder_path" | sed -E 's/^([0-9]+-)+//')
+    fi
+    echo "$name"
+}
+
+# =========================================================================
+# Function: Get the dependency names declared by a stage
+# Arguments: $1 = stage folder path
+# Returns: Space-separated dependency names to stdout. Exit code 1 when the
+#          Dockerfile has no '#---' header (dependencies unknown).
+# =========================================================================
+get_stage_depends() {
+    local folder_path="$1"
+    local dockerfile="$folder_path/Dockerfile"
+    if [[ ! -f "$dockerfile" ]] || ! grep -q '^#---[[:space:]]*$' "$dockerfile"; then
+        return 1
+    fi
+    get_stage_header_field "$dockerfile" "depends" \
+        | sed -E 's/^\[([^]]*)\].*$/\1/' \
+        | tr ',' '\n' \
+        | sed -E 's/^[[:space:]]+|[[:space:]]+$//g' \
+        | grep -v '^$' \
+        | sort -u \
+        | tr '\n' ' ' \
+        | sed -E 's/[[:space:]]+$//'
+    return 0
+}
+
+# =========================================================================
+# Function: Find the stage (earlier in the build order) providing a dependency
+# Arguments: $1 = dependency name, $2 = index of the dependent stage
+# Returns: Space-separated folder names providing the dependency. A stage provides
+#          'x' when its name is 'x' or 'x:<tag>' (e.g. 'protobuf' -> 'protobuf:apt').
+# =========================================================================
+_resolve_stage_dependency() {
+    local dep="$1"
+    local max_index="$2"
+    local folder providers=()
+    for folder in "${!STAGE_NAME[@]}"; do
+        [[ ${STAGE_INDEX[$folder]} -lt $max_index ]] || continue
+        local name="${STAGE_NAME[$folder]}"
+        if [[ "$name" == "$dep" || "${name%%:*}" == "$dep" ]]; then
+            providers+=("$folder")
+        fi
+    done
+    echo "${providers[*]:-}"
+}
+
+# =========================================================================
+# Function: Print the ancestor chain of a stage (itself included)
+# Arguments: $1 = folder name
+# Returns: Space-separated folder names to stdout
+# =========================================================================
+get_stage_ancestors() {
+    local folder="$1"
+    local chain=()
+    while [[ -n "$folder" ]]; do
+        chain+=("$folder")
+        folder="${STAGE_PARENT[$folder]:-}"
+    done
+    echo "${chain[*]}"
+}
+
+# =========================================================================
+# Function: Read the name and dependencies of every stage from the package index
+# package_index.py caches the parsed headers keyed on file mtimes and hashes, so
+# this avoids re-parsing each Dockerfile. Disabled with PACKAGE_INDEX=n.
+# Arguments: $1 = build directory holding the stage folders
+# Returns: '<folder>\t<name>\t<depends>' lines to stdout ('-' = no dependencies,
+#          '?' = no header); nothing when the index is unavailable
+# =========================================================================
+get_indexed_stage_headers() {
+    local build_dir="$1"
+    [[ "${PACKAGE_INDEX:-y}" == "y" ]] || return 0
+    command -v python3 > /dev/null || return 0
+    python3 "$SCRIPT_DIR_GRAPH/package_index.py" --build-dir "$build_dir" stages 2>/dev/null || true
+}
+
+# =========================================================================
+# Function: Build the stage dependency graph for ORDERED_FOLDERS
+# Rules:
+#   - Only dependencies provided by an EARLIER selected stage are edges; anything
+#     else (pytorch, cmake, ...) is expected to come from the base image, exactly
+#     as in the serial chain.
+#   - A stage without a '#---' header keeps the serial behaviour and builds on
+#     the previous stage in ORDERED_FOLDERS.
+#   - An image has a single FROM, so all dependencies of a stage must sit on one
+#     ancestor chain. When they are spread over several branches, those branches
+#     are linearised (in build order) before the stage is attached.
+# Arguments: $1 = optional '--quiet' (do not log the resulting graph)
+# Relies on: ORDERED_FOLDERS
+# Exports:   STAGE_NAME, STAGE_DEPENDS, STAGE_INDEX, STAGE_PATH, STAGE_PARENT
+# Returns:   0 on success
+# =========================================================================
+build_stage_graph() {
+    local quiet="${1:-}"
+    STAGE_NAME=()
+    STAGE_DEPENDS=()
+    STAGE_INDEX=()
+    STAGE_PATH=()
+    STAGE_PARENT=()
+
+    # Header fields from the cached package index (one call for all stages);
+    # stages it does not know are parsed from their Dockerfile below
+    local -A indexed_name=() indexed_depends=()
+    local i folder_path folder
+    if [[ ${#ORDERED_FOLDERS[@]} -gt 0 ]]; then
+        local build_dir name depends
+        build_dir=$(dirname "${ORDERED_FOLDERS[0]}")
+        while IFS=$'\t' read -r folder name depends; do
+            indexed_name["$build_dir/$folder"]="$name"
+            indexed_depends["$build_dir/$folder"]="$depends"
+        done < <(get_indexed_stage_headers "$build_dir")
+    fi
+
+    for i in "${!ORDERED_FOLDERS[@]}"; do
+        folder_path="${ORDERED_FOLDERS[$i]}"
+        folder=$(basename "$folder_path")
+        STAGE_PATH["$folder"]="$folder_path"
+        STAGE_INDEX["$folder"]=$i
+        STAGE_NAME["$folder"]="${indexed_name[$folder_path]:-$(get_stage_name "$folder_path")}"
+    done
+
+    local previous=""
+    for folder_path in "${ORDERED_FOLDERS[@]}"; do
+        folder=$(basename "$folder_path")
+        local depends="${indexed_depends[$folder_path]:-}"
+        if [[ -z "$depends" ]]; then
+            depends=$(get_stage_depends "$folder_path") || depends="?"
+        fi
+        [[ "$depends" == "-" ]] && depends=""
+        if [[ "$depends" == "?" ]]; then
+            log_debug "Stage '$folder' has no header; chaining onto previous stage '${previous:-<base>}'."
+            STAGE_DEPENDS["$folder"]="?"
+            STAGE_PARENT["$folder"]="$previous"
+            previous="$folder"
+            continue
+        fi
+        STAGE_DEPENDS["$folder"]="$depends"
+
+        # Resolve declared dependencies to earlier stage folders
+        local dep_folders=() dep
+        for dep in $depends; do
+            local providers
+            providers=$(_resolve_stage_dependency "$dep" "${STAGE_INDEX[$folder]}")
+            if [[ -n "$providers" ]]; then
+                # shellcheck disable=SC2206
+                dep_folders+=($providers)
+            else
+                log_debug "Stage '$folder': dependency '$dep' not built here, expected in base image."
+            fi
+        done
+
+        if [[ ${#dep_folders[@]} -eq 0 ]]; then
+            STAGE_PARENT["$folder"]=""
+            previous="$folder"
+            continue
+        fi
+
+        # Union of the ancestor chains of every dependency, sorted by build order
+        local -A union=()
+        local d a
+        for d in "${dep_folders[@]}"; do
+            for a in $(get_stage_ancestors "$d"); do union["$a"]=1; done
+        done
+        local chain=()
+        mapfile -t chain < <(for a in "${!union[@]}"; do echo "${STAGE_INDEX[$a]} $a"; done | sort -n | awk '{print $2}')
+        unset union
+
+        # Linearise: each member of the union must be an ancestor of the next
+        local k
+        for ((k = 1; k < ${#chain[@]}; k++)); do
+            local expected="${chain[$((k - 1))]}"
+            if [[ " $(get_stage_ancestors "${chain[$k]}") " != *" $expected "* ]]; then
+                log_debug "Linearising branch: '${chain[$k]}' now builds on '$expected' (needed by '$folder')."
+                STAGE_PARENT["${chain[$k]}"]="$expected"
+            fi
+        done
+
+        STAGE_PARENT["$folder"]="${chain[$((${#chain[@]} - 1))]}"
+        previous="$folder"
+    done
+
+    [[ "$quiet" == "--quiet" ]] && return 0
+    log_info "Stage dependency graph (stage <- parent):"
+    for folder_path in "${ORDERED_FOLDERS[@]}"; do
+        folder=$(basename "$folder_path")
+        log_info "  - $folder <- ${STAGE_PARENT[$folder]:-<base image>}"
+    done
+    return 0
+}
+
+# =========================================================================
+# Function: List the stages that build directly on a given stage
+# Arguments: $1 = folder name ('' for stages built on the base image)
+# Returns: Space-separated folder names to stdout (in build order)
+# =========================================================================
+get_stage_children() {
+    local parent="$1"
+    local folder_path folder children=()
+    for folder_path in "${ORDERED_FOLDERS[@]}"; do
+        folder=$(basename "$folder_path")
+        if [[ "${STAGE_PARENT[$folder]:-}" == "$parent" ]]; then
+            children+=("$folder")
+        fi
+    done
+    echo "${children[*]:-}"
+}
+
+# --- Main Execution (for testing) ---
+if [[ "${BASH_SOURCE[0]}" == "${0}" ]]; then
+    set -euo pipefail
+    log_info "Running stage_graph.sh directly for testing..."
+
+    # Use the real stage folders so header parsing is exercised end to end
+    build_dir="$SCRIPT_DIR_GRAPH/../build"
+    mapfile -t ORDERED_FOLDERS < <(find "$build_dir" -maxdepth 1 -mindepth 1 -type d -name '[0-9]*-*' | sort -V)
+    build_stage_graph
+
+    log_info "Stages built directly on the base image: $(get_stage_children "")"
+    log_info "Ancestors of 18-comfyui: $(get_stage_ancestors "18-comfyui")"
+    log_info "Stage graph script test finished."
+    exit 0
+fi
+
+# --- Footer ---
+# File location diagram:
+# jetc/                          <- Main project folder
+# ├── buildx/                    <- Parent directory
+# │   └── scripts/               <- Current directory
+# │       └── stage_graph.sh     <- THIS FILE
+# └── ...                        <- Other project files
+#
+# Description: Parses Dockerfile '#---' headers (via the cached package index when available) and builds the stage dependency graph (also used for selection closure).
+# Author: Mr K / GitHub Copilot
+# COMMIT-TRACKING: UUID-20261017-002500-PIDX
@@ -4,6 +4,9 @@
 # =========================================================================
 # Final Tagging Script
 # Responsibility: Create, push, and verify the final timestamped tag.
+#                 In push mode images are verified by manifest digest and the
+#                 timestamp tag is a manifest-only retag: no layers are pulled
+#                 back or pushed again.
 # Relies on logging functions sourced by the main script.
 # Relies on env_setup.sh and docker_helpers.sh sourced by the main script or caller.
 # =========================================================================
@@ -17,14 +20,18 @@ SCRIPT_DIR_TAGGING="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 # DO NOT source logging.sh, env_setup.sh or docker_helpers.sh here.
 # Assume they are sourced by the main build.sh script.
 # Check if required functions exist as a safety measure.
-if ! declare -f log_info > /dev/null || ! declare -f generate_timestamped_tag > /dev/null || ! declare -f pull_image > /dev/null || ! declare -f verify_image_exists > /dev/null; then
+if ! declare -f log_info > /dev/null || ! declare -f generate_timestamped_tag > /dev/null || ! declare -f verify_pushed_image > /dev/null || ! declare -f verify_image_exists > /dev/null || ! declare -f sync_local_image > /dev/null; then
      echo "CRITICAL ERROR: Required functions (log_info, docker helpers) not found in tagging.sh. Ensure main script sources logging.sh, env_setup.sh, and docker_helpers.sh." >&2
      exit 1
 fi
 
 
 # =========================================================================
-# Function: Perform pre-tagging verification to ensure the image can be pulled/exists
+# Function: Perform pre-tagging verification to ensure the image exists
+# Local builds: the image must be in the docker daemon. Push mode: the
+# registry must serve the tag (HEAD request for its digest, nothing is pulled).
+# Arguments: $1 = image tag, $2 = skip_push_pull ('y' = local build)
+# Returns: 0 if verified, 1 otherwise
 # =========================================================================
 perform_pre_tagging_pull() {
     local image_tag="$1"
@@ -34,33 +41,37 @@ perform_pre_tagging_pull() {
 
     log_info "Performing pre-tagging verification for $image_tag"
 
-    # First verify the image exists locally using function from docker_helpers.sh
-    if ! verify_image_exists "$image_tag"; then
-        log_error "Image $image_tag not found locally for pre-tagging verification"
-        return 1
-    fi
-
-    # If built locally (--load), no need to pull
+    # If built locally (--load), the image must be in the daemon
     if [[ "$skip_push_pull" == "y" ]]; then
-        log_info "Image built locally (skip_push_pull=y), skipping pull verification"
+        if ! verify_image_exists "$image_tag"; then
+            log_error "Image $image_tag not found locally for pre-tagging verification"
+            return 1
+        fi
+        log_info "Image built locally (skip_push_pull=y), verified in the local daemon"
         return 0
     fi
 
-    # Try pulling the image if push mode was used
-    log_debug "Attempting pull for pre-tagging verification (push mode): $image_tag"
-    # Use pull_image function from docker_helpers.sh
-    if ! pull_image "$image_tag"; then
-        log_warning "Failed to pull $image_tag during pre-tagging verification (push mode)"
-        return 1 # Treat failure to pull back a pushed image as an error
+    # Push mode: the registry must serve the tag (verify_pushed_image from docker_helpers.sh)
+    if ! verify_pushed_image "$image_tag"; then
+        log_warning "$image_tag not found in the registry during pre-tagging verification (push mode)"
+        return 1
     fi
 
-    log_success "Pre-tagging verification successful for $image_tag (pull verified)"
+    log_success "Pre-tagging verification successful for $image_tag (digest verified)"
     return 0
 }
 
 
 # =========================================================================
 # Function: Create and potentially push a final timestamp tag for the image
+# Push mode: the tag is created in the registry from the image's manifest
+# (retag_registry_image); the local tag is only added when the image is local.
+# With FINAL_IMAGE_COMPRESSION other than the compression the stages were
+# pushed with (IMAGE_COMPRESSION), the tag is pushed with its layers
+# recompressed instead (export_image_variant).
+# Arguments: $1 = source tag, $2 = username, $3 = repo prefix,
+#            $4 = skip_push_pull ('y' = local build), $5 = optional registry
+# Returns: The timestamp tag to stdout, exit code 1 on failure
 # =========================================================================
 create_final_timestamp_tag() {
     local source_tag="$1"
@@ -81,22 +92,32 @@ create_final_timestamp_tag() {
     if [[ -z "$timestamp_tag" ]]; then log_error "Failed to generate timestamp tag"; return 1; fi
     log_debug "Generated timestamp tag: $timestamp_tag"
 
-    log_info "Tagging $source_tag as $timestamp_tag"
-    if ! docker tag "$source_tag" "$timestamp_tag"; then
-        log_error "Failed to tag $source_tag as $timestamp_tag"
-        return 1
-    fi
-
-    # If using push mode, push the new tag
-    if [[ "$skip_push_pull" != "y" ]]; then
-        log_info "Pushing timestamp tag $timestamp_tag to registry"
-        if ! docker push "$timestamp_tag"; then
+    # If using push mode, tag in the registry: a manifest copy, no layers are pushed
+    local final_compression="${FINAL_IMAGE_COMPRESSION:-${IMAGE_COMPRESSION:-gzip}}"
+    if [[ "$skip_push_pull" != "y" && "$final_compression" != "${IMAGE_COMPRESSION:-gzip}" ]]; then
+        if ! export_image_variant "$source_tag" "$timestamp_tag" "$final_compression"; then
+            log_error "Failed to push $timestamp_tag to registry"
+            return 1
+        fi
+        log_success "Successfully pushed $timestamp_tag ($final_compression layers)"
+    elif [[ "$skip_push_pull" != "y" ]]; then
+        log_info "Tagging $source_tag as $timestamp_tag in the registry (manifest only)"
+        if ! retag_registry_image "$source_tag" "$timestamp_tag"; then
             log_error "Failed to push $timestamp_tag to registry"
-            # Attempt to remove the local tag if push fails? Maybe not, leave it.
             return 1
         fi
         log_success "Successfully pushed $timestamp_tag"
+        # The local tag must name the pushed image, not an older local build under the source tag
+        if sync_local_image "$source_tag"; then
+            docker tag "$source_tag" "$timestamp_tag" || log_warning "Failed to add local tag $timestamp_tag"
+        fi
     else
+        [[ -n "${FINAL_IMAGE_COMPRESSION:-}" ]] && log_warning "FINAL_IMAGE_COMPRESSION applies to pushed images only; local build keeps its layers."
+        log_info "Tagging $source_tag as $timestamp_tag"
+        if ! docker tag "$source_tag" "$timestamp_tag"; then
+            log_error "Failed to tag $source_tag as $timestamp_tag"
+            return 1
+        fi
         log_debug "Skipping push for timestamp tag (local build mode)."
     fi
 
@@ -132,6 +153,31 @@ verify_all_images_exist_locally() {
 }
 
 
+# =========================================================================
+# Function: Verify all images in a list are served by their registry
+# Push-mode counterpart of verify_all_images_exist_locally (digest lookups only).
+# =========================================================================
+verify_all_images_pushed() {
+    local missing=0
+    if [[ $# -eq 0 ]]; then log_debug "No images provided to verify_all_images_pushed"; return 0; fi
+
+    log_info "Verifying $# images in the registry: $*"
+    for img in "$@"; do
+        if ! verify_pushed_image "$img"; then
+            missing=1
+        fi
+    done
+
+    if [[ $missing -eq 1 ]]; then
+        log_error "One or more expected images are missing from the registry."
+        return 1
+    fi
+
+    log_success "All expected images verified in the registry."
+    return 0
+}
+
+
 # --- Main Execution (for testing) ---\
 if [[ "${BASH_SOURCE[0]}" == "${0}" ]]; then
     # If testing directly, source dependencies first
@@ -153,6 +199,6 @@ fi
 # │       └── tagging.sh         <- THIS FILE
 # └── ...                        <- Other project files
 #
-# Description: Functions related to Docker image tagging.
+# Description: Functions related to Docker image tagging. Push mode verifies by manifest digest and retags manifests instead of pulling and pushing images, or pushes the final tag with zstd/eStargz layers (FINAL_IMAGE_COMPRESSION).
 # Author: Mr K / GitHub Copilot
-# COMMIT-TRACKING: UUID-20250425-080000-42595D
+# COMMIT-TRACKING: UUID-20261017-044500-FX20
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# filepath: /workspaces/jetc/buildx/scripts/wheelhouse.py
+"""
+Local wheelhouse: a wheel index the builder stages publish to and the other
+stages install from.
+
+'serve' runs a small HTTP server over a directory of wheels. Wheels are kept per
+profile (the L4T, CUDA and SM list they were compiled for, see 'profile'), since
+a wheel name and version do not say which of them it targets:
+
+    GET  /<profile>/simple/                  project list (PEP 503 simple repository API)
+    GET  /<profile>/simple/<project>/        the project's files, with #sha256= hashes
+    GET  /<profile>/links/                   every file of the profile (pip --find-links)
+    GET  /<profile>/files/<project>/<file>   a file
+    POST /<profile>/                         upload ('twine upload --repository-url <url>/',
+                                             legacy upload API)
+
+Uploads need the token (WHEELHOUSE_TOKEN, as the twine password); without one the
+server is read-only. A file that exists is never replaced (409). The server binds
+to the address given with --host (build.sh uses the Docker bridge gateway the
+builder reaches the host on), not to every interface.
+
+With USE_WHEELHOUSE=y build.sh starts it (scripts/wheelhouse.sh) and passes
+WHEELHOUSE_URL (<server>/<profile>) to the stages, and the token as the
+jetc-wheelhouse secret. The stages source scripts/stage/wheelhouse-env.sh: PyPI
+(or the image's index) stays the index, the wheelhouse is added as --find-links,
+and the builder variants (onnxruntime, triton, diffusers, bitsandbytes with
+FORCE_BUILD=on) upload their wheels with twine. A wheel compiled once is reused
+by every later build of the same profile.
+
+Usage:
+    wheelhouse.py serve [--dir DIR] [--host HOST] [--port PORT]
+    wheelhouse.py profile
+    wheelhouse.py list [--dir DIR]
+"""
+import argparse
+import base64
+import binascii
+import email.parser
+import email.policy
+import hashlib
+import hmac
+import html
+import os
+import re
+import shutil
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote
+
+from package_index import SCRIPT_DIR, log_warning
+
+DEFAULT_DIR = os.path.join(SCRIPT_DIR, '..', '.buildcache', 'wheelhouse')
+DEFAULT_PORT = 8099
+DIST_FILE = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._+-]*\.(whl|tar\.gz|zip)$')
+PROFILE = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._-]*$')
+
+
+def normalize(name):
+    """PEP 503 project name ('Flash_Attn' -> 'flash-attn')."""
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+
+class Wheelhouse:
+    """Directory of distributions: one subdirectory per profile, then per normalized project name."""
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self._hashes = {}   # path -> (mtime, size, sha256)
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def profiles(self):
+        return sorted(name for name in os.listdir(self.root)
+                      if PROFILE.match(name) and os.path.isdir(os.path.join(self.root, name)))
+
+    def projects(self, profile):
+        directory = os.path.join(self.root, profile)
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return []
+        return sorted(name for name in names if os.path.isdir(os.path.join(directory, name)) and self.files(profile, name))
+
+    def files(self, profile, project):
+        directory = os.path.join(self.root, profile, normalize(project))
+        try:
+            return sorted(name for name in os.listdir(directory) if DIST_FILE.match(name))
+        except OSError:
+            return []
+
+    def path(self, profile, project, filename):
+        if not PROFILE.match(profile) or not DIST_FILE.match(filename):
+            return None
+        return os.path.join(self.root, profile, normalize(project), filename)
+
+    def sha256(self, path):
+        """Hash of a file, recomputed only when it changed."""
+        stat = os.stat(path)
+        with self._lock:
+            cached = self._hashes.get(path)
+        if cached and cached[:2] == (stat.st_mtime, stat.st_size):
+            return cached[2]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        with self._lock:
+            self._hashes[path] = (stat.st_mtime, stat.st_size, digest.hexdigest())
+        return digest.hexdigest()
+
+    def store(self, profile, project, filename, data):
+        """Write an uploaded distribution atomically; raises FileExistsError when the file exists."""
+        path = self.path(profile, project, filename)
+        if path is None:
+            raise ValueError(f"not a profile and distribution file name: {profile}/{filename}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp.{threading.get_ident()}"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        try:
+            os.link(tmp_path, path)   # fails instead of replacing an existing file
+        finally:
+            os.remove(tmp_path)
+        return path
+
+
+def page(title, links):
+    body = '\n'.join(f'    <a href="{html.escape(href)}">{html.escape(text)}</a><br/>' for href, text in links)
+    return (f'<!DOCTYPE html>\n<html>\n  <head><meta name="pypi:repository-version" content="1.0">'
+            f'<title>{html.escape(title)}</title></head>\n  <body>\n{body}\n  </body>\n</html>\n').encode()
+
+
+class WheelhouseHandler(BaseHTTPRequestHandler):
+    wheelhouse = None   # set by serve()
+    token = None        # upload token; None = read-only
+
+    def _send(self, status, body=b'', content_type='text/html; charset=utf-8', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _file_link(self, profile, project, name):
+        path = self.wheelhouse.path(profile, project, name)
+        return (f"/{quote(profile)}/files/{quote(project)}/{quote(name)}#sha256={self.wheelhouse.sha256(path)}", name)
+
+    def do_GET(self):
+        parts = [unquote(part) for part in self.path.split('?')[0].split('/') if part]
+        if not parts or not PROFILE.match(parts[0]):
+            return self._send(404, b'not found (URLs start with a profile, see wheelhouse.py profile)\n', 'text/plain')
+        profile, parts = parts[0], parts[1:]
+        if not parts or parts == ['simple']:
+            links = [(f"/{quote(profile)}/simple/{quote(name)}/", name) for name in self.wheelhouse.projects(profile)]
+            return self._send(200, page('Simple index', links))
+        if parts == ['links']:
+            links = [self._file_link(profile, project, name)
+                     for project in self.wheelhouse.projects(profile) for name in self.wheelhouse.files(profile, project)]
+            return self._send(200, page(f"Files of {profile}", links))
+        if len(parts) == 2 and parts[0] == 'simple':
+            project = normalize(parts[1])
+            if project != parts[1]:
+                return self._redirect(f"/{quote(profile)}/simple/{quote(project)}/")
+            files = self.wheelhouse.files(profile, project)
+            if not files:
+                return self._send(404, b'not found\n', 'text/plain')
+            return self._send(200, page(f"Links for {project}", [self._file_link(profile, project, name) for name in files]))
+        if len(parts) == 3 and parts[0] == 'files':
+            path = self.wheelhouse.path(profile, parts[1], parts[2])
+            if path and os.path.isfile(path):
+                return self._send_file(path)
+        return self._send(404, b'not found\n', 'text/plain')
+
+    do_HEAD = do_GET
+
+    def _redirect(self, location):
+        self.send_response(301)
+        self.send_header('Location', location)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _send_file(self, path):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(os.path.getsize(path)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            with open(path, 'rb') as f:
+                shutil.copyfileobj(f, self.wfile)
+
+    def _authorized(self):
+        """Whether the request carries the upload token (as the basic auth password, as twine sends it)."""
+        scheme, _, credentials = self.headers.get('Authorization', '').partition(' ')
+        if not self.token or scheme.lower() != 'basic':
+            return False
+        try:
+            password = base64.b64decode(credentials, validate=True).decode().partition(':')[2]
+        except (binascii.Error, UnicodeDecodeError):
+            return False
+        return hmac.compare_digest(password.encode(), self.token.encode())
+
+    def do_POST(self):
+        """Legacy upload API as used by twine: multipart form with ':action', 'name' and 'content'."""
+        if not self.token:
+            return self._send(403, b'uploads are disabled: the wheelhouse was started without a token\n', 'text/plain')
+        if not self._authorized():
+            return self._send(401, b'upload token required\n', 'text/plain', {'WWW-Authenticate': 'Basic realm="wheelhouse"'})
+        parts = [unquote(part) for part in self.path.split('?')[0].split('/') if part]
+        if len(parts) != 1 or not PROFILE.match(parts[0]):
+            return self._send(404, b'upload to /<profile>/\n', 'text/plain')
+        content_type = self.headers.get('Content-Type', '')
+        length = int(self.headers.get('Content-Length') or 0)
+        if not content_type.startswith('multipart/form-data') or length <= 0:
+            return self._send(400, b'expected a multipart/form-data upload\n', 'text/plain')
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode() + self.rfile.read(length))
+        fields, upload = {}, None
+        for part in message.iter_parts():
+            name = part.get_param('name', header='content-disposition')
+            if name == 'content':
+                upload = (part.get_filename(), part.get_payload(decode=True))
+            elif name:
+                fields[name] = part.get_content().strip()
+        if fields.get(':action') != 'file_upload' or not upload or not upload[0] or not fields.get('name'):
+            return self._send(400, b'expected :action=file_upload with name and content\n', 'text/plain')
+        filename = os.path.basename(upload[0])
+        try:
+            self.wheelhouse.store(parts[0], fields['name'], filename, upload[1])
+        except FileExistsError:
+            return self._send(409, f"{parts[0]}/{filename} already exists\n".encode(), 'text/plain')
+        except (ValueError, OSError) as error:
+            return self._send(400, f"{error}\n".encode(), 'text/plain')
+        self.log_message("stored %s/%s (%d bytes)", parts[0], filename, len(upload[1]))
+        return self._send(200, b'OK\n', 'text/plain')
+
+
+def cmd_serve(args):
+    WheelhouseHandler.wheelhouse = Wheelhouse(args.dir)
+    WheelhouseHandler.token = os.environ.get('WHEELHOUSE_TOKEN') or None
+    if WheelhouseHandler.token is None:
+        log_warning("WHEELHOUSE_TOKEN is not set: serving read-only")
+    try:
+        server = ThreadingHTTPServer((args.host, args.port), WheelhouseHandler)
+    except OSError as error:
+        log_warning(f"cannot listen on {args.host}:{args.port}: {error}")
+        return 1
+    print(f"Serving {WheelhouseHandler.wheelhouse.root} on http://{args.host}:{args.port}/<profile>/simple/", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def cmd_profile(args):
+    # 'l4t36.4.0-cu12.6-sm87': what a compiled wheel targets beyond its name, version and platform tag
+    if SCRIPT_DIR not in sys.path:
+        sys.path.insert(0, SCRIPT_DIR)
+    from jetson_containers import CUDA_ARCHITECTURES, CUDA_VERSION, L4T_VERSION
+    print(f"l4t{L4T_VERSION}-cu{CUDA_VERSION}-sm{'_'.join(str(sm) for sm in sorted(CUDA_ARCHITECTURES))}")
+    return 0
+
+
+def cmd_list(args):
+    wheelhouse = Wheelhouse(args.dir)
+    for profile in wheelhouse.profiles():
+        for project in wheelhouse.projects(profile):
+            for name in wheelhouse.files(profile, project):
+                size = os.path.getsize(wheelhouse.path(profile, project, name))
+                print(f"{profile:28} {project:24} {name}  ({size / 1e6:.1f} MB)")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local wheel index the builder stages publish to")
+    parser.add_argument('--dir', default=os.environ.get('WHEELHOUSE_DIR') or DEFAULT_DIR,
+                        help="wheel directory (default: $WHEELHOUSE_DIR)")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    cmd = sub.add_parser('serve', help="serve the wheelhouse (simple index + uploads with $WHEELHOUSE_TOKEN)")
+    cmd.add_argument('--host', default=os.environ.get('WHEELHOUSE_HOST') or '127.0.0.1',
+                     help="address to bind (default: $WHEELHOUSE_HOST or 127.0.0.1)")
+    cmd.add_argument('--port', type=int, default=int(os.environ.get('WHEELHOUSE_PORT') or DEFAULT_PORT))
+    cmd.set_defaults(func=cmd_serve)
+    sub.add_parser('profile', help="wheel profile of the configured target (L4T, CUDA, SMs)").set_defaults(func=cmd_profile)
+    cmd = sub.add_parser('list', help="list the stored distributions")
+    cmd.set_defaults(func=cmd_list)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+# --- Footer ---
+# File location diagram:
+# jetc/                          <- Main project folder
+# ├── buildx/                    <- Parent directory
+# │   └── scripts/               <- Current directory
+# │       └── wheelhouse.py      <- THIS FILE
+# └── ...                        <- Other project files
+#
+# Description: Local wheel index (PEP 503 simple API + token-authenticated twine uploads, no overwrites), kept per L4T/CUDA/SM profile and shared by the builder and installer stages.
+# Author: Mr K / GitHub Copilot
+# COMMIT-TRACKING: UUID-20261017-043000-FX17
@@ -0,0 +1,197 @@
+#!/bin/bash
+# filepath: /workspaces/jetc/buildx/scripts/wheelhouse.sh
+
+# =========================================================================
+# Wheelhouse Script
+# Responsibility: Start the local wheel index (scripts/wheelhouse.py) before
+#                 the stages are built (USE_WHEELHOUSE=y), stop it after the
+#                 build, and export WHEELHOUSE_URL (server and wheel profile)
+#                 and WHEELHOUSE_TOKEN, which build_folder_image passes to the
+#                 stages: builder variants upload their wheels there, the other
+#                 stages find them with pip --find-links.
+# Relies on logging functions sourced by the main script.
+# =========================================================================
+
+# --- Dependencies ---
+SCRIPT_DIR_WHEELHOUSE="$(cd "$(dirname "${BASH_SOURCE[0]:-$0}")" && pwd)"
+
+# DO NOT source logging.sh or env_setup.sh here.
+# Assume they are sourced by the main build.sh script; fall back to basic echo otherwise.
+if ! declare -f log_info > /dev/null; then
+    log_info() { echo "INFO: $1"; }
+    log_warning() { echo "WARNING: $1" >&2; }
+    log_error() { echo "ERROR: $1" >&2; }
+    log_success() { echo "SUCCESS: $1"; }
+fi
+declare -f log_debug > /dev/null || log_debug() { :; }
+
+# =========================================================================
+# Function: Get the address the builder reaches this host on
+# BuildKit containers cannot reach the host's loopback, but they reach the
+# gateway of the Docker bridge network; the wheelhouse binds to that address
+# only (WHEELHOUSE_HOST overrides it), so it is not exposed on the LAN.
+# Arguments: None
+# Returns: The address to stdout (127.0.0.1 without a Docker bridge)
+# =========================================================================
+get_wheelhouse_address() {
+    local address="${WHEELHOUSE_HOST:-}"
+    if [[ -z "$address" ]] && command -v docker > /dev/null 2>&1; then
+        address=$(docker network inspect bridge --format '{{range .IPAM.Config}}{{.Gateway}}{{end}}' 2>/dev/null | awk '{print $1}')
+    fi
+    echo "${address:-127.0.0.1}"
+}
+
+# =========================================================================
+# Function: Get the wheel profile of the configured target
+# Wheels are kept per L4T, CUDA version and SM list ('wheelhouse.py profile'),
+# so a wheel compiled for another target or CUDA_ARCH_PROFILE is not installed.
+# Arguments: None
+# Returns: The profile (e.g. l4t36.4.0-cu12.6-sm87) to stdout, 1 on failure
+# =========================================================================
+get_wheelhouse_profile() {
+    python3 "$SCRIPT_DIR_WHEELHOUSE/wheelhouse.py" profile 2>/dev/null
+}
+
+# =========================================================================
+# Function: Get (or create) the upload token of the local wheelhouse
+# Arguments: $1 = wheelhouse directory
+# Returns: The token to stdout (kept in <dir>/token, readable by the owner only)
+# =========================================================================
+get_wheelhouse_token() {
+    local token_file="$1/token"
+    if [[ ! -s "$token_file" ]]; then
+        (umask 077 && python3 -c 'import secrets; print(secrets.token_hex(16))' > "$token_file") || return 1
+    fi
+    cat "$token_file"
+}
+
+# =========================================================================
+# Function: Check whether a wheelhouse answers
+# Arguments: $1 = wheelhouse URL (server/profile)
+# Returns: 0 if its simple index is reachable, 1 otherwise
+# =========================================================================
+wheelhouse_is_up() {
+    if command -v curl > /dev/null 2>&1; then
+        curl -fsS -o /dev/null --max-time 3 "$1/simple/" 2>/dev/null
+    else
+        python3 -c "import sys, urllib.request; urllib.request.urlopen(sys.argv[1] + '/simple/', timeout=3)" "$1" 2>/dev/null
+    fi
+}
+
+# PID of the wheelhouse server started by this build (stop_wheelhouse stops only that one)
+WHEELHOUSE_PID=""
+
+# =========================================================================
+# Function: Start (or join) the wheelhouse for this build
+# With WHEELHOUSE_URL set the wheelhouse of that host is used (uploads need its
+# WHEELHOUSE_TOKEN); otherwise the local one is started on the Docker bridge
+# address and WHEELHOUSE_PORT over WHEELHOUSE_DIR, with the token kept in that
+# directory (or joined when another build is running it). The wheel profile of
+# the target is appended to the URL.
+# Arguments: None
+# Relies on: USE_WHEELHOUSE, WHEELHOUSE_URL, WHEELHOUSE_DIR, WHEELHOUSE_PORT,
+#            WHEELHOUSE_HOST, WHEELHOUSE_TOKEN
+# Exports: WHEELHOUSE_URL (<server>/<profile>; empty when the wheelhouse is off
+#          or unavailable), WHEELHOUSE_TOKEN (upload token), WHEELHOUSE_PID
+# Returns: 0 (the build goes on without a wheelhouse when it cannot start)
+# =========================================================================
+start_wheelhouse() {
+    if [[ "${USE_WHEELHOUSE:-n}" != "y" ]]; then
+        export WHEELHOUSE_URL=""
+        return 0
+    fi
+    if ! command -v python3 > /dev/null 2>&1; then
+        log_warning "python3 not found; building without the wheelhouse."
+        export WHEELHOUSE_URL=""
+        return 0
+    fi
+    local profile
+    if ! profile=$(get_wheelhouse_profile) || [[ -z "$profile" ]]; then
+        log_warning "Cannot determine the wheel profile of the target; building without the wheelhouse."
+        export WHEELHOUSE_URL=""
+        return 0
+    fi
+
+    local server
+    if [[ -n "${WHEELHOUSE_URL:-}" ]]; then
+        server="${WHEELHOUSE_URL%/}"
+        server="${server%/"$profile"}"
+        wheelhouse_is_up "$server/$profile" || log_warning "Wheelhouse $server is not reachable; stages will fall back to their other indexes."
+        [[ -n "${WHEELHOUSE_TOKEN:-}" ]] || log_warning "WHEELHOUSE_TOKEN is not set; wheels built here are not uploaded to $server."
+    else
+        local wheelhouse_dir="${WHEELHOUSE_DIR:-$SCRIPT_DIR_WHEELHOUSE/../.buildcache/wheelhouse}"
+        mkdir -p "$wheelhouse_dir"
+        local address
+        address=$(get_wheelhouse_address)
+        server="http://$address:${WHEELHOUSE_PORT:-8099}"
+        if ! WHEELHOUSE_TOKEN=$(get_wheelhouse_token "$wheelhouse_dir"); then
+            log_warning "Cannot create the wheelhouse token in $wheelhouse_dir; building without the wheelhouse."
+            export WHEELHOUSE_URL="" WHEELHOUSE_TOKEN=""
+            return 0
+        fi
+        export WHEELHOUSE_TOKEN
+        if ! wheelhouse_is_up "$server/$profile"; then
+            nohup python3 "$SCRIPT_DIR_WHEELHOUSE/wheelhouse.py" --dir "$wheelhouse_dir" serve --host "$address" --port "${WHEELHOUSE_PORT:-8099}" \
+                >> "$wheelhouse_dir/server.log" 2>&1 &
+            WHEELHOUSE_PID=$!
+            local i
+            for ((i = 0; i < 20; i++)); do
+                wheelhouse_is_up "$server/$profile" && break
+                sleep 0.5
+            done
+            if ! wheelhouse_is_up "$server/$profile"; then
+                log_warning "Wheelhouse did not start (see $wheelhouse_dir/server.log); building without it."
+                stop_wheelhouse
+                export WHEELHOUSE_URL=""
+                return 0
+            fi
+            log_success "Started wheelhouse on $server (wheels in $wheelhouse_dir)"
+        fi
+    fi
+    export WHEELHOUSE_URL="$server/$profile" WHEELHOUSE_PID
+    log_info "Using wheelhouse: $WHEELHOUSE_URL"
+    return 0
+}
+
+# =========================================================================
+# Function: Stop the wheelhouse server started by start_wheelhouse
+# A wheelhouse joined from another build or host is left running.
+# Arguments: None
+# Relies on: WHEELHOUSE_PID
+# Returns: 0
+# =========================================================================
+stop_wheelhouse() {
+    [[ -n "${WHEELHOUSE_PID:-}" ]] || return 0
+    if kill "$WHEELHOUSE_PID" 2>/dev/null; then
+        log_info "Stopped wheelhouse (pid $WHEELHOUSE_PID)."
+    fi
+    WHEELHOUSE_PID=""
+    return 0
+}
+
+# --- Main Execution (for testing) ---
+if [[ "${BASH_SOURCE[0]}" == "${0}" ]]; then
+    set -euo pipefail
+    log_info "Running wheelhouse.sh directly for testing..."
+    WHEELHOUSE_DIR="$(mktemp -d)"
+    WHEELHOUSE_PORT="${WHEELHOUSE_PORT:-18099}"
+    USE_WHEELHOUSE=y
+    start_wheelhouse
+    log_info "Simple index reachable: $(wheelhouse_is_up "$WHEELHOUSE_URL" && echo yes || echo no)"
+    stop_wheelhouse
+    rm -rf "$WHEELHOUSE_DIR"
+    log_info "Wheelhouse script test finished."
+    exit 0
+fi
+
+# --- Footer ---
+# File location diagram:
+# jetc/                          <- Main project folder
+# ├── buildx/                    <- Parent directory
+# │   └── scripts/               <- Current directory
+# │       └── wheelhouse.sh      <- THIS FILE
+# └── ...                        <- Other project files
+#
+# Description: Starts (on the Docker bridge address, with an upload token) or joins the local wheelhouse for a build, exports WHEELHOUSE_URL (server and wheel profile) and WHEELHOUSE_TOKEN for the stages, and stops the server it started.
+# Author: Mr K / GitHub Copilot
+# COMMIT-TRACKING: UUID-20261017-043000-FX17